@@ -5,9 +5,11 @@ Reads ambient environmental conditions for AC and dehumidification control
 
 import logging
 import time
-from typing import Optional, Tuple
+from typing import Hashable, Optional, Tuple
 from datetime import datetime
 
+from modbus_sensor import SensorData
+
 logger = logging.getLogger(__name__)
 
 try:
@@ -38,6 +40,20 @@ class AmbientSensorData:
             'is_valid': self.is_valid,
             'error': self.error
         }
+    
+    def to_sensor_data(self, sensor_id: Hashable) -> SensorData:
+        """
+        Convert to a SensorData (temperature and humidity only) so the reading
+        can share the snapshot, history and streaming pipeline of the soil sensors.
+        The DHT22 is not calibrated, so raw and calibrated values are the same.
+        """
+        data = SensorData(sensor_id)
+        data.temperature = data.temperature_raw = self.temperature
+        data.humidity = data.humidity_raw = self.humidity
+        data.timestamp = self.timestamp
+        data.is_valid = self.is_valid
+        data.error = self.error
+        return data
 
 
 class AmbientSensorReader:
@@ -4,14 +4,29 @@ Provides REST API endpoints for sensor data and serves HTML dashboard.
 Includes humidity-based relay control for atomizer/humidifier.
 """
 
-from flask import Flask, render_template, jsonify
+from flask import Flask, Response, g, render_template, jsonify, request
 from datetime import datetime
+import json
 import logging
 import os
 from pathlib import Path
 import threading
+import time
 
-from modbus_sensor import ModbusNPKReader, initialize_logger
+from ambient_sensor import ACControlAutomation, AmbientSensorReader
+from modbus_sensor import DEFAULT_REGISTER_MAP, PARAMETERS, initialize_logger
+from bus_manager import BusConfig, BusManager, parse_bus_list
+from calibration_engine import get_engine, load_calibration, set_engine
+from config_watcher import ConfigWatcher, load_config_file
+from control_loop import ControlEngine, ControlLoop, DecisionLoop, LoopConfig, PIDLoop, PIDTuning
+from event_stream import EventBroadcaster
+from history_store import HistoryStore
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, REGISTRY
+from reading_cache import ReadingCache
+from rule_engine import RuleEngine, rules_from_config
+from sensor_poller import BackgroundSource, SensorPoller
+from sensor_registry import load_registry
+from signal_filters import SignalFilterStage, parse_filter_spec
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -21,17 +36,134 @@ app.config['JSON_SORT_KEYS'] = False
 initialize_logger('/var/log/soil-monitor/app.log', level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Global Modbus reader instance
-modbus_reader = None
+# Global bus manager, reading cache and background poller instances
+bus_manager = None
+reading_cache = None
+sensor_poller = None
+history_store = None
+sensor_registry = None
+config_watcher = None
+control_engine = None
+ambient_reader = None
+rule_engine = None
+rules_lock = threading.Lock()  # Held while rules are evaluated or replaced
+
+# Server-Sent Events fan-out for the dashboard
+event_broadcaster = EventBroadcaster()
+
+# Instrumentation, exposed at /metrics
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    'http_request_seconds', 'Flask request latency per route (until the response starts)',
+    ('route', 'method'), buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+HTTP_REQUESTS = REGISTRY.counter('http_requests', 'Flask requests per route and status',
+                                 ('route', 'method', 'status'))
+RELAY_TOGGLES = REGISTRY.counter('relay_toggles', 'Relay state changes', ('port', 'state'))
+CACHE_REQUESTS = REGISTRY.counter('reading_cache_requests', 'Reading cache lookups by result', ('result',))
 
 # Configuration
 MODBUS_PORT = os.getenv('MODBUS_PORT', '/dev/ttyAMA0')
 MODBUS_BAUDRATE = int(os.getenv('MODBUS_BAUDRATE', '9600'))
 GPIO_DE_RE = int(os.getenv('GPIO_DE_RE', '24'))
+# DE/RE switching: 'timed' (from baud rate), 'rs485' (kernel RTS toggling) or 'sleep' (legacy 10 ms)
+DE_RE_MODE = os.getenv('DE_RE_MODE', 'timed').lower()
+MODBUS_ROOM = os.getenv('MODBUS_ROOM', 'default')  # Namespace for the MODBUS_PORT bus
+# Optional extra buses, one USB-RS485 adapter per room: 'room1:/dev/ttyUSB0,room2:/dev/ttyUSB1'
+MODBUS_BUSES = os.getenv('MODBUS_BUSES', '')
+# Slave IDs on each bus when no registry file is used: '1' or '1,2,3,4'
+MODBUS_SLAVES = [int(slave) for slave in os.getenv('MODBUS_SLAVES', '1').split(',') if slave.strip()]
+# Declarative sensor registry (.json/.yaml/.toml); overrides the MODBUS_* bus settings
+SENSOR_REGISTRY = os.getenv('SENSOR_REGISTRY', '')
+# Holding register with moisture/humidity (% * HUMIDITY_SCALE), if the sensor has one;
+# required for humidity-based relay control. Check the sensor datasheet
+HUMIDITY_REGISTER = os.getenv('HUMIDITY_REGISTER', '')
+HUMIDITY_SCALE = float(os.getenv('HUMIDITY_SCALE', '10'))
+# Unused registers read through rather than sending another request (0 = never)
+REGISTER_MAX_GAP = int(os.getenv('REGISTER_MAX_GAP', '16'))
+POLL_INTERVAL = float(os.getenv('POLL_INTERVAL', '5.0'))  # Seconds between bus scans
+# 'sync' (one blocking thread per bus) or 'async' (all buses on one asyncio loop)
+MODBUS_BACKEND = os.getenv('MODBUS_BACKEND', 'sync').lower()
+# Slow-changing NPK values are read less often than pH/EC/temperature (0 = every scan)
+NPK_POLL_INTERVAL = float(os.getenv('NPK_POLL_INTERVAL', '60'))
+# Slaves that stop answering are backed off so they do not stall the scan
+SLAVE_FAILURE_THRESHOLD = int(os.getenv('SLAVE_FAILURE_THRESHOLD', '3'))  # Failed reads before backoff
+SLAVE_BACKOFF_MAX = float(os.getenv('SLAVE_BACKOFF_MAX', '600'))  # Max seconds between probes
+
+# Reading cache (serves last good reading if a read fails)
+CACHE_READINGS = os.getenv('CACHE_READINGS', 'True').lower() == 'true'
+CACHE_DURATION = float(os.getenv('CACHE_DURATION', '300'))  # Seconds before a reading is stale
+
+# Streaming filters per parameter applied before readings are served (history stays unfiltered), e.g.
+# 'humidity=median:5,ewma:0.3;temperature=median:5;*=median:3' ('' = no filtering)
+SIGNAL_FILTERS = os.getenv('SIGNAL_FILTERS', '')
+
+# Sensor history (SQLite, written in batches to spare the SD card)
+HISTORY_DB = os.getenv('HISTORY_DB', '/var/lib/soil-monitor/history.db')
+HISTORY_FLUSH_INTERVAL = float(os.getenv('HISTORY_FLUSH_INTERVAL', '60'))  # Seconds between disk writes
+HISTORY_DEFAULT_RANGE = 24 * 3600  # Seconds of history returned when 'from' is omitted
+HISTORY_MAX_POINTS = 10000
 
-# Humidity control configuration
+# Humidity control configuration (defaults; CONTROL_CONFIG overrides them at runtime)
 HUMIDITY_THRESHOLD_ON = 60.0   # Turn ON relay when humidity < 60%
 HUMIDITY_THRESHOLD_OFF = 75.0  # Turn OFF relay when humidity >= 75%
+HUMIDITY_AGGREGATE = 'median'  # Across sensors: median, min, max, mean or weighted
+HUMIDITY_MIN_ON = 30.0         # Seconds the atomizer stays ON at least
+HUMIDITY_MIN_OFF = 30.0        # Seconds the atomizer stays OFF at least
+HUMIDITY_MAX_TOGGLES = 12      # Relay switches per hour (0 = unlimited)
+HUMIDITY_MODE = 'hysteresis'   # 'hysteresis' (thresholds above) or 'pid' (time-proportioning)
+HUMIDITY_SETPOINT = 68.0       # PID target humidity (%)
+HUMIDITY_KP = 0.04             # PID gains: duty per % error, per %·s, per %/s (pid_autotune.py or
+HUMIDITY_KI = 0.00008          # POST /api/control/humidity/autotune find them for a chamber)
+HUMIDITY_KD = 0.0
+HUMIDITY_PID_WINDOW = 300.0    # Seconds per on/off cycle; the relay switches at most twice per window
+
+# Ambient DHT22 sensor and AC control on relay port 2
+AMBIENT_SENSOR_PIN = os.getenv('AMBIENT_SENSOR_PIN', 'D25')  # D24, D25 or D26; '' = no ambient sensor
+AMBIENT_POLL_INTERVAL = float(os.getenv('AMBIENT_POLL_INTERVAL', '10'))  # DHT22 needs >= 2 s between reads
+AMBIENT_SENSOR_KEY = f"{MODBUS_ROOM}/ambient/dht22"  # Key in the snapshot, history and stream
+# A failed read is retried after 0.5 s; with SIGNAL_FILTERS the median and the cache already cover misses
+AMBIENT_READ_RETRIES = int(os.getenv('AMBIENT_READ_RETRIES', '1' if SIGNAL_FILTERS else '3'))
+AC_TEMP_ON = 28.0       # AC ON at or above this temperature (°C)
+AC_TEMP_OFF = 24.0      # AC OFF once temperature and humidity are at or below their OFF thresholds
+AC_HUMIDITY_ON = 70.0   # AC ON (dehumidify) at or above this humidity (%)
+AC_HUMIDITY_OFF = 60.0
+AC_MIN_ON = 300.0       # Compressor protection: seconds ON at least
+AC_MIN_OFF = 180.0      # Seconds OFF at least before restarting
+AC_MAX_TOGGLES = 6      # Relay switches per hour
+
+# Hot-reloaded configuration files (.json/.yaml/.toml), checked every CONFIG_RELOAD_INTERVAL seconds
+# Calibration table; without it calibration_config.py itself is watched
+CALIBRATION_FILE = os.getenv('CALIBRATION_FILE', '')
+# Control parameters, e.g. {"humidity_threshold_on": 55, "humidity_threshold_off": 70}
+CONTROL_CONFIG = os.getenv('CONTROL_CONFIG', '')
+# Automation rules, e.g. {"rules": [{"when": "avg(ec) > 2.0 and temperature > 28 for 10m", "relay": 2}]}
+RULES_CONFIG = os.getenv('RULES_CONFIG', '')
+CONFIG_RELOAD_INTERVAL = float(os.getenv('CONFIG_RELOAD_INTERVAL', '2'))  # 0 = no hot reload
+
+DEFAULT_CONTROL_SETTINGS = {
+    'humidity_threshold_on': HUMIDITY_THRESHOLD_ON,
+    'humidity_threshold_off': HUMIDITY_THRESHOLD_OFF,
+    'humidity_aggregate': HUMIDITY_AGGREGATE,
+    'humidity_sensors': None,  # Sensor keys or slave IDs (None = all sensors with humidity)
+    'humidity_weights': {},    # Per-sensor weights for the 'weighted' zone average
+    'humidity_min_on': HUMIDITY_MIN_ON,
+    'humidity_min_off': HUMIDITY_MIN_OFF,
+    'humidity_max_toggles': HUMIDITY_MAX_TOGGLES,
+    'humidity_mode': HUMIDITY_MODE,
+    'humidity_setpoint': HUMIDITY_SETPOINT,
+    'humidity_kp': HUMIDITY_KP,
+    'humidity_ki': HUMIDITY_KI,
+    'humidity_kd': HUMIDITY_KD,
+    'humidity_pid_window': HUMIDITY_PID_WINDOW,
+    'ac_temp_on': AC_TEMP_ON,
+    'ac_temp_off': AC_TEMP_OFF,
+    'ac_humidity_on': AC_HUMIDITY_ON,
+    'ac_humidity_off': AC_HUMIDITY_OFF,
+    'ac_min_on': AC_MIN_ON,
+    'ac_min_off': AC_MIN_OFF,
+    'ac_max_toggles': AC_MAX_TOGGLES,
+}
+# Active control parameters; replaced as a whole on reload, never mutated
+control_settings = dict(DEFAULT_CONTROL_SETTINGS)
 GPIO_RELAY_PORT1 = int(os.getenv('GPIO_RELAY_PORT1', '26'))  # GPIO pin for Port 1 (atomizer/humidifier)
 GPIO_RELAY_PORT2 = int(os.getenv('GPIO_RELAY_PORT2', '19'))  # GPIO pin for Port 2 (future expansion)
 
@@ -40,6 +172,8 @@ relay_states = {
     1: {'enabled': True, 'active': False},  # Port 1 (atomizer)
     2: {'enabled': True, 'active': False}   # Port 2 (future)
 }
+RELAY_LABELS = {1: 'Atomizer/Humidifier', 2: 'Reserved'}  # Port 2 becomes the AC with an ambient sensor
+RELAY_LOOPS = {1: 'humidity', 2: 'ac'}  # Control loop driving each port, if it runs
 
 # Initialize GPIO (only on Raspberry Pi)
 try:
@@ -50,20 +184,40 @@ try:
     GPIO.output(GPIO_RELAY_PORT1, GPIO.LOW)  # Initially OFF
     GPIO.output(GPIO_RELAY_PORT2, GPIO.LOW)
     logger.info(f"GPIO relay pins initialized: Port1={GPIO_RELAY_PORT1}, Port2={GPIO_RELAY_PORT2}")
+    GPIO_AVAILABLE = True
 except (ImportError, RuntimeError) as e:
     logger.warning(f"GPIO not available (not on Raspberry Pi?): {e}")
+    GPIO_AVAILABLE = False
 
 
 def init_modbus():
-    """Initialize Modbus connection on startup."""
-    global modbus_reader
+    """Initialize Modbus connections (one reader and arbiter per bus) on startup."""
+    global bus_manager, sensor_registry
     try:
-        modbus_reader = ModbusNPKReader(
-            port=MODBUS_PORT,
-            baudrate=MODBUS_BAUDRATE,
-            gpio_de_re=GPIO_DE_RE
-        )
-        if modbus_reader.connect():
+        register_map = DEFAULT_REGISTER_MAP
+        if HUMIDITY_REGISTER:
+            register_map = register_map.with_field('humidity', int(HUMIDITY_REGISTER, 0), HUMIDITY_SCALE)
+
+        if SENSOR_REGISTRY:
+            sensor_registry = load_registry(SENSOR_REGISTRY, defaults={'baudrate': MODBUS_BAUDRATE,
+                                                                       'max_gap': REGISTER_MAX_GAP,
+                                                                       'de_re_mode': DE_RE_MODE})
+            configs = sensor_registry.buses
+        elif MODBUS_BUSES:
+            configs = parse_bus_list(MODBUS_BUSES, baudrate=MODBUS_BAUDRATE, slaves=MODBUS_SLAVES,
+                                     register_map=register_map, max_gap=REGISTER_MAX_GAP,
+                                     de_re_mode=DE_RE_MODE)
+        else:
+            configs = [BusConfig(MODBUS_PORT, room=MODBUS_ROOM, baudrate=MODBUS_BAUDRATE,
+                                 gpio_de_re=GPIO_DE_RE, slaves=MODBUS_SLAVES,
+                                 register_map=register_map, max_gap=REGISTER_MAX_GAP,
+                                 de_re_mode=DE_RE_MODE)]
+        param_intervals = {param: NPK_POLL_INTERVAL for param in ('nitrogen', 'phosphorus', 'potassium')}
+        bus_manager = BusManager(configs, param_intervals=param_intervals,
+                                 failure_threshold=SLAVE_FAILURE_THRESHOLD,
+                                 backoff_max=SLAVE_BACKOFF_MAX,
+                                 backend=MODBUS_BACKEND)
+        if bus_manager.connect():
             logger.info("Modbus reader initialized successfully")
             return True
         else:
@@ -74,94 +228,399 @@ def init_modbus():
         return False
 
 
-def set_relay(port, state):
+def init_poller():
+    """Start the background poller that scans all buses through the bus manager."""
+    global reading_cache, sensor_poller
+    if not bus_manager:
+        return False
+    filters = None
+    if SIGNAL_FILTERS:
+        try:
+            filters = SignalFilterStage(parse_filter_spec(SIGNAL_FILTERS))
+            logger.info(f"Signal filters: {SIGNAL_FILTERS}")
+        except ValueError as e:
+            logger.error(f"Invalid SIGNAL_FILTERS, publishing unfiltered readings: {e}")
+    reading_cache = ReadingCache(bus_manager, ttl=CACHE_DURATION, fallback=CACHE_READINGS, filters=filters)
+    CACHE_REQUESTS.labels('hit').set_function(lambda: reading_cache.hits)
+    CACHE_REQUESTS.labels('stale').set_function(lambda: reading_cache.stale_hits)
+    CACHE_REQUESTS.labels('miss').set_function(lambda: reading_cache.misses)
+    sensor_poller = SensorPoller(bus_manager, interval=POLL_INTERVAL, cache=reading_cache)
+    if ambient_reader:
+        sensor_poller.add_source(BackgroundSource(AMBIENT_SENSOR_KEY, read_ambient, AMBIENT_POLL_INTERVAL))
+    init_control()
+    init_rules()
+    # Rules first, so their overrides apply in the same cycle
+    sensor_poller.add_listener(apply_rules)
+    sensor_poller.add_listener(control_engine.update)
+    sensor_poller.add_listener(publish_snapshot)
+    if history_store:
+        sensor_poller.add_listener(record_history)
+    sensor_poller.start()
+    return True
+
+
+def init_history():
+    """Open the sensor history database."""
+    global history_store
+    try:
+        history_store = HistoryStore(HISTORY_DB, flush_interval=HISTORY_FLUSH_INTERVAL)
+        return True
+    except Exception as e:
+        logger.error(f"Error opening history store: {e}")
+        return False
+
+
+def init_calibration():
     """
-    Control relay state.
-    
-    Args:
-        port: Relay port (1 or 2)
-        state: True for ON, False for OFF
+    Register the active calibration with the history store.
+
+    If the calibration changed since history was recorded, stored values
+    are recalibrated from their raw readings in the background. Waits for
+    the buses: history is keyed by sensor key, and only the bus manager
+    knows which calibration entry each key uses.
+    """
+    if not bus_manager:
+        logger.info("History recalibration deferred until the sensor buses are configured")
+        return False
+    try:
+        engine = get_engine()
+        history_store.sync_calibration(engine.table, bus_manager.calibration_ids, label=engine.version)
+        return True
+    except Exception as e:
+        logger.error(f"Error registering calibration with history store: {e}")
+        return False
+
+
+def reload_calibration(path):
+    """Config watcher loader: compile a calibration file and make it the active one."""
+    engine = load_calibration(path)
+    set_engine(engine)
+    if history_store:
+        init_calibration()
+
+
+def resolve_sensor_key(sensor):
+    """Sensor key for a key or bare slave ID in the control settings."""
+    sensor = str(sensor)
+    return (bus_manager.resolve(sensor) if bus_manager else None) or sensor
+
+
+def humidity_loop_config(settings):
+    """Build (and validate) the atomizer control loop settings."""
+    sensors = settings['humidity_sensors']
+    if sensors is None and bus_manager:
+        # Soil sensors only, not the ambient air sensor
+        sensors = bus_manager.sensor_keys
+    return LoopConfig(
+        'humidity', settings['humidity_threshold_on'], settings['humidity_threshold_off'], mode='below',
+        aggregate=settings['humidity_aggregate'],
+        sensors=[resolve_sensor_key(sensor) for sensor in sensors] if sensors is not None else None,
+        weights={resolve_sensor_key(sensor): float(weight)
+                 for sensor, weight in (settings['humidity_weights'] or {}).items()},
+        min_on=float(settings['humidity_min_on']), min_off=float(settings['humidity_min_off']),
+        max_toggles=int(settings['humidity_max_toggles']),
+        max_age=max(CACHE_DURATION, 3 * POLL_INTERVAL),
+    )
+
+
+def humidity_pid_tuning(settings):
+    """Build (and validate) the atomizer PID settings; None in hysteresis mode."""
+    mode = settings['humidity_mode']
+    if mode not in ('hysteresis', 'pid'):
+        raise ValueError(f"Invalid humidity_mode '{mode}', must be 'hysteresis' or 'pid'")
+    if mode == 'hysteresis':
+        return None
+    return PIDTuning(float(settings['humidity_setpoint']), float(settings['humidity_kp']),
+                     float(settings['humidity_ki']), float(settings['humidity_kd']),
+                     float(settings['humidity_pid_window']))
+
+
+def humidity_loop(loop_config, tuning):
+    """Atomizer control loop on relay port 1 for the given mode."""
+    if tuning is not None:
+        return PIDLoop('humidity', relay_actuator(1), loop_config, tuning, state=relay_states[1]['active'])
+    return ControlLoop('humidity', relay_actuator(1), loop_config, state=relay_states[1]['active'])
+
+
+def ac_loop_settings(settings):
+    """Build (and validate) the AC loop settings and its ACControlAutomation."""
+    temp_on, temp_off = float(settings['ac_temp_on']), float(settings['ac_temp_off'])
+    humidity_on, humidity_off = float(settings['ac_humidity_on']), float(settings['ac_humidity_off'])
+    if temp_on <= temp_off or humidity_on <= humidity_off:
+        raise ValueError("AC ON thresholds must be above the OFF thresholds")
+    # The automation decides; the thresholds here only document the loop in /api/status
+    config = LoopConfig(
+        'temperature', temp_on, temp_off, mode='above', sensors=[AMBIENT_SENSOR_KEY],
+        min_on=float(settings['ac_min_on']), min_off=float(settings['ac_min_off']),
+        max_toggles=int(settings['ac_max_toggles']), max_age=max(3 * AMBIENT_POLL_INTERVAL, 60.0),
+    )
+    return config, ACControlAutomation(temp_on, temp_off, humidity_on, humidity_off)
+
+
+def load_control_settings(path):
+    """Config watcher loader: validate control parameters and swap them in."""
+    global control_settings
+    config = load_config_file(path)
+    unknown = set(config) - set(DEFAULT_CONTROL_SETTINGS)
+    if unknown:
+        raise ValueError(f"Unknown control settings: {', '.join(sorted(unknown))}")
+    # Settings missing from the file fall back to their defaults
+    settings = {**DEFAULT_CONTROL_SETTINGS, **config}
+    tuning = humidity_pid_tuning(settings)
+    loop_config = humidity_loop_config(settings)
+    ac_config, ac_automation = ac_loop_settings(settings)
+    control_settings = settings
+    if control_engine:
+        loop = control_engine.loops['humidity']
+        if isinstance(loop, PIDLoop) == (tuning is not None):
+            control_engine.configure('humidity', loop_config)
+            if tuning is not None:
+                loop.tuning = tuning
+        else:
+            # Mode change: a new loop that keeps the relay state and minimum on/off timers
+            control_engine.replace(humidity_loop(loop_config, tuning))
+            logger.info(f"Humidity control mode: {settings['humidity_mode']}")
+        if 'ac' in control_engine.loops:
+            control_engine.loops['ac'].controller = ac_automation
+            control_engine.configure('ac', ac_config)
+    logger.info(f"Control settings: {settings}")
+
+
+def load_rules(path):
+    """Config watcher loader: compile automation rules and swap them in."""
+    global rule_engine
+    rules = rules_from_config(load_config_file(path), targets=relay_states)
+    with rules_lock:
+        engine = rule_engine or RuleEngine(max_age=max(CACHE_DURATION, 3 * POLL_INTERVAL),
+                                           resolve=resolve_sensor_key)
+        # Compiled under the lock so no cycle's decisions are lost between old and new rules
+        rule_engine = engine.compile(rules)
+    logger.info(f"Loaded {len(rules)} automation rules from {path}")
+
+
+def init_rules():
+    """Load the automation rules and watch them (after the buses, so bare slave IDs resolve)."""
+    if not RULES_CONFIG or not config_watcher:
+        return False
+    try:
+        if not config_watcher.watch(RULES_CONFIG, load_rules):
+            logger.warning(f"Rules file {RULES_CONFIG} not found, waiting for it")
+        return True
+    except Exception as e:
+        logger.error(f"Error loading rules: {e}")
+        return False
+
+
+def apply_rules(snapshot):
+    """
+    Poll listener: evaluate the automation rules and apply their decisions.
+
+    A rule on a relay with a control loop overrides the loop while it
+    requests a state (minimum on/off times still apply); other relays are
+    switched directly.
     """
+    with rules_lock:
+        if rule_engine is None:
+            return
+        changes = rule_engine.update(snapshot)
+    for port, decision in changes.items():
+        loop = control_engine.loops.get(RELAY_LOOPS[port]) if control_engine else None
+        if loop is not None:
+            loop.override = decision
+        elif decision is not None:
+            set_relay(port, decision[0])
+
+
+def relay_actuator(port):
+    """Actuator for a control loop: switch a relay port, report whether it is now in that state."""
+    def switch(state):
+        return set_relay(port, state)
+    return switch
+
+
+def init_control():
+    """Create the control loops; they run after every poll cycle."""
+    global control_engine
+    control_engine = ControlEngine()
+    control_engine.add(humidity_loop(humidity_loop_config(control_settings),
+                                     humidity_pid_tuning(control_settings)))
+    if ambient_reader:
+        ac_config, ac_automation = ac_loop_settings(control_settings)
+        control_engine.add(DecisionLoop('ac', relay_actuator(2), ac_config, ac_automation,
+                                        ('temperature', 'humidity'), state=relay_states[2]['active']))
+        RELAY_LABELS[2] = 'Air Conditioner'
+        event_broadcaster.publish_state('relays', relay_status())
+
+
+def init_ambient():
+    """Open the ambient DHT22 sensor; it is sampled on its own thread by the poller."""
+    global ambient_reader
+    if not AMBIENT_SENSOR_PIN:
+        return False
     try:
-        if port not in [1, 2]:
-            logger.error(f"Invalid relay port: {port}")
+        reader = AmbientSensorReader(pin=AMBIENT_SENSOR_PIN)
+        if reader.sensor is None:
+            logger.warning("Ambient sensor not available, AC control disabled")
             return False
-        
-        gpio_pin = GPIO_RELAY_PORT1 if port == 1 else GPIO_RELAY_PORT2
-        relay_states[port]['active'] = state
-        
-        # Set GPIO output (HIGH = ON for this configuration)
-        GPIO.output(gpio_pin, GPIO.HIGH if state else GPIO.LOW)
-        logger.info(f"Relay Port {port} turned {'ON' if state else 'OFF'}")
+        ambient_reader = reader
         return True
-    except (NameError, Exception) as e:
-        logger.error(f"Error controlling relay {port}: {e}")
+    except Exception as e:
+        logger.error(f"Error initializing ambient sensor: {e}")
         return False
 
 
-def control_humidifier_based_on_humidity(humidity, port=1):
+def read_ambient():
+    """Background source: one DHT22 reading (with its retry sleeps) as SensorData."""
+    return ambient_reader.read(retries=AMBIENT_READ_RETRIES).to_sensor_data(AMBIENT_SENSOR_KEY)
+
+
+def init_config_watcher():
+    """Load the configuration files and watch them for changes."""
+    global config_watcher
+    try:
+        config_watcher = ConfigWatcher(interval=CONFIG_RELOAD_INTERVAL or 2.0)
+        if CALIBRATION_FILE:
+            if not config_watcher.watch(CALIBRATION_FILE, reload_calibration):
+                logger.warning(f"Calibration file {CALIBRATION_FILE} not found, waiting for it")
+        else:
+            # calibration_config is compiled on first use; only reload it on change
+            import calibration_config
+            config_watcher.watch(calibration_config.__file__, reload_calibration, load_now=False)
+        if CONTROL_CONFIG:
+            if not config_watcher.watch(CONTROL_CONFIG, load_control_settings):
+                logger.warning(f"Control config {CONTROL_CONFIG} not found, using defaults")
+        if CONFIG_RELOAD_INTERVAL > 0:
+            config_watcher.start()
+        return True
+    except Exception as e:
+        logger.error(f"Error loading configuration: {e}")
+        return False
+
+
+def record_history(snapshot):
+    """
+    Poll listener: append fresh readings from a snapshot to the history store.
+
+    History gets the readings before signal filtering, like their raw
+    values, so a recalibration from raw yields the same series.
     """
-    Automatically control humidifier relay based on humidity level.
+    now = time.time()
+    for key in snapshot.updated:
+        entry = snapshot.entries[key]
+        # Skip last-known-good fallbacks so a reading is stored only once
+        if entry.last_error is None:
+            history_store.record_reading(key, snapshot.unfiltered.get(key, entry.data), now)
+
+
+def relay_status():
+    """Relay states as served to the dashboard."""
+    return {str(port): {'active': relay_states[port]['active'], 'label': RELAY_LABELS[port]}
+            for port in relay_states}
+
+
+# Stream clients get the relays in their first snapshot, before any toggle
+event_broadcaster.publish_state('relays', relay_status())
+
+
+def publish_snapshot(snapshot):
+    """Poll listener: push changed sensor fields to stream clients."""
+    sensors = {key: entry.to_dict() for key, entry in snapshot.entries.items()}
+    # 'age' changes every cycle; clients derive freshness from 'timestamp'
+    event_broadcaster.publish_state('sensors', sensors, exclude=('age',))
+
+
+def set_relay(port, state):
+    """
+    Control relay state.
     
-    Logic:
-    - Humidity < 60%: Turn ON atomizer (activate irrigation)
-    - Humidity >= 75%: Turn OFF atomizer
-    - 60-75%: Maintain current state (hysteresis)
+    The state is recorded and published only once the GPIO output succeeded.
+    Without GPIO (development machines) it is recorded without switching
+    anything.
     
     Args:
-        humidity: Current humidity percentage
-        port: Relay port to control (default 1)
+        port: Relay port (1 or 2)
+        state: True for ON, False for OFF
+    
+    Returns:
+        True if the relay is now in the requested state
     """
-    if humidity is None:
-        return
+    if port not in [1, 2]:
+        logger.error(f"Invalid relay port: {port}")
+        return False
     
-    try:
-        current_state = relay_states[port]['active']
-        
-        if humidity < HUMIDITY_THRESHOLD_ON and not current_state:
-            # Humidity dropped below 60%, turn on humidifier
-            set_relay(port, True)
-            logger.info(f"Humidity {humidity:.1f}% < {HUMIDITY_THRESHOLD_ON}% → Atomizer ON")
-        
-        elif humidity >= HUMIDITY_THRESHOLD_OFF and current_state:
-            # Humidity rose above 75%, turn off humidifier
-            set_relay(port, False)
-            logger.info(f"Humidity {humidity:.1f}% >= {HUMIDITY_THRESHOLD_OFF}% → Atomizer OFF")
-        
-        elif 60.0 <= humidity < 75.0:
-            # In optimal range, maintain current state
-            pass
-    except Exception as e:
-        logger.error(f"Error in humidity control: {e}")
+    if GPIO_AVAILABLE:
+        gpio_pin = GPIO_RELAY_PORT1 if port == 1 else GPIO_RELAY_PORT2
+        try:
+            # Set GPIO output (HIGH = ON for this configuration)
+            GPIO.output(gpio_pin, GPIO.HIGH if state else GPIO.LOW)
+        except Exception as e:
+            logger.error(f"Error controlling relay {port}: {e}")
+            return False
+    
+    if relay_states[port]['active'] != state:
+        RELAY_TOGGLES.labels(port, 'on' if state else 'off').inc()
+    relay_states[port]['active'] = state
+    event_broadcaster.publish_state('relays', relay_status())
+    logger.info(f"Relay Port {port} turned {'ON' if state else 'OFF'}")
+    return True
+
+
+@app.before_request
+def start_request_timer():
+    """Note the request start time for HTTP_REQUEST_SECONDS."""
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def observe_request(response):
+    """Record request latency and status per route template."""
+    # Label by route template, not path, so sensor keys do not create new series
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    start = g.get('request_start')
+    if start is not None:
+        HTTP_REQUEST_SECONDS.labels(route, request.method).observe(time.perf_counter() - start)
+    HTTP_REQUESTS.labels(route, request.method, response.status_code).inc()
+    return response
 
 
 @app.route('/')
 def index():
     """Serve the main dashboard page."""
-    return render_template('dashboard.html')
+    return render_template('dashboard.html', ambient_sensor_key=AMBIENT_SENSOR_KEY)
 
 
-@app.route('/api/sensor/<int:sensor_id>', methods=['GET'])
+@app.route('/api/sensor/<path:sensor_id>', methods=['GET'])
 def get_sensor(sensor_id):
     """
-    Get current reading for a specific sensor with all 8 parameters.
+    Get cached reading for a specific sensor with all 8 parameters.
+    Stale readings are returned immediately and refreshed in the background.
     
     Args:
-        sensor_id: Sensor ID (1-4)
+        sensor_id: Sensor key ('room/bus/slave') or slave ID on the first bus
+    
+    Query parameters:
+        raw: 'true' to add the uncalibrated values under '_raw' (for lab calibration)
     
     Returns:
-        JSON with sensor data or error message
+        JSON with sensor data (including age and stale flag) or error message
     """
-    if not modbus_reader:
+    if not reading_cache:
         return jsonify({'error': 'Modbus reader not initialized'}), 503
     
-    if sensor_id not in range(1, 5):
-        return jsonify({'error': 'Invalid sensor ID. Must be 1-4'}), 400
+    key = bus_manager.resolve(sensor_id)
+    if key is None and sensor_id == AMBIENT_SENSOR_KEY and ambient_reader:
+        key = sensor_id
+    if key is None:
+        return jsonify({'error': f'Unknown sensor: {sensor_id}'}), 400
     
     try:
-        data = modbus_reader.read_sensor(sensor_id)
-        result = data.to_dict()
-        result['timestamp'] = datetime.now().isoformat()
+        entry = reading_cache.get(key)
+        if entry is None:
+            return jsonify({'error': 'No reading available yet'}), 503
+        result = entry.to_dict()
+        result['sensor_key'] = key
+        if request.args.get('raw', 'false').lower() == 'true':
+            result['_raw'] = entry.data.to_dict_with_raw()['_raw']
         return jsonify(result), 200
     except Exception as e:
         logger.error(f"Error reading sensor {sensor_id}: {e}")
@@ -171,36 +630,30 @@ def get_sensor(sensor_id):
 @app.route('/api/sensors', methods=['GET'])
 def get_all_sensors():
     """
-    Get current readings for all 4 sensors with all 8 parameters each.
-    Automatically controls humidifier relay based on humidity levels.
+    Get cached readings for all sensors on all buses, keyed by 'room/bus/slave'.
     
     Returns:
-        JSON with all sensor data and relay states
+        JSON with all sensor data (including age and stale flag) and relay states
     """
-    if not modbus_reader:
+    if not sensor_poller:
         return jsonify({'error': 'Modbus reader not initialized'}), 503
     
     try:
-        all_sensors = modbus_reader.read_all_sensors()
         results = {}
-        timestamp = datetime.now().isoformat()
         
-        for sensor_id, data in all_sensors.items():
-            result = data.to_dict()
-            result['timestamp'] = timestamp
-            results[str(sensor_id)] = result
+        for key in sensor_poller.snapshot.entries:
+            entry = reading_cache.get(key)
+            data = entry.data
+            result = entry.to_dict()
+            results[key] = result
             
-            # Automatic humidity-based relay control for Port 1 (atomizer)
-            if data.is_valid and data.humidity is not None:
-                control_humidifier_based_on_humidity(data.humidity, port=1)
-                # Add relay state to sensor data for dashboard
+            # Humidity-based relay control for Port 1 runs in the poller;
+            # add relay state to sensor data for dashboard
+            if data.is_valid and data.humidity is not None and key != AMBIENT_SENSOR_KEY:
                 result['humidifier'] = {'active': relay_states[1]['active']}
         
         # Add relay status to response
-        results['_relays'] = {
-            '1': {'active': relay_states[1]['active'], 'label': 'Atomizer/Humidifier'},
-            '2': {'active': relay_states[2]['active'], 'label': 'Reserved'}
-        }
+        results['_relays'] = relay_status()
         
         return jsonify(results), 200
     except Exception as e:
@@ -208,6 +661,99 @@ def get_all_sensors():
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/stream', methods=['GET'])
+def stream():
+    """
+    Server-Sent Events stream of sensor and relay updates.
+    
+    The first event is a full 'snapshot' ({'sensors': {...}, 'relays': {...}});
+    after that 'sensors' and 'relays' events carry only the fields that changed.
+    Reconnecting clients resume from the Last-Event-ID header.
+    """
+    last_event_id = request.headers.get('Last-Event-ID')
+    return Response(
+        event_broadcaster.subscribe(last_event_id),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+def parse_time_arg(value, default):
+    """Parse a query-string time given as Unix seconds or ISO 8601."""
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+@app.route('/api/history', methods=['GET'])
+def get_history():
+    """
+    Get stored history for one sensor parameter.
+    
+    Query parameters:
+        sensor: Sensor key ('room/bus/slave') or slave ID on the first bus
+        param: Parameter name (e.g. 'ph', 'temperature')
+        from/to: Range as Unix seconds or ISO 8601 (default: last 24 hours)
+        points: Desired number of points (default 500); the coarsest rollup
+                that still provides this many points is used
+        raw: 'true' for uncalibrated values
+    
+    Returns:
+        Streamed JSON with one entry per point: timestamp, mean value under the
+        parameter name, and min/max/count for rollups
+    """
+    if not history_store:
+        return jsonify({'error': 'History store not initialized'}), 503
+    
+    sensor = request.args.get('sensor')
+    param = request.args.get('param')
+    if not sensor:
+        return jsonify({'error': 'Missing sensor'}), 400
+    if bus_manager:
+        sensor = bus_manager.resolve(sensor) or sensor
+    if param not in PARAMETERS:
+        return jsonify({'error': f"Invalid param. Must be one of: {', '.join(PARAMETERS)}"}), 400
+    
+    try:
+        end = parse_time_arg(request.args.get('to'), time.time())
+        start = parse_time_arg(request.args.get('from'), end - HISTORY_DEFAULT_RANGE)
+        points = int(request.args.get('points', '500'))
+    except ValueError as e:
+        return jsonify({'error': f"Invalid query parameter: {e}"}), 400
+    if start >= end or not 0 < points <= HISTORY_MAX_POINTS:
+        return jsonify({'error': f"Require from < to and 1 <= points <= {HISTORY_MAX_POINTS}"}), 400
+    
+    raw = request.args.get('raw', 'false').lower() == 'true'
+    resolution = history_store.select_resolution(start, end, points)
+    rows = history_store.iter_range(sensor, param, start, end, resolution, raw=raw)
+    
+    def generate():
+        # Stream rows straight from the cursor so the result is never held in memory
+        header = {
+            'sensor_id': sensor,
+            'parameter': param,
+            'resolution': resolution,
+            'raw': raw,
+            'calibration_version': None if raw else history_store.calibration_version,
+            'from': datetime.fromtimestamp(start).isoformat(),
+            'to': datetime.fromtimestamp(end).isoformat(),
+        }
+        yield json.dumps(header)[:-1] + ', "points": ['
+        separator = ''
+        for row in rows:
+            point = {'timestamp': datetime.fromtimestamp(row[0]).isoformat(), param: row[1]}
+            if resolution:
+                point['min'], point['max'], point['count'] = row[2], row[3], row[4]
+            yield separator + json.dumps(point)
+            separator = ', '
+        yield ']}'
+    
+    return Response(generate(), mimetype='application/json')
+
+
 @app.route('/api/status', methods=['GET'])
 def get_status():
     """
@@ -218,22 +764,49 @@ def get_status():
     """
     status = {
         'timestamp': datetime.now().isoformat(),
-        'modbus_connected': modbus_reader is not None and modbus_reader.client is not None,
+        'modbus_connected': bus_manager is not None and bus_manager.is_healthy(),
         'modbus_port': MODBUS_PORT,
         'modbus_baudrate': MODBUS_BAUDRATE,
-        'sensors': [1, 2, 3, 4],
+        'modbus_backend': MODBUS_BACKEND,
+        'buses': {config.label: config.port for config in bus_manager.configs} if bus_manager else {},
+        'sensors': bus_manager.sensor_keys if bus_manager else [],
+        'registry': [spec.to_dict() for spec in sensor_registry.sensors] if sensor_registry else None,
+        'poller': {
+            'running': sensor_poller is not None and sensor_poller.is_alive(),
+            'interval': POLL_INTERVAL,
+            'cycle': sensor_poller.snapshot.cycle if sensor_poller else 0,
+            'last_poll': sensor_poller.snapshot.timestamp if sensor_poller else None,
+            'last_poll_duration': sensor_poller.snapshot.duration if sensor_poller else None,
+            'filters': SIGNAL_FILTERS if reading_cache and reading_cache.filters else None
+        },
+        'bus': bus_manager.metrics() if bus_manager else None,
+        'sensor_health': bus_manager.health() if bus_manager else {},
+        'cache': reading_cache.stats() if reading_cache else None,
+        'calibration': history_store.recalibration_status() if history_store else None,
+        'calibration_version': get_engine().version,
+        'rules': rule_engine.status() if rule_engine else None,
+        'config_reload': {
+            'interval': CONFIG_RELOAD_INTERVAL,
+            'reloads': config_watcher.reloads if config_watcher else 0,
+            'errors': config_watcher.errors if config_watcher else 0,
+        },
+        'stream_clients': event_broadcaster.clients,
         'parameters_per_sensor': 8,
-        'parameters': ['nitrogen', 'phosphorus', 'potassium', 'ph', 'ec', 'temperature', 'humidity'],
+        'parameters': list(PARAMETERS),
         'relay_control': {
             'enabled': True,
             'port_1': {
                 'name': 'Atomizer/Humidifier',
-                'humidity_threshold_on': HUMIDITY_THRESHOLD_ON,
-                'humidity_threshold_off': HUMIDITY_THRESHOLD_OFF,
+                'mode': control_settings['humidity_mode'],
+                'humidity_threshold_on': control_settings['humidity_threshold_on'],
+                'humidity_threshold_off': control_settings['humidity_threshold_off'],
+                'control': control_engine.loops['humidity'].status() if control_engine else None,
                 'current_state': relay_states[1]['active']
             },
             'port_2': {
-                'name': 'Reserved',
+                'name': RELAY_LABELS[2],
+                'control': (control_engine.loops['ac'].status()
+                            if control_engine and 'ac' in control_engine.loops else None),
                 'current_state': relay_states[2]['active']
             }
         }
@@ -241,10 +814,54 @@ def get_status():
     return jsonify(status), 200
 
 
+@app.route('/api/control/humidity/autotune', methods=['POST', 'DELETE'])
+def humidity_autotune():
+    """
+    Start (POST) or cancel (DELETE) a relay autotune of the PID atomizer loop.
+
+    The atomizer is switched fully on/off around humidity_setpoint until the
+    chamber oscillates steadily; the gains found replace the active ones
+    (copy them from /api/status into CONTROL_CONFIG to keep them).
+
+    JSON body (optional, POST):
+        hysteresis: Relay dead band in % (default 1.0, above the sensor noise)
+        cycles: Oscillations averaged (default 3)
+        rule: 'pi' (default), 'ziegler-nichols', 'tyreus-luyben' or 'no-overshoot'
+        timeout: Seconds before giving up (default 14400)
+
+    Returns:
+        JSON with the autotune status or error message
+    """
+    loop = control_engine.loops.get('humidity') if control_engine else None
+    if not isinstance(loop, PIDLoop):
+        return jsonify({'error': "Humidity control is not in 'pid' mode"}), 409
+    if request.method == 'DELETE':
+        loop.stop_autotune()
+        return jsonify({'cancelled': True}), 200
+
+    options = request.get_json(silent=True) or {}
+    try:
+        tuner = loop.start_autotune(
+            hysteresis=float(options.get('hysteresis', 1.0)),
+            cycles=int(options.get('cycles', 3)),
+            rule=options.get('rule', 'pi'),
+            timeout=float(options.get('timeout', 4 * 3600)),
+        )
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(tuner.status()), 202
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Pipeline counters and histograms in OpenMetrics text format (for Prometheus)."""
+    return Response(REGISTRY.render(), content_type=METRICS_CONTENT_TYPE)
+
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Simple health check endpoint."""
-    if modbus_reader and modbus_reader.client and modbus_reader.client.is_socket_open():
+    if bus_manager and bus_manager.is_healthy():
         return jsonify({'status': 'healthy'}), 200
     return jsonify({'status': 'unhealthy'}), 503
 
@@ -266,9 +883,22 @@ if __name__ == '__main__':
     # Ensure log directory exists
     os.makedirs('/var/log/soil-monitor', exist_ok=True)
     
+    # Open history before the poller starts so the first cycle is recorded
+    if not init_history():
+        logger.warning("Sensor history will not be recorded")
+    
+    # Calibration and control settings, before the first reading is decoded
+    if not init_config_watcher():
+        logger.warning("Configuration files will not be reloaded")
+    
     # Initialize Modbus
     if not init_modbus():
         logger.warning("Starting Flask server without Modbus connection")
+    else:
+        init_ambient()
+        init_poller()
+    if history_store:
+        init_calibration()
     
     # Run Flask app
     try:
@@ -276,5 +906,14 @@ if __name__ == '__main__':
     except KeyboardInterrupt:
         logger.info("Shutting down...")
     finally:
-        if modbus_reader:
-            modbus_reader.disconnect()
+        event_broadcaster.close()
+        if config_watcher:
+            config_watcher.stop(timeout=5)
+        if sensor_poller:
+            sensor_poller.stop(timeout=5)
+        if history_store:
+            history_store.close()
+        if bus_manager:
+            bus_manager.disconnect()
+        if ambient_reader:
+            ambient_reader.disconnect()
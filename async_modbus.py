@@ -0,0 +1,356 @@
+"""
+Asyncio Modbus RTU backend.
+Runs every bus on a single event loop thread instead of one blocking thread
+per bus, with real per-request deadlines and cancellation of in-flight reads.
+"""
+
+import asyncio
+import inspect
+import logging
+import threading
+import time
+from typing import Awaitable, Dict, List, Optional, Tuple
+
+from bus_arbiter import BusArbiter
+from modbus_sensor import (DE_RE_RS485, DE_RE_SLEEP, DE_RE_TIMED, DEVICE_ID_KWARG, GPIO_AVAILABLE,
+                           ModbusNPKReader, RegisterBlock, SensorData, frame_time)
+
+logger = logging.getLogger(__name__)
+
+try:
+    from pymodbus.client import AsyncModbusSerialClient
+    ASYNC_MODBUS_AVAILABLE = True
+except ImportError:
+    ASYNC_MODBUS_AVAILABLE = False
+
+if GPIO_AVAILABLE:
+    import RPi.GPIO as GPIO
+
+
+class EventLoopThread:
+    """A background thread running one asyncio event loop."""
+
+    def __init__(self, name: str = 'modbus-async'):
+        """
+        Args:
+            name: Thread name
+        """
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name=name, daemon=True)
+        self._thread.start()
+
+    def run(self, coro: Awaitable, timeout: Optional[float] = None):
+        """Run a coroutine on the loop and wait for its result from another thread."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def stop(self, timeout: Optional[float] = None):
+        """Stop the loop and join the thread."""
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
+
+
+class AsyncModbusNPKReader(ModbusNPKReader):
+    """
+    Coroutine counterpart of ModbusNPKReader.
+
+    Shares register plans, decoding and calibration with the blocking reader;
+    connect(), disconnect(), read_sensor() and read_all_sensors() are
+    coroutines with the same arguments and results. Each request has its own
+    deadline (the read timeout), and a read_sensor() call can be given an
+    overall deadline that also bounds its retries.
+    """
+
+    async def connect(self) -> bool:
+        """Establish the Modbus RTU connection on the running loop."""
+        if not ASYNC_MODBUS_AVAILABLE:
+            logger.error("pymodbus async client not available")
+            return False
+        try:
+            # Retries and deadlines are handled here, not by the client
+            self.client = AsyncModbusSerialClient(
+                port=self.port,
+                baudrate=self.baudrate,
+                timeout=self.timeout,
+                retries=0
+            )
+            if await self._open():
+                logger.info(f"Connected to Modbus RTU (async) on {self.port} @ {self.baudrate} baud")
+                return True
+            else:
+                logger.error("Failed to connect to Modbus RTU")
+                return False
+        except Exception as e:
+            logger.error(f"Connection error: {e}")
+            return False
+
+    async def _open(self) -> bool:
+        """Open the client's port and set up the protocol it created for it."""
+        await self.client.connect()
+        if not self.client.connected:
+            return False
+        protocol = self.client.protocol
+        # The client's own timeout is fixed when the port opens; the per-request
+        # deadline in _read_block_async() is the one that applies
+        protocol.params.timeout = None
+        if self.de_re_mode == DE_RE_RS485:
+            serial_port = getattr(protocol.transport, 'serial', None)
+            if serial_port is None or not self._enable_rs485_mode(serial_port):
+                self.de_re_mode = DE_RE_TIMED
+        if self.de_re_mode == DE_RE_TIMED and self._gpio_available:
+            write = protocol.write_transport
+            protocol.write_transport = lambda packet: self._write_frame(write, packet)
+        return True
+
+    async def _reconnect(self) -> bool:
+        """
+        Close and reopen the serial port with an empty receive side.
+
+        Used when the client dropped the port and after a timed-out request:
+        a reply that arrives after its request was cancelled would otherwise
+        be taken as the answer to the next request to that slave.
+        """
+        try:
+            if self.client.connected:
+                await self.client.close()
+            self.client.framer.resetFrame()
+            if not await self._open():
+                return False
+            serial_port = getattr(self.client.protocol.transport, 'serial', None)
+            if serial_port is not None:
+                serial_port.reset_input_buffer()
+        except Exception as e:
+            logger.debug(f"Reconnect to {self.port} failed: {e}")
+            return False
+        logger.debug(f"Reopened {self.port}")
+        return True
+
+    async def disconnect(self):
+        """Close the Modbus connection and cleanup GPIO."""
+        if self.client:
+            result = self.client.close()
+            if inspect.isawaitable(result):
+                await result
+            logger.info("Disconnected from Modbus RTU")
+
+        if self._gpio_available:
+            try:
+                GPIO.cleanup()
+            except Exception as e:
+                logger.warning(f"GPIO cleanup error: {e}")
+
+    @property
+    def connected(self) -> bool:
+        """True while the serial transport is up."""
+        return bool(self.client and self.client.connected)
+
+    async def _set_tx_mode_async(self):
+        """Enable transmit mode (DE=HIGH) for the whole transaction ('sleep' mode only)."""
+        if self._gpio_available and self.de_re_mode == DE_RE_SLEEP:
+            GPIO.output(self.gpio_de_re, GPIO.HIGH)
+            await asyncio.sleep(0.01)
+
+    def _write_frame(self, write, packet: bytes):
+        """
+        Write one request frame with DE high until its last bit has left the UART.
+
+        The loop timer that drops DE starts when the frame is handed to the
+        transport, like the sleep in _send_frame() on the blocking path.
+        """
+        GPIO.output(self.gpio_de_re, GPIO.HIGH)
+        try:
+            return write(packet)
+        finally:
+            asyncio.get_running_loop().call_later(
+                frame_time(len(packet), self.baudrate) + self.turnaround,
+                GPIO.output, self.gpio_de_re, GPIO.LOW
+            )
+
+    async def _set_rx_mode_async(self):
+        """Enable receive mode (RE=LOW) after the transaction ('sleep' mode only)."""
+        if self._gpio_available and self.de_re_mode == DE_RE_SLEEP:
+            await asyncio.sleep(0.01)
+            GPIO.output(self.gpio_de_re, GPIO.LOW)
+
+    async def _read_block_async(self, sensor_id: int, block: RegisterBlock,
+                                timeout: float) -> Optional[List[int]]:
+        """Read one block of registers within timeout, or return None on an error response."""
+        if block.function == 'input':
+            read_registers = self.client.read_input_registers
+        else:
+            read_registers = self.client.read_holding_registers
+
+        await self._set_tx_mode_async()
+        start = time.perf_counter()
+        timed_out = False
+        try:
+            result = await asyncio.wait_for(
+                read_registers(address=block.start, count=block.count, **{DEVICE_ID_KWARG: sensor_id}),
+                timeout
+            )
+        except asyncio.TimeoutError:
+            self._count_error(sensor_id, 'timeout')
+            timed_out = True
+            raise
+        except Exception as e:
+            self._count_error(sensor_id, e)
+            raise
+        finally:
+            self._slave_metrics(sensor_id)[0].observe(time.perf_counter() - start)
+            await self._set_rx_mode_async()
+            if timed_out:
+                await self._reconnect()
+
+        if isinstance(result, Exception) or result.isError():
+            self._count_error(sensor_id, result)
+            logger.debug(f"Sensor {sensor_id} read error at register {block.start}: {result}")
+            return None
+        return result.registers
+
+    async def read_sensor(self, sensor_id: int, retries: int = 3,
+                          params: Optional[Tuple[str, ...]] = None,
+                          deadline: Optional[float] = None) -> SensorData:
+        """
+        Read mapped parameters from a single sensor.
+
+        Args:
+            sensor_id: Modbus slave ID
+            retries: Number of retry attempts on failure
+            params: Only read these parameters (default: all mapped ones)
+            deadline: Overall time budget in seconds, including retries
+                      (default: retries * (timeout + 0.1), as the blocking reader)
+
+        Returns:
+            SensorData object with readings
+        """
+        data = SensorData(sensor_id)
+        if sensor_id not in self.register_maps:
+            data.error = f"Sensor {sensor_id} not connected"
+            return data
+
+        if not self.connected and (self.client is None or not await self._reconnect()):
+            data.error = "Not connected to Modbus RTU"
+            logger.error(f"Sensor {sensor_id}: {data.error}")
+            return data
+
+        plan = self.register_plan(sensor_id, params)
+        end = time.monotonic() + (deadline if deadline is not None else retries * (self.timeout + 0.1))
+
+        _, retry_count, failure_count = self._slave_metrics(sensor_id)
+        attempts = 0
+        for attempt in range(retries):
+            if attempt:
+                retry_count.inc()
+            attempts += 1
+            try:
+                blocks = []
+                for block in plan:
+                    remaining = end - time.monotonic()
+                    if remaining <= 0:
+                        raise asyncio.TimeoutError()
+                    regs = await self._read_block_async(sensor_id, block, min(self.timeout, remaining))
+                    if regs is None:
+                        break
+                    blocks.append((block, regs))
+                if len(blocks) == len(plan):
+                    return self._decode(data, blocks)
+            except asyncio.TimeoutError:
+                logger.debug(f"Sensor {sensor_id} timed out (attempt {attempt+1})")
+            except Exception as e:
+                logger.debug(f"Sensor {sensor_id} read error (attempt {attempt+1}): {str(e)}")
+
+            if end - time.monotonic() <= 0.1:
+                break
+            await asyncio.sleep(0.1)
+
+        failure_count.inc()
+        data.error = f"Failed to read after {attempts} attempts"
+        logger.error(f"Sensor {sensor_id}: {data.error}")
+        return data
+
+    async def read_all_sensors(self) -> Dict[int, SensorData]:
+        """Read all configured sensors one after another (the bus is half-duplex)."""
+        return {sensor_id: await self.read_sensor(sensor_id) for sensor_id in self.register_maps}
+
+
+class AsyncBusArbiter(BusArbiter):
+    """
+    BusArbiter whose owner is a coroutine on a shared event loop.
+
+    Coalescing, priorities, metrics and the Future-based interface are those
+    of BusArbiter, so BusManager, the scheduler and the reading cache use it
+    unchanged. Transactions whose Future was cancelled while queued never
+    reach the bus; a read on the wire is cancelled when its deadline passes.
+    """
+
+    def __init__(self, reader: AsyncModbusNPKReader, loop_thread: EventLoopThread,
+                 name: str = 'bus-arbiter'):
+        """
+        Args:
+            reader: AsyncModbusNPKReader whose client this arbiter will own
+            loop_thread: Event loop shared by all async buses
+            name: Name used in log messages
+        """
+        super().__init__(reader, name)
+        self.loop_thread = loop_thread
+        self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._owner = None
+
+    def start(self):
+        """Start the owner coroutine."""
+        if self._owner is not None and not self._owner.done():
+            return
+        self._running = True
+        self._owner = asyncio.run_coroutine_threadsafe(self._run_async(), self.loop_thread.loop)
+        logger.info(f"Bus arbiter started for {self.reader.port} (async)")
+
+    def stop(self, timeout: Optional[float] = None):
+        """Stop the owner coroutine after the transaction in progress finishes."""
+        self._running = False
+        self._enqueue((-1, next(self._seq), None))
+        if self._owner is not None:
+            try:
+                self._owner.result(timeout)
+            except Exception as e:
+                logger.warning(f"Bus arbiter {self.name} did not stop cleanly: {e}")
+
+    def _enqueue(self, item: Tuple):
+        """Put an entry on the loop's queue from any thread."""
+        self.loop_thread.loop.call_soon_threadsafe(self._put, item)
+
+    def _put(self, item: Tuple):
+        """Loop side of _enqueue()."""
+        self._queue.put_nowait(item)
+        with self._lock:
+            self._max_queue_depth = max(self._max_queue_depth, self._queue.qsize())
+
+    async def _run_async(self):
+        """Owner coroutine: execute queued transactions in priority order."""
+        while self._running:
+            _, _, txn = await self._queue.get()
+            if txn is None:
+                break
+            if not self._take(txn):
+                continue
+
+            start = time.monotonic()
+            failed = False
+            try:
+                txn.future.set_result(await self._call(txn))
+            except Exception as e:
+                failed = True
+                logger.error(f"Bus transaction {txn.key or txn.func.__name__} failed: {e}")
+                txn.future.set_exception(e)
+            self._record(txn, start, failed)
+
+        while not self._queue.empty():
+            _, _, txn = self._queue.get_nowait()
+            self._fail_queued(txn)
+        logger.info(f"Bus arbiter stopped for {self.reader.port}")
+
+    @staticmethod
+    async def _call(txn):
+        """Run a transaction's callable, awaiting it if it is a coroutine function."""
+        result = txn.func(*txn.args)
+        if inspect.isawaitable(result):
+            result = await result
+        return result
@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the acquisition-to-API pipeline.
+Runs against the simulated bus (modbus_simulator.py) and writes the results
+as JSON, so runs from different versions can be compared with --compare.
+
+    python benchmarks.py --output bench.json
+    python benchmarks.py --quick --compare bench.json
+"""
+
+import gc
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import urllib.request
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from history_store import RESOLUTION_HOUR, RESOLUTION_MINUTE, RESOLUTION_RAW, HistoryStore
+from modbus_sensor import DEFAULT_REGISTER_MAP, ModbusNPKReader, SensorData
+from modbus_simulator import PtySimulator, build_bus
+from reading_batch import ReadingBatch
+
+logger = logging.getLogger(__name__)
+
+
+def percentile(samples: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile (q in 0-100) of the samples."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    rank = max(int(round(q / 100 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def latency_summary(samples: List[float]) -> Dict:
+    """p50/p99/max of latency samples in seconds, reported in milliseconds."""
+    return {
+        'p50_ms': round(percentile(samples, 50) * 1000, 2) if samples else None,
+        'p99_ms': round(percentile(samples, 99) * 1000, 2) if samples else None,
+        'max_ms': round(max(samples) * 1000, 2) if samples else None,
+    }
+
+
+def timed_calls(func: Callable, count: int) -> List[float]:
+    """Call func count times and return the duration of each call."""
+    samples = []
+    for _ in range(count):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def bench_read_sensor(port: str, slaves: List[int], reads: int) -> Dict:
+    """Reads/sec and latency of ModbusNPKReader.read_sensor() on one slave."""
+    reader = ModbusNPKReader(port=port, gpio_de_re=None, timeout=0.5,
+                             register_maps={slave: DEFAULT_REGISTER_MAP for slave in slaves})
+    if not reader.connect():
+        raise RuntimeError(f"Cannot open simulated bus on {port}")
+    try:
+        failures = 0
+
+        def read():
+            nonlocal failures
+            if not reader.read_sensor(slaves[0]).is_valid:
+                failures += 1
+
+        samples = timed_calls(read, reads)
+    finally:
+        reader.disconnect()
+    result = {'reads': reads, 'failures': failures, 'reads_per_sec': round(reads / sum(samples), 2)}
+    result.update(latency_summary(samples))
+    return result
+
+
+def bench_read_all_sensors(port: str, slaves: List[int], scans: int) -> Dict:
+    """Scans/sec and per-scan latency of ModbusNPKReader.read_all_sensors()."""
+    reader = ModbusNPKReader(port=port, gpio_de_re=None, timeout=0.5,
+                             register_maps={slave: DEFAULT_REGISTER_MAP for slave in slaves})
+    if not reader.connect():
+        raise RuntimeError(f"Cannot open simulated bus on {port}")
+    try:
+        samples = timed_calls(reader.read_all_sensors, scans)
+    finally:
+        reader.disconnect()
+    total = sum(samples)
+    result = {
+        'scans': scans,
+        'sensors': len(slaves),
+        'scans_per_sec': round(scans / total, 2),
+        'reads_per_sec': round(scans * len(slaves) / total, 2),
+    }
+    result.update(latency_summary(samples))
+    return result
+
+
+def bench_api(port: str, slaves: List[int], client_counts: List[int], duration: float) -> Dict:
+    """
+    Requests/sec and latency of GET /api/sensors under concurrent clients.
+
+    Starts the real app (bus manager, poller, reading cache) on the simulated
+    bus and serves it with the threaded Werkzeug server, as app.py does.
+    """
+    os.environ['MODBUS_PORT'] = port
+    os.environ['MODBUS_SLAVES'] = ','.join(str(slave) for slave in slaves)
+    os.environ.setdefault('POLL_INTERVAL', '1')
+    os.environ['HISTORY_DB'] = os.path.join(tempfile.mkdtemp(prefix='bench-'), 'history.db')
+    import app as webapp
+    from werkzeug.serving import make_server
+    # app.py logs every decoded reading at INFO; keep the console quiet
+    logging.getLogger('modbus_sensor').setLevel(logging.WARNING)
+
+    webapp.init_history()
+    if not webapp.init_modbus():
+        raise RuntimeError("App could not connect to the simulated bus")
+    webapp.init_poller()
+    while webapp.sensor_poller.snapshot.cycle == 0:
+        time.sleep(0.05)
+
+    server = make_server('127.0.0.1', 0, webapp.app, threaded=True)
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+    url = f"http://127.0.0.1:{server.server_port}/api/sensors"
+
+    results = {}
+    try:
+        for clients in client_counts:
+            samples: List[float] = []
+            errors = 0
+            lock = threading.Lock()
+            end = time.monotonic() + duration
+
+            def client():
+                nonlocal errors
+                local, failed = [], 0
+                while time.monotonic() < end:
+                    start = time.perf_counter()
+                    try:
+                        with urllib.request.urlopen(url, timeout=10) as response:
+                            response.read()
+                        local.append(time.perf_counter() - start)
+                    except Exception:
+                        failed += 1
+                with lock:
+                    samples.extend(local)
+                    errors += failed
+
+            threads = [threading.Thread(target=client) for _ in range(clients)]
+            start = time.monotonic()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.monotonic() - start
+            result = {'requests': len(samples), 'errors': errors,
+                      'requests_per_sec': round(len(samples) / elapsed, 1)}
+            result.update(latency_summary(samples))
+            results[f'clients_{clients}'] = result
+    finally:
+        server.shutdown()
+        webapp.sensor_poller.stop(timeout=5)
+        webapp.history_store.close()
+        webapp.bus_manager.disconnect()
+        webapp.event_broadcaster.close()
+    return results
+
+
+def bench_reading_memory(count: int) -> Dict:
+    """Python heap bytes per reading, as SensorData objects and in a ReadingBatch."""
+    def measure(build: Callable[[], object]) -> float:
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        kept = build()
+        after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del kept
+        return round((after - before) / count, 1)
+
+    def reading(i: int) -> SensorData:
+        data = SensorData(i % 4 + 1)
+        for param, _, _ in DEFAULT_REGISTER_MAP.fields:
+            setattr(data, f'{param}_raw', float(i))
+            setattr(data, param, float(i) * 1.01)
+        data.is_valid = True
+        return data
+
+    def batch() -> ReadingBatch:
+        readings = ReadingBatch()
+        for i in range(count):
+            readings.append(f"bench/bus/{i % 4 + 1}", reading(i), float(i))
+        return readings
+
+    return {
+        'readings': count,
+        'bytes_per_reading': measure(lambda: [reading(i) for i in range(count)]),
+        'batch_bytes_per_reading': measure(batch),
+    }
+
+
+def bench_history(sensors: int, days: float, interval: float, queries: int) -> Dict:
+    """
+    Disk bytes per stored reading and query latency of HistoryStore.
+
+    Fills a fresh store with days of readings at interval seconds for each
+    sensor, then times iter_range() over typical dashboard ranges.
+    """
+    directory = tempfile.mkdtemp(prefix='bench-history-')
+    path = os.path.join(directory, 'history.db')
+    store = HistoryStore(path, flush_interval=3600)
+    now = time.time()
+    start = now - days * 86400
+    keys = [f"bench/bus/{sensor + 1}" for sensor in range(sensors)]
+    values = {param: 1.0 for param, _, _ in DEFAULT_REGISTER_MAP.fields}
+
+    fill_start = time.perf_counter()
+    readings = 0
+    ts = start
+    while ts < now:
+        for key in keys:
+            store.record(key, {param: value + ts % 97 for param, value in values.items()}, ts)
+            readings += 1
+        ts += interval
+        if readings % 5000 < sensors:
+            store.flush()
+    store.flush()
+    fill_time = time.perf_counter() - fill_start
+
+    ranges = {
+        'raw_1h': (now - 3600, now, RESOLUTION_RAW),
+        'raw_24h': (now - 86400, now, RESOLUTION_RAW),
+        'minute_7d': (now - 7 * 86400, now, RESOLUTION_MINUTE),
+        'hour_30d': (now - 30 * 86400, now, RESOLUTION_HOUR),
+    }
+    result = {
+        'readings': readings,
+        'insert_readings_per_sec': round(readings / fill_time, 1),
+        'disk_bytes_per_reading': round(sum(os.path.getsize(os.path.join(directory, name))
+                                            for name in os.listdir(directory)) / readings, 1),
+        'queries': {},
+    }
+    for name, (query_start, query_end, resolution) in ranges.items():
+        rows = 0
+
+        def query():
+            nonlocal rows
+            rows = sum(1 for _ in store.iter_range(keys[0], 'ph', query_start, query_end, resolution))
+
+        samples = timed_calls(query, queries)
+        result['queries'][name] = dict(rows=rows, **latency_summary(samples))
+    store.close()
+    return result
+
+
+def git_revision() -> Optional[str]:
+    """Short commit hash of the working tree, if it is a git checkout."""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def flatten(results: Dict, prefix: str = '') -> Dict[str, float]:
+    """Flatten nested results into 'a.b.c' -> number."""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(baseline: Dict, current: Dict, threshold: float = 0.1) -> List[str]:
+    """
+    List metrics that got worse by more than threshold (relative) against a baseline.
+
+    Counts (reads, rows, ...) are skipped; only rates, latencies and sizes are compared.
+    """
+    old, new = flatten(baseline['results']), flatten(current['results'])
+    regressions = []
+    for name, value in new.items():
+        metric = name.rsplit('.', 1)[-1]
+        if name not in old or not old[name] or not (
+                metric.endswith(('_ms', '_per_sec', '_per_reading'))):
+            continue
+        change = (value - old[name]) / old[name]
+        worse = -change if metric.endswith('_per_sec') else change  # Rates: higher is better
+        if worse > threshold:
+            regressions.append(f"{name}: {old[name]} -> {value} ({change:+.0%})")
+    return regressions
+
+
+def main():
+    """Run the benchmarks and write the JSON report."""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Benchmark the acquisition-to-API pipeline on a simulated bus',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python benchmarks.py --output bench.json               # Full run
+  python benchmarks.py --quick --only read_sensor api    # Subset, short
+  python benchmarks.py --output new.json --compare bench.json
+        """
+    )
+    parser.add_argument('--output', default='bench_output.json',
+                        help='JSON report file (default: bench_output.json)')
+    parser.add_argument('--compare', metavar='BASELINE',
+                        help='Report metrics more than 10%% worse than a previous report')
+    parser.add_argument('--only', nargs='+',
+                        choices=['read_sensor', 'read_all_sensors', 'api', 'memory', 'history'],
+                        help='Run only these benchmarks')
+    parser.add_argument('--quick', action='store_true', help='Fewer iterations (for CI)')
+    parser.add_argument('--slaves', type=int, default=4, help='Simulated sensors (default: 4)')
+    parser.add_argument('--baudrate', type=int, default=9600, help='Simulated line speed (default: 9600)')
+    parser.add_argument('--latency', type=float, default=0.02,
+                        help='Simulated slave latency in seconds (default: 0.02)')
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 10, 100],
+                        help='Concurrent API clients (default: 1 10 100)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    reads = 20 if args.quick else 200
+    config = {
+        'slaves': args.slaves,
+        'baudrate': args.baudrate,
+        'latency': args.latency,
+        'reads': reads,
+        'api_duration': 2.0 if args.quick else 10.0,
+        'history_days': 2 if args.quick else 30,
+        'quick': args.quick,
+    }
+    selected = args.only or ['read_sensor', 'read_all_sensors', 'api', 'memory', 'history']
+    slaves = list(range(1, args.slaves + 1))
+
+    bus = build_bus(slaves, baudrate=args.baudrate, latency=args.latency, jitter=args.latency / 4, seed=0)
+    simulator = PtySimulator(bus)
+    simulator.start()
+
+    results = {}
+    try:
+        if 'read_sensor' in selected:
+            results['read_sensor'] = bench_read_sensor(simulator.port, slaves, reads)
+        if 'read_all_sensors' in selected:
+            results['read_all_sensors'] = bench_read_all_sensors(simulator.port, slaves,
+                                                                 max(reads // args.slaves, 1))
+        if 'api' in selected:
+            results['api_sensors'] = bench_api(simulator.port, slaves, args.clients, config['api_duration'])
+        if 'memory' in selected:
+            results['memory'] = bench_reading_memory(10000 if args.quick else 100000)
+        if 'history' in selected:
+            results['history'] = bench_history(args.slaves, config['history_days'], 60,
+                                               10 if args.quick else 50)
+        results['simulator'] = bus.stats()
+    finally:
+        simulator.stop()
+
+    report = {
+        'timestamp': datetime.now().isoformat(),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': config,
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(results, indent=2))
+    print(f"\nReport written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), report)
+        if regressions:
+            print("\nRegressions against " + args.compare + ":")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.compare}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+"""
+Bus arbiter for the shared RS-485 Modbus connection.
+Serializes every transaction through a single owner thread so frames and
+DE/RE direction changes from concurrent callers can never interleave.
+"""
+
+import itertools
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from modbus_sensor import ModbusNPKReader, SensorData
+
+logger = logging.getLogger(__name__)
+
+
+class BusTransaction:
+    """A pending unit of work for the bus owner thread."""
+
+    def __init__(self, func: Callable, args: tuple, key: Optional[Hashable], priority: int):
+        self.func = func
+        self.args = args
+        self.key = key
+        self.priority = priority
+        self.future: Future = Future()
+        self.enqueued_at = time.monotonic()
+        self.started = False
+
+
+class BusArbiter:
+    """
+    Owns a ModbusNPKReader and executes its transactions one at a time.
+
+    Callers submit work into a priority queue and get a Future back.
+    Identical reads that are still waiting in the queue are coalesced, so
+    concurrent requests for the same slave share a single Modbus frame.
+    Lower priority numbers run first.
+    """
+
+    PRIORITY_INTERACTIVE = 0   # A client is waiting on the result
+    PRIORITY_POLL = 10         # Scheduled background scan
+    PRIORITY_PROBE = 20        # Health probe of a slave that stopped answering
+
+    def __init__(self, reader: ModbusNPKReader, name: str = 'bus-arbiter'):
+        """
+        Args:
+            reader: ModbusNPKReader whose client this arbiter will own
+            name: Thread name for the owner thread
+        """
+        self.reader = reader
+        self.name = name
+        self._queue: queue.PriorityQueue = queue.PriorityQueue()
+        self._pending: Dict[Hashable, BusTransaction] = {}
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+
+        # Metrics
+        self._submitted = 0
+        self._coalesced = 0
+        self._executed = 0
+        self._failed = 0
+        self._max_queue_depth = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._service_total = 0.0
+
+    def start(self):
+        """Start the bus owner thread."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        logger.info(f"Bus arbiter started for {self.reader.port}")
+
+    def stop(self, timeout: Optional[float] = None):
+        """Stop the owner thread after the transaction in progress finishes."""
+        self._running = False
+        # Sentinel sorts ahead of all real work
+        self._enqueue((-1, next(self._seq), None))
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout)
+
+    def _enqueue(self, item: Tuple):
+        """Put a (priority, seq, transaction) entry on the queue."""
+        self._queue.put(item)
+
+    def submit(self, func: Callable, *args, priority: int = PRIORITY_POLL,
+               key: Optional[Hashable] = None) -> Future:
+        """
+        Queue a callable to run on the bus owner thread.
+
+        Args:
+            func: Callable performing the bus transaction
+            *args: Arguments passed to func
+            priority: Queue priority (lower runs first)
+            key: Coalescing key; a queued transaction with the same key is
+                 reused instead of sending another frame
+
+        Returns:
+            Future resolving to the callable's return value
+        """
+        with self._lock:
+            self._submitted += 1
+            if key is not None and key in self._pending:
+                txn = self._pending[key]
+                self._coalesced += 1
+                if priority < txn.priority:
+                    # Re-queue at the higher priority; the stale entry is skipped
+                    txn.priority = priority
+                    self._enqueue((priority, next(self._seq), txn))
+                return txn.future
+
+            txn = BusTransaction(func, args, key, priority)
+            if key is not None:
+                self._pending[key] = txn
+            self._enqueue((priority, next(self._seq), txn))
+            self._max_queue_depth = max(self._max_queue_depth, self._queue.qsize())
+            return txn.future
+
+    def submit_read(self, sensor_id: int, priority: int = PRIORITY_POLL,
+                    params: Optional[Tuple[str, ...]] = None, retries: int = 3) -> Future:
+        """
+        Queue a coalesced read_sensor transaction for one slave.
+
+        Args:
+            sensor_id: Modbus slave ID
+            priority: Queue priority (lower runs first)
+            params: Only read these parameters (default: all)
+            retries: Attempts before the read is reported as failed
+        """
+        key = ('read_sensor', sensor_id) if params is None else ('read_sensor', sensor_id, params)
+        return self.submit(self.reader.read_sensor, sensor_id, retries, params,
+                           priority=priority, key=key)
+
+    def read_sensor(self, sensor_id: int, priority: int = PRIORITY_INTERACTIVE,
+                    timeout: Optional[float] = None) -> SensorData:
+        """Read one sensor through the arbiter, blocking until it completes."""
+        return self.submit_read(sensor_id, priority).result(timeout)
+
+    def read_all_sensors(self, priority: int = PRIORITY_POLL) -> Dict[int, SensorData]:
+        """
+        Read all sensors through the arbiter.
+
+        Each sensor is queued as its own transaction so interactive requests
+        can be served between slaves instead of waiting for the whole scan.
+        """
+        futures = {sensor_id: self.submit_read(sensor_id, priority) for sensor_id in self.reader.slaves}
+        return {sensor_id: future.result() for sensor_id, future in futures.items()}
+
+    def _take(self, txn: BusTransaction) -> bool:
+        """Claim a dequeued transaction; False if it is stale or was cancelled."""
+        with self._lock:
+            if txn.started:
+                return False  # Stale entry left behind by a priority upgrade
+            txn.started = True
+            if txn.key is not None:
+                self._pending.pop(txn.key, None)
+        return txn.future.set_running_or_notify_cancel()
+
+    def _record(self, txn: BusTransaction, start: float, failed: bool):
+        """Update the wait and service time metrics for a finished transaction."""
+        now = time.monotonic()
+        wait = start - txn.enqueued_at
+        with self._lock:
+            self._executed += 1
+            self._failed += failed
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+            self._service_total += now - start
+
+    def _fail_queued(self, txn: Optional[BusTransaction]):
+        """Fail a transaction left in the queue at shutdown."""
+        if txn is not None and not txn.started:
+            txn.started = True
+            if txn.future.set_running_or_notify_cancel():
+                txn.future.set_exception(RuntimeError("Bus arbiter stopped"))
+
+    def _run(self):
+        """Owner thread: execute queued transactions in priority order."""
+        while self._running:
+            _, _, txn = self._queue.get()
+            if txn is None:
+                break
+            if not self._take(txn):
+                continue
+
+            start = time.monotonic()
+            failed = False
+            try:
+                txn.future.set_result(txn.func(*txn.args))
+            except Exception as e:
+                failed = True
+                logger.error(f"Bus transaction {txn.key or txn.func.__name__} failed: {e}")
+                txn.future.set_exception(e)
+            self._record(txn, start, failed)
+
+        # Fail anything still queued so callers are not left waiting forever
+        while True:
+            try:
+                _, _, txn = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            self._fail_queued(txn)
+        logger.info(f"Bus arbiter stopped for {self.reader.port}")
+
+    def metrics(self) -> Dict[str, Any]:
+        """Return queue-depth and wait-time statistics."""
+        with self._lock:
+            executed = self._executed
+            return {
+                'queue_depth': self._queue.qsize(),
+                'max_queue_depth': self._max_queue_depth,
+                'submitted': self._submitted,
+                'coalesced': self._coalesced,
+                'executed': executed,
+                'failed': self._failed,
+                'avg_wait_ms': round(self._wait_total / executed * 1000, 3) if executed else 0.0,
+                'max_wait_ms': round(self._wait_max * 1000, 3),
+                'avg_service_ms': round(self._service_total / executed * 1000, 3) if executed else 0.0,
+            }
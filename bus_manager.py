@@ -0,0 +1,297 @@
+"""
+Multi-bus manager for several RS-485 ports (e.g. one USB adapter per room).
+Each bus has its own reader and arbiter thread, so buses are scanned in
+parallel and results are merged into one namespaced sensor registry.
+"""
+
+import logging
+import os
+from concurrent.futures import Future
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+from async_modbus import AsyncBusArbiter, AsyncModbusNPKReader, EventLoopThread
+from bus_arbiter import BusArbiter
+from modbus_sensor import (DE_RE_TIMED, DEFAULT_MAX_GAP, DEFAULT_REGISTER_MAP, ModbusNPKReader,
+                           RegisterMap, SensorData)
+from sensor_scheduler import PollScheduler
+
+logger = logging.getLogger(__name__)
+
+
+class BusConfig:
+    """Connection settings and slave list for one RS-485 bus."""
+
+    def __init__(self, port: str, room: str = 'default', name: Optional[str] = None,
+                 baudrate: int = 9600, gpio_de_re: Optional[int] = None,
+                 timeout: float = 1.0, slaves: Iterable[int] = (1,),
+                 register_map: RegisterMap = DEFAULT_REGISTER_MAP, max_gap: int = DEFAULT_MAX_GAP,
+                 de_re_mode: str = DE_RE_TIMED):
+        """
+        Args:
+            port: Serial port of the RS-485 adapter
+            room: Room (or zone) the bus belongs to
+            name: Bus name within the room (defaults to the port's basename)
+            baudrate: Modbus RTU speed
+            gpio_de_re: GPIO pin for DE/RE control (None for auto-direction adapters)
+            timeout: Read timeout in seconds
+            slaves: Modbus slave IDs on this bus, using register_map
+                    (use add_sensor() for per-slave layouts)
+            register_map: Register layout of the slaves listed in slaves
+            max_gap: Largest run of unused registers read to save a request
+            de_re_mode: DE/RE direction control ('timed', 'rs485' or 'sleep')
+        """
+        self.port = port
+        self.room = room
+        self.name = name or os.path.basename(port)
+        self.baudrate = baudrate
+        self.gpio_de_re = gpio_de_re
+        self.timeout = timeout
+        self.max_gap = max_gap
+        self.de_re_mode = de_re_mode
+        self.register_maps: Dict[int, RegisterMap] = {}
+        self.calibration_ids: Dict[int, Hashable] = {}
+        self.poll_intervals: Dict[int, float] = {}
+        self.param_intervals: Dict[int, Dict[str, float]] = {}
+        for slave in slaves:
+            self.add_sensor(slave, register_map)
+
+    def add_sensor(self, slave: int, register_map: RegisterMap = DEFAULT_REGISTER_MAP,
+                   calibration_id: Optional[Hashable] = None, poll_interval: Optional[float] = None,
+                   param_intervals: Optional[Dict[str, float]] = None):
+        """
+        Register a slave on this bus.
+
+        Args:
+            slave: Modbus slave ID
+            register_map: Register layout of the sensor
+            calibration_id: SENSOR_CALIBRATION entry (defaults to the slave ID)
+            poll_interval: Minimum seconds between reads (None = every poll cycle)
+            param_intervals: Per-parameter overrides of poll_interval
+                             (None = BusManager default)
+        """
+        self.register_maps[slave] = register_map
+        if calibration_id is not None:
+            self.calibration_ids[slave] = calibration_id
+        if poll_interval is not None:
+            self.poll_intervals[slave] = poll_interval
+        if param_intervals is not None:
+            self.param_intervals[slave] = param_intervals
+
+    @property
+    def slaves(self) -> List[int]:
+        """Slave IDs on this bus, in registration order."""
+        return list(self.register_maps)
+
+    @property
+    def label(self) -> str:
+        """Namespace prefix for this bus ('room/bus')."""
+        return f"{self.room}/{self.name}"
+
+    def key(self, slave: int) -> str:
+        """Namespaced sensor key ('room/bus/slave')."""
+        return f"{self.label}/{slave}"
+
+
+def parse_bus_list(value: str, baudrate: int = 9600, timeout: float = 1.0,
+                   slaves: Iterable[int] = (1,), register_map: RegisterMap = DEFAULT_REGISTER_MAP,
+                   max_gap: int = DEFAULT_MAX_GAP, de_re_mode: str = DE_RE_TIMED) -> List[BusConfig]:
+    """
+    Parse a MODBUS_BUSES style list: 'room:port[,room:port...]'.
+
+    Example: 'room1:/dev/ttyUSB0,room2:/dev/ttyUSB1'
+    """
+    configs = []
+    for item in value.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        room, _, port = item.partition(':')
+        if not port:
+            raise ValueError(f"Invalid bus entry '{item}', expected room:port")
+        configs.append(BusConfig(port, room=room, baudrate=baudrate, timeout=timeout, slaves=slaves,
+                                 register_map=register_map, max_gap=max_gap, de_re_mode=de_re_mode))
+    return configs
+
+
+class BusManager:
+    """
+    Runs one ModbusNPKReader and BusArbiter per bus.
+
+    Exposes the same read_sensor/read_all_sensors/submit_read interface as
+    BusArbiter, keyed by 'room/bus/slave' instead of slave ID, so the poller
+    and reading cache work unchanged. A full scan queues every slave on every
+    bus at once, so it takes as long as the slowest bus, not the sum of all.
+    Scheduled scans go through a PollScheduler, which backs off slaves that
+    stop answering.
+    """
+
+    PRIORITY_INTERACTIVE = BusArbiter.PRIORITY_INTERACTIVE
+    PRIORITY_POLL = BusArbiter.PRIORITY_POLL
+
+    def __init__(self, configs: List[BusConfig], param_intervals: Optional[Dict[str, float]] = None,
+                 failure_threshold: int = 3, backoff_max: float = 600.0, backend: str = 'sync'):
+        """
+        Args:
+            configs: One BusConfig per serial port
+            backend: 'sync' (one blocking thread per bus) or 'async' (all
+                     buses on one asyncio event loop thread)
+            param_intervals: Default per-parameter poll intervals in seconds
+                             (e.g. slow-changing NPK values)
+            failure_threshold: Consecutive failed reads before a slave is backed off
+            backoff_max: Maximum seconds between probes of a backed-off slave
+        """
+        if backend not in ('sync', 'async'):
+            raise ValueError(f"Unknown Modbus backend: {backend}")
+        self.configs = configs
+        self.backend = backend
+        self.param_intervals = param_intervals or {}
+        self._loop_thread = None
+        self.arbiters: Dict[str, BusArbiter] = {}
+        self._sensors: Dict[str, Tuple[BusArbiter, int]] = {}
+        self.scheduler = PollScheduler(
+            self._submit_scheduled,
+            poll_priority=BusArbiter.PRIORITY_POLL,
+            probe_priority=BusArbiter.PRIORITY_PROBE,
+            failure_threshold=failure_threshold,
+            backoff_max=backoff_max
+        )
+
+    def connect(self) -> bool:
+        """
+        Open every bus and start its arbiter thread.
+
+        Returns:
+            True if at least one bus connected
+        """
+        if self.backend == 'async':
+            self._loop_thread = EventLoopThread()
+
+        connected = 0
+        for config in self.configs:
+            reader_class = AsyncModbusNPKReader if self.backend == 'async' else ModbusNPKReader
+            reader = reader_class(
+                port=config.port,
+                baudrate=config.baudrate,
+                gpio_de_re=config.gpio_de_re,
+                timeout=config.timeout,
+                register_maps=config.register_maps,
+                calibration_ids=config.calibration_ids,
+                max_gap=config.max_gap,
+                de_re_mode=config.de_re_mode
+            )
+            if self.backend == 'async':
+                ok = self._loop_thread.run(reader.connect())
+                arbiter = AsyncBusArbiter(reader, self._loop_thread, name=f"bus-{config.label}")
+            else:
+                ok = reader.connect()
+                arbiter = BusArbiter(reader, name=f"bus-{config.label}")
+            if ok:
+                connected += 1
+            else:
+                logger.error(f"Bus {config.label}: failed to connect on {config.port}")
+
+            # Unconnected buses stay registered and report per-sensor errors
+            arbiter.start()
+            self.arbiters[config.label] = arbiter
+            for slave in config.slaves:
+                self._sensors[config.key(slave)] = (arbiter, slave)
+                self.scheduler.add(
+                    config.key(slave), slave, config.register_maps[slave].params,
+                    interval=config.poll_intervals.get(slave),
+                    param_intervals=config.param_intervals.get(slave, self.param_intervals)
+                )
+
+        logger.info(f"Bus manager ({self.backend}): {connected}/{len(self.configs)} buses connected, "
+                    f"{len(self._sensors)} sensors registered")
+        return connected > 0
+
+    @property
+    def sensor_keys(self) -> List[str]:
+        """All registered sensor keys, in configuration order."""
+        return list(self._sensors)
+
+    @property
+    def calibration_ids(self) -> Dict[str, Hashable]:
+        """SENSOR_CALIBRATION entry per sensor key."""
+        return {config.key(slave): config.calibration_ids.get(slave, slave)
+                for config in self.configs for slave in config.slaves}
+
+    def resolve(self, sensor: str) -> Optional[str]:
+        """
+        Resolve a sensor key, or a bare slave ID on the first bus that has it.
+
+        Returns:
+            Namespaced sensor key, or None if unknown
+        """
+        if sensor in self._sensors:
+            return sensor
+        if sensor.isdigit():
+            slave = int(sensor)
+            for config in self.configs:
+                if slave in config.slaves:
+                    return config.key(slave)
+        return None
+
+    def submit_read(self, key: str, priority: int = PRIORITY_POLL) -> Future:
+        """
+        Queue a read for one sensor on its bus's arbiter.
+
+        Fails immediately, without touching the bus, while the slave is backed off.
+        """
+        arbiter, slave = self._sensors[key]
+        error = self.scheduler.unavailable(key)
+        if error is not None:
+            data = SensorData(slave)
+            data.error = error
+            future = Future()
+            future.set_result(data)
+            return future
+        return arbiter.submit_read(slave, priority)
+
+    def _submit_scheduled(self, key: str, params: Optional[Tuple[str, ...]],
+                          retries: int, priority: int) -> Future:
+        """PollScheduler hook: queue a (possibly partial) read."""
+        arbiter, slave = self._sensors[key]
+        return arbiter.submit_read(slave, priority, params=params, retries=retries)
+
+    def read_sensor(self, key: str, priority: int = PRIORITY_INTERACTIVE,
+                    timeout: Optional[float] = None) -> SensorData:
+        """Read one sensor, blocking until it completes."""
+        return self.submit_read(key, priority).result(timeout)
+
+    def read_all_sensors(self, priority: int = PRIORITY_POLL) -> Dict[str, SensorData]:
+        """Read every sensor on every bus concurrently."""
+        futures = {key: self.submit_read(key, priority) for key in self._sensors}
+        return {key: future.result() for key, future in futures.items()}
+
+    def read_due_sensors(self) -> Dict[str, SensorData]:
+        """
+        Read the sensors and parameters that are due, all buses concurrently.
+
+        Slaves that stopped answering are probed in the background; their
+        results are returned by a later call.
+        """
+        return self.scheduler.poll()
+
+    def is_healthy(self) -> bool:
+        """True if at least one bus has an open serial port."""
+        return any(arbiter.reader.connected for arbiter in self.arbiters.values())
+
+    def health(self) -> Dict[str, Dict]:
+        """Per-sensor health and backoff state keyed by sensor key."""
+        return self.scheduler.status()
+
+    def metrics(self) -> Dict[str, Dict]:
+        """Per-bus arbiter metrics keyed by 'room/bus'."""
+        return {label: arbiter.metrics() for label, arbiter in self.arbiters.items()}
+
+    def disconnect(self):
+        """Stop all arbiters and close their serial ports."""
+        for arbiter in self.arbiters.values():
+            arbiter.stop(timeout=5)
+            if self._loop_thread is not None:
+                self._loop_thread.run(arbiter.reader.disconnect(), timeout=5)
+            else:
+                arbiter.reader.disconnect()
+        if self._loop_thread is not None:
+            self._loop_thread.stop(timeout=5)
@@ -1,14 +1,21 @@
 """
 NPK Sensor Calibration Configuration
-Linear Regression Calibration (y = mx + b)
+Linear Regression Calibration (y = mx + b), piecewise-linear and polynomial curves
 
 Based on industry standards and typical NPK sensor error patterns
 These values can be adjusted after lab testing
 """
 
+from calibration_engine import get_engine
+
 # Calibration coefficients for each sensor
 # Format: {parameter: {'m': slope, 'b': intercept}}
 # Corrected_Value = (m * Raw_Value) + b
+#
+# Non-linear sensors can use instead:
+#   {'points': [[raw, true], [raw, true], ...]}  piecewise linear between lab points
+#                                                (end segments extended)
+#   {'poly': [c0, c1, c2]}                       Corrected = c0 + c1*Raw + c2*Raw^2
 
 SENSOR_CALIBRATION = {
     1: {  # Sensor 1 (Primary sensor - currently working)
@@ -61,7 +68,7 @@ REFERENCE_RANGES = {
 
 def apply_calibration(sensor_id, parameter, raw_value):
     """
-    Apply linear regression calibration to raw sensor value
+    Apply calibration to raw sensor value
     
     Args:
         sensor_id: Sensor ID (1-4)
@@ -69,22 +76,9 @@ def apply_calibration(sensor_id, parameter, raw_value):
         raw_value: Raw sensor reading
         
     Returns:
-        Calibrated value (float)
+        Calibrated value (float), or raw_value if the sensor/parameter is not configured
     """
-    if sensor_id not in SENSOR_CALIBRATION:
-        return raw_value  # Return uncalibrated if sensor not configured
-    
-    if parameter not in SENSOR_CALIBRATION[sensor_id]:
-        return raw_value  # Return uncalibrated if parameter not configured
-    
-    calib = SENSOR_CALIBRATION[sensor_id][parameter]
-    m = calib['m']  # slope
-    b = calib['b']  # intercept
-    
-    # Apply linear regression: y = mx + b
-    calibrated_value = (m * raw_value) + b
-    
-    return calibrated_value
+    return get_engine().apply(sensor_id, parameter, raw_value)
 
 
 def get_sensor_health(parameter, calibrated_value):
@@ -114,8 +108,8 @@ def log_calibration_info(sensor_id):
         return f"Sensor {sensor_id}: No calibration configured"
     
     info = f"Sensor {sensor_id} Calibration:\n"
-    for param, coeffs in SENSOR_CALIBRATION[sensor_id].items():
-        info += f"  {param}: y = {coeffs['m']}x + {coeffs['b']}\n"
+    for param, formula in get_engine().describe(sensor_id).items():
+        info += f"  {param}: {formula}\n"
     return info
 
 
@@ -0,0 +1,353 @@
+"""
+Compiled calibration engine.
+Turns SENSOR_CALIBRATION into dense slope/intercept arrays indexed by
+(sensor, parameter) and applies them to single values, whole history
+columns or ReadingBatch columns in one pass. Besides y = mx + b, entries
+can be piecewise-linear curves or polynomials.
+"""
+
+import importlib.util
+import logging
+import os
+import threading
+from array import array
+from bisect import bisect_right
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple, Union
+
+from config_watcher import load_config_file
+
+logger = logging.getLogger(__name__)
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+
+class PiecewiseCurve:
+    """
+    Linear interpolation between calibration points.
+
+    Outside the first/last point the end segments are extended, so a sensor
+    reading slightly beyond the calibrated range is not clamped.
+    """
+
+    kind = 'piecewise'
+
+    def __init__(self, points: Sequence[Sequence[float]]):
+        """
+        Args:
+            points: (raw, true) pairs, at least two, with distinct raw values
+        """
+        points = sorted((float(x), float(y)) for x, y in points)
+        if len(points) < 2:
+            raise ValueError("Piecewise calibration needs at least two points")
+        self.xs = [x for x, _ in points]
+        self.ys = [y for _, y in points]
+        if any(b <= a for a, b in zip(self.xs, self.xs[1:])):
+            raise ValueError("Piecewise calibration points need distinct raw values")
+        self.slopes = [(y1 - y0) / (x1 - x0)
+                       for x0, x1, y0, y1 in zip(self.xs, self.xs[1:], self.ys, self.ys[1:])]
+        self._last = len(self.slopes) - 1
+
+    def __call__(self, raw: float) -> float:
+        segment = min(max(bisect_right(self.xs, raw) - 1, 0), self._last)
+        return self.ys[segment] + (raw - self.xs[segment]) * self.slopes[segment]
+
+    def apply_numpy(self, raw):
+        """Evaluate a NumPy array."""
+        xs = np.asarray(self.xs)
+        segment = np.clip(np.searchsorted(xs, raw, side='right') - 1, 0, self._last)
+        return np.asarray(self.ys)[segment] + (raw - xs[segment]) * np.asarray(self.slopes)[segment]
+
+    def describe(self) -> str:
+        return 'piecewise ' + ', '.join(f"{x:g}->{y:g}" for x, y in zip(self.xs, self.ys))
+
+
+class PolynomialCurve:
+    """y = c0 + c1*x + c2*x^2 + ..., evaluated with Horner's scheme."""
+
+    kind = 'polynomial'
+
+    def __init__(self, coefficients: Sequence[float]):
+        """
+        Args:
+            coefficients: c0, c1, c2, ... in ascending powers
+        """
+        if not coefficients:
+            raise ValueError("Polynomial calibration needs at least one coefficient")
+        self.coefficients = [float(c) for c in coefficients]
+        self._descending = self.coefficients[::-1]
+
+    def __call__(self, raw: float) -> float:
+        result = 0.0
+        for c in self._descending:
+            result = result * raw + c
+        return result
+
+    def apply_numpy(self, raw):
+        """Evaluate a NumPy array."""
+        return np.polyval(self._descending, raw)
+
+    def describe(self) -> str:
+        return 'y = ' + ' + '.join(f"{c:g}x^{power}" if power else f"{c:g}"
+                                   for power, c in enumerate(self.coefficients))
+
+
+Curve = Union[PiecewiseCurve, PolynomialCurve]
+
+
+def compile_entry(coeffs: Dict) -> Union[Tuple[float, float], Curve]:
+    """
+    Compile one SENSOR_CALIBRATION entry.
+
+    Accepted forms:
+        {'m': slope, 'b': intercept}           y = mx + b
+        {'points': [[raw, true], ...]}         piecewise linear
+        {'poly': [c0, c1, c2, ...]}            polynomial, ascending powers
+
+    Returns:
+        (slope, intercept) for linear entries, else a curve object
+    """
+    if 'points' in coeffs:
+        return PiecewiseCurve(coeffs['points'])
+    if 'poly' in coeffs:
+        return PolynomialCurve(coeffs['poly'])
+    if 'm' in coeffs or 'b' in coeffs:
+        return (float(coeffs.get('m', 1.0)), float(coeffs.get('b', 0.0)))
+    raise ValueError(f"Unknown calibration entry: {coeffs}")
+
+
+class CalibrationEngine:
+    """
+    Calibration table compiled for fast lookups and column-wise application.
+
+    Linear entries live in dense slope/intercept arrays at
+    slot = sensor_index * len(params) + param_index; missing entries are the
+    identity (1, 0). Curves are kept per slot. apply() costs one dict lookup;
+    apply_series() and apply_column() calibrate whole columns at once, with
+    NumPy when it is installed and a tight loop otherwise.
+    """
+
+    def __init__(self, table: Dict[Hashable, Dict[str, Dict]], version: Optional[str] = None):
+        """
+        Args:
+            table: SENSOR_CALIBRATION style {sensor: {param: coefficients}}
+            version: Label of this calibration (e.g. a lab report or file hash)
+        """
+        self.version = version
+        self.table = table
+        self.sensors: List[Hashable] = list(table)
+        self.params: List[str] = []
+        for entries in table.values():
+            for param in entries:
+                if param not in self.params:
+                    self.params.append(param)
+        self._sensor_index = {sensor: index for index, sensor in enumerate(self.sensors)}
+        self._param_index = {param: index for index, param in enumerate(self.params)}
+
+        size = len(self.sensors) * len(self.params)
+        self.slope = array('d', [1.0]) * size
+        self.intercept = array('d', [0.0]) * size
+        self.curves: Dict[int, Curve] = {}
+        # (sensor, param) -> (slope, intercept) or curve, for the scalar path
+        self._entries: Dict[Tuple[Hashable, str], Union[Tuple[float, float], Curve]] = {}
+
+        for sensor, entries in table.items():
+            for param, coeffs in entries.items():
+                try:
+                    entry = compile_entry(coeffs)
+                except (TypeError, ValueError) as e:
+                    raise ValueError(f"Sensor {sensor} {param}: {e}") from None
+                slot = self.slot(sensor, param)
+                if isinstance(entry, tuple):
+                    self.slope[slot], self.intercept[slot] = entry
+                else:
+                    self.curves[slot] = entry
+                self._entries[(sensor, param)] = entry
+
+    def slot(self, sensor: Hashable, param: str) -> Optional[int]:
+        """Flat index of (sensor, param), or None if either has no entries."""
+        sensor_index = self._sensor_index.get(sensor)
+        param_index = self._param_index.get(param)
+        if sensor_index is None or param_index is None:
+            return None
+        return sensor_index * len(self.params) + param_index
+
+    def apply(self, sensor: Hashable, param: str, raw: float) -> float:
+        """Calibrate one value (identity if the sensor/parameter is not calibrated)."""
+        entry = self._entries.get((sensor, param))
+        if entry is None:
+            return raw
+        if entry.__class__ is tuple:
+            return entry[0] * raw + entry[1]
+        return entry(raw)
+
+    def apply_series(self, sensor: Hashable, param: str, raw: Sequence[float]):
+        """
+        Calibrate a column of values from one sensor (e.g. a history series).
+
+        Returns:
+            numpy.ndarray if NumPy is available, else array('d')
+        """
+        entry = self._entries.get((sensor, param))
+        if NUMPY_AVAILABLE:
+            values = np.asarray(raw, dtype=np.float64)
+            if entry is None:
+                return values.copy()
+            if entry.__class__ is tuple:
+                return values * entry[0] + entry[1]
+            return entry.apply_numpy(values)
+
+        if entry is None:
+            return array('d', raw)
+        if entry.__class__ is tuple:
+            m, b = entry
+            return array('d', [m * x + b for x in raw])
+        return array('d', map(entry, raw))
+
+    def apply_column(self, sensors: Sequence[Hashable], codes: Sequence[int], param: str,
+                     raw: Sequence[float]):
+        """
+        Calibrate a column whose values come from several sensors.
+
+        Args:
+            sensors: Calibration IDs referenced by codes
+            codes: Per value, an index into sensors (e.g. ReadingBatch.sensor)
+            param: Parameter of the column
+            raw: Raw values, same length as codes
+
+        Returns:
+            numpy.ndarray if NumPy is available, else array('d')
+        """
+        param_index = self._param_index.get(param)
+        if param_index is None:
+            return self.apply_series(None, param, raw)
+        width = len(self.params)
+        # Slot per sensor; uncalibrated sensors map to -1, the identity
+        lookup = [self._sensor_index[sensor] * width + param_index if sensor in self._sensor_index else -1
+                  for sensor in sensors]
+
+        if NUMPY_AVAILABLE:
+            values = np.asarray(raw, dtype=np.float64)
+            slots = np.asarray(lookup, dtype=np.intp)[np.asarray(codes, dtype=np.intp)]
+            known = slots >= 0
+            result = values.copy()
+            # Zero-copy views of the coefficient arrays
+            slope = np.frombuffer(self.slope, dtype=np.float64)
+            intercept = np.frombuffer(self.intercept, dtype=np.float64)
+            result[known] = values[known] * slope[slots[known]] + intercept[slots[known]]
+            for slot in set(lookup) & self.curves.keys():
+                mask = slots == slot
+                result[mask] = self.curves[slot].apply_numpy(values[mask])
+            return result
+
+        slope, intercept, curves = self.slope, self.intercept, self.curves
+        result = array('d', raw)
+        for index, code in enumerate(codes):
+            slot = lookup[code]
+            if slot < 0:
+                continue
+            curve = curves.get(slot) if curves else None
+            x = result[index]
+            result[index] = curve(x) if curve is not None else slope[slot] * x + intercept[slot]
+        return result
+
+    def apply_batch(self, batch, calibration_ids: Optional[Dict[Hashable, Hashable]] = None):
+        """
+        Recompute the calibrated columns of a ReadingBatch from its raw columns.
+
+        Args:
+            batch: ReadingBatch created with raw=True
+            calibration_ids: Calibration ID per sensor key (default: the key itself)
+        """
+        if batch.raw_columns is None:
+            raise ValueError("Batch has no raw columns to calibrate")
+        calibration_ids = calibration_ids or {}
+        ids = [calibration_ids.get(key, key) for key in batch.sensors]
+        for param, raw in batch.raw_columns.items():
+            calibrated = self.apply_column(ids, batch.sensor, param, raw)
+            batch.columns[param] = array(batch.typecode, calibrated)
+        return batch
+
+    def describe(self, sensor: Hashable) -> Dict[str, str]:
+        """Human-readable formula per parameter of a sensor."""
+        result = {}
+        for (entry_sensor, param), entry in self._entries.items():
+            if entry_sensor == sensor:
+                result[param] = (f"y = {entry[0]}x + {entry[1]}" if isinstance(entry, tuple)
+                                 else entry.describe())
+        return result
+
+
+def table_from_config(config: Dict) -> Tuple[Dict[Hashable, Dict[str, Dict]], Optional[str]]:
+    """
+    Extract a calibration table from a parsed calibration file.
+
+    The file is either a bare {sensor: {param: coefficients}} table or
+    {'version': label, 'sensors': table}. Sensor keys that are digits become
+    ints, matching slave IDs, since JSON/TOML keys are always strings.
+
+    Returns:
+        (table, version label or None)
+    """
+    version = None
+    if 'sensors' in config:
+        version = config.get('version')
+        config = config['sensors'] or {}
+    table = {}
+    for sensor, entries in config.items():
+        key = int(sensor) if isinstance(sensor, str) and sensor.isdigit() else sensor
+        table[key] = dict(entries)
+    return table, None if version is None else str(version)
+
+
+def load_calibration(path: str) -> CalibrationEngine:
+    """
+    Compile a calibration file into a new engine (the active one is untouched).
+
+    Args:
+        path: .json/.yaml/.toml calibration file, or a Python module that
+              defines SENSOR_CALIBRATION (like calibration_config.py)
+    """
+    if os.path.splitext(path)[1].lower() == '.py':
+        # Execute into a fresh module object so a broken edit leaves the imported one intact
+        spec = importlib.util.spec_from_file_location('_calibration_reload', path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        table, version = dict(module.SENSOR_CALIBRATION), getattr(module, 'CALIBRATION_VERSION', None)
+    else:
+        table, version = table_from_config(load_config_file(path))
+    engine = CalibrationEngine(table, version=version)
+    logger.info(f"Compiled calibration {path}" + (f" (version {version})" if version else "") +
+                f": {len(engine.sensors)} sensors")
+    return engine
+
+
+# Engine used by the readers; replaced atomically when calibration changes
+_engine: Optional[CalibrationEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> CalibrationEngine:
+    """Return the active engine, compiling calibration_config.SENSOR_CALIBRATION on first use."""
+    global _engine
+    engine = _engine
+    if engine is None:
+        with _engine_lock:
+            if _engine is None:
+                try:
+                    from calibration_config import SENSOR_CALIBRATION
+                except ImportError:
+                    SENSOR_CALIBRATION = {}
+                    logger.warning("calibration_config not found, readings are not calibrated")
+                _engine = CalibrationEngine(SENSOR_CALIBRATION)
+            engine = _engine
+    return engine
+
+
+def set_engine(engine: CalibrationEngine):
+    """Make engine the active one (a single reference swap, safe while reads run)."""
+    global _engine
+    _engine = engine
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Fit calibration coefficients from lab reference samples.
+Takes (raw reading, lab value) pairs per sensor and parameter, fits a
+least-squares line or polynomial for every pair at once and writes a new
+calibration file that the app loads (and hot-reloads) via CALIBRATION_FILE.
+
+    python calibration_fit.py samples.csv --output calibration.json
+"""
+
+import csv
+import json
+import logging
+import math
+import os
+import sys
+import tempfile
+from datetime import datetime
+from math import comb
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+from calibration_engine import CalibrationEngine, load_calibration
+from modbus_sensor import PARAMETERS
+
+logger = logging.getLogger(__name__)
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+SeriesKey = Tuple[Hashable, str]
+
+# Calibration kept for series without samples: the file the app loads, else calibration_config.py
+DEFAULT_BASE = os.getenv('CALIBRATION_FILE') or os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                             'calibration_config.py')
+
+
+class FitResult:
+    """Least-squares fit of one sensor parameter."""
+
+    __slots__ = ('sensor', 'param', 'degree', 'coefficients', 'samples', 'r2', 'rmse', 'max_residual')
+
+    def __init__(self, sensor: Hashable, param: str, degree: int, coefficients: List[float],
+                 samples: int, r2: float, rmse: float, max_residual: float):
+        self.sensor = sensor
+        self.param = param
+        self.degree = degree
+        self.coefficients = coefficients  # c0, c1, ... in ascending powers
+        self.samples = samples
+        self.r2 = r2
+        self.rmse = rmse
+        self.max_residual = max_residual
+
+    def entry(self) -> Dict:
+        """SENSOR_CALIBRATION entry for this fit."""
+        if self.degree == 1:
+            return {'m': self.coefficients[1], 'b': self.coefficients[0]}
+        return {'poly': self.coefficients}
+
+    def to_dict(self) -> Dict:
+        return {
+            'sensor': self.sensor,
+            'param': self.param,
+            'degree': self.degree,
+            'entry': self.entry(),
+            'samples': self.samples,
+            'r2': self.r2,
+            'rmse': self.rmse,
+            'max_residual': self.max_residual,
+        }
+
+
+def _sensor_key(value: str) -> Hashable:
+    value = value.strip()
+    return int(value) if value.isdigit() else value
+
+
+def load_samples(path: str) -> Dict[SeriesKey, Tuple[List[float], List[float]]]:
+    """
+    Read lab samples from CSV or JSON.
+
+    CSV needs the columns sensor, param, raw, lab (a header row); JSON is a
+    list of objects with the same keys. raw is the uncalibrated sensor
+    reading (the *_raw value in the API), lab the reference measurement.
+
+    Returns:
+        {(sensor, param): (raw values, lab values)}
+    """
+    if os.path.splitext(path)[1].lower() == '.json':
+        with open(path) as f:
+            rows = json.load(f)
+    else:
+        with open(path, newline='') as f:
+            rows = list(csv.DictReader(f))
+
+    samples: Dict[SeriesKey, Tuple[List[float], List[float]]] = {}
+    for line, row in enumerate(rows, start=1):
+        try:
+            sensor = _sensor_key(str(row['sensor']))
+            param = str(row['param']).strip()
+            raw, lab = float(row['raw']), float(row['lab'])
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"{path}: sample {line} is invalid ({e})") from None
+        if param not in PARAMETERS:
+            raise ValueError(f"{path}: sample {line} has unknown param '{param}'")
+        xs, ys = samples.setdefault((sensor, param), ([], []))
+        xs.append(raw)
+        ys.append(lab)
+    return samples
+
+
+def _summary(xs: Sequence[float], ys: Sequence[float], fitted: Sequence[float]) -> Tuple[float, float, float]:
+    """(R², RMSE, max |residual|) of a fit."""
+    n = len(ys)
+    residuals = [y - f for y, f in zip(ys, fitted)]
+    ss_res = sum(r * r for r in residuals)
+    mean = sum(ys) / n
+    ss_tot = sum((y - mean) ** 2 for y in ys)
+    r2 = 1.0 - ss_res / ss_tot if ss_tot > 0 else float('nan')
+    return r2, math.sqrt(ss_res / n), max(abs(r) for r in residuals)
+
+
+def _unscale(scaled: Sequence[float], mu: float, sigma: float) -> List[float]:
+    """Convert coefficients of p((x - mu) / sigma) to coefficients of x."""
+    coefficients = [0.0] * len(scaled)
+    for k, a in enumerate(scaled):
+        a /= sigma ** k
+        for j in range(k + 1):
+            coefficients[j] += a * comb(k, j) * (-mu) ** (k - j)
+    return coefficients
+
+
+def _solve(matrix: List[List[float]], vector: List[float]) -> List[float]:
+    """Gaussian elimination with partial pivoting."""
+    n = len(vector)
+    rows = [list(row) + [value] for row, value in zip(matrix, vector)]
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(rows[r][col]))
+        if abs(rows[pivot][col]) < 1e-12:
+            raise ValueError("Samples do not determine the fit (too few distinct raw values)")
+        rows[col], rows[pivot] = rows[pivot], rows[col]
+        for r in range(col + 1, n):
+            factor = rows[r][col] / rows[col][col]
+            for c in range(col, n + 1):
+                rows[r][c] -= factor * rows[col][c]
+    solution = [0.0] * n
+    for r in range(n - 1, -1, -1):
+        solution[r] = (rows[r][n] - sum(rows[r][c] * solution[c] for c in range(r + 1, n))) / rows[r][r]
+    return solution
+
+
+def _fit_python(samples: Dict[SeriesKey, Tuple[List[float], List[float]]], degree: int) -> List[FitResult]:
+    """Fit every series with the normal equations, one series at a time."""
+    results = []
+    for (sensor, param), (xs, ys) in samples.items():
+        n = len(xs)
+        mu = sum(xs) / n
+        sigma = math.sqrt(sum((x - mu) ** 2 for x in xs) / n) or 1.0
+        zs = [(x - mu) / sigma for x in xs]
+        moments = [sum(z ** k for z in zs) for k in range(2 * degree + 1)]
+        matrix = [[moments[i + j] for j in range(degree + 1)] for i in range(degree + 1)]
+        vector = [sum(y * z ** k for z, y in zip(zs, ys)) for k in range(degree + 1)]
+        scaled = _solve(matrix, vector)
+        fitted = [sum(a * z ** k for k, a in enumerate(scaled)) for z in zs]
+        results.append(FitResult(sensor, param, degree, _unscale(scaled, mu, sigma), n,
+                                 *_summary(xs, ys, fitted)))
+    return results
+
+
+def _fit_numpy(samples: Dict[SeriesKey, Tuple[List[float], List[float]]], degree: int) -> List[FitResult]:
+    """
+    Fit all series in one pass.
+
+    Raw values are standardized per series, the normal-equation moments of
+    every series are accumulated with bincount, and the stacked
+    (degree+1)x(degree+1) systems are solved together.
+    """
+    keys = list(samples)
+    codes = np.concatenate([np.full(len(samples[key][0]), index) for index, key in enumerate(keys)])
+    x = np.concatenate([np.asarray(samples[key][0], dtype=np.float64) for key in keys])
+    y = np.concatenate([np.asarray(samples[key][1], dtype=np.float64) for key in keys])
+    groups = len(keys)
+
+    counts = np.bincount(codes, minlength=groups).astype(np.float64)
+    mu = np.bincount(codes, x, groups) / counts
+    sigma = np.sqrt(np.bincount(codes, (x - mu[codes]) ** 2, groups) / counts)
+    sigma[sigma == 0] = 1.0
+    z = (x - mu[codes]) / sigma[codes]
+
+    powers = z[:, None] ** np.arange(2 * degree + 1)
+    moments = np.stack([np.bincount(codes, powers[:, k], groups) for k in range(2 * degree + 1)], axis=1)
+    index = np.add.outer(np.arange(degree + 1), np.arange(degree + 1))
+    matrices = moments[:, index]
+    vectors = np.stack([np.bincount(codes, powers[:, k] * y, groups) for k in range(degree + 1)], axis=1)
+
+    # fit_samples checked that every series has degree + 1 distinct raw values,
+    # so each system has full rank
+    scaled = np.linalg.solve(matrices, vectors[..., None])[..., 0]
+
+    fitted = np.einsum('nk,nk->n', powers[:, :degree + 1], scaled[codes])
+    residuals = y - fitted
+    ss_res = np.bincount(codes, residuals ** 2, groups)
+    y_mean = np.bincount(codes, y, groups) / counts
+    ss_tot = np.bincount(codes, (y - y_mean[codes]) ** 2, groups)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r2 = np.where(ss_tot > 0, 1.0 - ss_res / ss_tot, np.nan)
+    rmse = np.sqrt(ss_res / counts)
+    max_residual = np.zeros(groups)
+    np.maximum.at(max_residual, codes, np.abs(residuals))
+
+    # Back to coefficients of the raw value: c_j = sum_k a_k / sigma^k * C(k, j) * (-mu)^(k-j)
+    coefficients = np.zeros_like(scaled)
+    for k in range(degree + 1):
+        a = scaled[:, k] / sigma ** k
+        for j in range(k + 1):
+            coefficients[:, j] += a * comb(k, j) * (-mu) ** (k - j)
+
+    return [FitResult(sensor, param, degree, coefficients[index].tolist(), int(counts[index]),
+                      float(r2[index]), float(rmse[index]), float(max_residual[index]))
+            for index, (sensor, param) in enumerate(keys)]
+
+
+def fit_samples(samples: Dict[SeriesKey, Tuple[List[float], List[float]]], degree: int = 1) -> List[FitResult]:
+    """
+    Least-squares fit of lab = c0 + c1*raw + ... + c_degree*raw^degree per series.
+
+    Args:
+        samples: {(sensor, param): (raw values, lab values)}
+        degree: 1 for y = mx + b, 2+ for a polynomial
+
+    Returns:
+        One FitResult per series, in the order of samples
+
+    Raises:
+        ValueError: A series has fewer distinct raw values than degree + 1
+    """
+    if degree < 1:
+        raise ValueError("Degree must be at least 1")
+    if not samples:
+        return []
+    for (sensor, param), (xs, _) in samples.items():
+        if len(set(xs)) < degree + 1:
+            raise ValueError(f"Sensor {sensor} {param}: a degree {degree} fit needs "
+                             f"{degree + 1} distinct raw values, got {len(set(xs))}")
+    if NUMPY_AVAILABLE:
+        return _fit_numpy(samples, degree)
+    return _fit_python(samples, degree)
+
+
+def build_table(results: Sequence[FitResult],
+                base: Optional[Dict[Hashable, Dict[str, Dict]]] = None) -> Dict[Hashable, Dict[str, Dict]]:
+    """Calibration table with the fitted entries replacing those of base."""
+    table = {sensor: dict(entries) for sensor, entries in (base or {}).items()}
+    for result in results:
+        table.setdefault(result.sensor, {})[result.param] = result.entry()
+    return table
+
+
+def write_calibration(path: str, table: Dict[Hashable, Dict[str, Dict]], version: str):
+    """
+    Write a calibration file for CALIBRATION_FILE.
+
+    The file is written next to its destination and renamed over it, so a
+    config watcher never sees a partial file.
+    """
+    # Validate by compiling before anything is written
+    CalibrationEngine(table, version=version)
+    document = {'version': version, 'sensors': {str(sensor): entries for sensor, entries in table.items()}}
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.calibration-', suffix='.json', dir=directory)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(document, f, indent=2)
+            f.write('\n')
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def format_report(results: Sequence[FitResult]) -> str:
+    """Plain-text table of fits."""
+    lines = [f"{'sensor':<12} {'param':<12} {'n':>4} {'R²':>8} {'RMSE':>10} {'max|res|':>10}  model"]
+    for result in results:
+        model = CalibrationEngine({result.sensor: {result.param: result.entry()}}).describe(result.sensor)
+        lines.append(f"{str(result.sensor):<12} {result.param:<12} {result.samples:>4} "
+                     f"{result.r2:>8.4f} {result.rmse:>10.4g} {result.max_residual:>10.4g}  "
+                     f"{model[result.param]}")
+    return '\n'.join(lines)
+
+
+def main():
+    """Fit lab samples and write a calibration file."""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Fit sensor calibration coefficients from lab reference samples',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Samples (CSV with a header, or a JSON list of objects):
+  sensor,param,raw,lab
+  1,nitrogen,48.0,47.1
+  1,nitrogen,95.5,99.8
+
+Examples:
+  python calibration_fit.py samples.csv                          # Report only
+  python calibration_fit.py samples.csv --output calibration.json
+  python calibration_fit.py samples.csv --degree 2 --min-r2 0.98 --output calibration.json
+  python calibration_fit.py samples.csv --base calibration.json --output calibration.json
+        """
+    )
+    parser.add_argument('samples', help='Lab samples (.csv or .json)')
+    parser.add_argument('--degree', type=int, default=1, help='1 = linear (default), 2+ = polynomial')
+    parser.add_argument('--output', help='Calibration file to write (e.g. the CALIBRATION_FILE path)')
+    parser.add_argument('--base', default=DEFAULT_BASE,
+                        help='Calibration kept for sensors/parameters without samples '
+                             '(default: $CALIBRATION_FILE or calibration_config.py; "none" to start empty)')
+    parser.add_argument('--version', help='Version label of the new calibration (default: fit-<timestamp>)')
+    parser.add_argument('--min-r2', type=float,
+                        help='Refuse to write if any fit has a lower R²')
+    parser.add_argument('--report', help='Also write the fit results as JSON')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    try:
+        results = fit_samples(load_samples(args.samples), args.degree)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(2)
+    print(format_report(results))
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump([result.to_dict() for result in results], f, indent=2)
+
+    poor = [result for result in results
+            if args.min_r2 is not None and not result.r2 >= args.min_r2]
+    for result in results:
+        if result.samples <= result.degree + 1:
+            print(f"Warning: sensor {result.sensor} {result.param} has only {result.samples} samples, "
+                  f"the fit cannot be checked", file=sys.stderr)
+    if poor:
+        print(f"Error: {len(poor)} fits below R² {args.min_r2}, nothing written", file=sys.stderr)
+        sys.exit(1)
+
+    if args.output:
+        base = {}
+        if args.base.lower() != 'none':
+            base = load_calibration(args.base).table
+        version = args.version or datetime.now().strftime('fit-%Y%m%d-%H%M%S')
+        write_calibration(args.output, build_table(results, base), version)
+        print(f"\nCalibration version {version} written to {args.output} ({len(results)} entries fitted)")
+
+
+if __name__ == '__main__':
+    main()
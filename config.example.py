@@ -13,7 +13,11 @@ MODBUS_BAUDRATE = int(os.getenv('MODBUS_BAUDRATE', '9600'))
 MODBUS_TIMEOUT = float(os.getenv('MODBUS_TIMEOUT', '1.0'))
 
 # Sensor Configuration
-SENSOR_IDS = [1, 2, 3, 4]
+# Slave IDs on each bus; only slave 1 is fitted by default. For per-sensor
+# register maps, scale factors and poll intervals use a registry file instead
+# (see sensors.example.json), selected with SENSOR_REGISTRY
+SENSOR_IDS = [int(slave) for slave in os.getenv('MODBUS_SLAVES', '1').split(',')]
+SENSOR_REGISTRY = os.getenv('SENSOR_REGISTRY', '')
 
 # Modbus Register Addresses (verify with your sensor datasheet)
 REGISTER_NITROGEN = 0x0000
@@ -35,8 +39,10 @@ LOG_FILE = '/var/log/soil-monitor/app.log'
 LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
 
 # Data Caching (for redundancy if read fails)
-CACHE_READINGS = True
-CACHE_DURATION = 300  # seconds
+# Readings older than CACHE_DURATION are flagged stale and refreshed in the
+# background; with CACHE_READINGS the last good reading is served on failure
+CACHE_READINGS = os.getenv('CACHE_READINGS', 'True').lower() == 'true'
+CACHE_DURATION = float(os.getenv('CACHE_DURATION', '300'))  # seconds
 
 # GPIO Configuration (optional - for manual DE/RE control)
 # If using GPIO for RS-485 direction control, specify the pin number
@@ -44,9 +50,5 @@ CACHE_DURATION = 300  # seconds
 GPIO_DE_RE_PIN = None  # os.getenv('GPIO_DE_RE_PIN', None)
 
 # Advanced: Custom register mapping if your sensors differ
-# Uncomment and modify if needed:
-# REGISTER_MAP = {
-#     1: {'N': 0x0000, 'P': 0x0001, 'K': 0x0002, 'Moisture': 0x0003},
-#     2: {'N': 0x0000, 'P': 0x0001, 'K': 0x0002, 'Moisture': 0x0003},
-#     # ... etc
-# }
+# Declare it under "register_maps" in the SENSOR_REGISTRY file, e.g.
+# "npk7": {"start": 4, "count": 8, "params": {"nitrogen": {"offset": 2, "scale": 10}, ...}}
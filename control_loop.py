@@ -0,0 +1,705 @@
+"""
+Closed-loop relay control on the poller's cadence.
+Each ControlLoop aggregates one parameter across sensors, applies
+hysteresis, and switches its relay only when the minimum on/off times and
+the toggle rate limit allow it. PIDLoop instead time-proportions the relay
+from a PID output. The ControlEngine runs every loop once per poll cycle,
+so actuation never depends on HTTP traffic.
+"""
+
+import logging
+import math
+import statistics
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+CONTROL_INPUT = REGISTRY.gauge('control_input', 'Aggregated input value per control loop and parameter',
+                               ('loop', 'param'))
+CONTROL_BLOCKED = REGISTRY.counter('control_blocked', 'Relay switches held back per loop and reason',
+                                   ('loop', 'reason'))
+CONTROL_OUTPUT = REGISTRY.gauge('control_output', 'PID output (relay duty, 0-1) per control loop', ('loop',))
+
+
+def weighted_mean(values: Dict[Hashable, float], weights: Dict[Hashable, float]) -> Optional[float]:
+    """Zone average: each sensor weighted by weights (default 1); None if all weights are 0."""
+    total = sum(weights.get(key, 1.0) for key in values)
+    if total <= 0:
+        return None
+    return sum(value * weights.get(key, 1.0) for key, value in values.items()) / total
+
+
+# Aggregations of the per-sensor inputs of a loop
+AGGREGATES = {
+    'median': lambda values, weights: statistics.median(values.values()),
+    'min': lambda values, weights: min(values.values()),
+    'max': lambda values, weights: max(values.values()),
+    'mean': lambda values, weights: statistics.fmean(values.values()),
+    'weighted': weighted_mean,
+}
+
+
+class LoopConfig:
+    """
+    Settings of one control loop (immutable; replace it to reconfigure).
+
+    With mode 'below' the relay turns on when the input drops below
+    threshold_on and off once it reaches threshold_off (humidifier, heater);
+    with 'above' it turns on above threshold_on and off at or below
+    threshold_off (dehumidifier, cooling).
+    """
+
+    __slots__ = ('param', 'mode', 'threshold_on', 'threshold_off', 'aggregate', 'sensors', 'weights',
+                 'min_on', 'min_off', 'max_toggles', 'toggle_window', 'max_age', 'fail_safe')
+
+    def __init__(self, param: str, threshold_on: float, threshold_off: float, mode: str = 'below',
+                 aggregate: str = 'median', sensors: Optional[Iterable[Hashable]] = None,
+                 weights: Optional[Dict[Hashable, float]] = None, min_on: float = 0.0,
+                 min_off: float = 0.0, max_toggles: int = 0, toggle_window: float = 3600.0,
+                 max_age: float = 60.0, fail_safe: bool = True):
+        """
+        Args:
+            param: SensorData attribute used as input (e.g. 'humidity')
+            threshold_on: Switch on beyond this value
+            threshold_off: Switch off at this value (hysteresis band in between)
+            mode: 'below' or 'above', see class docstring
+            aggregate: 'median', 'min', 'max', 'mean' or 'weighted'
+            sensors: Sensor keys to use (None = every sensor reporting param)
+            weights: Per-sensor weights for 'weighted' (missing sensors weigh 1)
+            min_on: Minimum seconds the relay stays on once switched on
+            min_off: Minimum seconds the relay stays off once switched off
+            max_toggles: Switches allowed per toggle_window (0 = unlimited)
+            toggle_window: Rate-limit window in seconds
+            max_age: Ignore readings older than this (seconds)
+            fail_safe: Switch off when no sensor provides a usable input
+        """
+        if mode not in ('below', 'above'):
+            raise ValueError(f"Invalid mode '{mode}', must be 'below' or 'above'")
+        if aggregate not in AGGREGATES:
+            raise ValueError(f"Invalid aggregate '{aggregate}', must be one of: {', '.join(AGGREGATES)}")
+        threshold_on, threshold_off = float(threshold_on), float(threshold_off)
+        if (threshold_on >= threshold_off) if mode == 'below' else (threshold_on <= threshold_off):
+            raise ValueError(f"threshold_on must be {mode} threshold_off")
+        if min(min_on, min_off, max_toggles, max_age) < 0 or toggle_window <= 0:
+            raise ValueError("Times and limits must not be negative")
+        self.param = param
+        self.mode = mode
+        self.threshold_on = threshold_on
+        self.threshold_off = threshold_off
+        self.aggregate = aggregate
+        self.sensors = tuple(sensors) if sensors is not None else None
+        self.weights = dict(weights or {})
+        self.min_on = float(min_on)
+        self.min_off = float(min_off)
+        self.max_toggles = int(max_toggles)
+        self.toggle_window = float(toggle_window)
+        self.max_age = float(max_age)
+        self.fail_safe = bool(fail_safe)
+
+    def to_dict(self) -> Dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class ControlLoop:
+    """
+    One relay driven by an aggregated sensor input.
+
+    update() is called once per poll cycle with the snapshot. The desired
+    state comes from decide() (hysteresis on the aggregated input); a
+    change is applied only if the minimum on/off time has passed and the
+    rate limit has room, otherwise it is retried on the next cycle.
+    While override holds a (state, reason), e.g. from a rule_engine rule,
+    it replaces the loop's own decision; the same limits apply.
+    """
+
+    def __init__(self, name: str, actuator: Callable[[bool], bool], config: LoopConfig,
+                 state: bool = False):
+        """
+        Args:
+            name: Loop name (logs, metrics, status)
+            actuator: Switches the relay; returns True on success
+            config: Loop settings
+            state: Current relay state
+        """
+        self.name = name
+        self.actuator = actuator
+        self.config = config
+        self.state = state
+        self.value: Optional[float] = None
+        self.inputs: Dict[Hashable, float] = {}
+        self.reason = 'not evaluated yet'
+        self.blocked: Optional[str] = None
+        self.last_change: Optional[float] = None  # monotonic time of the last switch
+        self.override: Optional[Tuple[bool, str]] = None
+        self._toggles: Deque[float] = deque()
+
+    def read_inputs(self, snapshot, config: LoopConfig, param: Optional[str] = None) -> Dict[Hashable, float]:
+        """Usable value of param (default: config.param) per sensor: valid, recent and not None."""
+        param = param or config.param
+        entries = snapshot.entries
+        keys = config.sensors if config.sensors is not None else entries.keys()
+        inputs = {}
+        for key in keys:
+            entry = entries.get(key)
+            if entry is None or not entry.data.is_valid or entry.age > config.max_age:
+                continue
+            value = getattr(entry.data, param, None)
+            if value is not None:
+                inputs[key] = value
+        return inputs
+
+    def decide(self, value: Optional[float], config: LoopConfig) -> Tuple[bool, str]:
+        """
+        Desired relay state for an aggregated input (hysteresis).
+
+        Returns:
+            (state, reason)
+        """
+        if value is None:
+            if config.fail_safe:
+                return False, f"no usable {config.param} input (fail-safe off)"
+            return self.state, f"no usable {config.param} input (holding)"
+        if config.mode == 'below':
+            if value < config.threshold_on:
+                return True, f"{config.param} {value:.1f} < {config.threshold_on}"
+            if value >= config.threshold_off:
+                return False, f"{config.param} {value:.1f} >= {config.threshold_off}"
+        else:
+            if value > config.threshold_on:
+                return True, f"{config.param} {value:.1f} > {config.threshold_on}"
+            if value <= config.threshold_off:
+                return False, f"{config.param} {value:.1f} <= {config.threshold_off}"
+        return self.state, f"{config.param} {value:.1f} within hysteresis band"
+
+    def evaluate(self, snapshot, config: LoopConfig, now: float) -> Tuple[bool, str]:
+        """Read and aggregate the inputs, then decide (override for other controllers)."""
+        self.inputs = self.read_inputs(snapshot, config)
+        self.value = AGGREGATES[config.aggregate](self.inputs, config.weights) if self.inputs else None
+        if self.value is not None:
+            CONTROL_INPUT.labels(self.name, config.param).set(self.value)
+        return self.decide(self.value, config)
+
+    def _gate(self, desired: bool, config: LoopConfig, now: float) -> Optional[str]:
+        """Reason the switch to desired must wait, or None if it may happen now."""
+        if self.last_change is not None:
+            held = now - self.last_change
+            if self.state and held < config.min_on:
+                return f"min_on ({config.min_on - held:.0f}s left)"
+            if not self.state and held < config.min_off:
+                return f"min_off ({config.min_off - held:.0f}s left)"
+        if config.max_toggles:
+            while self._toggles and now - self._toggles[0] >= config.toggle_window:
+                self._toggles.popleft()
+            if len(self._toggles) >= config.max_toggles:
+                return f"rate limit ({config.max_toggles} per {config.toggle_window:.0f}s)"
+        return None
+
+    def update(self, snapshot, now: Optional[float] = None) -> bool:
+        """
+        Evaluate the loop for a poll snapshot and switch the relay if allowed.
+
+        Returns:
+            True if the relay was switched
+        """
+        now = now if now is not None else time.monotonic()
+        config = self.config  # One read, so a concurrent reconfigure applies from the next cycle
+        override = self.override
+        if override is not None:
+            desired, self.reason = override
+        else:
+            desired, self.reason = self.evaluate(snapshot, config, now)
+        if desired == self.state:
+            self.blocked = None
+            return False
+
+        blocked = self._gate(desired, config, now)
+        if blocked is not None:
+            if blocked != self.blocked:
+                logger.info(f"Control {self.name}: switching {'ON' if desired else 'OFF'} deferred, "
+                            f"{blocked} ({self.reason})")
+                CONTROL_BLOCKED.labels(self.name, blocked.split(' ')[0]).inc()
+            self.blocked = blocked
+            return False
+
+        if not self.actuator(desired):
+            logger.error(f"Control {self.name}: actuator failed to switch {'ON' if desired else 'OFF'}")
+            return False
+        self.state = desired
+        self.last_change = now
+        self.blocked = None
+        if config.max_toggles:
+            self._toggles.append(now)
+        logger.info(f"Control {self.name}: {'ON' if desired else 'OFF'} ({self.reason})")
+        return True
+
+    def status(self) -> Dict:
+        """Loop state for /api/status."""
+        return {
+            'state': self.state,
+            'value': self.value,
+            'inputs': len(self.inputs),
+            'reason': self.reason,
+            'blocked': self.blocked,
+            'override': self.override is not None,
+            'since_change': (round(time.monotonic() - self.last_change, 1)
+                             if self.last_change is not None else None),
+            'config': self.config.to_dict(),
+        }
+
+
+class DecisionLoop(ControlLoop):
+    """
+    Loop decided by an external controller, e.g. ambient_sensor.ACControlAutomation.
+
+    Each parameter in params is read and aggregated like a ControlLoop
+    input, and the values are passed to controller.decide(*values), which
+    returns (state, reason). The controller's own on/off flag (state_attr)
+    is set to the relay state before each decision, so its hysteresis
+    follows the relay and a deferred switch is requested again next cycle.
+    The thresholds in config are not used; min on/off times, the rate
+    limit and fail-safe apply as for any loop.
+    """
+
+    def __init__(self, name: str, actuator: Callable[[bool], bool], config: LoopConfig, controller,
+                 params: Iterable[str], state_attr: str = 'ac_active', state: bool = False):
+        """
+        Args:
+            name: Loop name
+            actuator: Switches the relay; returns True on success
+            config: Loop settings (sensors, aggregate, timing)
+            controller: Object with decide(*values) -> (state, reason)
+            params: SensorData attributes passed to decide, in order
+            state_attr: Controller attribute holding its on/off state
+            state: Current relay state
+        """
+        super().__init__(name, actuator, config, state)
+        self.controller = controller
+        self.params: List[str] = list(params)
+        self.state_attr = state_attr
+        self.values: Dict[str, Optional[float]] = {}
+
+    def evaluate(self, snapshot, config: LoopConfig, now: float) -> Tuple[bool, str]:
+        self.inputs = {}
+        for param in self.params:
+            inputs = self.read_inputs(snapshot, config, param)
+            value = AGGREGATES[config.aggregate](inputs, config.weights) if inputs else None
+            self.values[param] = value
+            if value is not None:
+                CONTROL_INPUT.labels(self.name, param).set(value)
+            self.inputs.update({(key, param): value for key, value in inputs.items()})
+        self.value = self.values[self.params[0]]
+
+        missing = [param for param in self.params if self.values[param] is None]
+        if missing and config.fail_safe:
+            return False, f"no usable {', '.join(missing)} input (fail-safe off)"
+        controller = self.controller
+        setattr(controller, self.state_attr, self.state)
+        return controller.decide(*(self.values[param] for param in self.params))
+
+    def status(self) -> Dict:
+        status = super().status()
+        status['values'] = dict(self.values)
+        return status
+
+
+class PIDTuning:
+    """
+    PID gains, setpoint and time-proportioning window (immutable; replace it to retune).
+
+    The PID output is the relay duty (0-1): kp is duty per unit of error,
+    ki duty per unit of error and second, kd duty per unit/second of change.
+    """
+
+    __slots__ = ('setpoint', 'kp', 'ki', 'kd', 'window')
+
+    def __init__(self, setpoint: float, kp: float, ki: float = 0.0, kd: float = 0.0, window: float = 300.0):
+        """
+        Args:
+            setpoint: Target value of the loop's parameter
+            kp: Proportional gain
+            ki: Integral gain (per second)
+            kd: Derivative gain (seconds)
+            window: Time-proportioning cycle in seconds; the relay is on
+                    for duty * window at the start of each window
+        """
+        if min(kp, ki, kd) < 0:
+            raise ValueError("PID gains must not be negative")
+        if window <= 0:
+            raise ValueError("PID window must be positive")
+        self.setpoint = float(setpoint)
+        self.kp = float(kp)
+        self.ki = float(ki)
+        self.kd = float(kd)
+        self.window = float(window)
+
+    def to_dict(self) -> Dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class PIDController:
+    """
+    PID on an output clamped to 0-1, with anti-windup.
+
+    The integral is frozen while the output is saturated in the direction
+    of the error (conditional integration) and kept within 0-1, so a long
+    dry or wet spell does not wind it up into overshoot. The derivative
+    acts on the measurement, so a setpoint change does not kick the output,
+    and is low-pass filtered with a time constant of kd / (kp * DERIVATIVE_FILTER)
+    so sensor noise is not amplified into relay chatter.
+    """
+
+    DERIVATIVE_FILTER = 8.0
+
+    __slots__ = ('integral', 'derivative', 'output', 'last_value', 'last_time')
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Forget the integral and the previous sample."""
+        self.integral = 0.0
+        self.derivative = 0.0
+        self.output = 0.0
+        self.last_value: Optional[float] = None
+        self.last_time: Optional[float] = None
+
+    def update(self, value: float, tuning: PIDTuning, now: float, mode: str = 'below') -> float:
+        """
+        Args:
+            value: Measured value
+            tuning: Gains and setpoint
+            now: Monotonic time of the measurement
+            mode: 'below' if switching on raises the value (humidifier),
+                  'above' if it lowers it (dehumidifier)
+
+        Returns:
+            Output (relay duty) between 0 and 1
+        """
+        sign = 1.0 if mode == 'below' else -1.0
+        error = sign * (tuning.setpoint - value)
+        dt = now - self.last_time if self.last_time is not None else 0.0
+        if dt > 0 and tuning.kd > 0:
+            slope = -sign * (value - self.last_value) / dt
+            time_constant = tuning.kd / (max(tuning.kp, 1e-9) * self.DERIVATIVE_FILTER)
+            self.derivative += dt / (dt + time_constant) * (slope - self.derivative)
+        self.last_value, self.last_time = value, now
+
+        proportional = tuning.kp * error
+        derivative = tuning.kd * self.derivative
+        integral = self.integral + tuning.ki * error * dt
+        output = proportional + integral + derivative
+        if (output > 1.0 and error > 0) or (output < 0.0 and error < 0):
+            integral = self.integral
+            output = proportional + integral + derivative
+        self.integral = min(max(integral, 0.0), 1.0)
+        self.output = min(max(output, 0.0), 1.0)
+        return self.output
+
+
+# Relay autotune rules: Kp = a * Ku, Ti = b * Pu, Td = c * Pu
+TUNING_RULES = {
+    'ziegler-nichols': (0.6, 0.5, 0.125),
+    'tyreus-luyben': (0.45, 2.2, 1 / 6.3),  # Less overshoot, slower recovery
+    'no-overshoot': (0.2, 0.5, 1 / 3),
+    'pi': (0.45, 1 / 1.2, 0.0),  # Ziegler-Nichols PI; usually the tightest for humidity
+}
+
+
+class RelayAutotuner:
+    """
+    Relay-method (Astrom-Hagglund) autotune.
+
+    Switches fully on below setpoint - hysteresis and fully off above
+    setpoint + hysteresis, which makes the process oscillate around the
+    setpoint. From the period Pu and amplitude a of that oscillation the
+    ultimate gain is Ku = 4d / (pi * sqrt(a^2 - hysteresis^2)) with relay
+    amplitude d = 0.5 (duty 0 to 1); TUNING_RULES turn Ku and Pu into gains.
+    The first oscillation is discarded as transient. PIDLoop lets the relay
+    switch only at window boundaries, so the gains allow for the delay the
+    time-proportioning window adds.
+    """
+
+    def __init__(self, setpoint: float, mode: str = 'below', hysteresis: float = 1.0, cycles: int = 3,
+                 rule: str = 'pi', timeout: float = 4 * 3600.0, window: float = 300.0):
+        """
+        Args:
+            setpoint: Value to oscillate around
+            mode: 'below' or 'above', as in LoopConfig
+            hysteresis: Relay dead band; must exceed the input noise
+            cycles: Oscillations averaged for the result
+            rule: Key of TUNING_RULES
+            timeout: Give up after this many seconds
+            window: Time-proportioning window of the resulting tuning
+        """
+        if rule not in TUNING_RULES:
+            raise ValueError(f"Invalid rule '{rule}', must be one of: {', '.join(TUNING_RULES)}")
+        if hysteresis < 0 or cycles < 1 or timeout <= 0:
+            raise ValueError("Autotune hysteresis, cycles and timeout must be positive")
+        self.setpoint = float(setpoint)
+        self.mode = mode
+        self.hysteresis = float(hysteresis)
+        self.cycles = int(cycles)
+        self.rule = rule
+        self.timeout = float(timeout)
+        self.window = float(window)
+        self.state: Optional[bool] = None
+        self.started: Optional[float] = None
+        self.done = False
+        self.error: Optional[str] = None
+        self.result: Optional[PIDTuning] = None
+        self.periods: List[float] = []
+        self.amplitudes: List[float] = []
+        self._last_on: Optional[float] = None
+        self._high = -math.inf
+        self._low = math.inf
+
+    def update(self, value: float, now: float, switch: bool = True) -> bool:
+        """
+        Feed one measurement.
+
+        Args:
+            value: Measured value
+            now: Monotonic time of the measurement
+            switch: Whether the relay may change now (False holds it; the
+                    measurement still counts towards the oscillation)
+
+        Returns:
+            The relay state to apply
+        """
+        if self.done:
+            return False
+        if self.started is None:
+            self.started = now
+        if now - self.started > self.timeout:
+            return self.fail(f"no stable oscillation within {self.timeout:.0f}s")
+        self._high = max(self._high, value)
+        self._low = min(self._low, value)
+
+        offset = value - self.setpoint if self.mode == 'below' else self.setpoint - value
+        if self.state is None:
+            self.state = offset < 0
+        if switch and not self.state and offset < -self.hysteresis:
+            self.state = True
+            # Each switch-on closes one full oscillation (peak and trough)
+            if self._last_on is not None:
+                self.periods.append(now - self._last_on)
+                self.amplitudes.append((self._high - self._low) / 2)
+            self._last_on = now
+            self._high, self._low = -math.inf, math.inf
+            if len(self.periods) > self.cycles:
+                self._finish()
+        elif switch and self.state and offset > self.hysteresis:
+            self.state = False
+        return bool(self.state) and not self.done
+
+    def fail(self, error: str) -> bool:
+        """Abort the autotune; returns the relay state to apply (off)."""
+        self.error = error
+        self.done = True
+        return False
+
+    def _finish(self):
+        period = statistics.fmean(self.periods[-self.cycles:])
+        amplitude = statistics.fmean(self.amplitudes[-self.cycles:])
+        if amplitude <= self.hysteresis:
+            self.fail(f"oscillation ({amplitude:.2f}) not larger than the hysteresis ({self.hysteresis})")
+            return
+        ku = 4 * 0.5 / (math.pi * math.sqrt(amplitude ** 2 - self.hysteresis ** 2))
+        a, b, c = TUNING_RULES[self.rule]
+        kp = a * ku
+        self.result = PIDTuning(self.setpoint, kp, kp / (b * period), kp * c * period, self.window)
+        self.done = True
+
+    def status(self) -> Dict:
+        return {
+            'state': 'failed' if self.error else 'done' if self.done else 'running',
+            'error': self.error,
+            'rule': self.rule,
+            'hysteresis': self.hysteresis,
+            'oscillations': len(self.periods),
+            'period': round(statistics.fmean(self.periods), 1) if self.periods else None,
+            'amplitude': round(statistics.fmean(self.amplitudes), 2) if self.amplitudes else None,
+            'result': self.result.to_dict() if self.result else None,
+        }
+
+
+class PIDLoop(ControlLoop):
+    """
+    Time-proportioning PID control of a relay.
+
+    The PID output is a duty between 0 and 1, computed every poll cycle. At
+    the start of each tuning.window the relay is scheduled on for
+    duty * window and off for the rest, and the on/off time resolution is
+    the poll interval. The window starts in the state the relay is already
+    in (on part first if it is on, last if it is off), so consecutive
+    windows join up and the relay switches about once per window rather
+    than twice. An on time shorter than min_on is dropped and an off time
+    shorter than min_off is filled, so the minimum times are met without
+    deferring switches. The thresholds in config are not used; sensors,
+    aggregate, max_age, fail-safe and the max_toggles rate limit apply as
+    for ControlLoop.
+
+    start_autotune() hands the relay to a RelayAutotuner until it
+    finishes, then continues with the tuning it found.
+    """
+
+    def __init__(self, name: str, actuator: Callable[[bool], bool], config: LoopConfig, tuning: PIDTuning,
+                 state: bool = False):
+        """
+        Args:
+            name: Loop name
+            actuator: Switches the relay; returns True on success
+            config: Loop settings (mode, sensors, aggregate, timing)
+            tuning: PID gains, setpoint and window
+            state: Current relay state
+        """
+        super().__init__(name, actuator, config, state)
+        self.tuning = tuning
+        self.pid = PIDController()
+        self.duty = 0.0
+        self.on_time = 0.0
+        self.on_first = True
+        self.window_start: Optional[float] = None
+        self.autotuner: Optional[RelayAutotuner] = None
+        self.last_autotune: Optional[Dict] = None
+
+    def start_autotune(self, hysteresis: float = 1.0, cycles: int = 3, rule: str = 'pi',
+                       timeout: float = 4 * 3600.0) -> RelayAutotuner:
+        """Run a relay autotune around the current setpoint (see RelayAutotuner)."""
+        tuning = self.tuning
+        tuner = RelayAutotuner(tuning.setpoint, self.config.mode, hysteresis, cycles, rule, timeout,
+                               tuning.window)
+        self.autotuner = tuner
+        logger.info(f"Control {self.name}: autotune started ({rule}, hysteresis {hysteresis})")
+        return tuner
+
+    def stop_autotune(self):
+        """Abort a running autotune and return to PID control."""
+        tuner = self.autotuner
+        if tuner is not None:
+            tuner.fail('cancelled')
+
+    def _autotune_step(self, tuner: RelayAutotuner, value: float, now: float) -> Optional[Tuple[bool, str]]:
+        """Relay state while autotuning, or None once the tuner has finished."""
+        # Switch only at window boundaries, so the tuning accounts for the window's delay
+        boundary = self.window_start is None or now - self.window_start >= tuner.window
+        if boundary:
+            self.window_start = now
+        state = tuner.update(value, now, switch=boundary)
+        if not tuner.done:
+            return state, (f"autotune: {self.config.param} {value:.1f}, "
+                           f"oscillation {len(tuner.periods)}/{tuner.cycles + 1}")
+        self._end_autotune(tuner)
+        return None
+
+    def _end_autotune(self, tuner: RelayAutotuner):
+        """Adopt the autotune result, if any, and return to PID control."""
+        self.autotuner = None
+        self.last_autotune = tuner.status()
+        if tuner.result is not None:
+            self.tuning = tuner.result
+            self.pid.reset()
+            self.window_start = None
+            logger.info(f"Control {self.name}: autotune done, kp={tuner.result.kp:.4g} "
+                        f"ki={tuner.result.ki:.4g} kd={tuner.result.kd:.4g}")
+        else:
+            logger.warning(f"Control {self.name}: autotune failed: {tuner.error}")
+
+    def evaluate(self, snapshot, config: LoopConfig, now: float) -> Tuple[bool, str]:
+        self.inputs = self.read_inputs(snapshot, config)
+        self.value = AGGREGATES[config.aggregate](self.inputs, config.weights) if self.inputs else None
+        tuner = self.autotuner
+        if self.value is None:
+            if tuner is not None:
+                tuner.fail(f"no usable {config.param} input")
+                self._end_autotune(tuner)
+            self.pid.reset()
+            self.duty = 0.0
+            self.window_start = None
+            CONTROL_OUTPUT.labels(self.name).set(0.0)
+            return self.decide(None, config)
+        CONTROL_INPUT.labels(self.name, config.param).set(self.value)
+
+        if tuner is not None:
+            decision = self._autotune_step(tuner, self.value, now)
+            if decision is not None:
+                return decision
+
+        tuning = self.tuning
+        self.duty = self.pid.update(self.value, tuning, now, config.mode)
+        CONTROL_OUTPUT.labels(self.name).set(self.duty)
+        if self.window_start is None or now - self.window_start >= tuning.window:
+            self.window_start = now
+            on_time = self.duty * tuning.window
+            if on_time < config.min_on:
+                on_time = 0.0
+            elif tuning.window - on_time < config.min_off:
+                on_time = tuning.window
+            self.on_time = on_time
+            self.on_first = self.state
+        elapsed = now - self.window_start
+        state = elapsed < self.on_time if self.on_first else elapsed >= tuning.window - self.on_time
+        return state, (f"{config.param} {self.value:.1f}, setpoint {tuning.setpoint}, duty {self.duty:.0%} "
+                       f"({self.on_time:.0f}s of {tuning.window:.0f}s)")
+
+    def status(self) -> Dict:
+        status = super().status()
+        tuner = self.autotuner
+        status.update({
+            'duty': round(self.duty, 3),
+            'integral': round(self.pid.integral, 3),
+            'tuning': self.tuning.to_dict(),
+            'autotune': tuner.status() if tuner is not None else self.last_autotune,
+        })
+        return status
+
+
+class ControlEngine:
+    """
+    Runs all control loops once per poll cycle.
+
+    Register update() as a SensorPoller listener: loops are then evaluated
+    right after each cycle's readings, in the poller thread, so the delay
+    from reading to relay is bounded by the poll interval.
+    """
+
+    def __init__(self):
+        self.loops: Dict[str, ControlLoop] = {}
+        self._lock = threading.Lock()
+
+    def add(self, loop: ControlLoop) -> ControlLoop:
+        """Register a loop (replacing one with the same name)."""
+        with self._lock:
+            self.loops = {**self.loops, loop.name: loop}
+        return loop
+
+    def replace(self, loop: ControlLoop) -> ControlLoop:
+        """Register a loop in place of the one with the same name, keeping its relay state, timers and override."""
+        previous = self.loops.get(loop.name)
+        if previous is not None:
+            loop.state = previous.state
+            loop.last_change = previous.last_change
+            loop.override = previous.override
+            loop._toggles = previous._toggles
+        return self.add(loop)
+
+    def configure(self, name: str, config: LoopConfig):
+        """Swap a loop's settings; its relay state and timers are kept."""
+        self.loops[name].config = config
+        logger.info(f"Control {name} reconfigured: {config.to_dict()}")
+
+    def update(self, snapshot):
+        """Poll listener: evaluate every loop."""
+        for loop in self.loops.values():
+            try:
+                loop.update(snapshot)
+            except Exception as e:
+                logger.error(f"Control {loop.name} failed: {e}")
+
+    def status(self) -> Dict[str, Dict]:
+        return {name: loop.status() for name, loop in self.loops.items()}
@@ -0,0 +1,141 @@
+"""
+Server-Sent Events broadcaster for live dashboard updates.
+Each update is diffed against the published state and serialized once;
+every connected client receives the same pre-encoded frame.
+"""
+
+import json
+import logging
+import threading
+from collections import deque
+from typing import Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class EventBroadcaster:
+    """
+    Fan-out of state deltas to any number of SSE clients.
+
+    State is kept per channel (e.g. 'sensors', 'relays') as a mapping of
+    key to field dict. publish_state() sends only the fields that changed.
+    Recent frames are kept in a ring buffer so reconnecting clients can
+    resume from Last-Event-ID; clients that fell too far behind get a full
+    snapshot instead. Waiting clients block on a condition variable and cost
+    no CPU until something is published.
+    """
+
+    def __init__(self, backlog: int = 64, keepalive: float = 15.0):
+        """
+        Args:
+            backlog: Number of recent frames kept for resuming clients
+            keepalive: Seconds between comment frames on an idle stream
+        """
+        self.keepalive = keepalive
+        self._frames: deque = deque(maxlen=backlog)
+        self._state: Dict[str, Dict[str, Dict]] = {}
+        self._snapshot_frame: Optional[bytes] = None
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self.clients = 0
+
+    @staticmethod
+    def _encode(seq: int, event: str, data: Dict) -> bytes:
+        """Encode one SSE frame."""
+        return f"id: {seq}\nevent: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode()
+
+    @staticmethod
+    def _diff(old: Dict, new: Dict) -> Dict:
+        """Return the fields of new that differ from old."""
+        return {field: value for field, value in new.items() if old.get(field, object()) != value}
+
+    def publish_state(self, channel: str, state: Dict[str, Dict], exclude=()) -> bool:
+        """
+        Publish the changed fields of a channel's state.
+
+        Args:
+            channel: Event name sent to clients
+            state: Mapping of key (e.g. sensor ID) to field dict
+            exclude: Fields that are not diffed or sent (e.g. ones that
+                     change on every cycle without carrying information)
+
+        Returns:
+            True if a delta was sent
+        """
+        with self._cond:
+            current = self._state.setdefault(channel, {})
+            delta = {}
+            for key, fields in state.items():
+                fields = {field: value for field, value in fields.items() if field not in exclude}
+                changed = self._diff(current.get(key, {}), fields)
+                if changed:
+                    delta[key] = changed
+                    current[key] = fields
+            if not delta:
+                return False
+
+            self._seq += 1
+            self._frames.append((self._seq, self._encode(self._seq, channel, delta)))
+            self._snapshot_frame = None
+            self._cond.notify_all()
+            return True
+
+    def _snapshot(self) -> bytes:
+        """Full-state frame for new clients, serialized once per state version."""
+        if self._snapshot_frame is None:
+            self._snapshot_frame = self._encode(self._seq, 'snapshot', self._state)
+        return self._snapshot_frame
+
+    def subscribe(self, last_event_id: Optional[str] = None) -> Iterator[bytes]:
+        """
+        Yield SSE frames for one client until the broadcaster is closed.
+
+        Args:
+            last_event_id: Value of the Last-Event-ID header when reconnecting
+        """
+        with self._cond:
+            self.clients += 1
+            try:
+                cursor = int(last_event_id)
+            except (TypeError, ValueError):
+                cursor = None
+            if cursor is None or not self._can_resume(cursor):
+                cursor = self._seq
+                pending = [self._snapshot()]
+            else:
+                pending = []
+
+        try:
+            while True:
+                for frame in pending:
+                    yield frame
+                with self._cond:
+                    if self._seq == cursor and not self._closed:
+                        self._cond.wait(self.keepalive)
+                    if self._closed:
+                        return
+                    if self._seq == cursor:
+                        pending = [b": keepalive\n\n"]
+                    elif self._can_resume(cursor):
+                        pending = [frame for seq, frame in self._frames if seq > cursor]
+                    else:
+                        pending = [self._snapshot()]
+                    cursor = self._seq
+        finally:
+            with self._cond:
+                self.clients -= 1
+
+    def _can_resume(self, cursor: int) -> bool:
+        """True if every frame after cursor is still in the ring buffer."""
+        if cursor > self._seq:
+            return False
+        if cursor == self._seq:
+            return True
+        return bool(self._frames) and self._frames[0][0] <= cursor + 1
+
+    def close(self):
+        """Disconnect all clients."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
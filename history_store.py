@@ -0,0 +1,661 @@
+"""
+Embedded time-series store for sensor history (SQLite in WAL mode).
+Readings are buffered in memory and written in batches, with 1-minute,
+1-hour and 1-day min/max/mean rollups maintained incrementally.
+Uncalibrated values are kept in the same rows, so stored history can be
+recalibrated when the calibration coefficients change.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from itertools import repeat
+from typing import Dict, Hashable, Iterator, List, Optional, Sequence, Tuple
+
+from calibration_engine import CalibrationEngine
+from modbus_sensor import PARAMETERS, SensorData
+from reading_batch import ReadingBatch
+
+logger = logging.getLogger(__name__)
+
+# Rollup resolutions in seconds (0 = raw readings)
+RESOLUTION_RAW = 0
+RESOLUTION_MINUTE = 60
+RESOLUTION_HOUR = 3600
+RESOLUTION_DAY = 86400
+ROLLUP_RESOLUTIONS = (RESOLUTION_MINUTE, RESOLUTION_HOUR, RESOLUTION_DAY)
+
+# Default retention per resolution in seconds (None = keep forever)
+DEFAULT_RETENTION = {
+    RESOLUTION_RAW: 7 * 86400,
+    RESOLUTION_MINUTE: 30 * 86400,
+    RESOLUTION_HOUR: 2 * 365 * 86400,
+    RESOLUTION_DAY: None,
+}
+
+# readings/rollups hold calibrated values, and in their raw columns the same
+# series before calibration (the source for recalibration; NULL/0 if unknown).
+# One row carries both, so a raw value costs a column rather than a second
+# row with its own copy of the key.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS readings (
+    sensor TEXT NOT NULL,
+    param  TEXT NOT NULL,
+    ts     INTEGER NOT NULL,
+    value  REAL NOT NULL,
+    raw    REAL,
+    PRIMARY KEY (sensor, param, ts)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS rollups (
+    resolution INTEGER NOT NULL,
+    sensor     TEXT NOT NULL,
+    param      TEXT NOT NULL,
+    bucket     INTEGER NOT NULL,
+    count      INTEGER NOT NULL,
+    sum        REAL NOT NULL,
+    min        REAL NOT NULL,
+    max        REAL NOT NULL,
+    raw_count  INTEGER NOT NULL DEFAULT 0,
+    raw_sum    REAL NOT NULL DEFAULT 0,
+    raw_min    REAL,
+    raw_max    REAL,
+    PRIMARY KEY (resolution, sensor, param, bucket)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS calibration_versions (
+    version      INTEGER PRIMARY KEY,
+    created      REAL NOT NULL,
+    label        TEXT,
+    digest       TEXT NOT NULL,
+    coefficients TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS recalibration_jobs (
+    version  INTEGER PRIMARY KEY,
+    started  REAL NOT NULL,
+    finished REAL,
+    rows     INTEGER NOT NULL DEFAULT 0,
+    cursor   TEXT
+);
+"""
+
+# MIN/MAX of NULL is NULL, so a bucket's first raw values need the COALESCE
+UPSERT_ROLLUP = """
+INSERT INTO rollups (resolution, sensor, param, bucket, count, sum, min, max,
+                     raw_count, raw_sum, raw_min, raw_max)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (resolution, sensor, param, bucket) DO UPDATE SET
+    count = count + excluded.count,
+    sum = sum + excluded.sum,
+    min = MIN(min, excluded.min),
+    max = MAX(max, excluded.max),
+    raw_count = raw_count + excluded.raw_count,
+    raw_sum = raw_sum + excluded.raw_sum,
+    raw_min = COALESCE(MIN(raw_min, excluded.raw_min), raw_min, excluded.raw_min),
+    raw_max = COALESCE(MAX(raw_max, excluded.raw_max), raw_max, excluded.raw_max)
+"""
+
+# Raw columns of a rollup bucket without uncalibrated values
+NO_RAW_ROLLUP = (0, 0.0, None, None)
+
+# Order in which a recalibration job rewrites the stored resolutions
+RECALIBRATION_STAGES = (RESOLUTION_RAW,) + ROLLUP_RESOLUTIONS
+
+
+def _accumulate(rollups: Dict[Tuple[int, str, str, int], List[float]], sensor: str,
+                values: Dict[str, Optional[float]], ts: int):
+    """Add one reading to in-memory rollup buckets (count, sum, min, max)."""
+    for param, value in values.items():
+        if value is None:
+            continue
+        for resolution in ROLLUP_RESOLUTIONS:
+            key = (resolution, sensor, param, ts - ts % resolution)
+            acc = rollups.get(key)
+            if acc is None:
+                rollups[key] = [1, value, value, value]
+            else:
+                acc[0] += 1
+                acc[1] += value
+                if value < acc[2]:
+                    acc[2] = value
+                if value > acc[3]:
+                    acc[3] = value
+
+
+def calibrate_rollups(engine: CalibrationEngine, calibration_id: Hashable, param: str,
+                      rows: Sequence[Tuple[int, int, float, float, float]]) -> List[Tuple]:
+    """
+    Calibrate raw rollup buckets.
+
+    Each bucket's mean, min and max are calibrated and the sum is rebuilt
+    from the calibrated mean. This is exact for linear calibrations; for
+    curves the mean is the curve at the raw mean, and min/max are exact as
+    long as the curve is monotonic.
+
+    Args:
+        engine: Calibration to apply
+        calibration_id: SENSOR_CALIBRATION entry of the series
+        param: Parameter of the series
+        rows: (bucket, count, sum, min, max) of raw values
+
+    Returns:
+        (bucket, count, sum, min, max) of calibrated values
+    """
+    buckets, counts, sums, mins, maxs = zip(*rows)
+    means = engine.apply_series(calibration_id, param, [s / c for s, c in zip(sums, counts)]).tolist()
+    lows = engine.apply_series(calibration_id, param, mins).tolist()
+    highs = engine.apply_series(calibration_id, param, maxs).tolist()
+    # A falling calibration swaps min and max
+    return [(bucket, count, mean * count, min(low, high), max(low, high))
+            for bucket, count, mean, low, high in zip(buckets, counts, means, lows, highs)]
+
+
+class HistoryStore:
+    """
+    Append-optimized sensor history with downsampled rollups.
+
+    Writes are buffered and committed in one transaction per flush, so the
+    SD card sees a handful of page writes per minute instead of one per
+    reading. Rollup buckets are accumulated in memory and merged into the
+    database with an upsert, so they never need to be recomputed from raw
+    rows. Raw and rollup rows are pruned according to the retention policy.
+
+    Every calibration table the store has recorded under gets a version
+    number. When it changes, a RecalibrationJob rewrites the calibrated
+    values from the uncalibrated ones in the background; until it finishes,
+    queries calibrate the uncalibrated values on the fly.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 60.0, batch_size: int = 500,
+                 retention: Optional[Dict[int, Optional[int]]] = None):
+        """
+        Args:
+            path: SQLite database file
+            flush_interval: Maximum seconds readings stay buffered in memory
+            batch_size: Flush early once this many readings are buffered
+            retention: Seconds to keep per resolution (None = forever)
+        """
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.retention = dict(DEFAULT_RETENTION)
+        if retention:
+            self.retention.update(retention)
+
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # Buffered readings as typed columns, calibrated and raw (~120 bytes per reading)
+        self._batch = ReadingBatch(raw=True)
+        self._rollups: Dict[Tuple[int, str, str, int], List[float]] = {}
+        self._raw_rollups: Dict[Tuple[int, str, str, int], List[float]] = {}
+        self._last_flush = time.monotonic()
+        self._last_prune = time.monotonic()  # First prune an hour after start, not on the first flush
+        self.calibration_version: Optional[int] = None
+        self._job: Optional['RecalibrationJob'] = None
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = self._connect()
+        self._conn.executescript(SCHEMA)
+        row = self._conn.execute('SELECT MAX(version) FROM calibration_versions').fetchone()
+        self.calibration_version = row[0]
+        logger.info(f"History store opened at {path}")
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection with the pragmas used for SD-card friendly writes."""
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        """Per-thread read connection; WAL lets readers run alongside the writer."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+
+    def record(self, sensor: str, values: Dict[str, Optional[float]], ts: Optional[float] = None,
+               raw: Optional[Dict[str, Optional[float]]] = None):
+        """
+        Buffer one set of parameter values for a sensor.
+
+        Args:
+            sensor: Sensor key
+            values: Mapping of parameter name to value (None values are skipped)
+            ts: Unix timestamp of the reading (defaults to now)
+            raw: Uncalibrated values of the same parameters, if known
+        """
+        ts = int(ts if ts is not None else time.time())
+        with self._lock:
+            self._batch.append_values(sensor, values, ts, raw)
+            _accumulate(self._rollups, sensor, values, ts)
+            if raw:
+                # Raw values live in the rows of their calibrated values
+                _accumulate(self._raw_rollups, sensor,
+                            {param: value for param, value in raw.items() if values.get(param) is not None}, ts)
+            due = (len(self._batch) >= self.batch_size or
+                   time.monotonic() - self._last_flush >= self.flush_interval)
+        if due:
+            self.flush()
+
+    def record_reading(self, sensor: str, data: SensorData, ts: Optional[float] = None):
+        """Buffer the parameters of a valid SensorData that were read this time."""
+        if data.is_valid:
+            params = [param for param in PARAMETERS if param not in data.carried_params]
+            self.record(sensor, {param: getattr(data, param) for param in params}, ts,
+                        {param: getattr(data, f'{param}_raw') for param in params})
+
+    def flush(self):
+        """Write buffered readings and rollup deltas in a single transaction."""
+        with self._lock:
+            batch, self._batch = self._batch, ReadingBatch(raw=True)
+            rollups, self._rollups = self._rollups, {}
+            raw_rollups, self._raw_rollups = self._raw_rollups, {}
+            self._last_flush = time.monotonic()
+            if not len(batch):
+                return
+            try:
+                with self._conn:
+                    self._conn.executemany(
+                        'INSERT OR REPLACE INTO readings (sensor, param, ts, value, raw) VALUES (?, ?, ?, ?, ?)',
+                        ((sensor, param, int(ts), value, raw)
+                         for sensor, param, ts, value, raw in batch.paired_rows())
+                    )
+                    self._conn.executemany(
+                        UPSERT_ROLLUP,
+                        [key + tuple(acc) + tuple(raw_rollups.get(key, NO_RAW_ROLLUP))
+                         for key, acc in rollups.items()]
+                    )
+                logger.debug(f"History flush: {len(batch)} readings, {len(rollups)} rollup buckets")
+            except sqlite3.Error as e:
+                logger.error(f"History flush failed, {len(batch)} readings dropped: {e}")
+                return
+
+        if time.monotonic() - self._last_prune >= 3600:
+            self.prune()
+
+    def prune(self, now: Optional[float] = None):
+        """Delete raw readings and rollups that are past their retention period."""
+        now = now if now is not None else time.time()
+        with self._lock:
+            self._last_prune = time.monotonic()
+            try:
+                with self._conn:
+                    keep = self.retention.get(RESOLUTION_RAW)
+                    if keep is not None:
+                        # Range delete per series so the (sensor, param, ts) key is used
+                        series = self._conn.execute(
+                            'SELECT DISTINCT sensor, param FROM rollups WHERE resolution = ?', (RESOLUTION_DAY,)
+                        ).fetchall()
+                        self._conn.executemany(
+                            'DELETE FROM readings WHERE sensor = ? AND param = ? AND ts < ?',
+                            [(sensor, param, int(now - keep)) for sensor, param in series]
+                        )
+                    for resolution in ROLLUP_RESOLUTIONS:
+                        keep = self.retention.get(resolution)
+                        if keep is not None:
+                            self._conn.execute(
+                                'DELETE FROM rollups WHERE resolution = ? AND bucket < ?',
+                                (resolution, int(now - keep))
+                            )
+            except sqlite3.Error as e:
+                logger.error(f"History prune failed: {e}")
+
+    @staticmethod
+    def select_resolution(start: float, end: float, points: int) -> int:
+        """
+        Pick the coarsest resolution that still yields at least `points` buckets.
+
+        Falls back to raw readings when even 1-minute rollups are too coarse.
+        """
+        span = max(end - start, 0)
+        for resolution in reversed(ROLLUP_RESOLUTIONS):
+            if span / resolution >= points:
+                return resolution
+        return RESOLUTION_RAW
+
+    def iter_range(self, sensor: str, param: str, start: float, end: float,
+                   resolution: int = RESOLUTION_RAW, raw: bool = False) -> Iterator[Tuple]:
+        """
+        Stream stored values for one sensor parameter in time order.
+
+        While a recalibration job runs, calibrated values are computed from
+        the uncalibrated rows with the new calibration as they are read.
+
+        Args:
+            raw: Return uncalibrated values instead
+
+        Yields:
+            (ts, value) for raw readings, or
+            (bucket, mean, min, max, count) for rollups
+        """
+        conn = self._reader()
+        job = self._job
+        if raw or (job is not None and job.is_alive()):
+            yielded = False
+            for row in self._iter_raw(conn, sensor, param, start, end, resolution,
+                                      None if raw else job):
+                yielded = True
+                yield row
+            # Series recorded before raw values were stored have only calibrated rows
+            if yielded or raw:
+                return
+
+        if resolution == RESOLUTION_RAW:
+            cursor = conn.execute(
+                'SELECT ts, value FROM readings '
+                'WHERE sensor = ? AND param = ? AND ts >= ? AND ts < ? ORDER BY ts',
+                (sensor, param, int(start), int(end))
+            )
+        else:
+            cursor = conn.execute(
+                'SELECT bucket, sum / count, min, max, count FROM rollups '
+                'WHERE resolution = ? AND sensor = ? AND param = ? AND bucket >= ? AND bucket < ? '
+                'ORDER BY bucket',
+                (resolution, sensor, param, int(start - start % resolution), int(end))
+            )
+        yield from cursor
+
+    def _iter_raw(self, conn: sqlite3.Connection, sensor: str, param: str, start: float, end: float,
+                  resolution: int, job: Optional['RecalibrationJob'],
+                  chunk_size: int = 1000) -> Iterator[Tuple]:
+        """Uncalibrated rows of a range, calibrated chunk by chunk with job's engine if given."""
+        if resolution == RESOLUTION_RAW:
+            cursor = conn.execute(
+                'SELECT ts, raw FROM readings '
+                'WHERE sensor = ? AND param = ? AND ts >= ? AND ts < ? AND raw IS NOT NULL ORDER BY ts',
+                (sensor, param, int(start), int(end))
+            )
+        else:
+            cursor = conn.execute(
+                'SELECT bucket, raw_count, raw_sum, raw_min, raw_max FROM rollups '
+                'WHERE resolution = ? AND sensor = ? AND param = ? AND bucket >= ? AND bucket < ? '
+                'AND raw_count > 0 ORDER BY bucket',
+                (resolution, sensor, param, int(start - start % resolution), int(end))
+            )
+        calibration_id = job.calibration_ids.get(sensor, sensor) if job else None
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                return
+            if resolution == RESOLUTION_RAW:
+                if job is not None:
+                    ts, values = zip(*rows)
+                    rows = zip(ts, job.engine.apply_series(calibration_id, param, values).tolist())
+                yield from rows
+            else:
+                if job is not None:
+                    rows = calibrate_rollups(job.engine, calibration_id, param, rows)
+                for bucket, count, total, low, high in rows:
+                    yield bucket, total / count, low, high, count
+
+    def register_calibration(self, table: Dict[Hashable, Dict[str, Dict]],
+                             label: Optional[str] = None,
+                             calibration_ids: Optional[Dict[str, Hashable]] = None) -> Tuple[int, bool]:
+        """
+        Record the calibration table new readings are calibrated with.
+
+        Args:
+            table: SENSOR_CALIBRATION style {sensor: {param: coefficients}}
+            label: Free-form description (e.g. lab report reference)
+            calibration_ids: SENSOR_CALIBRATION entry per sensor key; part of
+                             the version, so a changed mapping is a new version
+
+        Returns:
+            (version, changed): changed is True if stored history was
+            calibrated with an earlier, different version
+        """
+        entries = sorted(([sensor, param, coeffs] for sensor, params in table.items()
+                          for param, coeffs in params.items()), key=lambda entry: repr(entry[:2]))
+        coefficients = json.dumps(entries, sort_keys=True)
+        mapping = sorted([str(key), repr(entry)] for key, entry in (calibration_ids or {}).items())
+        digest = hashlib.sha1((coefficients + json.dumps(mapping)).encode()).hexdigest()
+        with self._lock:
+            with self._conn:
+                latest = self._conn.execute(
+                    'SELECT version, digest FROM calibration_versions ORDER BY version DESC LIMIT 1'
+                ).fetchone()
+                if latest is not None and latest[1] == digest:
+                    self.calibration_version = latest[0]
+                    return latest[0], False
+                version = latest[0] + 1 if latest is not None else 1
+                self._conn.execute(
+                    'INSERT INTO calibration_versions (version, created, label, digest, coefficients) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    (version, time.time(), label, digest, coefficients)
+                )
+        self.calibration_version = version
+        logger.info(f"Calibration version {version} registered ({digest[:8]})")
+        return version, latest is not None
+
+    def calibration_table(self, version: int) -> Optional[Dict[Hashable, Dict[str, Dict]]]:
+        """SENSOR_CALIBRATION table stored for a version, or None if unknown."""
+        row = self._reader().execute(
+            'SELECT coefficients FROM calibration_versions WHERE version = ?', (version,)
+        ).fetchone()
+        if row is None:
+            return None
+        table: Dict[Hashable, Dict[str, Dict]] = {}
+        for sensor, param, coeffs in json.loads(row[0]):
+            table.setdefault(sensor, {})[param] = coeffs
+        return table
+
+    def sync_calibration(self, table: Dict[Hashable, Dict[str, Dict]],
+                         calibration_ids: Optional[Dict[str, Hashable]] = None,
+                         label: Optional[str] = None, **job_options) -> Optional['RecalibrationJob']:
+        """
+        Register the active calibration and recalibrate history if needed.
+
+        Starts a job when the calibration changed, and resumes the job of the
+        current version if a previous run was interrupted.
+
+        Args:
+            table: SENSOR_CALIBRATION style table readings are calibrated with
+            calibration_ids: SENSOR_CALIBRATION entry per sensor key
+                             (default: the key itself)
+            label: Description stored with a new version
+            job_options: chunk_size/pause for RecalibrationJob
+
+        Returns:
+            The running job, or None if history is up to date
+        """
+        version, changed = self.register_calibration(table, label, calibration_ids)
+        row = self._reader().execute(
+            'SELECT finished FROM recalibration_jobs WHERE version = ?', (version,)
+        ).fetchone()
+        if (row is None and not changed) or (row is not None and row[0] is not None):
+            return None
+        engine = CalibrationEngine(table, version=str(version))
+        return self.start_recalibration(engine, version, calibration_ids, **job_options)
+
+    def start_recalibration(self, engine: CalibrationEngine, version: int,
+                            calibration_ids: Optional[Dict[str, Hashable]] = None,
+                            chunk_size: int = 2000, pause: float = 0.01) -> 'RecalibrationJob':
+        """Start (or resume) rewriting stored history with engine, stopping any running job."""
+        if self._job is not None:
+            self._job.stop()
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    'INSERT OR IGNORE INTO recalibration_jobs (version, started) VALUES (?, ?)',
+                    (version, time.time())
+                )
+        job = RecalibrationJob(self, engine, version, calibration_ids, chunk_size, pause)
+        self._job = job
+        job.start()
+        return job
+
+    def recalibration_status(self) -> Dict:
+        """Calibration version and progress of the latest recalibration job."""
+        row = self._reader().execute(
+            'SELECT version, started, finished, rows FROM recalibration_jobs ORDER BY version DESC LIMIT 1'
+        ).fetchone()
+        job = self._job
+        return {
+            'version': self.calibration_version,
+            'running': job is not None and job.is_alive(),
+            'job': None if row is None else {
+                'version': row[0], 'started': row[1], 'finished': row[2], 'rows': row[3],
+                'position': job.position if job is not None and job.version == row[0] else None,
+            },
+        }
+
+    def _series(self) -> List[Tuple[str, str]]:
+        """(sensor, param) of every series with uncalibrated values, in key order."""
+        return self._reader().execute(
+            'SELECT DISTINCT sensor, param FROM rollups WHERE resolution = ? AND raw_count > 0 '
+            'ORDER BY sensor, param',
+            (RESOLUTION_DAY,)
+        ).fetchall()
+
+    def _recalibrate_chunk(self, job: 'RecalibrationJob', stage: int, sensor: str, param: str,
+                           after: int) -> Optional[int]:
+        """
+        Rewrite the next chunk of one series and save the job position with it.
+
+        Returns:
+            Timestamp/bucket of the last row rewritten, None if the series is done
+        """
+        calibration_id = job.calibration_ids.get(sensor, sensor)
+        with self._lock:
+            with self._conn:
+                if stage == RESOLUTION_RAW:
+                    rows = self._conn.execute(
+                        'SELECT ts, raw FROM readings WHERE sensor = ? AND param = ? AND ts > ? '
+                        'AND raw IS NOT NULL ORDER BY ts LIMIT ?', (sensor, param, after, job.chunk_size)
+                    ).fetchall()
+                    if not rows:
+                        return None
+                    ts, values = zip(*rows)
+                    self._conn.executemany(
+                        'UPDATE readings SET value = ? WHERE sensor = ? AND param = ? AND ts = ?',
+                        zip(job.engine.apply_series(calibration_id, param, values).tolist(),
+                            repeat(sensor), repeat(param), ts)
+                    )
+                else:
+                    rows = self._conn.execute(
+                        'SELECT bucket, raw_count, raw_sum, raw_min, raw_max FROM rollups '
+                        'WHERE resolution = ? AND sensor = ? AND param = ? AND bucket > ? AND raw_count > 0 '
+                        'ORDER BY bucket LIMIT ?', (stage, sensor, param, after, job.chunk_size)
+                    ).fetchall()
+                    if not rows:
+                        return None
+                    self._conn.executemany(
+                        'UPDATE rollups SET count = ?, sum = ?, min = ?, max = ? '
+                        'WHERE resolution = ? AND sensor = ? AND param = ? AND bucket = ?',
+                        [(count, total, low, high, stage, sensor, param, bucket)
+                         for bucket, count, total, low, high
+                         in calibrate_rollups(job.engine, calibration_id, param, rows)]
+                    )
+                last = rows[-1][0]
+                self._conn.execute(
+                    'UPDATE recalibration_jobs SET rows = rows + ?, cursor = ? WHERE version = ?',
+                    (len(rows), json.dumps([stage, sensor, param, last]), job.version)
+                )
+        return last
+
+    def close(self):
+        """Stop recalibration, flush pending readings and close the writer connection."""
+        if self._job is not None:
+            self._job.stop()
+        self.flush()
+        with self._lock:
+            self._conn.close()
+        logger.info("History store closed")
+
+
+class RecalibrationJob(threading.Thread):
+    """
+    Background rewrite of stored history under a new calibration version.
+
+    Walks the uncalibrated columns stage by stage (raw readings, then each
+    rollup resolution) and series by series in key order, chunk_size rows
+    per transaction. The position is saved in the same transaction as each
+    chunk, so a job interrupted by a restart continues where it stopped.
+    The store lock is held for one chunk at a time, so the poller's flushes
+    interleave with the job instead of waiting for it.
+    """
+
+    def __init__(self, store: HistoryStore, engine: CalibrationEngine, version: int,
+                 calibration_ids: Optional[Dict[str, Hashable]] = None,
+                 chunk_size: int = 2000, pause: float = 0.01):
+        """
+        Args:
+            store: History store to rewrite
+            engine: Calibration of the new version
+            version: Calibration version number
+            calibration_ids: SENSOR_CALIBRATION entry per sensor key (default: the key itself)
+            chunk_size: Rows rewritten per transaction
+            pause: Seconds to yield between chunks
+        """
+        super().__init__(name=f'recalibration-{version}', daemon=True)
+        self.store = store
+        self.engine = engine
+        self.version = version
+        self.calibration_ids = calibration_ids or {}
+        self.chunk_size = chunk_size
+        self.pause = pause
+        self.position: Optional[List] = None  # [stage, sensor, param, ts] last committed
+        self._stop_event = threading.Event()
+
+    def stop(self, timeout: Optional[float] = 10.0):
+        """Stop after the current chunk; progress so far is kept."""
+        self._stop_event.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
+
+    def run(self):
+        store = self.store
+        started = time.monotonic()
+        try:
+            row = store._reader().execute(
+                'SELECT cursor, rows FROM recalibration_jobs WHERE version = ?', (self.version,)
+            ).fetchone()
+            self.position = json.loads(row[0]) if row and row[0] else None
+            if self.position:
+                logger.info(f"Resuming recalibration to version {self.version} at {self.position}")
+            else:
+                logger.info(f"Recalibrating history to version {self.version}")
+            series = store._series()
+            position = self.position
+
+            for stage in RECALIBRATION_STAGES:
+                if position and RECALIBRATION_STAGES.index(stage) < RECALIBRATION_STAGES.index(position[0]):
+                    continue
+                for sensor, param in series:
+                    after = -1
+                    if position and stage == position[0]:
+                        if (sensor, param) < (position[1], position[2]):
+                            continue
+                        if (sensor, param) == (position[1], position[2]):
+                            after = position[3]
+                    while not self._stop_event.is_set():
+                        after = store._recalibrate_chunk(self, stage, sensor, param, after)
+                        if after is None:
+                            break
+                        self.position = [stage, sensor, param, after]
+                        self._stop_event.wait(self.pause)
+                    if self._stop_event.is_set():
+                        logger.info(f"Recalibration to version {self.version} paused at {self.position}")
+                        return
+                position = None
+
+            with store._lock:
+                with store._conn:
+                    store._conn.execute(
+                        'UPDATE recalibration_jobs SET finished = ? WHERE version = ?',
+                        (time.time(), self.version)
+                    )
+            logger.info(f"Recalibration to version {self.version} finished "
+                        f"in {time.monotonic() - started:.1f}s")
+        except sqlite3.Error as e:
+            logger.error(f"Recalibration to version {self.version} failed at {self.position}: {e}")
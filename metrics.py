@@ -0,0 +1,209 @@
+"""
+Low-overhead counters, gauges and histograms rendered in OpenMetrics text format.
+Label sets are resolved once to a child object that keeps its sample names
+pre-rendered, so the hot path is a lock and an add, and a scrape only
+formats numbers.
+"""
+
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+# Default histogram buckets in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    """Render a label set ('{a="1",b="2"}'), with an optional pre-rendered extra label."""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Child:
+    """Values of one label set; created once per label set and reused."""
+
+    __slots__ = ('_lock', 'value', 'function', '_sample')
+
+    def __init__(self, lock: threading.Lock, sample: str):
+        self._lock = lock
+        self.value = 0
+        self.function: Optional[Callable[[], float]] = None
+        self._sample = sample + ' '
+
+    def inc(self, amount: float = 1):
+        """Increase the value (counters and gauges)."""
+        with self._lock:
+            self.value += amount
+
+    def set(self, value: float):
+        """Set the value (gauges)."""
+        self.value = value
+
+    def set_function(self, function: Callable[[], float]):
+        """Read the value from function at scrape time instead of storing it."""
+        self.function = function
+
+    def render(self, out: List[str]):
+        value = self.function() if self.function is not None else self.value
+        if value is not None:
+            out.append(self._sample + _format(value))
+
+
+class _HistogramChild:
+    """Bucket counts, sum and count of one label set."""
+
+    __slots__ = ('_lock', '_upper', 'counts', 'sum', '_bucket_samples', '_count_sample', '_sum_sample')
+
+    def __init__(self, lock: threading.Lock, name: str, names: Tuple[str, ...], values: Tuple[str, ...],
+                 upper: Tuple[float, ...]):
+        self._lock = lock
+        self._upper = upper
+        self.counts = [0] * (len(upper) + 1)  # Per bucket, the last one is +Inf
+        self.sum = 0.0
+        bounds = [repr(float(bound)) for bound in upper] + ['+Inf']
+        self._bucket_samples = tuple(
+            name + '_bucket' + _labels(names, values, f'le="{bound}"') + ' ' for bound in bounds
+        )
+        labels = _labels(names, values)
+        self._count_sample = f"{name}_count{labels} "
+        self._sum_sample = f"{name}_sum{labels} "
+
+    def observe(self, value: float):
+        """Record one observation."""
+        index = bisect_left(self._upper, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def render(self, out: List[str]):
+        with self._lock:
+            counts = list(self.counts)
+            total = self.sum
+        cumulative = 0
+        for sample, count in zip(self._bucket_samples, counts):
+            cumulative += count
+            out.append(sample + str(cumulative))
+        out.append(self._count_sample + str(cumulative))
+        out.append(self._sum_sample + repr(total))
+
+
+class MetricFamily:
+    """A named metric with a fixed set of label names."""
+
+    def __init__(self, name: str, kind: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = LATENCY_BUCKETS):
+        """
+        Args:
+            name: Metric name (counters without the '_total' suffix)
+            kind: 'counter', 'gauge' or 'histogram'
+            documentation: HELP text
+            labelnames: Label names; values are given to labels()
+            buckets: Upper bounds of histogram buckets
+        """
+        self.name = name
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._header = f"# TYPE {name} {kind}\n# HELP {name} {_escape(documentation)}"
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._ordered: Tuple = ()
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self.labels()
+
+    def labels(self, *values):
+        """
+        Return the child for a label set, creating it on first use.
+
+        Keep the returned child where the label set is fixed, e.g. per slave.
+        """
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is not None:
+            return child
+        if len(key) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {key}")
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                if self.kind == 'histogram':
+                    child = _HistogramChild(self._lock, self.name, self.labelnames, key, self.buckets)
+                else:
+                    suffix = '_total' if self.kind == 'counter' else ''
+                    child = _Child(self._lock, f"{self.name}{suffix}{_labels(self.labelnames, key)}")
+                self._children[key] = child
+                self._ordered = self._ordered + (child,)
+        return child
+
+    # Shortcuts for metrics without labels
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def set_function(self, function: Callable[[], float]):
+        self.labels().set_function(function)
+
+    def render(self, out: List[str]):
+        out.append(self._header)
+        for child in self._ordered:
+            child.render(out)
+
+
+class MetricsRegistry:
+    """Collection of metric families rendered together at /metrics."""
+
+    def __init__(self):
+        self._families: Dict[str, MetricFamily] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, family: MetricFamily) -> MetricFamily:
+        with self._lock:
+            existing = self._families.get(family.name)
+            if existing is not None:
+                if existing.kind != family.kind or existing.labelnames != family.labelnames:
+                    raise ValueError(f"Metric {family.name} already registered differently")
+                return existing
+            self._families[family.name] = family
+            return family
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> MetricFamily:
+        """Register (or return the existing) counter."""
+        return self._register(MetricFamily(name, 'counter', documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> MetricFamily:
+        """Register (or return the existing) gauge."""
+        return self._register(MetricFamily(name, 'gauge', documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Iterable[float] = LATENCY_BUCKETS) -> MetricFamily:
+        """Register (or return the existing) histogram."""
+        return self._register(MetricFamily(name, 'histogram', documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """All metrics in OpenMetrics text format."""
+        out: List[str] = []
+        for family in tuple(self._families.values()):
+            family.render(out)
+        out.append('# EOF\n')
+        return '\n'.join(out)
+
+
+# Process-wide registry used by the pipeline modules
+REGISTRY = MetricsRegistry()
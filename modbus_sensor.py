@@ -5,20 +5,18 @@ Handles communication with 4 sensors on RS-485 bus.
 Includes calibration using linear regression (y = mx + b)
 """
 
+import inspect
 import logging
 import time
 import struct
-from typing import Dict, Optional
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
 from pymodbus.client import ModbusSerialClient as ModbusClient
 from pymodbus.exceptions import ModbusException
 
-# Import calibration configuration
-try:
-    from calibration_config import apply_calibration
-except ImportError:
-    # Fallback if calibration config not available
-    def apply_calibration(sensor_id, parameter, raw_value):
-        return raw_value  # No calibration if config not found
+from metrics import REGISTRY
+
+# Calibration (SENSOR_CALIBRATION from calibration_config, compiled once)
+from calibration_engine import get_engine
 
 logger = logging.getLogger(__name__)
 
@@ -29,8 +27,223 @@ except (ImportError, RuntimeError):
     GPIO_AVAILABLE = False
 
 
+# Measured parameters, in the order used by to_dict() and the history store
+PARAMETERS = ('nitrogen', 'phosphorus', 'potassium', 'ph', 'ec', 'temperature', 'humidity')
+
+# Physically possible range per parameter; values outside are discarded as
+# misreads so they cannot drive relay control
+PARAMETER_LIMITS = {
+    'ph': (0.0, 14.0),
+    'humidity': (0.0, 100.0),
+}
+
+# Keyword for the slave address of client requests: 'slave' up to pymodbus 3.9,
+# 'device_id' from 3.10 on
+DEVICE_ID_KWARG = ('device_id' if 'device_id' in inspect.signature(ModbusClient.read_holding_registers).parameters
+                   else 'slave')
+
+# Instrumentation, exposed at /metrics
+MODBUS_TRANSACTION_SECONDS = REGISTRY.histogram(
+    'modbus_transaction_seconds', 'Modbus request/response time per slave, including failed requests',
+    ('port', 'slave'))
+MODBUS_ERRORS = REGISTRY.counter(
+    'modbus_errors', 'Failed Modbus requests by kind (timeout, crc, exception)', ('port', 'slave', 'kind'))
+MODBUS_RETRIES = REGISTRY.counter(
+    'modbus_retries', 'Sensor read attempts repeated after a failed attempt', ('port', 'slave'))
+MODBUS_READ_FAILURES = REGISTRY.counter(
+    'modbus_read_failures', 'Sensor reads that failed after all retries', ('port', 'slave'))
+
+
+def error_kind(error) -> str:
+    """
+    Classify a failed request for MODBUS_ERRORS.
+    
+    pymodbus reports bad CRCs and silence with the same exception type, so
+    its message is used to tell them apart.
+    """
+    if hasattr(error, 'exception_code'):
+        return 'exception'
+    message = str(error).lower()
+    if 'crc' in message or 'decode' in message:
+        return 'crc'
+    return 'timeout'
+
+
+# Modbus limit on registers per read request
+MAX_REGISTERS_PER_READ = 125
+
+# Unused registers merged into one read rather than sending another request.
+# At 9600 baud an extra register costs ~2 ms on the wire; a separate
+# request/response costs ~15 bytes of framing, two 3.5-character gaps, a
+# DE/RE turnaround and the slave's response latency (~40 ms or more)
+DEFAULT_MAX_GAP = 16
+
+# RS-485 DE/RE direction control modes
+DE_RE_TIMED = 'timed'   # DE high for exactly the request frame, timed from the baud rate
+DE_RE_RS485 = 'rs485'   # Kernel RS485 mode toggles RTS (DE/RE wired to RTS)
+DE_RE_SLEEP = 'sleep'   # Legacy: DE high for the whole transaction, 10 ms settle sleeps
+DE_RE_MODES = (DE_RE_TIMED, DE_RE_RS485, DE_RE_SLEEP)
+
+# Bits per character on the wire for 8N1: start + 8 data + stop
+BITS_PER_CHAR = 10
+
+
+def frame_time(num_bytes: int, baudrate: int, bits_per_char: int = BITS_PER_CHAR) -> float:
+    """Seconds needed to shift num_bytes out of the UART."""
+    return num_bytes * bits_per_char / baudrate
+
+
+class RegisterMap:
+    """
+    Register layout of a sensor model: one block read plus per-parameter offsets.
+    
+    Each field is (parameter, offset into the block, scale divisor), so
+    value = registers[offset] / scale.
+    """
+    
+    __slots__ = ('function', 'start', 'count', 'fields')
+    
+    def __init__(self, start: int, count: int, fields: Iterable[Tuple[str, int, float]],
+                 function: str = 'holding'):
+        """
+        Args:
+            start: First register address of the block
+            count: Number of registers in the block
+            fields: (parameter, offset, scale) tuples
+            function: 'holding' or 'input' registers
+        """
+        if function not in ('holding', 'input'):
+            raise ValueError(f"Unknown register function: {function}")
+        self.function = function
+        self.start = start
+        self.count = count
+        self.fields = tuple((param, int(offset), float(scale)) for param, offset, scale in fields)
+        for param, offset, _ in self.fields:
+            if param not in PARAMETERS:
+                raise ValueError(f"Unknown parameter in register map: {param}")
+            if not 0 <= offset < count:
+                raise ValueError(f"Register offset {offset} for {param} outside block of {count}")
+    
+    def key(self) -> Tuple:
+        """Hashable identity, used to share identical maps between sensors."""
+        return (self.function, self.start, self.count, self.fields)
+    
+    @property
+    def params(self) -> Tuple[str, ...]:
+        """Parameters provided by this map, in field order."""
+        return tuple(param for param, _, _ in self.fields)
+    
+    def with_field(self, param: str, address: int, scale: float) -> 'RegisterMap':
+        """
+        Return a copy of this map with one more parameter at an absolute address.
+        
+        The address may lie outside the current block; the block is widened
+        and compile_register_plan() decides whether it is read separately.
+        """
+        start = min(self.start, address)
+        end = max(self.start + self.count, address + 1)
+        fields = [(p, self.start + offset - start, sc) for p, offset, sc in self.fields if p != param]
+        fields.append((param, address - start, scale))
+        return RegisterMap(start, end - start, fields, function=self.function)
+    
+
+# NPK 7-in-1 layout: 8 holding registers from address 4
+# reg[0-1]: not used
+# reg[2]: Nitrogen * 10
+# reg[3]: Phosphorus * 10
+# reg[4]: Potassium * 10
+# reg[5]: pH * 100
+# reg[6]: EC * 100
+# reg[7]: Temperature * 100
+# Moisture/humidity is not part of this block; add it with RegisterMap.with_field()
+# once its register is known (e.g. HUMIDITY_REGISTER in app.py)
+DEFAULT_REGISTER_MAP = RegisterMap(4, 8, (
+    ('nitrogen', 2, 10),
+    ('phosphorus', 3, 10),
+    ('potassium', 4, 10),
+    ('ph', 5, 100),
+    ('ec', 6, 100),
+    ('temperature', 7, 100),
+))
+
+
+class RegisterBlock:
+    """One read request of a compiled register plan."""
+    
+    __slots__ = ('function', 'start', 'count', 'fields')
+    
+    def __init__(self, function: str, start: int, count: int, fields: Tuple[Tuple[str, int, float], ...]):
+        """
+        Args:
+            function: 'holding' or 'input' registers
+            start: First register address
+            count: Number of registers
+            fields: (parameter, offset into this block, scale divisor) tuples
+        """
+        self.function = function
+        self.start = start
+        self.count = count
+        self.fields = fields
+    
+    def __repr__(self) -> str:
+        return f"RegisterBlock({self.function} {self.start}+{self.count}: {[f[0] for f in self.fields]})"
+
+
+def compile_register_plan(register_map: RegisterMap, params: Optional[Iterable[str]] = None,
+                          max_gap: int = DEFAULT_MAX_GAP) -> Tuple[RegisterBlock, ...]:
+    """
+    Compile the registers of the requested parameters into the fewest reads.
+    
+    Registers are sorted by address and merged into one request while the
+    run of unused registers between them is at most max_gap and the request
+    stays within MAX_REGISTERS_PER_READ.
+    
+    Args:
+        register_map: Register layout of the sensor
+        params: Parameters to read (default: all mapped ones)
+        max_gap: Largest run of unused registers read to avoid another request
+        
+    Returns:
+        Tuple of RegisterBlock, in address order
+    """
+    wanted = None if params is None else set(params)
+    fields = sorted((register_map.start + offset, param, scale)
+                    for param, offset, scale in register_map.fields
+                    if wanted is None or param in wanted)
+    if not fields:
+        raise ValueError(f"No mapped parameters in {sorted(wanted or ())}")
+    
+    groups = [[fields[0]]]
+    for field in fields[1:]:
+        group = groups[-1]
+        address = field[0]
+        if (address - group[-1][0] - 1 <= max_gap and
+                address - group[0][0] + 1 <= MAX_REGISTERS_PER_READ):
+            group.append(field)
+        else:
+            groups.append([field])
+    
+    blocks = []
+    for group in groups:
+        start = group[0][0]
+        blocks.append(RegisterBlock(
+            register_map.function, start, group[-1][0] - start + 1,
+            tuple((param, address - start, scale) for address, param, scale in group)
+        ))
+    return tuple(blocks)
+
+
 class SensorData:
-    """Container for 8-parameter sensor readings with calibration."""
+    """
+    Container for 8-parameter sensor readings with calibration.
+    
+    Slotted with a fixed schema (PARAMETERS, their raw values and metadata),
+    so a reading carries no per-instance __dict__. Use ReadingBatch to hold
+    many readings compactly.
+    """
+    
+    __slots__ = (('sensor_id',) + PARAMETERS + tuple(f'{param}_raw' for param in PARAMETERS) +
+                 ('timestamp', 'is_valid', 'error', 'carried_params'))
     
     def __init__(self, sensor_id: int):
         self.sensor_id = sensor_id
@@ -49,10 +262,13 @@ class SensorData:
         self.ph_raw: Optional[float] = None
         self.ec_raw: Optional[float] = None
         self.temperature_raw: Optional[float] = None
+        self.humidity_raw: Optional[float] = None
         # Metadata
         self.timestamp: Optional[str] = None
         self.is_valid: bool = False
         self.error: Optional[str] = None
+        # Parameters copied from an earlier reading rather than read this time
+        self.carried_params: Tuple[str, ...] = ()
     
     def to_dict(self) -> Dict:
         """Convert to dictionary for JSON serialization."""
@@ -80,11 +296,25 @@ class SensorData:
             'ph': self.ph_raw,
             'ec': self.ec_raw,
             'temperature': self.temperature_raw,
+            'humidity': self.humidity_raw,
         }
         return data
-            'is_valid': self.is_valid,
-            'error': self.error
-        }
+
+
+class DirectionControlledClient(ModbusClient):
+    """
+    ModbusSerialClient that lets the reader drive DE/RE around each request frame.
+    
+    send_frame(send, request) is called instead of the plain send, so the
+    transceiver is only in transmit mode while the request is on the wire.
+    """
+    
+    send_frame = None
+    
+    def send(self, request):
+        if self.send_frame is None or not request:
+            return super().send(request)
+        return self.send_frame(super().send, request)
 
 
 class ModbusNPKReader:
@@ -103,19 +333,15 @@ class ModbusNPKReader:
     
     # Modbus holding register addresses (NPK sensor layout)
     # Read from address 4, 8 consecutive 16-bit registers
-    REGISTER_START = 4              # Start reading from register 4
-    REGISTER_COUNT = 8              # Read 8 registers total
-    # Register layout at address 4:
-    # reg[0-1]: not used
-    # reg[2]: Nitrogen * 10
-    # reg[3]: Phosphorus * 10
-    # reg[4]: Potassium * 10
-    # reg[5]: pH * 100
-    # reg[6]: EC * 100
-    # reg[7]: Temperature * 100
+    # (see DEFAULT_REGISTER_MAP for the per-parameter layout)
+    REGISTER_START = DEFAULT_REGISTER_MAP.start
+    REGISTER_COUNT = DEFAULT_REGISTER_MAP.count
     
     def __init__(self, port: str = '/dev/ttyAMA0', baudrate: int = 9600, 
-                 gpio_de_re: Optional[int] = 24, timeout: float = 1.0):
+                 gpio_de_re: Optional[int] = 24, timeout: float = 1.0,
+                 register_maps: Optional[Dict[int, RegisterMap]] = None,
+                 calibration_ids: Optional[Dict[int, Hashable]] = None,
+                 max_gap: int = DEFAULT_MAX_GAP, de_re_mode: str = DE_RE_TIMED):
         """
         Initialize Modbus RTU reader.
         
@@ -124,11 +350,33 @@ class ModbusNPKReader:
             baudrate: Modbus RTU speed (typically 9600)
             gpio_de_re: GPIO pin for DE/RE control (set to None to disable)
             timeout: Read timeout in seconds
+            register_maps: Register layout per slave ID; the keys are the
+                           slaves scanned by read_all_sensors (default: slave 1
+                           with DEFAULT_REGISTER_MAP)
+            calibration_ids: SENSOR_CALIBRATION entry per slave (default: slave ID)
+            max_gap: Largest run of unused registers read to save a request
+            de_re_mode: DE/RE direction control: 'timed' (GPIO switched when
+                        the request frame has left the UART), 'rs485' (kernel
+                        RS485 mode on RTS, falls back to 'timed') or 'sleep'
+                        (legacy fixed 10 ms sleeps)
         """
+        if de_re_mode not in DE_RE_MODES:
+            raise ValueError(f"Unknown DE/RE mode: {de_re_mode}")
         self.port = port
         self.baudrate = baudrate
         self.gpio_de_re = gpio_de_re
         self.timeout = timeout
+        self.register_maps = register_maps or {1: DEFAULT_REGISTER_MAP}
+        self.calibration_ids = calibration_ids or {}
+        self.max_gap = max_gap
+        self.de_re_mode = de_re_mode
+        # Receiver is re-enabled one character after the last stop bit; the
+        # slave stays silent for at least 3.5 characters before it answers
+        self.turnaround = frame_time(1, baudrate)
+        # Compiled register plans per (slave, parameters), built on first use
+        self._plans: Dict[Tuple, Tuple[RegisterBlock, ...]] = {}
+        # Metric children per slave: (latency, retries, failures)
+        self._metrics: Dict[int, Tuple] = {}
         self.client: Optional[ModbusClient] = None
         self._gpio_available = False
         
@@ -148,27 +396,54 @@ class ModbusNPKReader:
             self._gpio_available = False
     
     def _set_tx_mode(self):
-        """Enable transmit mode (DE=HIGH)."""
-        if self._gpio_available:
+        """Enable transmit mode (DE=HIGH) for the whole transaction ('sleep' mode only)."""
+        if self._gpio_available and self.de_re_mode == DE_RE_SLEEP:
             GPIO.output(self.gpio_de_re, GPIO.HIGH)
             time.sleep(0.01)
     
     def _set_rx_mode(self):
-        """Enable receive mode (RE=LOW)."""
-        if self._gpio_available:
+        """Enable receive mode (RE=LOW) after the transaction ('sleep' mode only)."""
+        if self._gpio_available and self.de_re_mode == DE_RE_SLEEP:
             time.sleep(0.01)
             GPIO.output(self.gpio_de_re, GPIO.LOW)
     
+    def _send_frame(self, send, request: bytes):
+        """Send one request frame with DE high only until its last bit has left the UART."""
+        GPIO.output(self.gpio_de_re, GPIO.HIGH)
+        start = time.monotonic()
+        try:
+            return send(request)
+        finally:
+            remaining = start + frame_time(len(request), self.baudrate) + self.turnaround - time.monotonic()
+            if remaining > 0:
+                time.sleep(remaining)
+            GPIO.output(self.gpio_de_re, GPIO.LOW)
+    
+    def _enable_rs485_mode(self, serial_port) -> bool:
+        """Let the kernel (or pyserial) toggle RTS around each frame."""
+        try:
+            from serial.rs485 import RS485Settings
+            serial_port.rs485_mode = RS485Settings(rts_level_for_tx=True, rts_level_for_rx=False)
+            logger.info(f"RS485 mode enabled on {self.port} (DE/RE on RTS)")
+            return True
+        except Exception as e:
+            logger.warning(f"RS485 mode not available on {self.port}: {e}")
+            return False
+    
     def connect(self) -> bool:
         """Establish Modbus RTU connection."""
         try:
-            self.client = ModbusClient(
+            self.client = DirectionControlledClient(
                 port=self.port,
                 baudrate=self.baudrate,
                 timeout=self.timeout
             )
             if self.client.connect():
                 logger.info(f"Connected to Modbus RTU on {self.port} @ {self.baudrate} baud")
+                if self.de_re_mode == DE_RE_RS485 and not self._enable_rs485_mode(self.client.socket):
+                    self.de_re_mode = DE_RE_TIMED
+                if self.de_re_mode == DE_RE_TIMED and self._gpio_available:
+                    self.client.send_frame = self._send_frame
                 return True
             else:
                 logger.error("Failed to connect to Modbus RTU")
@@ -177,6 +452,24 @@ class ModbusNPKReader:
             logger.error(f"Connection error: {e}")
             return False
     
+    def _reconnect(self) -> bool:
+        """
+        Reopen the serial port the client closed.
+
+        pymodbus closes the port when a slave does not answer; without a
+        reopen one dead slave would take every other slave on the bus down.
+        """
+        try:
+            if not self.client.connect():
+                return False
+        except Exception as e:
+            logger.debug(f"Reconnect to {self.port} failed: {e}")
+            return False
+        if self.de_re_mode == DE_RE_RS485:
+            self._enable_rs485_mode(self.client.socket)
+        logger.debug(f"Reopened {self.port}")
+        return True
+    
     def disconnect(self):
         """Close Modbus connection and cleanup GPIO."""
         if self.client:
@@ -210,110 +503,156 @@ class ModbusNPKReader:
         except (struct.error, ValueError):
             return None
     
-    def read_sensor(self, sensor_id: int, retries: int = 3) -> SensorData:
+    @property
+    def connected(self) -> bool:
+        """True while the serial port is open."""
+        return bool(self.client and self.client.is_socket_open())
+    
+    @property
+    def slaves(self) -> List[int]:
+        """Slave IDs configured on this bus."""
+        return list(self.register_maps)
+    
+    def register_plan(self, sensor_id: int,
+                      params: Optional[Tuple[str, ...]] = None) -> Tuple[RegisterBlock, ...]:
+        """Return the (cached) read plan for a slave's parameters."""
+        plan_key = (sensor_id, params)
+        plan = self._plans.get(plan_key)
+        if plan is None:
+            plan = compile_register_plan(self.register_maps[sensor_id], params, self.max_gap)
+            self._plans[plan_key] = plan
+            logger.debug(f"Sensor {sensor_id}: register plan {plan}")
+        return plan
+    
+    def _slave_metrics(self, sensor_id: int) -> Tuple:
+        """Metric children of a slave (latency, retries, failures), resolved once."""
+        children = self._metrics.get(sensor_id)
+        if children is None:
+            children = (MODBUS_TRANSACTION_SECONDS.labels(self.port, sensor_id),
+                        MODBUS_RETRIES.labels(self.port, sensor_id),
+                        MODBUS_READ_FAILURES.labels(self.port, sensor_id))
+            self._metrics[sensor_id] = children
+        return children
+    
+    def _count_error(self, sensor_id: int, error):
+        """Count a failed request by kind."""
+        MODBUS_ERRORS.labels(self.port, sensor_id, error_kind(error)).inc()
+    
+    def _read_block(self, sensor_id: int, block: RegisterBlock) -> Optional[List[int]]:
+        """Read one block of registers, or return None on an error response."""
+        if block.function == 'input':
+            read_registers = self.client.read_input_registers
+        else:
+            read_registers = self.client.read_holding_registers
+        
+        self._set_tx_mode()
+        start = time.perf_counter()
+        try:
+            result = read_registers(
+                address=block.start,
+                count=block.count,
+                **{DEVICE_ID_KWARG: sensor_id}
+            )
+        except Exception as e:
+            self._count_error(sensor_id, e)
+            raise
+        finally:
+            self._slave_metrics(sensor_id)[0].observe(time.perf_counter() - start)
+            self._set_rx_mode()
+        
+        if isinstance(result, Exception) or result.isError():
+            self._count_error(sensor_id, result)
+            logger.debug(f"Sensor {sensor_id} read error at register {block.start}: {result}")
+            return None
+        return result.registers
+    
+    def _decode(self, data: SensorData, blocks: List[Tuple[RegisterBlock, List[int]]]) -> SensorData:
+        """Parse mapped parameters (raw values) from read blocks, then apply calibration."""
+        sensor_id = data.sensor_id
+        calibration_id = self.calibration_ids.get(sensor_id, sensor_id)
+        calibrate = get_engine().apply
+        fields = []
+        for block, regs in blocks:
+            for param, offset, scale in block.fields:
+                raw = regs[offset] / scale
+                limits = PARAMETER_LIMITS.get(param)
+                if limits and not limits[0] <= raw <= limits[1]:
+                    logger.warning(f"Sensor {sensor_id}: {param}={raw} out of range, discarded")
+                    continue
+                setattr(data, f'{param}_raw', raw)
+                setattr(data, param, calibrate(calibration_id, param, raw))
+                fields.append(param)
+        
+        data.is_valid = True
+        logger.info(f"Sensor {sensor_id} (RAW→CALIBRATED): " + " ".join(
+            f"{param}={getattr(data, param + '_raw'):.2f}→{getattr(data, param):.2f}"
+            for param in fields))
+        return data
+    
+    def read_sensor(self, sensor_id: int, retries: int = 3,
+                    params: Optional[Tuple[str, ...]] = None) -> SensorData:
         """
-        Read all parameters from a single sensor at address 4.
-        Only Sensor 1 is connected. Sensors 2-4 return empty data.
+        Read mapped parameters from a single sensor.
         
         Args:
-            sensor_id: Modbus ID (1 for the connected sensor, 2-4 for disconnected)
+            sensor_id: Modbus slave ID
             retries: Number of retry attempts on failure
+            params: Only read these parameters (default: all mapped ones);
+                    the others are left as None
             
         Returns:
             SensorData object with readings
         """
         data = SensorData(sensor_id)
+        register_map = self.register_maps.get(sensor_id)
         
-        # Sensors 2-4 are not connected - return empty data
-        if sensor_id > 1:
+        if register_map is None:
             data.error = f"Sensor {sensor_id} not connected"
-            data.is_valid = False
             return data
         
-        if not self.client or not self.client.is_socket_open():
+        if not self.connected and (self.client is None or not self._reconnect()):
             data.error = "Not connected to Modbus RTU"
             logger.error(f"Sensor {sensor_id}: {data.error}")
             return data
         
+        plan = self.register_plan(sensor_id, params)
+        _, retry_count, failure_count = self._slave_metrics(sensor_id)
+        
         for attempt in range(retries):
+            if attempt:
+                retry_count.inc()
             try:
-                self._set_tx_mode()
-                
-                # Read 8 registers starting at address 4
-                # reg[0-1]: unused
-                # reg[2]: Nitrogen * 10
-                # reg[3]: Phosphorus * 10
-                # reg[4]: Potassium * 10
-                # reg[5]: pH * 100
-                # reg[6]: EC * 100
-                # reg[7]: Temperature * 100
-                result = self.client.read_holding_registers(
-                    address=self.REGISTER_START,
-                    count=self.REGISTER_COUNT,
-                    device_id=sensor_id
-                )
-                
-                self._set_rx_mode()
-                
-                if isinstance(result, Exception) or result.isError():
-                    logger.debug(f"Sensor {sensor_id} read error (attempt {attempt+1}): {result}")
+                # One request per block of the compiled plan
+                blocks = []
+                for block in plan:
+                    regs = self._read_block(sensor_id, block)
+                    if regs is None:
+                        break
+                    blocks.append((block, regs))
+                if len(blocks) < len(plan):
                     time.sleep(0.1)
                     continue
                 
-                # Parse parameters from 8 registers (raw values)
-                regs = result.registers
-                
-                # Store raw values
-                data.nitrogen_raw = regs[2] / 10.0 if regs[2] is not None else None
-                data.phosphorus_raw = regs[3] / 10.0 if regs[3] is not None else None
-                data.potassium_raw = regs[4] / 10.0 if regs[4] is not None else None
-                data.ph_raw = regs[5] / 100.0 if regs[5] is not None else None
-                data.ec_raw = regs[6] / 100.0 if regs[6] is not None else None
-                data.temperature_raw = regs[7] / 100.0 if regs[7] is not None else None
-                
-                # Apply calibration to get corrected values
-                data.nitrogen = apply_calibration(sensor_id, 'nitrogen', data.nitrogen_raw) if data.nitrogen_raw is not None else None
-                data.phosphorus = apply_calibration(sensor_id, 'phosphorus', data.phosphorus_raw) if data.phosphorus_raw is not None else None
-                data.potassium = apply_calibration(sensor_id, 'potassium', data.potassium_raw) if data.potassium_raw is not None else None
-                data.ph = apply_calibration(sensor_id, 'ph', data.ph_raw) if data.ph_raw is not None else None
-                data.ec = apply_calibration(sensor_id, 'ec', data.ec_raw) if data.ec_raw is not None else None
-                data.temperature = apply_calibration(sensor_id, 'temperature', data.temperature_raw) if data.temperature_raw is not None else None
-                
-                # No humidity parameter in this sensor model
-                data.humidity = None
-                
-                data.is_valid = True
-                logger.info(f"Sensor {sensor_id} (RAW→CALIBRATED): "
-                           f"N={data.nitrogen_raw:.1f}→{data.nitrogen:.1f} "
-                           f"P={data.phosphorus_raw:.1f}→{data.phosphorus:.1f} "
-                           f"K={data.potassium_raw:.1f}→{data.potassium:.1f} "
-                           f"pH={data.ph_raw:.2f}→{data.ph:.2f} "
-                           f"EC={data.ec_raw:.2f}→{data.ec:.2f} "
-                           f"T={data.temperature_raw:.1f}→{data.temperature:.1f}°C")
-                return data
-                
-                logger.debug(f"Sensor {sensor_id} Modbus exception (attempt {attempt+1}): {str(e)}")
-                time.sleep(0.1)
+                return self._decode(data, blocks)
             except Exception as e:
                 logger.debug(f"Sensor {sensor_id} read error (attempt {attempt+1}): {str(e)}")
                 time.sleep(0.1)
         
         # All retries failed
+        failure_count.inc()
         data.error = f"Failed to read after {retries} attempts"
         logger.error(f"Sensor {sensor_id}: {data.error}")
         return data
     
     def read_all_sensors(self) -> Dict[int, SensorData]:
         """
-        Read data from all 4 sensors sequentially.
-        Sensor 1 is connected and returns real data.
-        Sensors 2-4 are disconnected and return empty data with error message.
+        Read data from all configured slaves sequentially.
         
         Returns:
             Dictionary mapping sensor_id to SensorData
         """
         results = {}
-        for sensor_id in range(1, 5):
+        for sensor_id in self.register_maps:
             results[sensor_id] = self.read_sensor(sensor_id)
         return results
 
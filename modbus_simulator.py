@@ -0,0 +1,458 @@
+#!/usr/bin/env python3
+"""
+Software Modbus RTU bus with simulated NPK sensors.
+Serves a pseudo-terminal that behaves like an RS-485 adapter with N slaves
+(same register layout as the real sensors), with configurable latency, CRC
+errors, dropped frames, dead slaves and replay of recorded register traces,
+so polling can be tested and benchmarked without hardware.
+
+    python modbus_simulator.py --slaves 1 2 3 4 --dead 4 --drop-rate 0.01
+    MODBUS_PORT=/dev/pts/5 GPIO_DE_RE=0 python app.py
+"""
+
+import json
+import logging
+import os
+import random
+import select
+import struct
+import threading
+import time
+import tty
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from modbus_sensor import DEFAULT_REGISTER_MAP, RegisterMap, frame_time
+
+logger = logging.getLogger(__name__)
+
+# Function codes served by the simulator
+FUNCTION_CODES = {3: 'holding', 4: 'input'}
+
+# Modbus exception codes
+ILLEGAL_FUNCTION = 1
+ILLEGAL_DATA_ADDRESS = 2
+
+# Typical values of a healthy substrate, used when no values are given
+DEFAULT_VALUES = {
+    'nitrogen': 120.0,
+    'phosphorus': 45.0,
+    'potassium': 180.0,
+    'ph': 6.5,
+    'ec': 1.2,
+    'temperature': 22.5,
+    'humidity': 68.0,
+}
+
+
+def _crc16_table() -> List[int]:
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+
+
+_CRC_TABLE = _crc16_table()
+
+
+def crc16(frame: bytes) -> bytes:
+    """Modbus RTU CRC of a frame, in wire order (low byte first)."""
+    crc = 0xFFFF
+    for byte in frame:
+        crc = (crc >> 8) ^ _CRC_TABLE[(crc ^ byte) & 0xFF]
+    return struct.pack('<H', crc)
+
+
+class SimulatedSensor:
+    """
+    Register image of one simulated slave.
+
+    Values are written through a RegisterMap exactly as the real sensor
+    encodes them (value * scale), so the reader decodes them unchanged.
+    """
+
+    def __init__(self, slave: int, register_map: RegisterMap = DEFAULT_REGISTER_MAP,
+                 values: Optional[Dict[str, float]] = None, noise: float = 0.0,
+                 trace: Optional[List[Tuple[float, str, int, List[int]]]] = None):
+        """
+        Args:
+            slave: Modbus slave ID
+            register_map: Register layout to emulate
+            values: Parameter values to serve (default: DEFAULT_VALUES)
+            noise: Relative standard deviation added to each value on every read
+            trace: Recorded (time, function, address, registers) frames to
+                   replay instead of values, looped over the trace's duration
+        """
+        self.slave = slave
+        self.register_map = register_map
+        self.values = dict(DEFAULT_VALUES)
+        self.values.update(values or {})
+        self.noise = noise
+        self.trace = sorted(trace or [], key=lambda frame: frame[0])
+        self.dead = False
+        size = register_map.start + register_map.count
+        for _, _, address, registers in self.trace:
+            size = max(size, address + len(registers))
+        self.registers = {'holding': [0] * size, 'input': [0] * size}
+        self._started = time.monotonic()
+        self._render()
+
+    def _render(self):
+        """Encode the current values into the register image."""
+        image = self.registers[self.register_map.function]
+        for param, offset, scale in self.register_map.fields:
+            value = self.values[param]
+            if self.noise:
+                value = random.gauss(value, abs(value) * self.noise)
+            image[self.register_map.start + offset] = int(round(value * scale)) & 0xFFFF
+
+    def _replay(self):
+        """Load the trace frames that are due at the current point of the loop."""
+        duration = self.trace[-1][0] or 1.0
+        elapsed = (time.monotonic() - self._started) % duration
+        due = {}
+        for t, function, address, registers in self.trace:
+            if t > elapsed and due:
+                break
+            due[(function, address)] = registers
+        for (function, address), registers in due.items():
+            self.registers[function][address:address + len(registers)] = registers
+
+    def read(self, function: str, address: int, count: int) -> Optional[List[int]]:
+        """Return count registers from address, or None if outside the image."""
+        image = self.registers[function]
+        if count < 1 or address + count > len(image):
+            return None
+        if self.trace:
+            self._replay()
+        elif self.noise:
+            self._render()
+        return image[address:address + count]
+
+
+class SimulatedBus:
+    """
+    Modbus RTU slaves sharing one line, with fault injection.
+
+    handle() takes a request frame and returns the response frame (or None
+    when nothing would be on the wire) plus the time the exchange takes:
+    request and response frame times at the configured baud rate plus the
+    slave's processing latency.
+    """
+
+    def __init__(self, sensors: Iterable[SimulatedSensor], baudrate: int = 9600,
+                 latency: float = 0.02, jitter: float = 0.005, crc_error_rate: float = 0.0,
+                 drop_rate: float = 0.0, seed: Optional[int] = None):
+        """
+        Args:
+            sensors: Simulated slaves on the bus
+            baudrate: Line speed used to time frames
+            latency: Mean slave processing time before it answers, in seconds
+            jitter: Standard deviation of the processing time, in seconds
+            crc_error_rate: Fraction of responses with a corrupted byte
+            drop_rate: Fraction of requests that get no response
+            seed: Random seed for reproducible fault patterns
+        """
+        self.sensors: Dict[int, SimulatedSensor] = {sensor.slave: sensor for sensor in sensors}
+        self.baudrate = baudrate
+        self.latency = latency
+        self.jitter = jitter
+        self.crc_error_rate = crc_error_rate
+        self.drop_rate = drop_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.responses = 0
+        self.dropped = 0
+        self.crc_errors = 0
+        self.ignored = 0
+
+    def set_dead(self, slave: int, dead: bool = True):
+        """Make a slave stop (or resume) answering."""
+        self.sensors[slave].dead = dead
+
+    def _exception(self, slave: int, function: int, code: int) -> bytes:
+        frame = struct.pack('>BBB', slave, function | 0x80, code)
+        return frame + crc16(frame)
+
+    def handle(self, request: bytes) -> Tuple[Optional[bytes], float]:
+        """
+        Process one request frame.
+
+        Returns:
+            (response frame or None, seconds until the response has been sent)
+        """
+        with self._lock:
+            self.requests += 1
+            elapsed = frame_time(len(request), self.baudrate)
+            if len(request) < 4 or crc16(request[:-2]) != request[-2:]:
+                self.ignored += 1  # A real slave discards frames with a bad CRC
+                return None, elapsed
+            slave, function = request[0], request[1]
+            sensor = self.sensors.get(slave)
+            if sensor is None or sensor.dead:
+                self.ignored += 1
+                return None, elapsed
+            if self._random.random() < self.drop_rate:
+                self.dropped += 1
+                return None, elapsed
+
+            if function not in FUNCTION_CODES or len(request) != 8:
+                response = self._exception(slave, function, ILLEGAL_FUNCTION)
+            else:
+                address, count = struct.unpack('>HH', request[2:6])
+                registers = sensor.read(FUNCTION_CODES[function], address, count)
+                if registers is None:
+                    response = self._exception(slave, function, ILLEGAL_DATA_ADDRESS)
+                else:
+                    frame = struct.pack(f'>BBB{count}H', slave, function, 2 * count, *registers)
+                    response = frame + crc16(frame)
+
+            if self._random.random() < self.crc_error_rate:
+                self.crc_errors += 1
+                corrupt = self._random.randrange(len(response))
+                response = response[:corrupt] + bytes([response[corrupt] ^ 0xFF]) + response[corrupt + 1:]
+
+            self.responses += 1
+            delay = max(self._random.gauss(self.latency, self.jitter), 0.0) if self.jitter else self.latency
+            return response, elapsed + delay + frame_time(len(response), self.baudrate)
+
+    def stats(self) -> Dict:
+        """Request and fault counters."""
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'responses': self.responses,
+                'dropped': self.dropped,
+                'crc_errors': self.crc_errors,
+                'ignored': self.ignored,
+            }
+
+
+class PtySimulator:
+    """
+    Serves a SimulatedBus on a pseudo-terminal.
+
+    Open port with any serial client (ModbusSerialClient, sensor_scanner.py,
+    app.py via MODBUS_PORT). Frames are delimited by line silence as on a
+    real RS-485 bus, and the response is written after the simulated
+    exchange time, since a pty has no baud rate of its own.
+    """
+
+    def __init__(self, bus: SimulatedBus):
+        """
+        Args:
+            bus: Simulated slaves to serve
+        """
+        self.bus = bus
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)  # No echo or line editing on the client side
+        self.port = os.ttyname(self._slave)
+        # End of frame: 3.5 characters of silence (at least 2 ms for pty scheduling)
+        self.frame_gap = max(frame_time(3.5, bus.baudrate), 0.002)
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Start serving in a background thread."""
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='modbus-simulator', daemon=True)
+        self._thread.start()
+        logger.info(f"Simulated Modbus bus on {self.port}: slaves {sorted(self.bus.sensors)} "
+                    f"@ {self.bus.baudrate} baud")
+
+    def stop(self):
+        """Stop serving and close the pty."""
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        os.close(self._master)
+        os.close(self._slave)
+
+    def _read_frame(self) -> bytes:
+        """Block until a request frame has been received."""
+        frame = b''
+        while self._running:
+            ready, _, _ = select.select([self._master], [], [], self.frame_gap if frame else 0.5)
+            if not ready:
+                if frame:
+                    return frame
+                continue
+            frame += os.read(self._master, 256)
+        return frame
+
+    def _run(self):
+        while self._running:
+            try:
+                request = self._read_frame()
+                if not request:
+                    continue
+                start = time.monotonic()
+                response, elapsed = self.bus.handle(request)
+                remaining = start + elapsed - time.monotonic()
+                if remaining > 0:
+                    time.sleep(remaining)
+                if response is not None:
+                    os.write(self._master, response)
+            except Exception as e:
+                if self._running:
+                    logger.error(f"Simulator error: {e}")
+
+
+def load_trace(path: str) -> Dict[int, List[Tuple[float, str, int, List[int]]]]:
+    """
+    Load a register trace recorded with record_trace().
+
+    Returns:
+        (time, function, address, registers) frames per slave ID
+    """
+    traces: Dict[int, List] = {}
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            frame = json.loads(line)
+            traces.setdefault(int(frame['slave']), []).append(
+                (float(frame['t']), frame.get('function', 'holding'), int(frame['address']),
+                 [int(value) for value in frame['registers']])
+            )
+    return traces
+
+
+def record_trace(reader, path: str, duration: float, interval: float = 5.0):
+    """
+    Record the raw registers of a connected ModbusNPKReader's slaves.
+
+    Writes one JSON line per register block read:
+    {"t": seconds, "slave": id, "function": "holding", "address": 4, "registers": [...]}
+
+    Args:
+        reader: Connected ModbusNPKReader
+        path: Output file
+        duration: Seconds to record
+        interval: Seconds between scans
+    """
+    start = time.monotonic()
+    frames = 0
+    with open(path, 'w') as f:
+        while time.monotonic() - start < duration:
+            scan = time.monotonic()
+            for slave in reader.slaves:
+                for block in reader.register_plan(slave):
+                    registers = reader._read_block(slave, block)
+                    if registers is None:
+                        continue
+                    f.write(json.dumps({
+                        't': round(time.monotonic() - start, 3),
+                        'slave': slave,
+                        'function': block.function,
+                        'address': block.start,
+                        'registers': list(registers),
+                    }) + '\n')
+                    frames += 1
+            time.sleep(max(interval - (time.monotonic() - scan), 0.0))
+    logger.info(f"Recorded {frames} register frames to {path}")
+
+
+def build_bus(slaves: Iterable[int], baudrate: int = 9600, latency: float = 0.02,
+              jitter: float = 0.005, crc_error_rate: float = 0.0, drop_rate: float = 0.0,
+              dead: Iterable[int] = (), noise: float = 0.0, trace: Optional[str] = None,
+              register_map: RegisterMap = DEFAULT_REGISTER_MAP,
+              seed: Optional[int] = None) -> SimulatedBus:
+    """
+    Build a SimulatedBus of identical sensors.
+
+    Args:
+        slaves: Slave IDs to simulate
+        dead: Slave IDs that never answer
+        noise: Relative noise on served values
+        trace: Trace file to replay (slaves it covers replay it, others serve values)
+        (other arguments as SimulatedBus)
+    """
+    traces = load_trace(trace) if trace else {}
+    sensors = [SimulatedSensor(slave, register_map, noise=noise, trace=traces.get(slave))
+               for slave in slaves]
+    bus = SimulatedBus(sensors, baudrate=baudrate, latency=latency, jitter=jitter,
+                       crc_error_rate=crc_error_rate, drop_rate=drop_rate, seed=seed)
+    for slave in dead:
+        bus.set_dead(slave)
+    return bus
+
+
+def main():
+    """Run a simulated bus, or record a trace from real sensors."""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Simulated Modbus RTU bus of NPK sensors on a pseudo-terminal',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python modbus_simulator.py                              # 4 healthy sensors
+  python modbus_simulator.py --dead 3 --drop-rate 0.02    # Faulty bus
+  python modbus_simulator.py --record trace.jsonl --port /dev/ttyAMA0 --duration 600
+  python modbus_simulator.py --trace trace.jsonl          # Replay the recording
+        """
+    )
+    parser.add_argument('--slaves', type=int, nargs='+', default=[1, 2, 3, 4],
+                        help='Slave IDs to simulate (default: 1 2 3 4)')
+    parser.add_argument('--baudrate', type=int, default=9600,
+                        help='Simulated line speed (default: 9600)')
+    parser.add_argument('--latency', type=float, default=0.02,
+                        help='Slave response latency in seconds (default: 0.02)')
+    parser.add_argument('--jitter', type=float, default=0.005,
+                        help='Standard deviation of the latency (default: 0.005)')
+    parser.add_argument('--crc-error-rate', type=float, default=0.0,
+                        help='Fraction of responses with a bad CRC (default: 0)')
+    parser.add_argument('--drop-rate', type=float, default=0.0,
+                        help='Fraction of requests left unanswered (default: 0)')
+    parser.add_argument('--dead', type=int, nargs='*', default=[],
+                        help='Slave IDs that never answer')
+    parser.add_argument('--noise', type=float, default=0.0,
+                        help='Relative noise on served values (default: 0)')
+    parser.add_argument('--trace', help='Replay a recorded register trace')
+    parser.add_argument('--seed', type=int, help='Random seed for reproducible faults')
+    parser.add_argument('--record', metavar='FILE',
+                        help='Record a trace from real sensors on --port instead')
+    parser.add_argument('--port', default='/dev/ttyAMA0',
+                        help='Serial port for --record (default: /dev/ttyAMA0)')
+    parser.add_argument('--duration', type=float, default=300,
+                        help='Seconds to record (default: 300)')
+    parser.add_argument('--interval', type=float, default=5,
+                        help='Seconds between recorded scans (default: 5)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    if args.record:
+        from modbus_sensor import ModbusNPKReader
+        reader = ModbusNPKReader(port=args.port, baudrate=args.baudrate,
+                                 register_maps={slave: DEFAULT_REGISTER_MAP for slave in args.slaves})
+        if not reader.connect():
+            raise SystemExit(1)
+        try:
+            record_trace(reader, args.record, args.duration, args.interval)
+        finally:
+            reader.disconnect()
+        return
+
+    bus = build_bus(args.slaves, baudrate=args.baudrate, latency=args.latency, jitter=args.jitter,
+                    crc_error_rate=args.crc_error_rate, drop_rate=args.drop_rate, dead=args.dead,
+                    noise=args.noise, trace=args.trace, seed=args.seed)
+    simulator = PtySimulator(bus)
+    simulator.start()
+    print(f"Serving simulated sensors on {simulator.port} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(10)
+            logger.info(f"Simulator stats: {bus.stats()}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        simulator.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Autotune and compare humidity control modes on a simulated chamber.
+Runs the control_loop relay autotune against a first-order humidity model
+with dead time, then simulates hysteresis and time-proportioning PID
+control with the same model and reports overshoot, relay switches and
+atomizer duty. Live autotune runs in the app instead
+(POST /api/control/humidity/autotune).
+
+    python pid_autotune.py --setpoint 68
+"""
+
+import json
+import logging
+import random
+import statistics
+import sys
+from collections import deque
+from typing import Dict, Optional
+
+from control_loop import TUNING_RULES, ControlLoop, LoopConfig, PIDLoop, PIDTuning
+from modbus_sensor import SensorData
+from reading_cache import CachedReading
+from sensor_poller import SensorSnapshot
+
+logger = logging.getLogger(__name__)
+
+SENSOR_KEY = 'sim/chamber/1'
+
+
+class HumidityChamber:
+    """
+    First-order humidity model of a small chamber with an atomizer.
+
+    dh/dt = gain * u(t - dead_time) - leak * (h - ambient), plus Gaussian
+    sensor noise on the reported value.
+    """
+
+    def __init__(self, ambient: float = 45.0, gain: float = 0.1, leak: float = 1 / 500,
+                 dead_time: float = 30.0, noise: float = 0.3, humidity: Optional[float] = None,
+                 seed: Optional[int] = 1):
+        """
+        Args:
+            ambient: Humidity the chamber drifts to with the atomizer off (%)
+            gain: Humidity rise per second with the atomizer on (%/s)
+            leak: Exchange rate with the ambient air (1/s)
+            dead_time: Seconds before the atomizer affects the sensor
+            noise: Standard deviation of the sensor noise (%)
+            humidity: Initial humidity (default: ambient)
+            seed: Random seed for the noise
+        """
+        self.ambient = ambient
+        self.gain = gain
+        self.leak = leak
+        self.dead_time = dead_time
+        self.noise = noise
+        self.humidity = ambient if humidity is None else humidity
+        self._random = random.Random(seed)
+        self._pending = deque()  # (time, state) switches still in the dead time
+        self._effective = False
+        self.time = 0.0
+
+    def step(self, on: bool, dt: float) -> float:
+        """Advance the model by dt seconds; returns the sensor reading."""
+        self._pending.append((self.time + self.dead_time, on))
+        while self._pending and self._pending[0][0] <= self.time:
+            self._effective = self._pending.popleft()[1]
+        rate = self.gain * self._effective - self.leak * (self.humidity - self.ambient)
+        self.humidity = min(max(self.humidity + rate * dt, 0.0), 100.0)
+        self.time += dt
+        return self.humidity + self._random.gauss(0.0, self.noise)
+
+
+def snapshot_for(value: float) -> SensorSnapshot:
+    """Poll snapshot with one sensor reporting humidity."""
+    data = SensorData(1)
+    data.humidity = round(value, 1)
+    data.is_valid = True
+    return SensorSnapshot({SENSOR_KEY: CachedReading(data, ttl=60.0)})
+
+
+def run(loop: ControlLoop, chamber: HumidityChamber, duration: float, interval: float,
+        setpoint: float) -> Dict:
+    """
+    Drive a loop against the chamber for duration seconds, one poll every interval.
+
+    Returns:
+        Relay switches, atomizer duty and humidity statistics (the first
+        quarter of the run is excluded as settling time)
+    """
+    settle = duration / 4
+    toggles, on_time, errors, values = 0, 0.0, [], []
+    now = 0.0
+    while now < duration:
+        value = chamber.step(loop.state, interval)
+        if loop.update(snapshot_for(value), now=now):
+            toggles += now >= settle
+        if now >= settle:
+            on_time += interval * loop.state
+            errors.append(chamber.humidity - setpoint)
+            values.append(chamber.humidity)
+        now += interval
+    measured = duration - settle
+    return {
+        'switches_per_hour': round(toggles * 3600 / measured, 1),
+        'duty': round(on_time / measured, 3),
+        'rms_error': round(statistics.fmean(e * e for e in errors) ** 0.5, 2),
+        'min': round(min(values), 1),
+        'max': round(max(values), 1),
+    }
+
+
+def autotune(chamber: HumidityChamber, config: LoopConfig, setpoint: float, window: float,
+             interval: float, hysteresis: float = 1.0, cycles: int = 3, rule: str = 'pi',
+             timeout: float = 8 * 3600.0) -> Dict:
+    """
+    Run the relay autotune against the chamber.
+
+    Returns:
+        The autotune status (result under 'result', None if it failed)
+    """
+    loop = PIDLoop('autotune', lambda state: True, config, PIDTuning(setpoint, 0.0, window=window))
+    loop.start_autotune(hysteresis, cycles, rule, timeout)
+    now = 0.0
+    while loop.autotuner is not None:
+        loop.update(snapshot_for(chamber.step(loop.state, interval)), now=now)
+        now += interval
+    return loop.last_autotune
+
+
+def main():
+    """Autotune on the simulated chamber and compare hysteresis with PID control."""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Autotune PID humidity control on a simulated chamber and compare it with hysteresis',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python pid_autotune.py                                   # Defaults: setpoint 68, 60/75 hysteresis
+  python pid_autotune.py --rule ziegler-nichols --hours 12
+  python pid_autotune.py --kp 0.08 --ki 0.0004 --kd 0      # Evaluate given gains, no autotune
+  python pid_autotune.py --gain 0.2 --dead-time 60 --leak 0.001
+        """
+    )
+    parser.add_argument('--setpoint', type=float, default=68.0, help='PID setpoint (%%, default 68)')
+    parser.add_argument('--on', type=float, default=60.0, help='Hysteresis ON threshold (default 60)')
+    parser.add_argument('--off', type=float, default=75.0, help='Hysteresis OFF threshold (default 75)')
+    parser.add_argument('--window', type=float, default=300.0, help='PID cycle window in seconds (default 300)')
+    parser.add_argument('--interval', type=float, default=5.0, help='Poll interval in seconds (default 5)')
+    parser.add_argument('--min-on', type=float, default=30.0, help='Minimum relay ON time (default 30)')
+    parser.add_argument('--min-off', type=float, default=30.0, help='Minimum relay OFF time (default 30)')
+    parser.add_argument('--max-toggles', type=int, default=12,
+                        help='Relay switches allowed per hour, both modes (default 12, 0 = unlimited)')
+    parser.add_argument('--hours', type=float, default=6.0, help='Simulated hours per mode (default 6)')
+    parser.add_argument('--rule', choices=list(TUNING_RULES), default='pi',
+                        help='Autotune rule (default pi)')
+    parser.add_argument('--hysteresis', type=float, default=1.0, help='Autotune relay dead band (default 1)')
+    parser.add_argument('--cycles', type=int, default=3, help='Autotune oscillations averaged (default 3)')
+    parser.add_argument('--kp', type=float, help='Use these gains instead of autotuning')
+    parser.add_argument('--ki', type=float, default=0.0)
+    parser.add_argument('--kd', type=float, default=0.0)
+    chamber_group = parser.add_argument_group('chamber model')
+    chamber_group.add_argument('--ambient', type=float, default=45.0, help='Ambient humidity (default 45)')
+    chamber_group.add_argument('--gain', type=float, default=0.1, help='Rise with atomizer on, %%/s (default 0.1)')
+    chamber_group.add_argument('--leak', type=float, default=1 / 500, help='Air exchange rate, 1/s (default 0.002)')
+    chamber_group.add_argument('--dead-time', type=float, default=30.0, help='Seconds (default 30)')
+    chamber_group.add_argument('--noise', type=float, default=0.3, help='Sensor noise, %% (default 0.3)')
+    chamber_group.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    def chamber():
+        return HumidityChamber(args.ambient, args.gain, args.leak, args.dead_time, args.noise, seed=args.seed)
+
+    try:
+        # The PID loop uses the sensors and minimum times of the same config
+        config = LoopConfig('humidity', args.on, args.off, min_on=args.min_on, min_off=args.min_off,
+                            max_toggles=args.max_toggles, sensors=[SENSOR_KEY])
+        if args.kp is not None:
+            tuning = PIDTuning(args.setpoint, args.kp, args.ki, args.kd, args.window)
+        else:
+            result = autotune(chamber(), config, args.setpoint, args.window, args.interval,
+                              args.hysteresis, args.cycles, args.rule)
+            print(f"Autotune ({args.rule}): {result['oscillations']} oscillations, "
+                  f"period {result['period']}s, amplitude {result['amplitude']}")
+            if result['result'] is None:
+                print(f"Error: autotune failed: {result['error']}", file=sys.stderr)
+                sys.exit(1)
+            tuning = PIDTuning(**result['result'])
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(2)
+
+    duration = args.hours * 3600
+    results = {
+        f'hysteresis {args.on:g}/{args.off:g}': run(ControlLoop('hysteresis', lambda state: True, config),
+                                                   chamber(), duration, args.interval, args.setpoint),
+        f'pid {args.setpoint:g}': run(PIDLoop('pid', lambda state: True, config, tuning),
+                                      chamber(), duration, args.interval, args.setpoint),
+    }
+    print(f"\n{'Mode':<20} {'Switches/h':>10} {'Duty':>6} {'RMS err':>8} {'Min':>6} {'Max':>6}")
+    for mode, stats in results.items():
+        print(f"{mode:<20} {stats['switches_per_hour']:>10} {stats['duty']:>6.1%} {stats['rms_error']:>8} "
+              f"{stats['min']:>6} {stats['max']:>6}")
+
+    print("\nCONTROL_CONFIG settings:")
+    print(json.dumps({
+        'humidity_mode': 'pid',
+        'humidity_setpoint': tuning.setpoint,
+        'humidity_kp': round(tuning.kp, 5),
+        'humidity_ki': round(tuning.ki, 7),
+        'humidity_kd': round(tuning.kd, 4),
+        'humidity_pid_window': tuning.window,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""
+Struct-of-arrays container for many sensor readings.
+Each parameter is one typed array column plus a per-reading validity
+bitmask, so a buffered reading costs tens of bytes instead of a SensorData
+object with a boxed float per field.
+"""
+
+import math
+from array import array
+from typing import Dict, Hashable, Iterable, Iterator, List, Optional, Tuple
+
+from modbus_sensor import PARAMETERS, SensorData
+
+# Bit of each parameter in the validity mask; VALID_BIT marks a valid reading
+PARAM_BITS = {param: 1 << index for index, param in enumerate(PARAMETERS)}
+VALID_BIT = 1 << len(PARAMETERS)
+MASK_TYPECODE = 'B' if VALID_BIT < 1 << 8 else 'H'
+
+
+class ReadingBatch:
+    """
+    Append-only columns of readings from any number of sensors.
+
+    - sensor: index into sensors ('H', sensor keys are interned)
+    - ts: Unix timestamp ('d')
+    - mask: which parameters are present, plus VALID_BIT
+    - one column per parameter, NaN where the bit is not set
+
+    Columns use typecode 'd' by default so stored values round-trip exactly;
+    'f' halves the size at ~7 significant digits. With NumPy, a column can be
+    viewed without copying via numpy.frombuffer(batch.columns[param], ...).
+    """
+
+    def __init__(self, typecode: str = 'd', raw: bool = False):
+        """
+        Args:
+            typecode: array typecode of the value columns ('d' or 'f')
+            raw: Also keep the uncalibrated values (raw_columns)
+        """
+        self.typecode = typecode
+        self.sensors: List[Hashable] = []
+        self._sensor_index: Dict[Hashable, int] = {}
+        self.sensor = array('H')
+        self.ts = array('d')
+        self.mask = array(MASK_TYPECODE)
+        self.columns: Dict[str, array] = {param: array(typecode) for param in PARAMETERS}
+        self.raw_columns: Optional[Dict[str, array]] = (
+            {param: array(typecode) for param in PARAMETERS} if raw else None)
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    def _intern(self, key: Hashable) -> int:
+        index = self._sensor_index.get(key)
+        if index is None:
+            index = len(self.sensors)
+            self.sensors.append(key)
+            self._sensor_index[key] = index
+        return index
+
+    def append_values(self, key: Hashable, values: Dict[str, Optional[float]], ts: float,
+                      raw: Optional[Dict[str, Optional[float]]] = None):
+        """
+        Append one reading given as parameter values (None or missing = absent).
+
+        Args:
+            key: Sensor key
+            values: Parameter name to value
+            ts: Unix timestamp
+            raw: Uncalibrated values, stored if the batch keeps raw columns
+        """
+        mask = VALID_BIT
+        for param, column in self.columns.items():
+            value = values.get(param)
+            if value is None:
+                column.append(math.nan)
+            else:
+                column.append(value)
+                mask |= PARAM_BITS[param]
+        if self.raw_columns is not None:
+            raw = raw or {}
+            for param, column in self.raw_columns.items():
+                value = raw.get(param)
+                column.append(math.nan if value is None else value)
+        self.sensor.append(self._intern(key))
+        self.ts.append(ts)
+        self.mask.append(mask)
+
+    def append(self, key: Hashable, data: SensorData, ts: float, params: Optional[Iterable[str]] = None):
+        """
+        Append a SensorData reading.
+
+        Args:
+            key: Sensor key
+            data: Reading; an invalid one is stored with no parameters
+            ts: Unix timestamp
+            params: Only store these parameters (default: all present ones)
+        """
+        wanted = PARAMETERS if params is None else tuple(params)
+        if data.is_valid:
+            values = {param: getattr(data, param) for param in wanted}
+            raw = ({param: getattr(data, f'{param}_raw') for param in wanted}
+                   if self.raw_columns is not None else None)
+            self.append_values(key, values, ts, raw)
+        else:
+            self.append_values(key, {}, ts)
+            self.mask[-1] = 0
+
+    def get(self, index: int) -> SensorData:
+        """Materialize one reading as a SensorData (sensor_id is the sensor key)."""
+        mask = self.mask[index]
+        key = self.sensors[self.sensor[index]]
+        data = SensorData(key)
+        data.is_valid = bool(mask & VALID_BIT)
+        for param, bit in PARAM_BITS.items():
+            if mask & bit:
+                setattr(data, param, self.columns[param][index])
+                if self.raw_columns is not None:
+                    raw = self.raw_columns[param][index]
+                    setattr(data, f'{param}_raw', None if math.isnan(raw) else raw)
+        return data
+
+    def rows(self, raw: bool = False) -> Iterator[Tuple[Hashable, str, float, float]]:
+        """
+        Yield (sensor, param, ts, value) for every present value, in append order.
+
+        Args:
+            raw: Yield the uncalibrated values instead (skipping unknown ones)
+        """
+        if raw and self.raw_columns is None:
+            return
+        source = self.raw_columns if raw else self.columns
+        columns = [(param, PARAM_BITS[param], source[param]) for param in PARAMETERS]
+        sensors = self.sensors
+        for index, mask in enumerate(self.mask):
+            if not mask:
+                continue
+            sensor = sensors[self.sensor[index]]
+            ts = self.ts[index]
+            for param, bit, column in columns:
+                if mask & bit:
+                    value = column[index]
+                    if not raw or value == value:  # NaN: raw value not given
+                        yield sensor, param, ts, value
+
+    def paired_rows(self) -> Iterator[Tuple[Hashable, str, float, float, Optional[float]]]:
+        """Yield (sensor, param, ts, value, raw) for every present value (raw None if not given)."""
+        raw_columns = self.raw_columns or {}
+        columns = [(param, PARAM_BITS[param], self.columns[param], raw_columns.get(param))
+                   for param in PARAMETERS]
+        sensors = self.sensors
+        for index, mask in enumerate(self.mask):
+            if not mask:
+                continue
+            sensor = sensors[self.sensor[index]]
+            ts = self.ts[index]
+            for param, bit, column, raw_column in columns:
+                if mask & bit:
+                    raw = raw_column[index] if raw_column is not None else math.nan
+                    yield sensor, param, ts, column[index], (raw if raw == raw else None)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the array columns."""
+        arrays = [self.sensor, self.ts, self.mask] + list(self.columns.values())
+        if self.raw_columns is not None:
+            arrays += list(self.raw_columns.values())
+        return sum(len(a) * a.itemsize for a in arrays)
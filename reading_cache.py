@@ -0,0 +1,205 @@
+"""
+Time-bounded cache of sensor readings with stale-while-revalidate semantics.
+Callers always get the last good reading immediately; expired entries are
+refreshed in the background through the bus arbiter.
+"""
+
+import copy
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Hashable, Optional
+
+from modbus_sensor import SensorData
+from signal_filters import SignalFilterStage
+
+logger = logging.getLogger(__name__)
+
+
+class CachedReading:
+    """A cached SensorData plus the bookkeeping needed to report its age."""
+
+    def __init__(self, data: SensorData, ttl: float, last_error: Optional[str] = None):
+        """
+        Args:
+            data: Reading to serve (the last good one when falling back)
+            ttl: Seconds after which the reading is considered stale
+            last_error: Error from the most recent failed refresh, if any
+        """
+        self.data = data
+        self.ttl = ttl
+        self.last_error = last_error
+        self.fetched_at = time.monotonic()
+        # Serialized once; to_dict() only adds the age fields
+        self._payload = data.to_dict()
+        self._payload['timestamp'] = datetime.now().isoformat()
+
+    @property
+    def age(self) -> float:
+        """Seconds since the reading was taken."""
+        return time.monotonic() - self.fetched_at
+
+    @property
+    def stale(self) -> bool:
+        """True when the reading is older than its TTL or a refresh failed."""
+        return self.last_error is not None or self.age > self.ttl
+
+    def to_dict(self) -> Dict:
+        """Convert to dictionary for JSON serialization, with age and staleness."""
+        result = dict(self._payload)
+        result['age'] = round(self.age, 1)
+        result['stale'] = self.stale
+        if self.last_error is not None:
+            result['last_error'] = self.last_error
+        return result
+
+    def failed(self, error: Optional[str]) -> 'CachedReading':
+        """Return a copy of this entry flagged with a failed refresh."""
+        entry = copy.copy(self)
+        entry.last_error = error
+        return entry
+
+
+class ReadingCache:
+    """
+    Per-sensor reading cache in front of ModbusNPKReader.read_sensor.
+
+    Entries are keyed by whatever the bus front-end uses to address a
+    sensor: a slave ID for BusArbiter, 'room/bus/slave' for BusManager.
+
+    - Per-sensor TTL (CACHE_DURATION by default)
+    - Stale-while-revalidate: get() never blocks on the bus; an expired
+      entry is returned as-is while a refresh is queued on the arbiter
+    - Last-known-good fallback: a failed read keeps the previous valid
+      reading and marks it stale instead of replacing it
+    - Optional signal filters, applied to every reading stored (poll
+      cycles and background refreshes alike), so served values never
+      alternate between filtered and unfiltered
+    """
+
+    def __init__(self, arbiter=None, ttl: float = 300.0, fallback: bool = True,
+                 filters: Optional[SignalFilterStage] = None):
+        """
+        Args:
+            arbiter: BusArbiter or BusManager used for background refreshes
+                     (None disables them)
+            ttl: Default time-to-live in seconds
+            fallback: Keep serving the last good reading when a read fails
+            filters: Filters applied to each reading before it is served
+                     (None = serve readings as read)
+        """
+        self.arbiter = arbiter
+        self.ttl = ttl
+        self.fallback = fallback
+        self.filters = filters
+        self._ttls: Dict[Hashable, float] = {}
+        self._external = set()
+        self._entries: Dict[Hashable, CachedReading] = {}
+        self._refreshing = set()
+        self._revalidated_at: Dict[Hashable, float] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def set_ttl(self, key: Hashable, ttl: float):
+        """Override the TTL for a single sensor."""
+        self._ttls[key] = ttl
+
+    def set_external(self, key: Hashable):
+        """Mark a sensor that is not on the buses; it is never refreshed through the arbiter."""
+        self._external.add(key)
+
+    def update(self, data: SensorData, key: Optional[Hashable] = None) -> CachedReading:
+        """
+        Store a fresh reading, falling back to the last good one on failure.
+
+        Args:
+            data: Reading just taken from the bus
+            key: Sensor key (defaults to data.sensor_id)
+
+        Returns:
+            The entry now served for this sensor
+        """
+        key = data.sensor_id if key is None else key
+        if self.filters is not None:
+            data = self.filters.apply(key, data)
+        ttl = self._ttls.get(key, self.ttl)
+        # Poll cycles and background refreshes (_on_refreshed) update from different threads
+        with self._lock:
+            previous = self._entries.get(key)
+            if not data.is_valid and self.fallback and previous is not None and previous.data.is_valid:
+                entry = previous.failed(data.error)
+                logger.debug(f"Sensor {key}: serving last good reading ({data.error})")
+            else:
+                entry = CachedReading(data, ttl)
+            self._entries[key] = entry
+        return entry
+
+    def peek(self, key: Hashable) -> Optional[CachedReading]:
+        """Return the cached entry without triggering a refresh."""
+        return self._entries.get(key)
+
+    def get(self, key: Hashable) -> Optional[CachedReading]:
+        """
+        Return the cached entry immediately, refreshing it in the background if stale.
+
+        Returns:
+            CachedReading, or None if the sensor has never been read
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            self.revalidate(key)
+        elif entry.age > entry.ttl:
+            self.stale_hits += 1
+            self.revalidate(key)
+        elif entry.stale:
+            self.stale_hits += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def revalidate(self, key: Hashable):
+        """
+        Queue a background refresh for a sensor.
+
+        At most one refresh per sensor is in flight, and at most one is
+        started per TTL, so client traffic cannot add load to the bus.
+        """
+        if self.arbiter is None or key in self._external:
+            return
+        now = time.monotonic()
+        ttl = self._ttls.get(key, self.ttl)
+        with self._lock:
+            if key in self._refreshing:
+                return
+            if now - self._revalidated_at.get(key, float('-inf')) < ttl:
+                return
+            self._refreshing.add(key)
+            self._revalidated_at[key] = now
+
+        future = self.arbiter.submit_read(key, priority=self.arbiter.PRIORITY_INTERACTIVE)
+        future.add_done_callback(lambda f: self._on_refreshed(key, f))
+
+    def _on_refreshed(self, key: Hashable, future):
+        """Store the result of a background refresh."""
+        with self._lock:
+            self._refreshing.discard(key)
+        try:
+            self.update(future.result(), key)
+        except Exception as e:
+            logger.error(f"Sensor {key}: background refresh failed: {e}")
+
+    def stats(self) -> Dict:
+        """Return hit/miss counters for the status endpoint."""
+        total = self.hits + self.stale_hits + self.misses
+        return {
+            'ttl': self.ttl,
+            'fallback': self.fallback,
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / total, 3) if total else None,
+        }
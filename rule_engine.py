@@ -0,0 +1,699 @@
+"""
+Declarative automation rules over the poll snapshots.
+Rules such as 'avg(ec) > 2.0 and temperature > 28 for 10m' are parsed and
+compiled once into Python functions. Each poll cycle recomputes only the zone
+signals whose sensors were read, and evaluates only the rules that read a
+changed signal or have a 'for' timer due, so the cost of a cycle grows
+with what changed rather than with the number of rules.
+"""
+
+import heapq
+import logging
+import math
+import operator
+import re
+import time
+from bisect import bisect_left, insort
+from collections import deque
+from typing import Callable, Deque, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+from metrics import REGISTRY
+from modbus_sensor import PARAMETERS
+
+logger = logging.getLogger(__name__)
+
+RULE_CYCLE_SECONDS = REGISTRY.histogram(
+    'rule_cycle_seconds', 'Time to update signals and evaluate rules in one poll cycle',
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025))
+RULE_EVALUATIONS = REGISTRY.counter('rule_evaluations', 'Rule conditions evaluated')
+
+# Zone aggregates usable in conditions ('weighted' needs per-rule weights, so it is not offered)
+FUNCTIONS = {'avg': 'mean', 'mean': 'mean', 'median': 'median', 'min': 'min', 'max': 'max'}
+
+# Comparison -> its negation
+COMPARISONS = {'>': '<=', '>=': '<', '<': '>=', '<=': '>', '==': '!=', '!=': '=='}
+
+DURATION_UNITS = {'s': 1, 'sec': 1, 'm': 60, 'min': 60, 'h': 3600}
+
+_TOKEN = re.compile(r'\s*(?:(?P<number>\d+(?:\.\d*)?|\.\d+)|(?P<name>[A-Za-z_]\w*)'
+                    r'|(?P<selector>\[[^\]]*\])|(?P<op>>=|<=|==|!=|[<>(),-]))')
+
+Signal = Tuple[str, str, Optional[Tuple[Hashable, ...]], float]  # (function, param, sensors, window)
+Evaluator = Callable[[List[Optional[float]], float], bool]
+
+
+class TimeWindow:
+    """
+    Ring buffer of (time, value) samples over the last `seconds`, aggregated incrementally.
+
+    mean keeps a running sum, min/max a monotonic deque and median a sorted
+    copy, so a push plus expiry costs amortized O(1) (O(window) moves for
+    the median) instead of rescanning the window.
+    """
+
+    __slots__ = ('function', 'seconds', '_samples', '_sum', '_extreme', '_sorted')
+
+    def __init__(self, function: str, seconds: float):
+        self.function = function
+        self.seconds = seconds
+        self._samples: Deque[Tuple[float, float]] = deque()
+        self._sum = 0.0
+        self._extreme: Deque[Tuple[float, float]] = deque()
+        self._sorted: List[float] = []
+
+    def push(self, now: float, value: float):
+        self._samples.append((now, value))
+        if self.function == 'mean':
+            self._sum += value
+        elif self.function == 'median':
+            insort(self._sorted, value)
+        else:
+            # Drop samples that can no longer be the window's min (max)
+            worse = operator.ge if self.function == 'min' else operator.le
+            while self._extreme and worse(self._extreme[-1][1], value):
+                self._extreme.pop()
+            self._extreme.append((now, value))
+
+    def expire(self, now: float):
+        cutoff = now - self.seconds
+        samples = self._samples
+        while samples and samples[0][0] < cutoff:
+            ts, value = samples.popleft()
+            if self.function == 'mean':
+                self._sum -= value
+            elif self.function == 'median':
+                del self._sorted[bisect_left(self._sorted, value)]
+        while self._extreme and self._extreme[0][0] < cutoff:
+            self._extreme.popleft()
+
+    def value(self) -> Optional[float]:
+        n = len(self._samples)
+        if not n:
+            return None
+        if self.function == 'mean':
+            return self._sum / n
+        if self.function == 'median':
+            middle = n // 2
+            return self._sorted[middle] if n % 2 else (self._sorted[middle - 1] + self._sorted[middle]) / 2
+        return self._extreme[0][1]
+
+
+class _Parser:
+    """
+    Recursive-descent parser for rule conditions.
+
+    The condition is parsed into a small tree, negations are pushed down
+    into the comparisons, and the tree is compiled to one Python function
+    per rule (plus one per 'for' timer), so evaluating a rule is a single
+    call running plain short-circuit comparisons over the signal values.
+    Only slot numbers, numeric constants and the fixed comparison operators
+    end up in the generated source.
+    """
+
+    def __init__(self, text: str, default_function: str, sensors: Optional[Tuple[Hashable, ...]],
+                 resolve: Callable[[str], Hashable], slot: Callable[[Signal], int]):
+        self.text = text
+        self.default_function = default_function
+        self.sensors = sensors
+        self.resolve = resolve
+        self.slot = slot
+        self.tokens: List[Tuple[str, str, int]] = []
+        pos = 0
+        while pos < len(text):
+            match = _TOKEN.match(text, pos)
+            if match is None or match.end() == pos:
+                if text[pos:].strip():
+                    raise ValueError(f"unexpected '{text[pos:].strip()[0]}' at column {pos + 1}")
+                break
+            kind = match.lastgroup
+            self.tokens.append((kind, match.group(kind), match.start(kind)))
+            pos = match.end()
+        self.position = 0
+        self.signals: Set[int] = set()
+        self.wake = [math.inf]  # Earliest time a 'for' timer may complete, written during evaluation
+        self.holds: List[List[Optional[float]]] = []  # Start time of each 'for' timer, in source order
+        self._namespace: Dict[str, Callable] = {}
+
+    def peek(self, value: Optional[str] = None) -> Optional[Tuple[str, str, int]]:
+        if self.position >= len(self.tokens):
+            return None
+        token = self.tokens[self.position]
+        if value is not None and token[1].lower() != value:
+            return None
+        return token
+
+    def take(self, value: Optional[str] = None, kind: Optional[str] = None) -> Tuple[str, str, int]:
+        token = self.peek()
+        if token is None:
+            raise ValueError(f"unexpected end of condition, expected {value or kind or 'a value'}")
+        if (value is not None and token[1].lower() != value) or (kind is not None and token[0] != kind):
+            raise ValueError(f"expected {value or kind} at column {token[2] + 1}, got '{token[1]}'")
+        self.position += 1
+        return token
+
+    def parse(self) -> Evaluator:
+        node = self.condition()
+        token = self.peek()
+        if token is not None:
+            raise ValueError(f"unexpected '{token[1]}' at column {token[2] + 1}")
+        return self.function(self.normalize(node))
+
+    # Grammar methods return tree nodes: ('cmp', op, left, right), ('and', parts),
+    # ('or', parts), ('not', node) and ('for', node, seconds)
+
+    def condition(self) -> Tuple:
+        """condition := disjunction ['for' duration]"""
+        node = self.disjunction()
+        if self.peek('for'):
+            self.take('for')
+            return 'for', node, self.duration()
+        return node
+
+    def disjunction(self) -> Tuple:
+        parts = [self.conjunction()]
+        while self.peek('or'):
+            self.take('or')
+            parts.append(self.conjunction())
+        return ('or', parts) if len(parts) > 1 else parts[0]
+
+    def conjunction(self) -> Tuple:
+        parts = [self.negation()]
+        while self.peek('and'):
+            self.take('and')
+            parts.append(self.negation())
+        return ('and', parts) if len(parts) > 1 else parts[0]
+
+    def negation(self) -> Tuple:
+        if self.peek('not'):
+            self.take('not')
+            return 'not', self.negation()
+        if self.peek('('):
+            self.take('(')
+            node = self.condition()
+            self.take(')')
+            return node
+        return self.comparison()
+
+    def comparison(self) -> Tuple:
+        left = self.operand()
+        token = self.take(kind='op')
+        if token[1] not in COMPARISONS:
+            raise ValueError(f"expected a comparison at column {token[2] + 1}, got '{token[1]}'")
+        right = self.operand()
+        if left[0] == 'const' and right[0] == 'const':
+            raise ValueError(f"comparison of two constants at column {token[2] + 1}")
+        return 'cmp', token[1], left, right
+
+    def operand(self) -> Tuple[str, float]:
+        """operand := ['-'] number | function '(' param [selector] [',' duration] ')' | param [selector]"""
+        token = self.peek()
+        if token is not None and token[1] == '-':
+            self.take('-')
+            return 'const', -float(self.take(kind='number')[1])
+        token = self.take()
+        if token[0] == 'number':
+            return 'const', float(token[1])
+        if token[0] != 'name':
+            raise ValueError(f"expected a value at column {token[2] + 1}, got '{token[1]}'")
+        name = token[1].lower()
+        if name in FUNCTIONS and self.peek('('):
+            self.take('(')
+            param, sensors = self.parameter()
+            window = 0.0
+            if self.peek(','):
+                self.take(',')
+                window = self.duration()
+            self.take(')')
+            signal = (FUNCTIONS[name], param, sensors, window)
+        else:
+            self.position -= 1
+            param, sensors = self.parameter()
+            signal = (self.default_function, param, sensors, 0.0)
+        slot = self.slot(signal)
+        self.signals.add(slot)
+        return 'signal', slot
+
+    def parameter(self) -> Tuple[str, Optional[Tuple[Hashable, ...]]]:
+        token = self.take(kind='name')
+        param = token[1].lower()
+        if param not in PARAMETERS:
+            raise ValueError(f"unknown parameter '{token[1]}' at column {token[2] + 1}")
+        sensors = self.sensors
+        if self.peek() is not None and self.peek()[0] == 'selector':
+            keys = [key.strip() for key in self.take()[1][1:-1].split(',') if key.strip()]
+            if not keys:
+                raise ValueError(f"empty sensor selector after '{token[1]}'")
+            sensors = tuple(self.resolve(key) for key in keys)
+        return param, sensors
+
+    def duration(self) -> float:
+        amount = float(self.take(kind='number')[1])
+        token = self.peek()
+        unit = token[1].lower() if token is not None and token[0] == 'name' else None
+        if unit not in DURATION_UNITS:
+            raise ValueError(f"expected a duration unit (s, m, min, h) after {amount:g}")
+        self.take()
+        if amount <= 0:
+            raise ValueError("durations must be positive")
+        return amount * DURATION_UNITS[unit]
+
+    def normalize(self, node: Tuple, negated: bool = False) -> Tuple:
+        """
+        Push negations down to the comparisons (De Morgan, 'not a > b' -> 'a <= b').
+
+        A comparison with a missing value is unknown, and unknown must never
+        make a rule true, including through 'not'. Without negations above
+        them, and/or can only become true when every unknown comparison they
+        depend on could be false, so comparisons can simply read unknown as
+        false. A negated 'for' becomes ('not', timer, negated condition): it
+        is true only while the timer's condition is known to be false or has
+        not held long enough yet, and unknown (false) while it is unknown.
+        """
+        kind = node[0]
+        if kind == 'cmp':
+            return ('cmp', COMPARISONS[node[1]], node[2], node[3]) if negated else node
+        if kind == 'not':
+            return self.normalize(node[1], not negated)
+        if kind == 'for':
+            timer = ('for', self.normalize(node[1]), node[2])
+            return ('not', timer, self.normalize(node[1], True)) if negated else timer
+        if negated:
+            kind = 'or' if kind == 'and' else 'and'
+        return kind, [self.normalize(part, negated) for part in node[1]]
+
+    def function(self, node: Tuple) -> Evaluator:
+        """Compile a normalized tree to a function of (values, now)."""
+        timers: List[str] = []
+        expression = self.expression(node, timers)
+        name = f'_condition{len(self._namespace)}'
+        # Timers are called up front: each must see every evaluation, which
+        # a short-circuited and/or would skip
+        lines = [f'def {name}(v, now):'] + [f'    {line}' for line in timers] + [f'    return {expression}']
+        exec(compile('\n'.join(lines), f'<rule {self.text!r}>', 'exec'), self._namespace)
+        return self._namespace[name]
+
+    def expression(self, node: Tuple, timers: List[str]) -> str:
+        kind = node[0]
+        if kind == 'cmp':
+            _, op, (left_kind, a), (right_kind, b) = node
+            if left_kind == 'const':
+                return f'((x := v[{b}]) is not None and {a!r} {op} x)'
+            if right_kind == 'const':
+                return f'((x := v[{a}]) is not None and x {op} {b!r})'
+            return f'((x := v[{a}]) is not None and (y := v[{b}]) is not None and x {op} y)'
+        if kind == 'not':
+            # normalize() leaves 'not' only above timers
+            _, (_, inner, seconds), negated = node
+            return f'({self.timer(inner, seconds, negated, timers)} is False)'
+        if kind == 'for':
+            return self.timer(node[1], node[2], None, timers)
+        return '(' + f' {kind} '.join(self.expression(part, timers) for part in node[1]) + ')'
+
+    def timer(self, inner: Tuple, seconds: float, negated: Optional[Tuple], timers: List[str]) -> str:
+        """Add a 'for' timer, called before the expression; returns the local holding its result."""
+        held = self.hold(self.function(inner), seconds,
+                         self.function(negated) if negated is not None else None)
+        name = f'_timer{len(self._namespace)}'
+        self._namespace[name] = held
+        timers.append(f't{len(timers)} = {name}(v, now)')
+        return f't{len(timers) - 1}'
+
+    def hold(self, inner: Evaluator, seconds: float, inner_false: Optional[Evaluator] = None) -> Callable:
+        """
+        True once inner has been true continuously for seconds.
+
+        With inner_false (the negated condition, for a negated timer), the
+        result is None rather than False while the condition is unknown.
+        """
+        since = [None]
+        wake = self.wake
+        self.holds.append(since)
+
+        def held(values, now):
+            if not inner(values, now):
+                since[0] = None
+                if inner_false is not None and not inner_false(values, now):
+                    return None
+                return False
+            if since[0] is None:
+                since[0] = now
+            if now - since[0] >= seconds:
+                return True
+            wake[0] = min(wake[0], since[0] + seconds)
+            return False
+        return held
+
+
+class Rule:
+    """
+    One compiled rule: a condition and the state it requests for a target.
+
+    While the condition is true the rule asks for `state`; once it is false
+    it asks for `otherwise` (None = no request).
+    """
+
+    def __init__(self, name: str, when: str, target: Hashable, state: bool = True,
+                 otherwise: Optional[bool] = None, sensors: Optional[Iterable[Hashable]] = None,
+                 aggregate: str = 'median', spec: Optional[Dict] = None):
+        """
+        Args:
+            name: Rule name (logs, status)
+            when: Condition, e.g. 'avg(ec) > 2.0 and temperature > 28 for 10m'
+            target: What the rule switches (e.g. a relay port)
+            state: Requested state while the condition holds
+            otherwise: Requested state while it does not (None = none)
+            sensors: Zone for parameters without a [sensor] selector
+                     (None = every sensor)
+            aggregate: Zone aggregate for parameters used without a function
+            spec: Source settings, kept to detect unchanged rules on reload
+        """
+        self.name = name
+        self.when = when
+        self.target = target
+        self.state = bool(state)
+        self.otherwise = otherwise
+        self.sensors = tuple(sensors) if sensors is not None else None
+        self.aggregate = aggregate
+        self.spec = spec
+        self.active = False
+        self.since: Optional[float] = None
+        self.evaluator: Optional[Evaluator] = None
+        self.signals: Tuple[int, ...] = ()
+        self.wake = [math.inf]
+        self.holds: List[List[Optional[float]]] = []
+
+    @property
+    def request(self) -> Optional[bool]:
+        """State this rule currently asks for."""
+        return self.state if self.active else self.otherwise
+
+    def status(self) -> Dict:
+        return {
+            'when': self.when,
+            'target': self.target,
+            'active': self.active,
+            'request': self.request,
+            'since_change': round(time.monotonic() - self.since, 1) if self.since is not None else None,
+        }
+
+
+def _median(values: List[float]) -> float:
+    ordered = sorted(values)
+    middle = len(ordered) // 2
+    return ordered[middle] if len(ordered) % 2 else (ordered[middle - 1] + ordered[middle]) / 2
+
+
+# Zone aggregates over a list of values (builtins; this runs for every changed signal)
+AGGREGATES = {
+    'mean': lambda values: sum(values) / len(values),
+    'median': _median,
+    'min': min,
+    'max': max,
+}
+
+
+class RuleEngine:
+    """
+    Evaluates compiled rules incrementally, once per poll cycle.
+
+    Each cycle extracts the parameters the rules use from the sensors that
+    were read (or whose readings just went stale). Signals (a zone aggregate
+    of one parameter, optionally over a time window) are shared between
+    rules and recomputed only when one of their inputs changed value. A rule
+    is re-evaluated only when one of its signals changed or one of its 'for'
+    timers is due. Per target, the first rule (in load order) with a
+    request decides.
+    """
+
+    def __init__(self, max_age: float = 60.0, resolve: Optional[Callable[[str], Hashable]] = None):
+        """
+        Args:
+            max_age: Ignore readings older than this (seconds)
+            resolve: Maps a sensor name in a condition or zone to its snapshot key
+        """
+        self.max_age = max_age
+        self.resolve = resolve or (lambda key: key)
+        self.rules: List[Rule] = []
+        self.decisions: Dict[Hashable, Optional[Tuple[bool, str]]] = {}
+        self.evaluations = 0
+        self.last_duration = 0.0
+        self._signals: List[Signal] = []
+        self._slots: Dict[Signal, int] = {}
+        self._values: List[Optional[float]] = []
+        self._windows: Dict[int, TimeWindow] = {}
+        self._bases: Dict[int, int] = {}  # Windowed signal slot -> slot of its per-cycle value
+        self._dependents: List[List[Rule]] = []
+        self._params: Set[str] = set()
+        self._inputs: Dict[Hashable, Dict[str, float]] = {}  # Usable values per sensor
+        self._by_input: Dict[Tuple[Hashable, str], List[int]] = {}  # Zone signals per (sensor, param)
+        self._by_param: Dict[str, List[int]] = {}  # Signals over every sensor, per param
+        self._expiry: Dict[Hashable, float] = {}  # When each sensor's reading exceeds max_age
+        self._by_target: Dict[Hashable, List[Rule]] = {}
+        self._timers: List[Tuple[float, int, Rule]] = []
+        self._pending: Optional[List[Rule]] = None  # Rules to evaluate on the next cycle regardless
+
+    def compile(self, rules: Iterable[Rule]) -> 'RuleEngine':
+        """
+        Build an engine for a new rule set, keeping the state of unchanged rules.
+
+        Everything is parsed and validated before anything is returned, so a
+        rule set with an error never replaces a working one.
+
+        Returns:
+            A new RuleEngine; publish it with a single reference assignment
+        """
+        engine = RuleEngine(self.max_age, self.resolve)
+        previous = {rule.name: rule for rule in self.rules}
+        names = set()
+        for rule in rules:
+            if rule.name in names:
+                raise ValueError(f"duplicate rule name '{rule.name}'")
+            names.add(rule.name)
+            old = previous.get(rule.name)
+            engine._add(rule)
+            if old is not None and old.spec == rule.spec and rule.spec is not None:
+                # Unchanged rule: keep whether it holds and its running 'for' timers
+                rule.active, rule.since = old.active, old.since
+                for hold, old_hold in zip(rule.holds, old.holds):
+                    hold[0] = old_hold[0]
+        # Decisions already applied; the first update reports what the new rules change
+        engine.decisions = dict(self.decisions)
+        engine._pending = list(engine.rules)
+        # Windowed signals continue from the previous engine's samples
+        for slot in engine._windows:
+            old_slot = self._slots.get(engine._signals[slot])
+            if old_slot is not None:
+                engine._windows[slot] = self._windows[old_slot]
+        return engine
+
+    def _slot(self, signal: Signal) -> int:
+        slot = self._slots.get(signal)
+        if slot is not None:
+            return slot
+        function, param, sensors, window = signal
+        if window > 0:
+            # A windowed signal samples the same zone aggregate without window every cycle
+            base = self._slot((function, param, sensors, 0.0))
+        slot = len(self._signals)
+        self._signals.append(signal)
+        self._slots[signal] = slot
+        self._values.append(None)
+        self._dependents.append([])
+        if window > 0:
+            self._bases[slot] = base
+            self._windows[slot] = TimeWindow(function, window)
+        elif sensors is None:
+            self._by_param.setdefault(param, []).append(slot)
+        else:
+            for key in set(sensors):
+                self._by_input.setdefault((key, param), []).append(slot)
+        self._params.add(param)
+        return slot
+
+    def _add(self, rule: Rule):
+        if rule.aggregate not in AGGREGATES:
+            raise ValueError(f"rule '{rule.name}': invalid aggregate '{rule.aggregate}'")
+        sensors = tuple(self.resolve(str(key)) for key in rule.sensors) if rule.sensors is not None else None
+        try:
+            parser = _Parser(rule.when, rule.aggregate, sensors, lambda key: self.resolve(key), self._slot)
+            rule.evaluator = parser.parse()
+        except ValueError as e:
+            raise ValueError(f"rule '{rule.name}': {e}") from None
+        rule.wake = parser.wake
+        rule.holds = parser.holds
+        rule.signals = tuple(sorted(parser.signals))
+        for slot in rule.signals:
+            self._dependents[slot].append(rule)
+        self.rules.append(rule)
+        self._by_target.setdefault(rule.target, []).append(rule)
+
+    def _read_inputs(self, snapshot) -> Set[int]:
+        """Refresh the per-sensor inputs; returns the zone signals with a changed input."""
+        entries, updated = snapshot.entries, snapshot.updated
+        clock = time.monotonic()
+        stale = [key for key, expiry in self._expiry.items() if clock >= expiry]
+        if self._pending is not None:
+            # Freshly compiled: start from every cached reading, not just this cycle's
+            updated = updated.union(entries)
+        affected: Set[int] = set()
+        for key in updated.union(stale) if stale else updated:
+            entry = entries.get(key)
+            previous = self._inputs.get(key, {})
+            current = {}
+            if entry is not None and entry.data.is_valid and entry.age <= self.max_age:
+                data = entry.data
+                for param in self._params:
+                    value = getattr(data, param)
+                    if value is not None:
+                        current[param] = value
+            if current:
+                self._inputs[key] = current
+                self._expiry[key] = entry.fetched_at + self.max_age
+            else:
+                self._inputs.pop(key, None)
+                self._expiry.pop(key, None)
+            if current == previous:
+                continue
+            for param in self._params:
+                if current.get(param) != previous.get(param):
+                    affected.update(self._by_input.get((key, param), ()))
+                    affected.update(self._by_param.get(param, ()))
+        return affected
+
+    def _compute(self, signal: Signal) -> Optional[float]:
+        function, param, sensors, _ = signal
+        inputs = self._inputs
+        if sensors is None:
+            values = [value for value in (values.get(param) for values in inputs.values()) if value is not None]
+        else:
+            values = [value for value in (inputs[key].get(param) for key in sensors if key in inputs)
+                      if value is not None]
+        return AGGREGATES[function](values) if values else None
+
+    def _decide(self, target: Hashable) -> Optional[Tuple[bool, str]]:
+        for rule in self._by_target.get(target, ()):
+            if rule.request is not None:
+                return rule.request, f"rule {rule.name}"
+        return None
+
+    def update(self, snapshot, now: Optional[float] = None) -> Dict[Hashable, Optional[Tuple[bool, str]]]:
+        """
+        Update signals for a poll snapshot and evaluate the affected rules.
+
+        Returns:
+            Targets whose decision changed, mapped to (state, reason), or to
+            None once no rule requests anything for them
+        """
+        start = time.perf_counter()
+        now = now if now is not None else time.monotonic()
+        values = self._values
+        changed: Set[int] = set()
+        for slot in self._read_inputs(snapshot):
+            value = self._compute(self._signals[slot])
+            if value != values[slot]:
+                values[slot] = value
+                changed.add(slot)
+        for slot, window in self._windows.items():
+            base = values[self._bases[slot]]
+            if base is not None:
+                window.push(now, base)
+            window.expire(now)
+            value = window.value()
+            if value != values[slot]:
+                values[slot] = value
+                changed.add(slot)
+
+        due: Set[Rule] = set()
+        targets = set()
+        if self._pending is not None:
+            due.update(self._pending)
+            targets.update(self.decisions)
+            targets.update(self._by_target)
+            self._pending = None
+        for slot in changed:
+            due.update(self._dependents[slot])
+        timers = self._timers
+        while timers and timers[0][0] <= now:
+            due.add(heapq.heappop(timers)[2])
+
+        for rule in due:
+            wake = rule.wake
+            wake[0] = math.inf
+            active = rule.evaluator(values, now)
+            if wake[0] < math.inf:
+                heapq.heappush(timers, (wake[0], id(rule), rule))
+            if active != rule.active:
+                rule.active = active
+                rule.since = now
+                targets.add(rule.target)
+                logger.info(f"Rule {rule.name}: {'active' if active else 'inactive'}")
+        self.evaluations = len(due)
+        RULE_EVALUATIONS.inc(len(due))
+
+        decisions = {}
+        for target in targets:
+            decision = self._decide(target)
+            if decision != self.decisions.get(target):
+                self.decisions[target] = decision
+                decisions[target] = decision
+        self.last_duration = time.perf_counter() - start
+        RULE_CYCLE_SECONDS.observe(self.last_duration)
+        return decisions
+
+    def status(self) -> Dict:
+        return {
+            'rules': {rule.name: rule.status() for rule in self.rules},
+            'signals': len(self._signals),
+            'evaluations': self.evaluations,
+            'last_duration_ms': round(self.last_duration * 1000, 3),
+        }
+
+
+def parse_state(value, name: str) -> Optional[bool]:
+    """Rule state setting: true/false, 'on'/'off' or None."""
+    if value is None or isinstance(value, bool):
+        return value
+    text = str(value).lower()
+    if text in ('on', 'true', '1'):
+        return True
+    if text in ('off', 'false', '0'):
+        return False
+    raise ValueError(f"Invalid {name} '{value}', must be on or off")
+
+
+def rules_from_config(config, targets: Optional[Iterable[Hashable]] = None) -> List[Rule]:
+    """
+    Build rules from a RULES_CONFIG style mapping (or a bare list of rules).
+
+    Each rule is a mapping with 'name', 'when', 'relay' (the target), and
+    optionally 'state' (default on), 'else', 'sensors' and 'aggregate'.
+
+    Args:
+        config: {'rules': [...]} or [...]
+        targets: Valid targets (None = any)
+    """
+    items = config.get('rules', []) if isinstance(config, dict) else config
+    allowed = set(targets) if targets is not None else None
+    rules = []
+    for index, item in enumerate(items or []):
+        name = str(item.get('name') or f"rule{index + 1}")
+        unknown = set(item) - {'name', 'when', 'relay', 'state', 'else', 'sensors', 'aggregate'}
+        if unknown:
+            raise ValueError(f"rule '{name}': unknown settings: {', '.join(sorted(unknown))}")
+        if not item.get('when') or 'relay' not in item:
+            raise ValueError(f"rule '{name}': 'when' and 'relay' are required")
+        try:
+            target = int(item['relay'])  # "relay": "2" from YAML/JSON/env
+        except (TypeError, ValueError):
+            raise ValueError(f"rule '{name}': relay must be a port number, got {item['relay']!r}") from None
+        if allowed is not None and target not in allowed:
+            raise ValueError(f"rule '{name}': unknown relay {target}")
+        rules.append(Rule(
+            name, str(item['when']), target,
+            state=parse_state(item.get('state', True), 'state'),
+            otherwise=parse_state(item.get('else'), 'else'),
+            sensors=item.get('sensors'),
+            aggregate=item.get('aggregate', 'median'),
+            spec=dict(item),
+        ))
+    return rules
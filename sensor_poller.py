@@ -0,0 +1,226 @@
+"""
+Background sensor poller for the soil monitoring service.
+Drives the Modbus bus, samples all sensors on a fixed schedule and publishes
+an immutable snapshot that the Flask routes read without touching the bus.
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, FrozenSet, Hashable, List, Optional
+
+from metrics import REGISTRY
+from modbus_sensor import ModbusNPKReader, SensorData
+from reading_cache import CachedReading, ReadingCache
+
+logger = logging.getLogger(__name__)
+
+POLL_CYCLE_SECONDS = REGISTRY.histogram(
+    'poll_cycle_seconds', 'Time to read all due sensors in one poll cycle',
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0))
+
+
+class SensorSnapshot:
+    """Immutable result of one poll cycle, shared by all request threads."""
+
+    def __init__(self, entries: Dict[Hashable, CachedReading], cycle: int = 0,
+                 timestamp: Optional[str] = None, duration: float = 0.0,
+                 updated: Optional[FrozenSet[Hashable]] = None,
+                 unfiltered: Optional[Dict[Hashable, SensorData]] = None):
+        """
+        Args:
+            entries: Mapping of sensor key to the cache entry served for this cycle
+            cycle: Monotonic poll cycle counter (0 = nothing polled yet)
+            timestamp: ISO timestamp at which the cycle completed
+            duration: Time spent on the bus for this cycle, in seconds
+            updated: Keys read in this cycle (default: all entries)
+            unfiltered: Readings of this cycle as read, before the cache's
+                        signal filters (default: none)
+        """
+        self.entries = entries
+        self.updated = updated if updated is not None else frozenset(entries)
+        self.unfiltered = unfiltered if unfiltered is not None else {}
+        self.cycle = cycle
+        self.timestamp = timestamp
+        self.duration = duration
+
+    @property
+    def readings(self) -> Dict[Hashable, SensorData]:
+        """Mapping of sensor key to the SensorData served for this cycle."""
+        return {key: entry.data for key, entry in self.entries.items()}
+
+    def get(self, key: Hashable) -> Optional[Dict]:
+        """Return the serialized reading for a sensor, or None if not polled."""
+        entry = self.entries.get(key)
+        return entry.to_dict() if entry else None
+
+
+class BackgroundSource(threading.Thread):
+    """
+    Samples a sensor outside the Modbus buses (e.g. a DHT22) on its own thread.
+
+    Blocking reads and their retry sleeps stay in this thread. The latest
+    reading is handed to the SensorPoller, which publishes it with the next
+    poll cycle, so it reaches the snapshot, history, stream and control
+    loops like any bus reading.
+    """
+
+    def __init__(self, key: Hashable, read: Callable[[], SensorData], interval: float = 10.0):
+        """
+        Args:
+            key: Sensor key in the snapshot
+            read: Takes one reading (may block)
+            interval: Seconds between the start of consecutive reads
+        """
+        super().__init__(name=f'source-{key}', daemon=True)
+        self.key = key
+        self.read = read
+        self.interval = interval
+        self._latest: Optional[SensorData] = None
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def take(self) -> Optional[SensorData]:
+        """Return the reading taken since the last call, if any."""
+        with self._lock:
+            data, self._latest = self._latest, None
+        return data
+
+    def run(self):
+        logger.info(f"Source {self.key} started (interval {self.interval}s)")
+        next_run = time.monotonic()
+        while not self._stop_event.is_set():
+            try:
+                data = self.read()
+                with self._lock:
+                    self._latest = data
+            except Exception as e:
+                logger.error(f"Source {self.key} read failed: {e}")
+            next_run = max(next_run + self.interval, time.monotonic())
+            self._stop_event.wait(next_run - time.monotonic())
+
+    def stop(self, timeout: Optional[float] = None):
+        """Stop sampling (waits for a read in progress)."""
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+
+
+class SensorPoller(threading.Thread):
+    """
+    Daemon thread that polls all sensors on a fixed schedule.
+
+    The poller is the only scheduled source of bus traffic, so load on the
+    bus is independent of how many clients are connected. Each cycle
+    replaces the published snapshot with a single reference assignment,
+    which readers pick up without locking.
+    """
+
+    def __init__(self, reader: ModbusNPKReader, interval: float = 5.0,
+                 cache: Optional[ReadingCache] = None):
+        """
+        Args:
+            reader: Connected ModbusNPKReader, or a BusArbiter/BusManager in front of readers
+            interval: Seconds between the start of consecutive poll cycles
+            cache: ReadingCache to publish into, which also applies any
+                   signal filters (a non-fallback cache is created when omitted)
+        """
+        super().__init__(name='sensor-poller', daemon=True)
+        self.reader = reader
+        self.interval = interval
+        self.cache = cache if cache is not None else ReadingCache(ttl=interval * 2, fallback=False)
+        self._snapshot = SensorSnapshot({})
+        self._listeners: List[Callable[[SensorSnapshot], None]] = []
+        self._sources: List[BackgroundSource] = []
+        self._stop_event = threading.Event()
+
+    @property
+    def snapshot(self) -> SensorSnapshot:
+        """Most recently published snapshot (never blocks)."""
+        return self._snapshot
+
+    def add_listener(self, callback: Callable[[SensorSnapshot], None]):
+        """
+        Register a callback invoked from the poller thread after each cycle.
+
+        Args:
+            callback: Function taking the newly published SensorSnapshot
+        """
+        self._listeners.append(callback)
+
+    def add_source(self, source: BackgroundSource):
+        """
+        Publish the readings of a background source with the poll cycles.
+
+        The source is started and stopped together with the poller.
+        """
+        self._sources.append(source)
+        self.cache.set_external(source.key)
+        if self.is_alive() and not source.is_alive():
+            source.start()
+
+    def poll_once(self) -> SensorSnapshot:
+        """Read all sensors once and publish the result."""
+        # Readers with per-sensor poll intervals only return the sensors that were due
+        read = getattr(self.reader, 'read_due_sensors', self.reader.read_all_sensors)
+        start = time.monotonic()
+        readings = dict(read())
+        duration = time.monotonic() - start
+        POLL_CYCLE_SECONDS.observe(duration)
+        for source in self._sources:
+            data = source.take()
+            if data is not None:
+                readings[source.key] = data
+
+        entries = dict(self._snapshot.entries)
+        for key, data in readings.items():
+            entries[key] = self.cache.update(data, key)
+        snapshot = SensorSnapshot(
+            entries,
+            cycle=self._snapshot.cycle + 1,
+            timestamp=datetime.now().isoformat(),
+            duration=duration,
+            updated=frozenset(readings),
+            unfiltered=readings
+        )
+        self._snapshot = snapshot
+        logger.debug(f"Poll cycle {snapshot.cycle} completed in {duration * 1000:.1f} ms")
+
+        for callback in self._listeners:
+            try:
+                callback(snapshot)
+            except Exception as e:
+                logger.error(f"Poll listener error: {e}")
+        return snapshot
+
+    def run(self):
+        """Poll on a fixed schedule until stop() is called."""
+        logger.info(f"Sensor poller started (interval {self.interval}s)")
+        for source in self._sources:
+            if not source.is_alive():
+                source.start()
+        next_run = time.monotonic()
+        while not self._stop_event.is_set():
+            try:
+                self.poll_once()
+            except Exception as e:
+                logger.error(f"Poll cycle failed: {e}")
+
+            next_run += self.interval
+            delay = next_run - time.monotonic()
+            if delay < 0:
+                # Cycle overran the interval; skip missed slots instead of bursting
+                logger.warning(f"Poll cycle overran interval by {-delay:.2f}s")
+                next_run = time.monotonic()
+                delay = 0
+            self._stop_event.wait(delay)
+        logger.info("Sensor poller stopped")
+
+    def stop(self, timeout: Optional[float] = None):
+        """Signal the poller to exit and wait for the current cycle to finish."""
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+        for source in self._sources:
+            source.stop(timeout)
@@ -0,0 +1,156 @@
+"""
+Declarative sensor registry loaded once at startup.
+Lists each bus, its slave IDs, register maps, scale factors, calibration
+entries and poll intervals, so sensors can be added without code changes.
+"""
+
+import logging
+from typing import Dict, List, Optional
+
+from bus_manager import BusConfig
+from config_watcher import load_config_file
+from modbus_sensor import DE_RE_TIMED, DEFAULT_MAX_GAP, DEFAULT_REGISTER_MAP, RegisterMap
+
+logger = logging.getLogger(__name__)
+
+# Register maps available to every registry file without being declared
+BUILTIN_REGISTER_MAPS = {
+    'npk7': DEFAULT_REGISTER_MAP,
+}
+
+
+class SensorSpec:
+    """One registered sensor (immutable after loading)."""
+
+    __slots__ = ('key', 'bus', 'slave', 'register_map', 'poll_interval', 'param_intervals',
+                 'calibration_id')
+
+    def __init__(self, key: str, bus: str, slave: int, register_map: RegisterMap,
+                 poll_interval: Optional[float] = None, calibration_id=None,
+                 param_intervals: Optional[Dict[str, float]] = None):
+        self.key = key
+        self.bus = bus
+        self.slave = slave
+        self.register_map = register_map
+        self.poll_interval = poll_interval
+        self.param_intervals = param_intervals
+        self.calibration_id = calibration_id if calibration_id is not None else slave
+
+    def to_dict(self) -> Dict:
+        """Convert to dictionary for JSON serialization."""
+        return {
+            'key': self.key,
+            'bus': self.bus,
+            'slave': self.slave,
+            'parameters': [param for param, _, _ in self.register_map.fields],
+            'poll_interval': self.poll_interval,
+            'param_intervals': self.param_intervals,
+            'calibration_id': self.calibration_id,
+        }
+
+
+class SensorRegistry:
+    """Buses and sensors with an index by sensor key."""
+
+    def __init__(self, buses: List[BusConfig], sensors: List[SensorSpec]):
+        self.buses = buses
+        self.sensors = tuple(sensors)
+        self.index: Dict[str, SensorSpec] = {spec.key: spec for spec in self.sensors}
+
+    def get(self, key: str) -> Optional[SensorSpec]:
+        """Look up a sensor by its 'room/bus/slave' key."""
+        return self.index.get(key)
+
+    @property
+    def keys(self) -> List[str]:
+        """All sensor keys in file order."""
+        return [spec.key for spec in self.sensors]
+
+
+def _compile_register_map(spec: Dict) -> RegisterMap:
+    """Build a RegisterMap from its declarative form."""
+    fields = [(param, field['offset'], field.get('scale', 1.0))
+              for param, field in spec['params'].items()]
+    return RegisterMap(spec['start'], spec['count'], fields, function=spec.get('function', 'holding'))
+
+
+def build_registry(config: Dict, defaults: Optional[Dict] = None) -> SensorRegistry:
+    """
+    Build a SensorRegistry from a parsed registry document.
+
+    Args:
+        config: Parsed registry ({'register_maps': {...}, 'buses': [...]})
+        defaults: Fallback bus settings (baudrate, timeout, max_gap,
+                  de_re_mode, poll_interval, param_intervals)
+
+    Returns:
+        SensorRegistry
+    """
+    defaults = defaults or {}
+    # Sensors with identical layouts share one RegisterMap instance
+    interned = {register_map.key(): register_map for register_map in BUILTIN_REGISTER_MAPS.values()}
+    maps = dict(BUILTIN_REGISTER_MAPS)
+    for name, spec in config.get('register_maps', {}).items():
+        register_map = _compile_register_map(spec)
+        maps[name] = interned.setdefault(register_map.key(), register_map)
+
+    buses = []
+    sensors = []
+    for bus in config.get('buses', []):
+        bus_config = BusConfig(
+            bus['port'],
+            room=bus.get('room', 'default'),
+            name=bus.get('name'),
+            baudrate=bus.get('baudrate', defaults.get('baudrate', 9600)),
+            gpio_de_re=bus.get('gpio_de_re'),
+            timeout=bus.get('timeout', defaults.get('timeout', 1.0)),
+            slaves=(),
+            max_gap=bus.get('max_gap', defaults.get('max_gap', DEFAULT_MAX_GAP)),
+            de_re_mode=bus.get('de_re_mode', defaults.get('de_re_mode', DE_RE_TIMED))
+        )
+        for sensor in bus.get('sensors', []):
+            if not sensor.get('enabled', True):
+                continue
+            slave = int(sensor['slave'])
+            map_name = sensor.get('register_map', 'npk7')
+            if map_name not in maps:
+                raise ValueError(f"Bus {bus_config.label} slave {slave}: unknown register map '{map_name}'")
+            register_map = maps[map_name]
+            if sensor.get('scale'):
+                scales = sensor['scale']
+                register_map = RegisterMap(
+                    register_map.start, register_map.count,
+                    [(param, offset, scales.get(param, scale)) for param, offset, scale in register_map.fields],
+                    function=register_map.function
+                )
+            register_map = interned.setdefault(register_map.key(), register_map)
+
+            poll_interval = sensor.get('poll_interval', bus.get('poll_interval', defaults.get('poll_interval')))
+            param_intervals = sensor.get('param_intervals',
+                                         bus.get('param_intervals', defaults.get('param_intervals')))
+            spec = SensorSpec(bus_config.key(slave), bus_config.label, slave, register_map,
+                              poll_interval=poll_interval, calibration_id=sensor.get('calibration'),
+                              param_intervals=param_intervals)
+            if any(existing.key == spec.key for existing in sensors):
+                raise ValueError(f"Duplicate sensor {spec.key} in registry")
+            bus_config.add_sensor(slave, register_map, spec.calibration_id, poll_interval, param_intervals)
+            sensors.append(spec)
+        buses.append(bus_config)
+
+    return SensorRegistry(buses, sensors)
+
+
+def load_registry(path: str, defaults: Optional[Dict] = None) -> SensorRegistry:
+    """
+    Load a registry file (.json, .yaml/.yml or .toml).
+
+    Args:
+        path: Registry file path
+        defaults: Fallback bus settings (baudrate, timeout, max_gap,
+                  de_re_mode, poll_interval, param_intervals)
+    """
+    config = load_config_file(path)
+    registry = build_registry(config, defaults)
+    logger.info(f"Loaded sensor registry {path}: {len(registry.buses)} buses, "
+                f"{len(registry.sensors)} sensors")
+    return registry
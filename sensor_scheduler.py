@@ -0,0 +1,252 @@
+"""
+Adaptive per-sensor poll scheduler.
+Tracks the health of every slave so that absent or flaky devices are backed
+off and probed in the background instead of stalling the scan of healthy ones.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+from modbus_sensor import SensorData
+
+logger = logging.getLogger(__name__)
+
+# Slave states
+STATE_HEALTHY = 'healthy'   # Read every time it is due; the scan waits for it
+STATE_SUSPECT = 'suspect'   # Failed recently; single-attempt reads in the background
+STATE_OPEN = 'open'         # Circuit open; only probed after its backoff expires
+
+# submit(key, params, retries, priority) -> Future[SensorData]
+SubmitFunc = Callable[[Hashable, Optional[Tuple[str, ...]], int, int], Future]
+
+
+class SlaveHealth:
+    """Schedule and health counters of one slave."""
+
+    __slots__ = ('key', 'sensor_id', 'params', 'intervals', 'next_due', 'state', 'failures',
+                 'open_until', 'in_flight', 'last_data', 'last_ok', 'last_error', 'reads', 'errors')
+
+    def __init__(self, key: Hashable, sensor_id: int, params: Iterable[str], intervals: Dict[str, float]):
+        """
+        Args:
+            key: Sensor key used by the bus front-end
+            sensor_id: Modbus slave ID
+            params: Parameters the slave provides
+            intervals: Minimum seconds between reads per parameter
+                       (parameters without one are read on every poll)
+        """
+        self.key = key
+        self.sensor_id = sensor_id
+        self.params = tuple(params)
+        self.intervals = intervals
+        self.next_due: Dict[str, float] = {}
+        self.state = STATE_HEALTHY
+        self.failures = 0
+        self.open_until = 0.0
+        self.in_flight = False
+        self.last_data: Optional[SensorData] = None
+        self.last_ok: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.reads = 0
+        self.errors = 0
+
+    def due(self, now: float) -> Tuple[str, ...]:
+        """Parameters whose interval has elapsed."""
+        return tuple(param for param in self.params if now >= self.next_due.get(param, 0.0))
+
+
+class PollScheduler:
+    """
+    Decides which slaves and parameters to read on each poll.
+
+    - Healthy slaves are read with full retries and the poll waits for them
+    - A slave that fails becomes suspect: it is read with a single attempt
+      at probe priority and the poll does not wait for the result, which is
+      returned by a later poll()
+    - After failure_threshold consecutive failures the circuit opens and the
+      slave is only probed after an exponential backoff
+      (backoff_base, doubling up to backoff_max)
+    - Slow-changing parameters can have their own interval (e.g. NPK every
+      few minutes, temperature every poll); only the due parameters are read
+      and the others are carried over from the previous reading
+
+    Probes run after every healthy read queued in the same poll, so a dead
+    slave can delay a healthy one by at most one single-attempt timeout.
+    """
+
+    def __init__(self, submit: SubmitFunc, poll_priority: int, probe_priority: int,
+                 retries: int = 3, failure_threshold: int = 3,
+                 backoff_base: float = 30.0, backoff_max: float = 600.0):
+        """
+        Args:
+            submit: Queues a read and returns a Future of SensorData
+            poll_priority: Queue priority of reads of healthy slaves
+            probe_priority: Queue priority of background reads and probes
+            retries: Attempts per read of a healthy slave
+            failure_threshold: Consecutive failures before the circuit opens
+            backoff_base: First backoff after the circuit opens, in seconds
+            backoff_max: Maximum backoff between probes, in seconds
+        """
+        self.submit = submit
+        self.poll_priority = poll_priority
+        self.probe_priority = probe_priority
+        self.retries = retries
+        self.failure_threshold = failure_threshold
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._slaves: Dict[Hashable, SlaveHealth] = {}
+        self._completed: Dict[Hashable, SensorData] = {}
+        self._lock = threading.Lock()
+
+    def add(self, key: Hashable, sensor_id: int, params: Iterable[str],
+            interval: Optional[float] = None, param_intervals: Optional[Dict[str, float]] = None):
+        """
+        Register a slave.
+
+        Args:
+            key: Sensor key passed back to submit()
+            sensor_id: Modbus slave ID
+            params: Parameters the slave provides
+            interval: Default minimum seconds between reads (None = every poll)
+            param_intervals: Per-parameter overrides of interval
+        """
+        params = tuple(params)
+        intervals = {param: interval for param in params} if interval else {}
+        for param, value in (param_intervals or {}).items():
+            if param in params and value:
+                intervals[param] = value
+        self._slaves[key] = SlaveHealth(key, sensor_id, params, intervals)
+
+    def poll(self) -> Dict[Hashable, SensorData]:
+        """
+        Read every due slave.
+
+        Returns:
+            Readings of the healthy slaves read now, plus any background reads
+            that completed since the previous poll
+        """
+        now = time.monotonic()
+        waiting = {}
+        for slave in self._slaves.values():
+            with self._lock:
+                if slave.in_flight:
+                    continue
+                if slave.state == STATE_OPEN:
+                    if now < slave.open_until:
+                        continue
+                    due = slave.params
+                else:
+                    due = slave.due(now)
+                if not due:
+                    continue
+                slave.in_flight = True
+
+            for param in due:
+                if param in slave.intervals:
+                    slave.next_due[param] = now + slave.intervals[param]
+            params = None if len(due) == len(slave.params) else due
+            if slave.state == STATE_HEALTHY:
+                waiting[slave.key] = (slave, due, self.submit(slave.key, params, self.retries, self.poll_priority))
+            else:
+                future = self.submit(slave.key, params, 1, self.probe_priority)
+                future.add_done_callback(lambda f, slave=slave, due=due: self._on_background_done(slave, due, f))
+
+        with self._lock:
+            readings, self._completed = self._completed, {}
+        for key, (slave, due, future) in waiting.items():
+            readings[key] = self._record(slave, due, self._result(slave, future))
+        return readings
+
+    def _result(self, slave: SlaveHealth, future: Future) -> SensorData:
+        """Wait for a read, turning an exception into a failed reading."""
+        try:
+            return future.result()
+        except Exception as e:
+            data = SensorData(slave.sensor_id)
+            data.error = str(e)
+            return data
+
+    def _on_background_done(self, slave: SlaveHealth, due: Tuple[str, ...], future: Future):
+        """Record a background read and hand it to the next poll()."""
+        data = self._record(slave, due, self._result(slave, future))
+        with self._lock:
+            self._completed[slave.key] = data
+
+    def _record(self, slave: SlaveHealth, due: Tuple[str, ...], data: SensorData) -> SensorData:
+        """Update the slave's health from a finished read."""
+        with self._lock:
+            slave.in_flight = False
+            slave.reads += 1
+            if data.is_valid:
+                if slave.state != STATE_HEALTHY:
+                    logger.info(f"Sensor {slave.key}: responding again after {slave.failures} failed reads")
+                slave.state = STATE_HEALTHY
+                slave.failures = 0
+                slave.last_ok = time.time()
+                slave.last_error = None
+                if len(due) < len(slave.params) and slave.last_data is not None:
+                    self._carry_over(slave, data, due)
+                slave.last_data = data
+                return data
+
+            slave.errors += 1
+            slave.failures += 1
+            slave.last_error = data.error
+            for param in due:
+                slave.next_due[param] = 0.0  # Retry as soon as the slave is read again
+            if slave.failures >= self.failure_threshold:
+                backoff = min(self.backoff_base * 2 ** (slave.failures - self.failure_threshold),
+                              self.backoff_max)
+                slave.open_until = time.monotonic() + backoff
+                if slave.state != STATE_OPEN:
+                    logger.warning(f"Sensor {slave.key}: no response after {slave.failures} reads, "
+                                   f"probing every {backoff:.0f}s or more")
+                slave.state = STATE_OPEN
+            else:
+                slave.state = STATE_SUSPECT
+            return data
+
+    @staticmethod
+    def _carry_over(slave: SlaveHealth, data: SensorData, due: Tuple[str, ...]):
+        """Copy the parameters that were not due from the slave's previous reading."""
+        previous = slave.last_data
+        carried = tuple(param for param in slave.params if param not in due)
+        for param in carried:
+            setattr(data, param, getattr(previous, param))
+            setattr(data, f'{param}_raw', getattr(previous, f'{param}_raw'))
+        data.carried_params = carried
+
+    def unavailable(self, key: Hashable) -> Optional[str]:
+        """
+        Return an error message if the slave's circuit is open.
+
+        Lets interactive reads fail fast instead of waiting on a dead slave.
+        """
+        slave = self._slaves.get(key)
+        if slave is None or slave.state != STATE_OPEN:
+            return None
+        wait = max(slave.open_until - time.monotonic(), 0.0)
+        return f"Sensor {slave.sensor_id} not responding (next probe in {wait:.0f}s)"
+
+    def status(self) -> Dict[Hashable, Dict]:
+        """Per-slave health for the status endpoint."""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                key: {
+                    'state': slave.state,
+                    'failures': slave.failures,
+                    'reads': slave.reads,
+                    'errors': slave.errors,
+                    'last_ok': datetime.fromtimestamp(slave.last_ok).isoformat() if slave.last_ok else None,
+                    'last_error': slave.last_error,
+                    'next_probe_in': (round(max(slave.open_until - now, 0.0), 1)
+                                      if slave.state == STATE_OPEN else None),
+                    'param_intervals': dict(slave.intervals),
+                }
+                for key, slave in self._slaves.items()
+            }
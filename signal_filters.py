@@ -0,0 +1,223 @@
+"""
+Streaming filters for sensor readings.
+A filter chain per sensor and parameter (rolling median, EWMA, 1-D Kalman)
+smooths readings as they are stored in the reading cache, so spikes and
+read-to-read jitter never reach the API, event stream or control loops.
+History keeps the unfiltered values, consistent with their raw values.
+"""
+
+import copy
+import logging
+import threading
+from bisect import bisect_left, insort
+from collections import deque
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+from modbus_sensor import PARAMETERS, SensorData
+
+logger = logging.getLogger(__name__)
+
+
+class MedianFilter:
+    """
+    Rolling median over the last `window` samples.
+
+    Rejects spikes shorter than half the window outright, at the cost of a
+    delay of about half a window on genuine steps. The window is a ring
+    buffer plus a sorted copy, so an update is one bisect insert and one
+    bisect delete (O(window) moves, trivial for the 3-9 samples used here).
+    """
+
+    __slots__ = ('window', '_ring', '_sorted')
+
+    def __init__(self, window: int = 5):
+        if window < 1:
+            raise ValueError("Median window must be at least 1")
+        self.window = window
+        self._ring: deque = deque()
+        self._sorted: List[float] = []
+
+    def update(self, value: float) -> float:
+        if len(self._ring) == self.window:
+            oldest = self._ring.popleft()
+            del self._sorted[bisect_left(self._sorted, oldest)]
+        self._ring.append(value)
+        insort(self._sorted, value)
+        n = len(self._sorted)
+        middle = n // 2
+        return self._sorted[middle] if n % 2 else (self._sorted[middle - 1] + self._sorted[middle]) / 2
+
+
+class EWMAFilter:
+    """Exponentially weighted moving average, y += alpha * (x - y)."""
+
+    __slots__ = ('alpha', 'value')
+
+    def __init__(self, alpha: float = 0.3):
+        if not 0 < alpha <= 1:
+            raise ValueError("EWMA alpha must be in (0, 1]")
+        self.alpha = alpha
+        self.value: Optional[float] = None
+
+    def update(self, value: float) -> float:
+        if self.value is None:
+            self.value = value
+        else:
+            self.value += self.alpha * (value - self.value)
+        return self.value
+
+
+class KalmanFilter:
+    """
+    1-D Kalman filter for a slowly drifting value (random-walk model).
+
+    process_variance is how much the true value may change per sample,
+    measurement_variance the sensor's noise; their ratio sets the smoothing.
+    """
+
+    __slots__ = ('process_variance', 'measurement_variance', 'value', 'variance')
+
+    def __init__(self, process_variance: float = 0.01, measurement_variance: float = 1.0):
+        if process_variance <= 0 or measurement_variance <= 0:
+            raise ValueError("Kalman variances must be positive")
+        self.process_variance = process_variance
+        self.measurement_variance = measurement_variance
+        self.value: Optional[float] = None
+        self.variance = 0.0
+
+    def update(self, value: float) -> float:
+        if self.value is None:
+            self.value = value
+            self.variance = self.measurement_variance
+            return value
+        predicted = self.variance + self.process_variance
+        gain = predicted / (predicted + self.measurement_variance)
+        self.value += gain * (value - self.value)
+        self.variance = (1 - gain) * predicted
+        return self.value
+
+
+# Filter name -> (class, argument converters)
+FILTERS = {
+    'median': (MedianFilter, (int,)),
+    'ewma': (EWMAFilter, (float,)),
+    'kalman': (KalmanFilter, (float, float)),
+}
+
+Stage = Tuple[str, Tuple]
+
+
+def parse_chain(spec: str) -> List[Stage]:
+    """
+    Parse a filter chain such as 'median:5,ewma:0.3' or 'median:5,kalman:0.01:0.5'.
+
+    Arguments after the name are optional and are passed to the filter in
+    order (median window; EWMA alpha; Kalman process and measurement variance).
+    """
+    stages = []
+    for part in spec.split(','):
+        name, *args = [token.strip() for token in part.split(':')]
+        if name not in FILTERS:
+            raise ValueError(f"Unknown filter '{name}', must be one of: {', '.join(FILTERS)}")
+        cls, converters = FILTERS[name]
+        if len(args) > len(converters):
+            raise ValueError(f"Filter '{name}' takes at most {len(converters)} arguments")
+        values = tuple(convert(arg) for convert, arg in zip(converters, args))
+        cls(*values)  # Validate the arguments now rather than on the first reading
+        stages.append((name, values))
+    return stages
+
+
+def parse_filter_spec(value: str) -> Dict[str, List[Stage]]:
+    """
+    Parse a SIGNAL_FILTERS style setting: 'param=chain;param=chain'.
+
+    '*' applies a chain to every parameter without its own entry, e.g.
+    '*=median:3;humidity=median:5,ewma:0.3'.
+    """
+    chains = {}
+    for entry in value.split(';'):
+        if not entry.strip():
+            continue
+        param, _, spec = entry.partition('=')
+        param = param.strip()
+        if param != '*' and param not in PARAMETERS:
+            raise ValueError(f"Unknown parameter '{param}' in filter spec")
+        if not spec.strip():
+            raise ValueError(f"Missing filter chain for '{param}'")
+        chains[param] = parse_chain(spec)
+    default = chains.pop('*', None)
+    if default is not None:
+        for param in PARAMETERS:
+            chains.setdefault(param, default)
+    return chains
+
+
+class FilterChain:
+    """Filters applied in sequence to one sensor parameter."""
+
+    __slots__ = ('filters', 'value')
+
+    def __init__(self, stages: Sequence[Stage]):
+        self.filters = [FILTERS[name][0](*args) for name, args in stages]
+        self.value: Optional[float] = None
+
+    def update(self, value: float) -> float:
+        for stage in self.filters:
+            value = stage.update(value)
+        self.value = value
+        return value
+
+
+class SignalFilterStage:
+    """
+    Per-sensor, per-parameter filter chains applied to readings as they arrive.
+
+    Only valid readings feed the filters, and only parameters read this
+    time; parameters carried over from an earlier reading get the chain's
+    current output. Raw (*_raw) values are left unfiltered.
+    """
+
+    def __init__(self, chains: Dict[str, List[Stage]]):
+        """
+        Args:
+            chains: Filter stages per parameter (see parse_filter_spec)
+        """
+        self.chains = chains
+        self._state: Dict[Tuple[Hashable, str], FilterChain] = {}
+        self._lock = threading.Lock()  # Poll cycles and background refreshes run on different threads
+
+    def apply(self, key: Hashable, data: SensorData) -> SensorData:
+        """
+        Return a filtered copy of a reading (the reading itself if there is nothing to filter).
+
+        Args:
+            key: Sensor key (each sensor has its own filter state)
+            data: Reading as taken from the bus
+        """
+        if not data.is_valid or not self.chains:
+            return data
+        filtered = copy.copy(data)
+        with self._lock:
+            for param, stages in self.chains.items():
+                value = getattr(data, param)
+                if value is None:
+                    continue
+                chain = self._state.get((key, param))
+                if chain is None:
+                    chain = self._state[(key, param)] = FilterChain(stages)
+                if param in data.carried_params:
+                    if chain.value is not None:
+                        setattr(filtered, param, round(chain.value, 3))
+                    continue
+                setattr(filtered, param, round(chain.update(value), 3))
+        return filtered
+
+    def reset(self, key: Optional[Hashable] = None):
+        """Forget filter state (of one sensor, or of all)."""
+        with self._lock:
+            if key is None:
+                self._state.clear()
+            else:
+                for state_key in [k for k in self._state if k[0] == key]:
+                    del self._state[state_key]
@@ -0,0 +1,122 @@
+"""Ambient DHT22 source and AC control through ACControlAutomation."""
+
+import pytest
+
+from ambient_sensor import ACControlAutomation, AmbientSensorData
+from control_loop import DecisionLoop, LoopConfig
+from modbus_sensor import SensorData
+from reading_cache import CachedReading
+from sensor_poller import BackgroundSource, SensorPoller, SensorSnapshot
+
+KEY = 'room/ambient/dht22'
+
+
+def ambient(temperature=None, humidity=None, valid=True):
+    reading = AmbientSensorData()
+    reading.temperature, reading.humidity, reading.is_valid = temperature, humidity, valid
+    return reading
+
+
+def snapshot(temperature=None, humidity=None):
+    return SensorSnapshot({KEY: CachedReading(ambient(temperature, humidity).to_sensor_data(KEY), ttl=60.0)})
+
+
+def ac_loop(relay, **options):
+    config = LoopConfig('temperature', 28, 24, mode='above', sensors=[KEY], **options)
+    return DecisionLoop('ac', relay, config, ACControlAutomation(28, 24, 70, 60), ('temperature', 'humidity'))
+
+
+def test_automation_hysteresis():
+    ac = ACControlAutomation(28, 24, 70, 60)
+    assert ac.decide(26, 65) == (False, 'AC OFF: Temp=26°C, Humidity=65%')
+    assert ac.decide(26, 71)[0]
+    assert ac.decide(25, 59)[0]  # Both must drop below their OFF thresholds
+    assert ac.decide(24, 60) == (False, 'AC OFF: Temp=24°C (≤24), Humidity=60% (≤60)')
+    assert ac.decide(None, 80) == (False, 'Missing sensor data')
+
+
+def test_to_sensor_data_keeps_raw_values():
+    data = ambient(25.5, 61.0).to_sensor_data(KEY)
+    assert data.sensor_id == KEY and data.is_valid
+    assert (data.temperature, data.temperature_raw) == (25.5, 25.5)
+    assert (data.humidity, data.humidity_raw) == (61.0, 61.0)
+    assert data.nitrogen is None
+
+
+def test_decision_loop_switches_the_relay():
+    switches = []
+    loop = ac_loop(lambda state: switches.append(state) or True)
+    for now, (temperature, humidity) in enumerate([(26, 65), (29, 65), (26, 65), (24, 60)]):
+        loop.update(snapshot(temperature, humidity), now=now)
+    assert switches == [True, False]
+    assert loop.status()['values'] == {'temperature': 24, 'humidity': 60}
+
+
+def test_deferred_switch_is_requested_again():
+    switches = []
+    loop = ac_loop(lambda state: switches.append(state) or True, min_off=60)
+    loop.state, loop.last_change = False, 0.0
+    loop.update(snapshot(30, 50), now=10)
+    assert switches == [] and loop.blocked.startswith('min_off')
+    # The automation follows the relay: inside the band it does not claim the AC is on
+    loop.update(snapshot(26, 50), now=30)
+    assert switches == [] and loop.controller.ac_active is False
+    loop.update(snapshot(30, 50), now=60)
+    assert switches == [True]
+
+
+def test_missing_input_fails_safe():
+    loop = ac_loop(lambda state: True)
+    loop.state = True
+    loop.update(snapshot(temperature=30), now=0)
+    assert not loop.state
+    assert loop.reason == 'no usable humidity input (fail-safe off)'
+
+
+class Reader:
+    def read_all_sensors(self):
+        return {}
+
+
+def test_background_source_is_published_with_the_poll_cycle():
+    readings = [ambient(26.0, 55.0).to_sensor_data(KEY)]
+    source = BackgroundSource(KEY, readings.pop, interval=10)
+    poller = SensorPoller(Reader(), interval=5)
+    poller.add_source(source)
+    assert poller.poll_once().updated == frozenset()
+
+    # Not started: hand the poller one sample
+    source._latest = source.read()
+    snapshot = poller.poll_once()
+    assert snapshot.updated == {KEY}
+    assert snapshot.entries[KEY].data.temperature == 26.0
+    # Taken once; the next cycle keeps the cached entry without re-publishing it
+    snapshot = poller.poll_once()
+    assert snapshot.updated == frozenset() and KEY in snapshot.entries
+
+
+def test_failed_source_read_is_logged_not_raised(caplog):
+    calls = []
+
+    def read():
+        calls.append(1)
+        source._stop_event.set()
+        raise OSError('DHT checksum')
+
+    source = BackgroundSource(KEY, read, interval=0.01)
+    source.start()
+    source.stop(timeout=5)
+    assert calls == [1]
+    assert source.take() is None
+    assert 'DHT checksum' in caplog.text
+
+
+def test_invalid_ambient_reading():
+    data = ambient(valid=False).to_sensor_data(KEY)
+    assert not data.is_valid
+    assert isinstance(data, SensorData)
+
+
+@pytest.mark.parametrize('temperature, humidity, expected', [(29, 50, True), (25, 71, True), (25, 65, False)])
+def test_automation_on_conditions(temperature, humidity, expected):
+    assert ACControlAutomation(28, 24, 70, 60).decide(temperature, humidity)[0] is expected
@@ -0,0 +1,36 @@
+"""Benchmark helpers: percentiles, regression comparison and the memory benchmark."""
+
+from benchmarks import bench_reading_memory, compare, flatten, latency_summary, percentile
+
+
+def test_percentile_nearest_rank():
+    samples = [0.004, 0.001, 0.003, 0.002]
+    assert percentile(samples, 50) == 0.002
+    assert percentile(samples, 99) == 0.004
+    assert percentile(samples, 0) == 0.001
+    assert percentile([], 50) is None
+    assert latency_summary(samples) == {'p50_ms': 2.0, 'p99_ms': 4.0, 'max_ms': 4.0}
+    assert latency_summary([]) == {'p50_ms': None, 'p99_ms': None, 'max_ms': None}
+
+
+def test_flatten_keeps_numbers_only():
+    assert flatten({'a': {'b': 1, 'c': 'x', 'd': True}, 'e': 2.5}) == {'a.b': 1, 'e': 2.5}
+
+
+def test_compare_reports_regressions_in_the_right_direction():
+    baseline = {'results': {'api': {'p99_ms': 10.0, 'requests_per_sec': 100.0, 'reads': 50},
+                            'memory': {'bytes_per_reading': 100.0}}}
+    current = {'results': {'api': {'p99_ms': 10.5, 'requests_per_sec': 80.0, 'reads': 10},
+                           'memory': {'bytes_per_reading': 130.0}}}
+    assert compare(baseline, current) == [
+        'api.requests_per_sec: 100.0 -> 80.0 (-20%)',
+        'memory.bytes_per_reading: 100.0 -> 130.0 (+30%)',
+    ]
+    # Faster and smaller is never a regression
+    assert compare(current, baseline) == []
+
+
+def test_batch_stores_readings_more_compactly_than_objects():
+    result = bench_reading_memory(2000)
+    assert result['readings'] == 2000
+    assert 0 < result['batch_bytes_per_reading'] < result['bytes_per_reading']
@@ -0,0 +1,173 @@
+"""Bus arbiter: serialization, coalescing, priorities and shutdown."""
+
+import asyncio
+import threading
+
+import pytest
+
+from async_modbus import AsyncBusArbiter, EventLoopThread
+from bus_arbiter import BusArbiter
+from modbus_sensor import SensorData
+
+
+class FakeReader:
+    port = '/dev/fake'
+
+    def __init__(self, slaves=(1, 2, 3)):
+        self.slaves = list(slaves)
+        self.calls = []
+        self.active = 0
+        self.overlapped = False
+        self._lock = threading.Lock()
+
+    def read_sensor(self, sensor_id, retries=3, params=None):
+        with self._lock:
+            self.active += 1
+            self.overlapped |= self.active > 1
+        try:
+            self.calls.append((sensor_id, params))
+            data = SensorData(sensor_id)
+            data.is_valid = True
+            return data
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+@pytest.fixture
+def reader():
+    return FakeReader()
+
+
+def test_queued_reads_of_a_slave_are_coalesced(reader):
+    arbiter = BusArbiter(reader)
+    first = arbiter.submit_read(1)
+    second = arbiter.submit_read(1)
+    other_params = arbiter.submit_read(1, params=('ph',))
+    assert first is second
+    assert other_params is not first
+    arbiter.start()
+    try:
+        assert first.result(5).sensor_id == 1
+        other_params.result(5)
+    finally:
+        arbiter.stop(timeout=5)
+    assert reader.calls == [(1, None), (1, ('ph',))]
+    metrics = arbiter.metrics()
+    assert metrics['submitted'] == 3 and metrics['coalesced'] == 1 and metrics['executed'] == 2
+
+
+def test_lower_priority_numbers_run_first(reader):
+    arbiter = BusArbiter(reader)
+    futures = [arbiter.submit_read(1, priority=BusArbiter.PRIORITY_PROBE),
+               arbiter.submit_read(2, priority=BusArbiter.PRIORITY_POLL),
+               arbiter.submit_read(3, priority=BusArbiter.PRIORITY_INTERACTIVE)]
+    arbiter.start()
+    try:
+        for future in futures:
+            future.result(5)
+    finally:
+        arbiter.stop(timeout=5)
+    assert [sensor_id for sensor_id, _ in reader.calls] == [3, 2, 1]
+
+
+def test_coalesced_request_upgrades_the_priority(reader):
+    arbiter = BusArbiter(reader)
+    arbiter.submit_read(1, priority=BusArbiter.PRIORITY_POLL)
+    arbiter.submit_read(2, priority=BusArbiter.PRIORITY_POLL)
+    upgraded = arbiter.submit_read(2, priority=BusArbiter.PRIORITY_INTERACTIVE)
+    arbiter.start()
+    try:
+        upgraded.result(5)
+    finally:
+        arbiter.stop(timeout=5)
+    # Slave 2 jumped the queue and its stale low-priority entry was skipped
+    assert [sensor_id for sensor_id, _ in reader.calls] == [2, 1]
+
+
+def test_concurrent_callers_never_overlap_on_the_bus(reader):
+    arbiter = BusArbiter(reader)
+    arbiter.start()
+    try:
+        threads = [threading.Thread(target=lambda: [arbiter.read_sensor(slave, timeout=5) for slave in (1, 2, 3)])
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+        assert arbiter.read_all_sensors().keys() == {1, 2, 3}
+    finally:
+        arbiter.stop(timeout=5)
+    assert not reader.overlapped
+
+
+def test_failures_and_cancellations(reader):
+    arbiter = BusArbiter(reader)
+
+    def broken():
+        raise OSError('port closed')
+
+    failing = arbiter.submit(broken)
+    cancelled = arbiter.submit_read(1)
+    assert cancelled.cancel()
+    arbiter.start()
+    try:
+        with pytest.raises(OSError, match='port closed'):
+            failing.result(5)
+    finally:
+        arbiter.stop(timeout=5)
+    assert reader.calls == []
+    assert arbiter.metrics()['failed'] == 1
+
+
+def test_stop_fails_work_still_queued(reader):
+    arbiter = BusArbiter(reader)
+    future = arbiter.submit_read(1)
+    arbiter.stop()  # The stop sentinel sorts ahead of the queued read
+    arbiter.start()
+    arbiter.stop(timeout=5)
+    assert reader.calls == []
+    with pytest.raises(RuntimeError, match='Bus arbiter stopped'):
+        future.result(0)
+
+
+class FakeAsyncReader(FakeReader):
+    async def read_sensor(self, sensor_id, retries=3, params=None):
+        await asyncio.sleep(0)
+        return FakeReader.read_sensor(self, sensor_id, retries, params)
+
+
+@pytest.fixture
+def loop_thread():
+    loop_thread = EventLoopThread()
+    yield loop_thread
+    loop_thread.stop(timeout=5)
+
+
+def test_async_arbiter_coalesces_and_orders_like_the_threaded_one(loop_thread):
+    reader = FakeAsyncReader()
+    arbiter = AsyncBusArbiter(reader, loop_thread)
+    futures = [arbiter.submit_read(1, priority=BusArbiter.PRIORITY_PROBE),
+               arbiter.submit_read(2, priority=BusArbiter.PRIORITY_POLL),
+               arbiter.submit_read(2, priority=BusArbiter.PRIORITY_POLL),
+               arbiter.submit_read(3, priority=BusArbiter.PRIORITY_INTERACTIVE)]
+    assert futures[1] is futures[2]
+    arbiter.start()
+    try:
+        assert [future.result(5).sensor_id for future in futures] == [1, 2, 2, 3]
+        assert arbiter.read_all_sensors().keys() == {1, 2, 3}
+    finally:
+        arbiter.stop(timeout=5)
+    assert [sensor_id for sensor_id, _ in reader.calls[:3]] == [3, 2, 1]
+    assert arbiter.metrics()['coalesced'] == 1
+
+
+def test_async_arbiter_stop_fails_work_still_queued(loop_thread):
+    reader = FakeAsyncReader()
+    arbiter = AsyncBusArbiter(reader, loop_thread)
+    future = arbiter.submit_read(1)
+    arbiter.stop()
+    arbiter.start()
+    arbiter.stop(timeout=5)
+    with pytest.raises(RuntimeError, match='Bus arbiter stopped'):
+        future.result(5)
@@ -0,0 +1,102 @@
+"""Multi-bus manager: bus lists, sensor keys and parallel scans on simulated buses."""
+
+import os
+import time
+
+import pytest
+
+from bus_manager import BusConfig, BusManager, parse_bus_list
+
+BAUDRATE = 19200
+TIMEOUT = 0.3
+
+
+def test_parse_bus_list():
+    configs = parse_bus_list('room1:/dev/ttyUSB0, room2:/dev/ttyUSB1,', slaves=[1, 2])
+    assert [(config.room, config.port, config.name) for config in configs] == \
+        [('room1', '/dev/ttyUSB0', 'ttyUSB0'), ('room2', '/dev/ttyUSB1', 'ttyUSB1')]
+    assert configs[1].key(2) == 'room2/ttyUSB1/2'
+    with pytest.raises(ValueError, match="Invalid bus entry '/dev/ttyUSB0'"):
+        parse_bus_list('/dev/ttyUSB0')
+
+
+def test_resolve_keys_and_bare_slave_ids(tmp_path):
+    # Buses that fail to connect stay registered
+    manager = BusManager([BusConfig(str(tmp_path / 'a'), room='r', name='a', slaves=[1, 2]),
+                          BusConfig(str(tmp_path / 'b'), room='r', name='b', slaves=[2, 3])])
+    assert not manager.connect()
+    try:
+        assert manager.sensor_keys == ['r/a/1', 'r/a/2', 'r/b/2', 'r/b/3']
+        assert manager.resolve('r/b/2') == 'r/b/2'
+        assert manager.resolve('2') == 'r/a/2'  # First bus that has the slave
+        assert manager.resolve('3') == 'r/b/3'
+        assert manager.resolve('9') is None
+        assert manager.calibration_ids == {'r/a/1': 1, 'r/a/2': 2, 'r/b/2': 2, 'r/b/3': 3}
+        assert not manager.is_healthy()
+    finally:
+        manager.disconnect()
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError, match='Unknown Modbus backend: threads'):
+        BusManager([], backend='threads')
+
+
+@pytest.fixture
+def buses():
+    pytest.importorskip('pymodbus')
+    if not hasattr(os, 'openpty'):
+        pytest.skip('the bus simulator needs a pty')
+    from modbus_simulator import PtySimulator, build_bus
+
+    sims = [PtySimulator(build_bus([1, 2, 3], baudrate=BAUDRATE, latency=0.05, jitter=0.0, seed=seed))
+            for seed in (0, 1)]
+    for sim in sims:
+        sim.start()
+    yield [BusConfig(sim.port, room='test', name=f'bus{i}', baudrate=BAUDRATE, timeout=TIMEOUT,
+                     slaves=[1, 2, 3]) for i, sim in enumerate(sims)]
+    for sim in sims:
+        sim.stop()
+
+
+def timed_scan(manager):
+    start = time.monotonic()
+    readings = manager.read_all_sensors()
+    return readings, time.monotonic() - start
+
+
+@pytest.mark.parametrize('backend', ['sync', 'async'])
+def test_buses_are_scanned_in_parallel(buses, backend):
+    single = BusManager(buses[:1], backend=backend)
+    assert single.connect()
+    try:
+        single.read_all_sensors()  # Warm up the port
+        _, one_bus = timed_scan(single)
+    finally:
+        single.disconnect()
+
+    manager = BusManager(buses, backend=backend)
+    assert manager.connect()
+    try:
+        manager.read_all_sensors()
+        readings, two_buses = timed_scan(manager)
+        assert sorted(readings) == [f'test/bus{bus}/{slave}' for bus in (0, 1) for slave in (1, 2, 3)]
+        assert all(data.is_valid for data in readings.values())
+        assert manager.is_healthy()
+        assert set(manager.metrics()) == {'test/bus0', 'test/bus1'}
+    finally:
+        manager.disconnect()
+    # Twice the sensors, but each bus has its own thread (or coroutine)
+    assert two_buses < 1.5 * one_bus
+
+
+def test_unconnected_bus_reports_per_sensor_errors(buses, tmp_path):
+    missing = BusConfig(str(tmp_path / 'ttyMissing'), room='test', name='gone', timeout=TIMEOUT, slaves=[1])
+    manager = BusManager([buses[0], missing])
+    assert manager.connect()
+    try:
+        readings = manager.read_all_sensors()
+        assert readings['test/bus0/1'].is_valid
+        assert readings['test/gone/1'].error == 'Not connected to Modbus RTU'
+    finally:
+        manager.disconnect()
@@ -0,0 +1,94 @@
+"""Compiled calibration engine: entry forms, column application and loading."""
+
+import json
+
+import pytest
+
+import calibration_engine
+from calibration_engine import CalibrationEngine, compile_entry, load_calibration, table_from_config
+from reading_batch import ReadingBatch
+
+TABLE = {
+    1: {'ph': {'m': 1.1, 'b': -0.2}, 'ec': {'points': [[0, 0], [1, 2], [2, 3]]}},
+    2: {'ph': {'poly': [0.5, 1.0, 0.1]}},
+}
+
+
+@pytest.fixture(params=['numpy', 'python'])
+def backend(request, monkeypatch):
+    if request.param == 'numpy' and not calibration_engine.NUMPY_AVAILABLE:
+        pytest.skip('NumPy not installed')
+    monkeypatch.setattr(calibration_engine, 'NUMPY_AVAILABLE', request.param == 'numpy')
+    return request.param
+
+
+def test_entry_forms():
+    engine = CalibrationEngine(TABLE)
+    assert engine.apply(1, 'ph', 6.0) == pytest.approx(6.4)
+    assert engine.apply(1, 'ec', 0.5) == pytest.approx(1.0)
+    assert engine.apply(1, 'ec', 3.0) == pytest.approx(4.0)  # End segment extended
+    assert engine.apply(2, 'ph', 2.0) == pytest.approx(2.9)
+    assert engine.apply(3, 'ph', 6.0) == 6.0  # Uncalibrated sensors pass through
+    assert engine.describe(2) == {'ph': 'y = 0.5 + 1x^1 + 0.1x^2'}
+
+
+@pytest.mark.parametrize('coeffs, error', [
+    ({'points': [[1, 1]]}, 'at least two points'),
+    ({'points': [[1, 1], [1, 2]]}, 'distinct raw values'),
+    ({'poly': []}, 'at least one coefficient'),
+    ({'scale': 2}, 'Unknown calibration entry'),
+])
+def test_invalid_entries(coeffs, error):
+    with pytest.raises(ValueError, match=error):
+        compile_entry(coeffs)
+    with pytest.raises(ValueError, match=f'Sensor 1 ph: .*{error}'):
+        CalibrationEngine({1: {'ph': coeffs}})
+
+
+def test_series_and_columns_match_the_scalar_path(backend):
+    engine = CalibrationEngine(TABLE)
+    raw = [0.0, 0.5, 1.5, 6.0]
+    assert list(engine.apply_series(1, 'ec', raw)) == pytest.approx([engine.apply(1, 'ec', x) for x in raw])
+    assert list(engine.apply_series(3, 'ec', raw)) == raw
+
+    sensors = [2, 1, 3]
+    codes = [0, 1, 2, 1]
+    expected = [engine.apply(sensors[code], 'ph', x) for code, x in zip(codes, raw)]
+    assert list(engine.apply_column(sensors, codes, 'ph', raw)) == pytest.approx(expected)
+    assert list(engine.apply_column(sensors, codes, 'humidity', raw)) == raw
+
+
+def test_apply_batch_recalibrates_from_raw_columns(backend):
+    batch = ReadingBatch(raw=True)
+    batch.append_values('room/bus/1', {'ph': 0.0}, 100.0, raw={'ph': 6.0})
+    batch.append_values('room/bus/9', {'ph': 0.0}, 100.0, raw={'ph': 6.0})
+    CalibrationEngine(TABLE).apply_batch(batch, {'room/bus/1': 1, 'room/bus/9': 9})
+    assert [value for _, _, _, value in batch.rows()] == pytest.approx([6.4, 6.0])
+
+    with pytest.raises(ValueError, match='no raw columns'):
+        CalibrationEngine(TABLE).apply_batch(ReadingBatch())
+
+
+def test_table_from_config():
+    assert table_from_config({'1': {'ph': {'m': 2}}, 'ambient': {}}) == ({1: {'ph': {'m': 2}}, 'ambient': {}}, None)
+    assert table_from_config({'version': 7, 'sensors': None}) == ({}, '7')
+
+
+def test_load_calibration_files(tmp_path):
+    path = tmp_path / 'calibration.json'
+    path.write_text(json.dumps({'version': 'lab-2024', 'sensors': {'1': {'ph': {'m': 2, 'b': 1}}}}))
+    engine = load_calibration(str(path))
+    assert engine.version == 'lab-2024'
+    assert engine.apply(1, 'ph', 3.0) == 7.0
+
+    module = tmp_path / 'calibration_config.py'
+    module.write_text("SENSOR_CALIBRATION = {2: {'ec': {'b': 0.5}}}\nCALIBRATION_VERSION = 'v2'\n")
+    engine = load_calibration(str(module))
+    assert (engine.version, engine.apply(2, 'ec', 1.0)) == ('v2', 1.5)
+
+
+def test_set_engine_swaps_the_active_engine(monkeypatch):
+    monkeypatch.setattr(calibration_engine, '_engine', None)
+    engine = CalibrationEngine({})
+    calibration_engine.set_engine(engine)
+    assert calibration_engine.get_engine() is engine
@@ -0,0 +1,113 @@
+"""Least-squares calibration fits from lab samples."""
+
+import json
+import random
+
+import pytest
+
+import calibration_fit
+from calibration_engine import load_calibration
+from calibration_fit import build_table, fit_samples, load_samples, write_calibration
+
+
+@pytest.fixture(params=['numpy', 'python'])
+def backend(request, monkeypatch):
+    if request.param == 'numpy' and not calibration_fit.NUMPY_AVAILABLE:
+        pytest.skip('NumPy not installed')
+    monkeypatch.setattr(calibration_fit, 'NUMPY_AVAILABLE', request.param == 'numpy')
+    return request.param
+
+
+def test_exact_line(backend):
+    raw = [10.0, 20.0, 40.0, 80.0]
+    (result,) = fit_samples({(1, 'nitrogen'): (raw, [1.05 * x - 2 for x in raw])})
+    assert result.entry() == {'m': pytest.approx(1.05), 'b': pytest.approx(-2.0)}
+    assert result.r2 == pytest.approx(1.0)
+    assert result.rmse == pytest.approx(0.0, abs=1e-9)
+    assert result.samples == 4
+
+
+def test_polynomial_with_large_raw_values(backend):
+    # Standardizing the raw values keeps ~1e4 squared well conditioned
+    raw = [1000.0 * k for k in range(1, 8)]
+    lab = [3 + 0.01 * x + 2e-7 * x * x for x in raw]
+    (result,) = fit_samples({('a', 'ec'): (raw, lab)}, degree=2)
+    assert result.entry()['poly'] == pytest.approx([3, 0.01, 2e-7], rel=1e-6)
+
+
+def test_noisy_series_are_fitted_independently(backend):
+    rng = random.Random(0)
+    samples = {}
+    for sensor, (m, b) in enumerate([(1.0, 0.0), (0.5, 3.0), (2.0, -1.0)], start=1):
+        raw = [rng.uniform(0, 100) for _ in range(50)]
+        samples[(sensor, 'ph')] = (raw, [m * x + b + rng.gauss(0, 0.1) for x in raw])
+    results = fit_samples(samples)
+    assert [(r.sensor, r.param) for r in results] == list(samples)
+    for result, (m, b) in zip(results, [(1.0, 0.0), (0.5, 3.0), (2.0, -1.0)]):
+        assert result.entry() == {'m': pytest.approx(m, abs=0.01), 'b': pytest.approx(b, abs=0.1)}
+        assert 0.99 < result.r2 < 1.0
+        assert result.max_residual >= result.rmse > 0
+
+
+def test_backends_agree(monkeypatch):
+    if not calibration_fit.NUMPY_AVAILABLE:
+        pytest.skip('NumPy not installed')
+    rng = random.Random(1)
+    raw = [rng.uniform(0, 50) for _ in range(20)]
+    samples = {(1, 'potassium'): (raw, [x ** 1.3 for x in raw])}
+    fast = fit_samples(samples, degree=3)[0]
+    monkeypatch.setattr(calibration_fit, 'NUMPY_AVAILABLE', False)
+    slow = fit_samples(samples, degree=3)[0]
+    assert fast.coefficients == pytest.approx(slow.coefficients)
+    assert (fast.r2, fast.rmse, fast.max_residual) == pytest.approx((slow.r2, slow.rmse, slow.max_residual))
+
+
+def test_too_few_distinct_raw_values(backend):
+    with pytest.raises(ValueError, match='Sensor 1 ph: a degree 2 fit needs 3 distinct raw values, got 2'):
+        fit_samples({(1, 'ph'): ([5.0, 5.0, 6.0], [5.1, 5.2, 6.1])}, degree=2)
+    with pytest.raises(ValueError, match='Degree must be at least 1'):
+        fit_samples({}, degree=0)
+    assert fit_samples({}) == []
+
+
+def test_load_csv_and_json(tmp_path):
+    csv_path = tmp_path / 'samples.csv'
+    csv_path.write_text('sensor,param,raw,lab\n1,nitrogen,48,47.1\n1,nitrogen,95.5,99.8\nprobe-a,ph,6.5,6.4\n')
+    assert load_samples(str(csv_path)) == {(1, 'nitrogen'): ([48.0, 95.5], [47.1, 99.8]),
+                                           ('probe-a', 'ph'): ([6.5], [6.4])}
+    json_path = tmp_path / 'samples.json'
+    json_path.write_text(json.dumps([{'sensor': 2, 'param': 'ec', 'raw': 1.0, 'lab': 1.1}]))
+    assert load_samples(str(json_path)) == {(2, 'ec'): ([1.0], [1.1])}
+
+
+@pytest.mark.parametrize('row, message', [
+    ('1,nitrogen,abc,1', 'sample 1 is invalid'),
+    ('1,salinity,1,1', "sample 1 has unknown param 'salinity'"),
+])
+def test_load_invalid_samples(tmp_path, row, message):
+    path = tmp_path / 'samples.csv'
+    path.write_text(f'sensor,param,raw,lab\n{row}\n')
+    with pytest.raises(ValueError, match=message):
+        load_samples(str(path))
+
+
+def test_written_file_reloads_with_base_entries(tmp_path, backend):
+    raw = [10.0, 20.0, 30.0]
+    results = fit_samples({(1, 'nitrogen'): (raw, [2 * x + 1 for x in raw])})
+    table = build_table(results, base={1: {'ph': {'m': 1.0, 'b': 0.2}}, 2: {'ec': {'m': 1.1, 'b': 0.0}}})
+    path = tmp_path / 'calibration.json'
+    write_calibration(str(path), table, 'fit-test')
+
+    engine = load_calibration(str(path))
+    assert engine.version == 'fit-test'
+    assert engine.apply(1, 'nitrogen', 50.0) == pytest.approx(101.0)
+    assert engine.apply(1, 'ph', 6.0) == pytest.approx(6.2)
+    assert engine.apply(2, 'ec', 1.0) == pytest.approx(1.1)
+    assert [p.name for p in tmp_path.iterdir()] == ['calibration.json']  # No temporary file left
+
+
+def test_invalid_table_is_not_written(tmp_path):
+    path = tmp_path / 'calibration.json'
+    with pytest.raises(ValueError):
+        write_calibration(str(path), {1: {'ph': {'poly': []}}}, 'bad')
+    assert not path.exists()
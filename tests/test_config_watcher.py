@@ -0,0 +1,111 @@
+"""Config hot reload: file parsing, change detection and the app's loaders."""
+
+import json
+import os
+
+import pytest
+
+import app
+import calibration_engine
+import config_watcher
+from config_watcher import ConfigWatcher, load_config_file
+
+
+def write(path, text, mtime):
+    path.write_text(text)
+    os.utime(path, ns=(mtime, mtime))  # Distinct mtimes even within one clock tick
+
+
+def test_load_config_file_formats(tmp_path):
+    (tmp_path / 'a.json').write_text('{"x": 1}')
+    (tmp_path / 'b.toml').write_text('x = 1\n')
+    (tmp_path / 'c.json').write_text('null')
+    assert load_config_file(str(tmp_path / 'a.json')) == {'x': 1}
+    assert load_config_file(str(tmp_path / 'b.toml')) == {'x': 1}
+    assert load_config_file(str(tmp_path / 'c.json')) == {}
+
+
+def test_yaml_without_pyyaml(tmp_path, monkeypatch):
+    monkeypatch.setattr(config_watcher, 'YAML_AVAILABLE', False)
+    with pytest.raises(RuntimeError, match='PyYAML not installed'):
+        load_config_file(str(tmp_path / 'a.yaml'))
+
+
+def test_changed_files_are_reloaded(tmp_path):
+    path = tmp_path / 'settings.json'
+    write(path, '{"x": 1}', 1_000_000_000)
+    loaded = []
+    watcher = ConfigWatcher()
+    assert watcher.watch(str(path), lambda p: loaded.append(load_config_file(p)))
+    assert loaded == [{'x': 1}]
+    assert watcher.check() == 0  # Unchanged
+
+    write(path, '{"x": 2}', 2_000_000_000)
+    assert watcher.check() == 1
+    assert loaded == [{'x': 1}, {'x': 2}]
+    assert watcher.reloads == 1
+
+
+def test_failed_reload_is_not_retried_until_the_next_change(tmp_path):
+    path = tmp_path / 'settings.json'
+    write(path, '{"x": 1}', 1_000_000_000)
+    loaded = []
+    watcher = ConfigWatcher()
+    watcher.watch(str(path), lambda p: loaded.append(load_config_file(p)))
+
+    write(path, '{"x": ', 2_000_000_000)
+    assert watcher.check() == 0
+    assert watcher.check() == 0
+    assert watcher.errors == 1
+    write(path, '{"x": 3}', 3_000_000_000)
+    assert watcher.check() == 1
+    assert loaded == [{'x': 1}, {'x': 3}]
+
+
+def test_missing_file_is_loaded_once_it_appears(tmp_path):
+    path = tmp_path / 'settings.json'
+    loaded = []
+    watcher = ConfigWatcher()
+    assert not watcher.watch(str(path), loaded.append)
+    assert watcher.check() == 0
+    write(path, '{}', 1_000_000_000)
+    assert watcher.check() == 1
+    assert loaded == [str(path)]
+
+
+def test_watcher_thread_stops(tmp_path):
+    watcher = ConfigWatcher(interval=0.01)
+    watcher.start()
+    watcher.stop(timeout=5)
+    assert not watcher.is_alive()
+
+
+def test_reload_calibration_swaps_the_engine(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, 'history_store', None)
+    monkeypatch.setattr(calibration_engine, '_engine', None)
+    path = tmp_path / 'calibration.json'
+    path.write_text(json.dumps({'version': 'v1', 'sensors': {'1': {'ph': {'m': 2}}}}))
+    app.reload_calibration(str(path))
+    assert calibration_engine.get_engine().apply(1, 'ph', 3.0) == 6.0
+
+    # A broken file leaves the active engine in place
+    path.write_text(json.dumps({'sensors': {'1': {'ph': {'points': [[0, 0]]}}}}))
+    with pytest.raises(ValueError, match='at least two points'):
+        app.reload_calibration(str(path))
+    assert calibration_engine.get_engine().version == 'v1'
+
+
+def test_control_settings_reload(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, 'control_engine', None)
+    monkeypatch.setattr(app, 'bus_manager', None)
+    monkeypatch.setattr(app, 'control_settings', dict(app.DEFAULT_CONTROL_SETTINGS))
+    path = tmp_path / 'control.json'
+    path.write_text(json.dumps({'humidity_threshold_on': 55, 'humidity_threshold_off': 70}))
+    app.load_control_settings(str(path))
+    assert app.control_settings['humidity_threshold_on'] == 55
+    assert app.control_settings['humidity_min_on'] == app.DEFAULT_CONTROL_SETTINGS['humidity_min_on']
+
+    path.write_text(json.dumps({'humidity_treshold_on': 50}))
+    with pytest.raises(ValueError, match='Unknown control settings: humidity_treshold_on'):
+        app.load_control_settings(str(path))
+    assert app.control_settings['humidity_threshold_on'] == 55
@@ -0,0 +1,224 @@
+"""Hysteresis control loops and the control engine."""
+
+import pytest
+
+import app
+from control_loop import ControlEngine, ControlLoop, LoopConfig, weighted_mean
+from modbus_sensor import SensorData
+from reading_cache import CachedReading
+from sensor_poller import SensorSnapshot
+
+
+def snapshot(**humidity):
+    entries = {}
+    for key, value in humidity.items():
+        data = SensorData(key)
+        data.humidity = value
+        data.is_valid = True
+        entries[key] = CachedReading(data, ttl=60.0)
+    return SensorSnapshot(entries)
+
+
+class Relay:
+    def __init__(self, ok=True):
+        self.ok = ok
+        self.switches = []
+
+    def __call__(self, state):
+        if self.ok:
+            self.switches.append(state)
+        return self.ok
+
+
+def test_config_validation():
+    with pytest.raises(ValueError, match='threshold_on must be below threshold_off'):
+        LoopConfig('humidity', 75, 60)
+    with pytest.raises(ValueError, match='threshold_on must be above threshold_off'):
+        LoopConfig('humidity', 60, 75, mode='above')
+    with pytest.raises(ValueError, match="Invalid aggregate 'sum'"):
+        LoopConfig('humidity', 60, 75, aggregate='sum')
+    with pytest.raises(ValueError, match='must not be negative'):
+        LoopConfig('humidity', 60, 75, min_on=-1)
+
+
+def test_hysteresis():
+    relay = Relay()
+    loop = ControlLoop('humidity', relay, LoopConfig('humidity', 60, 75))
+    for now, value in enumerate([65, 59, 70, 74.9, 75, 62, 59]):
+        loop.update(snapshot(a=value), now=now)
+    assert relay.switches == [True, False, True]
+    assert loop.reason == 'humidity 59.0 < 60.0'
+
+
+def test_mode_above():
+    relay = Relay()
+    loop = ControlLoop('ac', relay, LoopConfig('humidity', 75, 60, mode='above'))
+    for now, value in enumerate([70, 76, 65, 60]):
+        loop.update(snapshot(a=value), now=now)
+    assert relay.switches == [True, False]
+
+
+@pytest.mark.parametrize('aggregate, sensors, weights, expected', [
+    ('median', None, None, 60.0),
+    ('min', None, None, 50.0),
+    ('max', None, None, 80.0),
+    ('mean', None, None, 190 / 3),
+    ('weighted', None, {'c': 0.0}, 55.0),
+    ('median', ['a', 'b'], None, 55.0),
+])
+def test_aggregates(aggregate, sensors, weights, expected):
+    loop = ControlLoop('humidity', Relay(), LoopConfig('humidity', 60, 75, aggregate=aggregate,
+                                                       sensors=sensors, weights=weights))
+    loop.update(snapshot(a=50, b=60, c=80), now=0)
+    assert loop.value == pytest.approx(expected)
+
+
+def test_weighted_mean_without_weight():
+    assert weighted_mean({'a': 50.0}, {'a': 0.0}) is None
+
+
+def test_minimum_times_defer_switches():
+    relay = Relay()
+    loop = ControlLoop('humidity', relay, LoopConfig('humidity', 60, 75, min_on=30, min_off=60))
+    loop.update(snapshot(a=50), now=0)
+    loop.update(snapshot(a=80), now=10)
+    assert loop.state and loop.blocked == 'min_on (20s left)'
+    loop.update(snapshot(a=80), now=30)
+    assert not loop.state and loop.blocked is None
+    loop.update(snapshot(a=50), now=60)
+    assert loop.blocked == 'min_off (30s left)'
+    loop.update(snapshot(a=50), now=90)
+    assert relay.switches == [True, False, True]
+
+
+def test_rate_limit():
+    relay = Relay()
+    loop = ControlLoop('humidity', relay, LoopConfig('humidity', 60, 75, max_toggles=2, toggle_window=100))
+    for now, value in [(0, 50), (10, 80), (20, 50)]:
+        loop.update(snapshot(a=value), now=now)
+    assert relay.switches == [True, False]
+    assert loop.blocked == 'rate limit (2 per 100s)'
+    loop.update(snapshot(a=50), now=100)
+    assert relay.switches == [True, False, True]
+
+
+def test_missing_input_fail_safe_or_hold():
+    relay = Relay()
+    loop = ControlLoop('humidity', relay, LoopConfig('humidity', 60, 75))
+    loop.update(snapshot(a=50), now=0)
+    loop.update(snapshot(), now=5)
+    assert relay.switches == [True, False]
+
+    holding = ControlLoop('humidity', Relay(), LoopConfig('humidity', 60, 75, fail_safe=False), state=True)
+    holding.update(snapshot(), now=0)
+    assert holding.state
+    assert holding.reason == 'no usable humidity input (holding)'
+
+
+def test_stale_and_invalid_readings_are_ignored():
+    loop = ControlLoop('humidity', Relay(), LoopConfig('humidity', 60, 75, max_age=10))
+    readings = snapshot(a=50, b=70, c=80)
+    readings.entries['a'].fetched_at -= 11
+    readings.entries['c'].data.is_valid = False
+    loop.update(readings, now=0)
+    assert loop.inputs == {'b': 70}
+
+
+def test_failed_actuator_keeps_state():
+    relay = Relay(ok=False)
+    loop = ControlLoop('humidity', relay, LoopConfig('humidity', 60, 75))
+    assert not loop.update(snapshot(a=50), now=0)
+    assert not loop.state and loop.last_change is None
+
+
+def test_override_replaces_the_decision():
+    relay = Relay()
+    loop = ControlLoop('humidity', relay, LoopConfig('humidity', 60, 75, min_on=30))
+    loop.override = (True, 'rule dry')
+    loop.update(snapshot(a=80), now=0)
+    assert loop.state and loop.reason == 'rule dry'
+    loop.override = None
+    loop.update(snapshot(a=80), now=10)
+    assert loop.state and loop.blocked.startswith('min_on')
+    assert loop.status()['override'] is False
+
+
+def test_engine_runs_every_loop_and_isolates_failures():
+    engine = ControlEngine()
+
+    def broken(state):
+        raise RuntimeError('gpio')
+
+    relay = Relay()
+    engine.add(ControlLoop('broken', broken, LoopConfig('humidity', 60, 75)))
+    engine.add(ControlLoop('humidity', relay, LoopConfig('humidity', 60, 75)))
+    engine.update(snapshot(a=50))
+    assert relay.switches == [True]
+    assert set(engine.status()) == {'broken', 'humidity'}
+
+
+def test_engine_replace_keeps_relay_state_and_timers():
+    engine = ControlEngine()
+    old = engine.add(ControlLoop('humidity', Relay(), LoopConfig('humidity', 60, 75, min_on=30)))
+    old.update(snapshot(a=50), now=0)
+    relay = Relay()
+    new = engine.replace(ControlLoop('humidity', relay, LoopConfig('humidity', 60, 75, min_on=30)))
+    assert engine.loops['humidity'] is new
+    new.update(snapshot(a=80), now=10)
+    assert new.state and new.blocked.startswith('min_on')
+
+    engine.configure('humidity', LoopConfig('humidity', 60, 85, min_on=0))
+    new.update(snapshot(a=80), now=11)
+    assert new.state
+    new.update(snapshot(a=90), now=12)
+    assert relay.switches == [False]
+
+
+class FakeGPIO:
+    HIGH, LOW = 1, 0
+
+    def __init__(self, ok=True):
+        self.ok = ok
+        self.outputs = []
+
+    def output(self, pin, level):
+        if not self.ok:
+            raise RuntimeError('GPIO write failed')
+        self.outputs.append((pin, level))
+
+
+@pytest.fixture
+def relay_port(monkeypatch):
+    monkeypatch.setitem(app.relay_states, 1, dict(app.relay_states[1], active=False))
+    published = []
+    monkeypatch.setattr(app.event_broadcaster, 'publish_state',
+                        lambda name, state: published.append((name, state)))
+    return published
+
+
+def test_relay_actuator_switches_gpio_then_records(monkeypatch, relay_port):
+    gpio = FakeGPIO()
+    monkeypatch.setattr(app, 'GPIO', gpio, raising=False)
+    monkeypatch.setattr(app, 'GPIO_AVAILABLE', True)
+    assert app.relay_actuator(1)(True)
+    assert gpio.outputs == [(app.GPIO_RELAY_PORT1, FakeGPIO.HIGH)]
+    assert app.relay_states[1]['active']
+    assert relay_port[-1][1]['1']['active']
+
+
+def test_relay_actuator_failed_gpio_records_nothing(monkeypatch, relay_port):
+    monkeypatch.setattr(app, 'GPIO', FakeGPIO(ok=False), raising=False)
+    monkeypatch.setattr(app, 'GPIO_AVAILABLE', True)
+    toggles = app.RELAY_TOGGLES.labels(1, 'on')
+    before = toggles.value
+    assert not app.relay_actuator(1)(True)
+    assert not app.relay_states[1]['active']
+    assert toggles.value == before
+    assert relay_port == []
+
+
+def test_relay_without_gpio_records_state(monkeypatch, relay_port):
+    monkeypatch.setattr(app, 'GPIO_AVAILABLE', False)
+    assert app.relay_actuator(1)(True)
+    assert app.relay_states[1]['active']
+    assert relay_port
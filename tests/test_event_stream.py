@@ -0,0 +1,27 @@
+"""SSE snapshot contents for clients that connect before anything changes."""
+
+import json
+
+import app
+
+
+def snapshot_frame():
+    stream = app.event_broadcaster.subscribe()
+    try:
+        frame = next(stream).decode()
+    finally:
+        stream.close()
+    fields = dict(line.split(': ', 1) for line in frame.strip().splitlines())
+    assert fields['event'] == 'snapshot'
+    return json.loads(fields['data'])
+
+
+def test_snapshot_has_relays_before_any_toggle():
+    relays = snapshot_frame()['relays']
+    assert relays == {str(port): {'active': False, 'label': app.RELAY_LABELS[port]}
+                      for port in app.relay_states}
+
+
+def test_dashboard_excludes_the_ambient_sensor_from_the_humidifier_badge():
+    page = app.app.test_client().get('/').get_data(as_text=True)
+    assert f'const AMBIENT_SENSOR_KEY = {json.dumps(app.AMBIENT_SENSOR_KEY)};' in page
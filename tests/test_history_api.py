@@ -0,0 +1,84 @@
+"""/api/history: argument checks and automatic resolution choice."""
+
+import time
+
+import pytest
+
+import app
+from history_store import (RESOLUTION_DAY, RESOLUTION_HOUR, RESOLUTION_MINUTE, RESOLUTION_RAW,
+                           HistoryStore)
+
+DAY = 86400
+T0 = (int(time.time()) // DAY - 1) * DAY
+
+
+@pytest.mark.parametrize('span, points, resolution', [
+    (DAY, 500, RESOLUTION_MINUTE),   # 1440 minute buckets
+    (DAY, 20, RESOLUTION_HOUR),      # 24 hour buckets
+    (DAY, 2000, RESOLUTION_RAW),     # Finer than minute rollups
+    (365 * DAY, 300, RESOLUTION_DAY),
+    (365 * DAY, 1000, RESOLUTION_HOUR),
+])
+def test_select_resolution(span, points, resolution):
+    assert HistoryStore.select_resolution(T0, T0 + span, points) == resolution
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    store = HistoryStore(str(tmp_path / 'history.db'), flush_interval=3600)
+    for minute in range(120):
+        store.record('room/bus/1', {'ph': 6.0 + minute % 2}, T0 + 60 * minute, raw={'ph': 3.0})
+    store.flush()
+    monkeypatch.setattr(app, 'history_store', store)
+    monkeypatch.setattr(app, 'bus_manager', None)
+    yield app.app.test_client()
+    store.close()
+
+
+def history(client, **args):
+    return client.get('/api/history', query_string={'sensor': 'room/bus/1', 'param': 'ph', **args})
+
+
+def test_history_picks_the_coarsest_rollup_with_enough_points(client):
+    body = history(client, **{'from': T0, 'to': T0 + 2 * 3600, 'points': 2}).get_json()
+    assert body['resolution'] == RESOLUTION_HOUR
+    assert body['sensor_id'] == 'room/bus/1' and body['parameter'] == 'ph'
+    assert [(point['ph'], point['min'], point['max'], point['count']) for point in body['points']] == \
+        [(6.5, 6.0, 7.0, 60), (6.5, 6.0, 7.0, 60)]
+
+
+def test_history_raw_readings_for_short_ranges(client):
+    body = history(client, **{'from': T0, 'to': T0 + 600, 'points': 100}).get_json()
+    assert body['resolution'] == RESOLUTION_RAW
+    assert [point['ph'] for point in body['points']] == [6.0, 7.0] * 5
+    assert 'count' not in body['points'][0]
+
+
+def test_history_uncalibrated_values(client):
+    body = history(client, **{'from': T0, 'to': T0 + 600, 'raw': 'true'}).get_json()
+    assert body['raw'] and body['calibration_version'] is None
+    assert {point['ph'] for point in body['points']} == {3.0}
+
+
+def test_history_accepts_iso_times(client):
+    start = time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(T0))
+    end = time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(T0 + 120))
+    assert len(history(client, **{'from': start, 'to': end}).get_json()['points']) == 2
+
+
+@pytest.mark.parametrize('args, error', [
+    ({'sensor': ''}, 'Missing sensor'),
+    ({'param': 'colour'}, 'Invalid param'),
+    ({'from': 'yesterday'}, 'Invalid query parameter'),
+    ({'from': T0 + 10, 'to': T0}, 'Require from < to'),
+    ({'points': 0}, 'Require from < to'),
+])
+def test_history_rejects_bad_arguments(client, args, error):
+    response = history(client, **args)
+    assert response.status_code == 400
+    assert error in response.get_json()['error']
+
+
+def test_history_without_store(monkeypatch):
+    monkeypatch.setattr(app, 'history_store', None)
+    assert app.app.test_client().get('/api/history?sensor=1&param=ph').status_code == 503
@@ -0,0 +1,184 @@
+"""History store: rollups, pruning, raw values and recalibration."""
+
+import time
+
+import pytest
+
+from calibration_engine import CalibrationEngine
+from history_store import (RESOLUTION_DAY, RESOLUTION_HOUR, RESOLUTION_MINUTE, RESOLUTION_RAW,
+                           HistoryStore, calibrate_rollups)
+from modbus_sensor import SensorData
+
+DAY = 86400
+T0 = (int(time.time()) // DAY - 1) * DAY  # Midnight yesterday: recent enough for the default retention
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = HistoryStore(str(tmp_path / 'history.db'), flush_interval=3600, batch_size=10000)
+    yield store
+    store.close()
+
+
+def series(store, resolution=RESOLUTION_RAW, raw=False, param='ph', start=T0 - DAY, end=T0 + 2 * DAY):
+    return list(store.iter_range('s1', param, start, end, resolution, raw=raw))
+
+
+def test_rollups_merge_across_flushes(store):
+    store.record('s1', {'ph': 6.0}, T0)
+    store.record('s1', {'ph': 7.0}, T0 + 30)
+    store.flush()
+    store.record('s1', {'ph': 5.0}, T0 + 59)
+    store.record('s1', {'ph': 8.0}, T0 + 60)
+    store.flush()
+    assert series(store) == [(T0, 6.0), (T0 + 30, 7.0), (T0 + 59, 5.0), (T0 + 60, 8.0)]
+    assert series(store, RESOLUTION_MINUTE) == [(T0, 6.0, 5.0, 7.0, 3), (T0 + 60, 8.0, 8.0, 8.0, 1)]
+    assert series(store, RESOLUTION_HOUR) == [(T0, 6.5, 5.0, 8.0, 4)]
+    assert series(store, RESOLUTION_DAY) == [(T0, 6.5, 5.0, 8.0, 4)]
+
+
+def test_rollup_query_includes_the_bucket_of_start(store):
+    store.record('s1', {'ph': 6.0}, T0 + 10)
+    store.flush()
+    assert series(store, RESOLUTION_MINUTE, start=T0 + 30) == [(T0, 6.0, 6.0, 6.0, 1)]
+    assert series(store, start=T0 + 30) == []
+
+
+def test_raw_values_share_the_calibrated_rows(store):
+    store.record('s1', {'ph': 6.4, 'ec': 1.2}, T0, raw={'ph': 3.2, 'ec': None})
+    store.record('s1', {'ph': 6.8}, T0 + 60, raw={'ph': 3.4, 'ec': 9.9})
+    store.flush()
+    assert series(store, raw=True) == [(T0, 3.2), (T0 + 60, 3.4)]
+    assert series(store, RESOLUTION_HOUR, raw=True) == [(T0, pytest.approx(3.3), 3.2, 3.4, 2)]
+    # ec has no raw value, and a raw value without a calibrated one is not stored
+    assert series(store, raw=True, param='ec') == []
+    assert store._conn.execute('SELECT COUNT(*) FROM readings').fetchone()[0] == 3
+
+
+def test_record_reading_skips_carried_and_invalid_readings(store):
+    data = SensorData(1)
+    data.ph, data.ph_raw, data.nitrogen, data.nitrogen_raw = 6.5, 3.25, 40.0, 20.0
+    data.is_valid = True
+    data.carried_params = ('nitrogen',)
+    store.record_reading('s1', data, T0)
+    store.record_reading('s1', SensorData(1), T0 + 5)
+    store.flush()
+    assert series(store) == [(T0, 6.5)]
+    assert series(store, param='nitrogen') == []
+
+
+def test_batch_size_triggers_a_flush(tmp_path):
+    store = HistoryStore(str(tmp_path / 'history.db'), flush_interval=3600, batch_size=3)
+    for i in range(3):
+        store.record('s1', {'ph': 6.0}, T0 + i)
+    assert len(store._batch) == 0
+    assert len(series(store)) == 3
+    store.close()
+
+
+def test_prune_keeps_each_resolution_for_its_retention(tmp_path):
+    store = HistoryStore(str(tmp_path / 'history.db'), flush_interval=3600,
+                         retention={RESOLUTION_RAW: DAY, RESOLUTION_MINUTE: 2 * DAY, RESOLUTION_HOUR: 3 * DAY})
+    now = T0 + 10 * DAY
+    for days in (0.5, 1.5, 2.5, 3.5):
+        store.record('s1', {'ph': days}, now - days * DAY, raw={'ph': days})
+    store.flush()
+    store.prune(now)
+    start, end = now - 5 * DAY, now + 1
+    assert [value for _, value in store.iter_range('s1', 'ph', start, end)] == [0.5]
+    assert [row[1] for row in store.iter_range('s1', 'ph', start, end, RESOLUTION_MINUTE)] == [1.5, 0.5]
+    assert [row[1] for row in store.iter_range('s1', 'ph', start, end, RESOLUTION_HOUR)] == [2.5, 1.5, 0.5]
+    assert len(list(store.iter_range('s1', 'ph', start, end, RESOLUTION_DAY))) == 4
+    store.close()
+
+
+def test_first_prune_waits_an_hour(tmp_path):
+    store = HistoryStore(str(tmp_path / 'history.db'), flush_interval=3600, retention={RESOLUTION_RAW: 60})
+    old = time.time() - 3600
+    store.record('s1', {'ph': 6.0}, old)
+    store.flush()  # Opening the store does not make a prune due
+    assert len(list(store.iter_range('s1', 'ph', old - 1, old + 1))) == 1
+    store._last_prune -= 3600
+    store.record('s1', {'ph': 6.1}, old + 1)
+    store.flush()
+    assert list(store.iter_range('s1', 'ph', old - 1, old + 2)) == []
+    store.close()
+
+
+@pytest.mark.parametrize('span, points, resolution', [
+    (3600, 200, RESOLUTION_RAW),
+    (DAY, 200, RESOLUTION_MINUTE),
+    (30 * DAY, 200, RESOLUTION_HOUR),
+    (400 * DAY, 200, RESOLUTION_DAY),
+])
+def test_select_resolution(span, points, resolution):
+    assert HistoryStore.select_resolution(T0, T0 + span, points) == resolution
+
+
+def test_recalibration_rewrites_calibrated_values(store):
+    assert store.sync_calibration({'s1': {'ph': {'m': 2.0, 'b': 0.0}}}) is None
+    for i in range(5):
+        store.record('s1', {'ph': 2.0 * (3 + i)}, T0 + 60 * i, raw={'ph': 3.0 + i})
+    store.flush()
+
+    job = store.sync_calibration({'s1': {'ph': {'m': 1.0, 'b': 1.0}}}, label='lab 2', chunk_size=2, pause=0)
+    job.join(10)
+    assert [value for _, value in series(store)] == [4.0, 5.0, 6.0, 7.0, 8.0]
+    assert series(store, RESOLUTION_HOUR) == [(T0, 6.0, 4.0, 8.0, 5)]
+    assert series(store, raw=True) == [(T0 + 60 * i, 3.0 + i) for i in range(5)]
+    status = store.recalibration_status()
+    assert status['version'] == 2 and not status['running']
+    assert status['job']['finished'] is not None and status['job']['rows'] == 5 + 5 + 1 + 1
+
+    # Unchanged calibration: nothing to do; a changed sensor mapping is a new version
+    assert store.sync_calibration({'s1': {'ph': {'m': 1.0, 'b': 1.0}}}) is None
+    store.sync_calibration({'s1': {'ph': {'m': 1.0, 'b': 1.0}}}, calibration_ids={'s1': 1}).join(10)
+    assert store.calibration_version == 3
+    # s1 now uses calibration entry 1, which has none: identity
+    assert [value for _, value in series(store)] == [3.0, 4.0, 5.0, 6.0, 7.0]
+    assert store.calibration_table(2) == {'s1': {'ph': {'m': 1.0, 'b': 1.0}}}
+
+
+def test_interrupted_recalibration_resumes(tmp_path):
+    path = str(tmp_path / 'history.db')
+    store = HistoryStore(path)
+    store.register_calibration({'s1': {'ph': {'m': 2.0, 'b': 0.0}}})
+    for i in range(10):
+        store.record('s1', {'ph': 2.0 * i}, T0 + i, raw={'ph': float(i)})
+    store.flush()
+    table = {'s1': {'ph': {'m': 3.0, 'b': 0.0}}}
+    job = store.sync_calibration(table, chunk_size=3, pause=0.2)
+    while job.position is None:
+        time.sleep(0.01)
+    job.stop()
+    assert store.recalibration_status()['job']['finished'] is None
+    store.close()
+
+    store = HistoryStore(path)
+    store.sync_calibration(table, chunk_size=3, pause=0).join(10)
+    assert [value for _, value in store.iter_range('s1', 'ph', T0, T0 + 10)] == [3.0 * i for i in range(10)]
+    assert store.recalibration_status()['job']['finished'] is not None
+    store.close()
+
+
+def test_reads_during_a_job_use_the_new_calibration(store):
+    store.register_calibration({'s1': {'ph': {'m': 2.0, 'b': 0.0}}})
+    for i in range(10):
+        store.record('s1', {'ph': 2.0 * i}, T0 + i, raw={'ph': float(i)})
+    store.flush()
+    job = store.sync_calibration({'s1': {'ph': {'m': 3.0, 'b': 0.0}}}, chunk_size=2, pause=5)
+    try:
+        while job.position is None:
+            time.sleep(0.01)
+        # Only the first chunk is rewritten, but every read sees version 2
+        assert store.recalibration_status()['running']
+        assert store.recalibration_status()['job']['position'] == [RESOLUTION_RAW, 's1', 'ph', T0 + 1]
+        assert [value for _, value in series(store)] == [3.0 * i for i in range(10)]
+        assert series(store, RESOLUTION_HOUR) == [(T0, 13.5, 0.0, 27.0, 10)]
+    finally:
+        job.stop()
+
+
+def test_falling_calibration_swaps_rollup_min_and_max():
+    engine = CalibrationEngine({1: {'ph': {'m': -1.0, 'b': 10.0}}})
+    assert calibrate_rollups(engine, 1, 'ph', [(T0, 2, 8.0, 3.0, 5.0)]) == [(T0, 2, 12.0, 5.0, 7.0)]
@@ -0,0 +1,80 @@
+"""Metrics registry: OpenMetrics rendering and the /metrics endpoint."""
+
+import pytest
+
+import app
+from metrics import CONTENT_TYPE, MetricsRegistry
+
+
+def test_counter_and_gauge_samples():
+    registry = MetricsRegistry()
+    reads = registry.counter('reads', 'Reads per slave', ('slave',))
+    reads.labels(1).inc()
+    reads.labels('1').inc(2)  # Label values are compared as strings
+    reads.labels(2)
+    depth = registry.gauge('queue_depth', 'Queued requests')
+    depth.set(3)
+    assert registry.render() == '\n'.join([
+        '# TYPE reads counter',
+        '# HELP reads Reads per slave',
+        'reads_total{slave="1"} 3',
+        'reads_total{slave="2"} 0',
+        '# TYPE queue_depth gauge',
+        '# HELP queue_depth Queued requests',
+        'queue_depth 3',
+        '# EOF\n',
+    ])
+
+
+def test_gauge_function_is_read_at_scrape_time():
+    registry = MetricsRegistry()
+    values = [1.5]
+    registry.gauge('age', 'Age').set_function(lambda: values[0])
+    assert 'age 1.5' in registry.render().splitlines()
+    values[0] = None  # Nothing to report
+    assert registry.render().splitlines() == ['# TYPE age gauge', '# HELP age Age', '# EOF']
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    latency = registry.histogram('latency', 'Latency', ('route',), buckets=(0.1, 0.01))
+    child = latency.labels('/a"b')
+    for value in (0.005, 0.01, 0.05, 2.0):
+        child.observe(value)
+    lines = registry.render().splitlines()
+    assert lines[2:] == [
+        'latency_bucket{route="/a\\"b",le="0.01"} 2',
+        'latency_bucket{route="/a\\"b",le="0.1"} 3',
+        'latency_bucket{route="/a\\"b",le="+Inf"} 4',
+        'latency_count{route="/a\\"b"} 4',
+        'latency_sum{route="/a\\"b"} 2.065',
+        '# EOF',
+    ]
+
+
+def test_registration_is_idempotent_but_checked():
+    registry = MetricsRegistry()
+    family = registry.counter('errors', 'Errors', ('kind',))
+    assert registry.counter('errors', 'Errors', ('kind',)) is family
+    with pytest.raises(ValueError, match='already registered differently'):
+        registry.gauge('errors', 'Errors', ('kind',))
+    with pytest.raises(ValueError, match='expects labels'):
+        family.labels('a', 'b')
+
+
+def test_metrics_endpoint_counts_requests_by_route(monkeypatch):
+    monkeypatch.setattr(app, 'bus_manager', None)
+    client = app.app.test_client()
+    requests = app.HTTP_REQUESTS.labels('/api/health', 'GET', 503)
+    before = requests.value
+    client.get('/api/health')
+    assert requests.value == before + 1
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.content_type == CONTENT_TYPE
+    body = response.get_data(as_text=True)
+    assert body.endswith('# EOF\n')
+    assert f'http_requests_total{{route="/api/health",method="GET",status="503"}} {before + 1}' in body
+    assert 'http_request_seconds_bucket{route="/api/health",method="GET",le="+Inf"}' in body
+    assert '# TYPE modbus_transaction_seconds histogram' in body
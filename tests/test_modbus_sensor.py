@@ -0,0 +1,245 @@
+"""Register plans, and reads against the pty bus simulator (modbus_simulator.py) including dead slaves."""
+
+import os
+import time
+
+import pytest
+
+import async_modbus
+import modbus_sensor
+
+pytest.importorskip('pymodbus')
+if not hasattr(os, 'openpty'):
+    pytest.skip('the bus simulator needs a pty', allow_module_level=True)
+
+from async_modbus import AsyncModbusNPKReader, EventLoopThread
+from bus_manager import BusConfig, BusManager
+from modbus_sensor import (DE_RE_RS485, DE_RE_TIMED, DEFAULT_REGISTER_MAP, MAX_REGISTERS_PER_READ,
+                           ModbusNPKReader, compile_register_plan, frame_time)
+from modbus_simulator import DEFAULT_VALUES, PtySimulator, build_bus
+from sensor_scheduler import STATE_HEALTHY
+
+BAUDRATE = 19200
+TIMEOUT = 0.2
+
+# Humidity 19 unused registers after temperature (address 11)
+SPARSE_MAP = DEFAULT_REGISTER_MAP.with_field('humidity', 31, 10)
+
+
+def layout(plan):
+    return [(block.start, block.count, [field[0] for field in block.fields]) for block in plan]
+
+
+def test_register_plan_merges_small_gaps():
+    assert layout(compile_register_plan(DEFAULT_REGISTER_MAP)) == \
+        [(6, 6, ['nitrogen', 'phosphorus', 'potassium', 'ph', 'ec', 'temperature'])]
+    assert layout(compile_register_plan(DEFAULT_REGISTER_MAP, ('temperature', 'nitrogen'))) == \
+        [(6, 6, ['nitrogen', 'temperature'])]
+    assert layout(compile_register_plan(DEFAULT_REGISTER_MAP, ('temperature', 'nitrogen'), max_gap=3)) == \
+        [(6, 1, ['nitrogen']), (11, 1, ['temperature'])]
+
+
+def test_register_plan_splits_large_gaps_and_long_reads():
+    assert layout(compile_register_plan(SPARSE_MAP, ('ph', 'humidity'))) == [(9, 1, ['ph']), (31, 1, ['humidity'])]
+    assert layout(compile_register_plan(SPARSE_MAP, ('ph', 'humidity'), max_gap=21)) == [(9, 23, ['ph', 'humidity'])]
+    far = DEFAULT_REGISTER_MAP.with_field('humidity', 6 + MAX_REGISTERS_PER_READ, 10)
+    assert len(compile_register_plan(far, ('nitrogen', 'humidity'), max_gap=1000)) == 2
+    with pytest.raises(ValueError, match="No mapped parameters in \\['colour'\\]"):
+        compile_register_plan(DEFAULT_REGISTER_MAP, ('colour',))
+
+
+@pytest.fixture
+def simulator():
+    """Four slaves, slave 3 never answers."""
+    bus = build_bus([1, 2, 3, 4], baudrate=BAUDRATE, latency=0.005, jitter=0.0, dead=[3], seed=0)
+    sim = PtySimulator(bus)
+    sim.start()
+    yield sim
+    sim.stop()
+
+
+def test_read_sensor(simulator):
+    reader = ModbusNPKReader(port=simulator.port, baudrate=BAUDRATE, timeout=TIMEOUT,
+                             register_maps={1: DEFAULT_REGISTER_MAP})
+    assert reader.connect()
+    try:
+        data = reader.read_sensor(1, retries=1)
+        assert data.is_valid
+        for param in DEFAULT_REGISTER_MAP.params:
+            assert getattr(data, param) is not None
+    finally:
+        reader.disconnect()
+
+
+@pytest.mark.parametrize('max_gap, requests', [(16, 2), (20, 1)])
+def test_sparse_map_is_read_in_as_few_requests_as_the_gap_allows(max_gap, requests):
+    bus = build_bus([1], baudrate=BAUDRATE, latency=0.005, jitter=0.0, register_map=SPARSE_MAP, seed=0)
+    sim = PtySimulator(bus)
+    sim.start()
+    reader = ModbusNPKReader(port=sim.port, baudrate=BAUDRATE, timeout=TIMEOUT,
+                             register_maps={1: SPARSE_MAP}, max_gap=max_gap)
+    try:
+        assert reader.connect()
+        data = reader.read_sensor(1, retries=1)
+        assert data.is_valid
+        assert data.humidity_raw == DEFAULT_VALUES['humidity']
+        assert data.nitrogen_raw == DEFAULT_VALUES['nitrogen']
+        assert bus.stats()['requests'] == requests
+    finally:
+        reader.disconnect()
+        sim.stop()
+
+
+def test_dead_slave_does_not_take_the_bus_down(simulator):
+    # pymodbus closes the port when a slave times out; the next read must reopen it
+    reader = ModbusNPKReader(port=simulator.port, baudrate=BAUDRATE, timeout=TIMEOUT,
+                             register_maps={slave: DEFAULT_REGISTER_MAP for slave in (1, 2, 3, 4)})
+    assert reader.connect()
+    try:
+        for _ in range(2):
+            results = {slave: reader.read_sensor(slave, retries=1) for slave in (1, 2, 3, 4)}
+            assert not results[3].is_valid
+            assert [slave for slave, data in results.items() if data.is_valid] == [1, 2, 4]
+    finally:
+        reader.disconnect()
+
+
+def test_scheduler_backs_off_only_the_dead_slave(simulator):
+    config = BusConfig(simulator.port, room='test', name='bus', baudrate=BAUDRATE,
+                       timeout=TIMEOUT, slaves=[1, 2, 3, 4])
+    manager = BusManager([config], failure_threshold=2, backoff_max=60.0)
+    assert manager.connect()
+    try:
+        for _ in range(4):
+            readings = manager.read_due_sensors()
+            assert all(readings[f'test/bus/{slave}'].is_valid for slave in (1, 2, 4))
+            time.sleep(3 * TIMEOUT)  # Let the background probe of slave 3 finish
+        health = manager.health()
+        assert [key for key, slave in health.items() if slave['state'] != STATE_HEALTHY] == ['test/bus/3']
+        assert health['test/bus/1']['errors'] == 0
+    finally:
+        manager.disconnect()
+
+
+@pytest.fixture
+def loop_thread():
+    loop_thread = EventLoopThread()
+    yield loop_thread
+    loop_thread.stop(timeout=5)
+
+
+def test_async_late_reply_is_not_taken_for_the_next_request(loop_thread):
+    # The slave answers after the first request's deadline; its late reply must
+    # not be decoded as the answer to the next request to the same slave
+    bus = build_bus([1, 2], baudrate=BAUDRATE, latency=0.15, jitter=0.0, seed=0)
+    sim = PtySimulator(bus)
+    sim.start()
+    reader = AsyncModbusNPKReader(port=sim.port, baudrate=BAUDRATE, timeout=0.1,
+                                  register_maps={1: DEFAULT_REGISTER_MAP, 2: DEFAULT_REGISTER_MAP})
+    try:
+        assert loop_thread.run(reader.connect())
+        assert not loop_thread.run(reader.read_sensor(1, retries=1, params=('nitrogen',))).is_valid
+
+        reader.timeout = 1.0
+        for _ in range(5):
+            data = loop_thread.run(reader.read_sensor(1, retries=1, params=('potassium',)))
+            assert data.is_valid
+            assert data.potassium_raw == DEFAULT_VALUES['potassium']
+            assert loop_thread.run(reader.read_sensor(2, retries=1)).is_valid
+    finally:
+        loop_thread.run(reader.disconnect())
+        sim.stop()
+
+
+def test_async_read_reopens_a_dropped_port(simulator, loop_thread):
+    reader = AsyncModbusNPKReader(port=simulator.port, baudrate=BAUDRATE, timeout=TIMEOUT,
+                                  register_maps={1: DEFAULT_REGISTER_MAP})
+    try:
+        assert loop_thread.run(reader.connect())
+        loop_thread.run(reader.client.close())
+        assert not reader.connected
+        assert loop_thread.run(reader.read_sensor(1, retries=1)).is_valid
+    finally:
+        loop_thread.run(reader.disconnect())
+
+
+class FakeGPIO:
+    """Records DE/RE pin changes with their time."""
+
+    BCM, OUT, HIGH, LOW = 'BCM', 'OUT', 1, 0
+
+    def __init__(self):
+        self.changes = []
+
+    def setmode(self, mode):
+        pass
+
+    def setup(self, pin, direction):
+        pass
+
+    def output(self, pin, level):
+        self.changes.append((time.monotonic(), level))
+
+    def cleanup(self):
+        pass
+
+    def pulses(self):
+        """(high, low) time pairs after the initial LOW of the setup."""
+        levels = self.changes[1:]
+        return [(high, low) for (high, _), (low, _) in zip(levels[::2], levels[1::2])]
+
+
+@pytest.fixture
+def gpio(monkeypatch):
+    gpio = FakeGPIO()
+    monkeypatch.setattr(modbus_sensor, 'GPIO_AVAILABLE', True)
+    monkeypatch.setattr(modbus_sensor, 'GPIO', gpio, raising=False)
+    monkeypatch.setattr(async_modbus, 'GPIO', gpio, raising=False)
+    return gpio
+
+
+def request_time():
+    """DE high time for one read request: 8 bytes plus one character of turnaround."""
+    return frame_time(8, BAUDRATE) + frame_time(1, BAUDRATE)
+
+
+def test_timed_de_re_is_high_only_while_the_request_is_sent(simulator, gpio):
+    reader = ModbusNPKReader(port=simulator.port, baudrate=BAUDRATE, timeout=TIMEOUT, gpio_de_re=24,
+                             register_maps={1: DEFAULT_REGISTER_MAP})
+    assert reader.turnaround == pytest.approx(frame_time(1, BAUDRATE))
+    assert reader.connect()
+    try:
+        assert reader.read_sensor(1, retries=1).is_valid
+    finally:
+        reader.disconnect()
+    assert [level for _, level in gpio.changes] == [FakeGPIO.LOW, FakeGPIO.HIGH, FakeGPIO.LOW]
+    (high, low), = gpio.pulses()
+    assert request_time() <= low - high < request_time() + 0.02
+
+
+def test_async_timed_de_re_starts_from_the_write(simulator, gpio, loop_thread):
+    reader = AsyncModbusNPKReader(port=simulator.port, baudrate=BAUDRATE, timeout=TIMEOUT, gpio_de_re=24,
+                                  register_maps={1: DEFAULT_REGISTER_MAP})
+    try:
+        assert loop_thread.run(reader.connect())
+        for _ in range(2):
+            assert loop_thread.run(reader.read_sensor(1, retries=1)).is_valid
+    finally:
+        loop_thread.run(reader.disconnect())
+    pulses = gpio.pulses()
+    assert len(pulses) == 2
+    for high, low in pulses:
+        assert request_time() - 0.002 <= low - high < request_time() + 0.02
+
+
+def test_rs485_mode_falls_back_to_timed_without_kernel_support(simulator, gpio, monkeypatch):
+    monkeypatch.setattr(ModbusNPKReader, '_enable_rs485_mode', lambda self, serial_port: False)
+    reader = ModbusNPKReader(port=simulator.port, baudrate=BAUDRATE, timeout=TIMEOUT, gpio_de_re=24,
+                             register_maps={1: DEFAULT_REGISTER_MAP}, de_re_mode=DE_RE_RS485)
+    assert reader.connect()
+    try:
+        assert reader.de_re_mode == DE_RE_TIMED
+        assert reader.read_sensor(1, retries=1).is_valid
+    finally:
+        reader.disconnect()
+    assert len(gpio.pulses()) == 1
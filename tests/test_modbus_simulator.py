@@ -0,0 +1,98 @@
+"""Simulated bus: frame handling, fault injection and trace record/replay."""
+
+import struct
+
+import pytest
+
+from modbus_sensor import DEFAULT_REGISTER_MAP, compile_register_plan, frame_time
+from modbus_simulator import (DEFAULT_VALUES, ILLEGAL_DATA_ADDRESS, ILLEGAL_FUNCTION, SimulatedBus,
+                              SimulatedSensor, build_bus, crc16, load_trace, record_trace)
+
+
+def request(slave=1, function=3, address=4, count=8):
+    frame = struct.pack('>BBHH', slave, function, address, count)
+    return frame + crc16(frame)
+
+
+def registers(response):
+    assert crc16(response[:-2]) == response[-2:]
+    count = response[2] // 2
+    return list(struct.unpack(f'>{count}H', response[3:3 + 2 * count]))
+
+
+def test_crc16():
+    assert crc16(bytes.fromhex('01030000000A')) == bytes.fromhex('C5CD')
+
+
+def test_read_serves_the_register_layout_and_takes_frame_time():
+    bus = build_bus([1], baudrate=9600, latency=0.02, jitter=0.0)
+    response, elapsed = bus.handle(request())
+    values = registers(response)
+    for param, offset, scale in DEFAULT_REGISTER_MAP.fields:
+        assert values[offset] / scale == DEFAULT_VALUES[param]
+    assert elapsed == pytest.approx(frame_time(8, 9600) + 0.02 + frame_time(len(response), 9600))
+
+
+def test_slaves_serve_their_own_values():
+    bus = SimulatedBus([SimulatedSensor(1), SimulatedSensor(2, values={'ph': 7.25})], jitter=0.0)
+    assert registers(bus.handle(request(slave=2))[0])[5] == 725
+    assert registers(bus.handle(request(slave=1))[0])[5] == 650
+
+
+def test_bad_crc_and_dead_or_unknown_slaves_get_no_answer():
+    bus = build_bus([1, 2], dead=[2], jitter=0.0)
+    corrupted = request()[:-1] + b'\x00'
+    assert bus.handle(corrupted)[0] is None
+    assert bus.handle(request(slave=2))[0] is None
+    assert bus.handle(request(slave=9))[0] is None
+    bus.set_dead(2, False)
+    assert bus.handle(request(slave=2))[0] is not None
+    assert bus.stats() == {'requests': 4, 'responses': 1, 'dropped': 0, 'crc_errors': 0, 'ignored': 3}
+
+
+@pytest.mark.parametrize('frame, code', [
+    (request(address=4, count=200), ILLEGAL_DATA_ADDRESS),
+    (request(function=6), ILLEGAL_FUNCTION),
+])
+def test_exception_responses(frame, code):
+    response, _ = build_bus([1], jitter=0.0).handle(frame)
+    assert response[1] == frame[1] | 0x80
+    assert response[2] == code
+    assert crc16(response[:-2]) == response[-2:]
+
+
+def test_fault_injection():
+    dropping = build_bus([1], drop_rate=1.0, seed=0)
+    assert dropping.handle(request())[0] is None
+    assert dropping.stats()['dropped'] == 1
+
+    corrupting = build_bus([1], crc_error_rate=1.0, seed=0)
+    response, _ = corrupting.handle(request())
+    assert crc16(response[:-2]) != response[-2:]
+    assert corrupting.stats()['crc_errors'] == 1
+
+
+class RecordingReader:
+    """Stands in for a connected ModbusNPKReader."""
+
+    slaves = [1]
+
+    def register_plan(self, slave):
+        return compile_register_plan(DEFAULT_REGISTER_MAP)
+
+    def _read_block(self, slave, block):
+        return [100 + i for i in range(block.count)]
+
+
+def test_recorded_trace_is_replayed(tmp_path):
+    path = str(tmp_path / 'trace.jsonl')
+    record_trace(RecordingReader(), path, duration=0.01, interval=0.05)
+    traces = load_trace(path)
+    assert list(traces) == [1]
+    t, function, address, values = traces[1][0]
+    assert (function, address, values) == ('holding', 6, [100, 101, 102, 103, 104, 105])
+
+    bus = build_bus([1, 2], trace=path, jitter=0.0)
+    assert registers(bus.handle(request(slave=1))[0])[2:] == [100, 101, 102, 103, 104, 105]
+    # Slaves the trace does not cover serve the default values
+    assert registers(bus.handle(request(slave=2))[0])[5] == 650
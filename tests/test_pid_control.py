@@ -0,0 +1,167 @@
+"""PID controller, time-proportioning PIDLoop and relay autotune."""
+
+import pytest
+
+from control_loop import ControlLoop, LoopConfig, PIDController, PIDLoop, PIDTuning, RelayAutotuner
+from pid_autotune import SENSOR_KEY, HumidityChamber, autotune, run, snapshot_for
+from sensor_poller import SensorSnapshot
+
+
+def config(**options):
+    return LoopConfig('humidity', 60, 75, sensors=[SENSOR_KEY], **options)
+
+
+def test_output_is_clamped_and_integral_does_not_wind_up():
+    pid = PIDController()
+    tuning = PIDTuning(70, kp=0.1, ki=0.01)
+    # Far below setpoint for an hour: saturated on, integral frozen
+    for now in range(0, 3600, 10):
+        assert pid.update(40, tuning, now) == 1.0
+    assert pid.integral <= 1.0
+    # Once above setpoint the output drops at once instead of unwinding for minutes
+    assert pid.update(72, tuning, 3600) < 1.0
+    assert pid.update(80, tuning, 3610) == 0.0
+
+
+def test_integral_removes_steady_state_error():
+    pid = PIDController()
+    tuning = PIDTuning(70, kp=0.05, ki=0.0001)
+    first = pid.update(68, tuning, 0)
+    for now in range(10, 610, 10):
+        output = pid.update(68, tuning, now)
+    assert first == pytest.approx(0.1)
+    assert output == pytest.approx(0.1 + 0.0001 * 2 * 600)
+
+
+def test_mode_above_reverses_the_error():
+    tuning = PIDTuning(70, kp=0.1)
+    assert PIDController().update(75, tuning, 0, mode='above') == pytest.approx(0.5)
+    assert PIDController().update(75, tuning, 0, mode='below') == 0.0
+
+
+def test_derivative_acts_on_the_measurement():
+    pid = PIDController()
+    pid.update(65, PIDTuning(70, kp=0.05, kd=20), 0)
+    before = pid.update(65, PIDTuning(70, kp=0.05, kd=20), 10)
+    # A setpoint step changes only the proportional term
+    after = pid.update(65, PIDTuning(72, kp=0.05, kd=20), 20)
+    assert after - before == pytest.approx(0.1)
+    # A rising measurement pulls the output down
+    assert pid.update(67, PIDTuning(72, kp=0.05, kd=20), 30) < after - 0.1
+
+
+def test_tuning_validation():
+    with pytest.raises(ValueError, match='must not be negative'):
+        PIDTuning(70, kp=-1)
+    with pytest.raises(ValueError, match='window must be positive'):
+        PIDTuning(70, kp=1, window=0)
+    with pytest.raises(ValueError, match="Invalid rule 'fast'"):
+        RelayAutotuner(70, rule='fast')
+
+
+def test_time_proportioning_window():
+    switches = []
+    loop = PIDLoop('pid', lambda state: switches.append(state) or True, config(),
+                   PIDTuning(70, kp=0.05, window=100))
+    # Error 5 -> duty 25%: on for 25s of each 100s window
+    states = []
+    for now in range(0, 200, 5):
+        loop.update(snapshot_for(65), now=now)
+        states.append(loop.state)
+    assert loop.duty == pytest.approx(0.25)
+    assert loop.on_time == 25
+    # The first window starts off, so its on time comes last and runs on into the second's
+    assert switches == [True, False]
+    assert [now for now, state in zip(range(0, 200, 5), states) if state] == list(range(75, 125, 5))
+
+
+@pytest.mark.parametrize('value, on_time', [(69, 0.0), (51, 100.0)])
+def test_short_pulses_respect_minimum_times(value, on_time):
+    loop = PIDLoop('pid', lambda state: True, config(min_on=10, min_off=10), PIDTuning(70, kp=0.05, window=100))
+    loop.update(snapshot_for(value), now=0)  # Duty 5% or 95%
+    assert loop.on_time == on_time
+
+
+def test_no_input_fails_safe_and_resets():
+    loop = PIDLoop('pid', lambda state: True, config(), PIDTuning(70, kp=0.05, ki=0.001, window=100))
+    loop.update(snapshot_for(65), now=0)
+    loop.update(snapshot_for(65), now=80)
+    assert loop.state and loop.pid.integral > 0
+    assert loop.update(SensorSnapshot({}), now=90)
+    assert not loop.state
+    assert loop.pid.integral == 0.0
+    assert loop.reason == 'no usable humidity input (fail-safe off)'
+
+
+def test_relay_autotune_oscillates_and_finds_gains():
+    tuner = RelayAutotuner(68, hysteresis=1.0, cycles=2)
+    chamber = HumidityChamber(noise=0.0)
+    state, now = False, 0.0
+    while not tuner.done:
+        state = tuner.update(chamber.step(state, 5.0), now)
+        now += 5.0
+    status = tuner.status()
+    assert status['state'] == 'done'
+    assert status['oscillations'] == 3  # The first one is discarded
+    assert status['amplitude'] > 1.0
+    result = tuner.result
+    assert result.setpoint == 68
+    assert result.kp > 0 and result.ki > 0 and result.kd == 0  # 'pi' rule
+
+
+def test_autotune_fails_without_oscillation():
+    tuner = RelayAutotuner(68, timeout=600)
+    for now in range(0, 700, 10):
+        assert tuner.update(50, now) is (not tuner.done)
+    assert tuner.status()['state'] == 'failed'
+    assert tuner.error == 'no stable oscillation within 600s'
+    assert tuner.result is None
+
+
+def test_autotuned_pid_beats_hysteresis_on_the_chamber():
+    result = autotune(HumidityChamber(), config(min_on=30, min_off=30), 68, window=300, interval=5)
+    assert result['state'] == 'done'
+    tuning = PIDTuning(**result['result'])
+
+    hysteresis = run(ControlLoop('hysteresis', lambda state: True, config(min_on=30, min_off=30)),
+                     HumidityChamber(), 6 * 3600, 5, 68)
+    pid = run(PIDLoop('pid', lambda state: True, config(min_on=30, min_off=30), tuning),
+              HumidityChamber(), 6 * 3600, 5, 68)
+    assert pid['rms_error'] < hysteresis['rms_error']
+    assert pid['max'] - pid['min'] < hysteresis['max'] - hysteresis['min']
+
+
+def test_pid_holds_humidity_within_a_toggle_limit_a_tight_band_exceeds():
+    tuning = PIDTuning(68, kp=0.03943, ki=7.89e-05, window=300)
+    limited = config(min_on=30, min_off=30, max_toggles=12)
+    hysteresis = run(ControlLoop('hysteresis', lambda state: True,
+                                 LoopConfig('humidity', 64, 72, sensors=[SENSOR_KEY], min_on=30, min_off=30,
+                                            max_toggles=12)),
+                     HumidityChamber(), 6 * 3600, 5, 68)
+    pid = run(PIDLoop('pid', lambda state: True, limited, tuning), HumidityChamber(), 6 * 3600, 5, 68)
+    assert pid['switches_per_hour'] <= 12
+    assert pid['rms_error'] < hysteresis['rms_error']
+    assert pid['min'] > hysteresis['min']
+
+
+def test_autotune_result_is_adopted_by_the_loop():
+    loop = PIDLoop('pid', lambda state: True, config(), PIDTuning(68, 0.0, window=300))
+    loop.start_autotune(cycles=2)
+    chamber, now = HumidityChamber(), 0.0
+    while loop.autotuner is not None:
+        loop.update(snapshot_for(chamber.step(loop.state, 5.0)), now=now)
+        now += 5.0
+    assert loop.last_autotune['state'] == 'done'
+    assert loop.tuning.kp == loop.last_autotune['result']['kp']
+    assert loop.status()['autotune'] == loop.last_autotune
+
+
+def test_autotune_can_be_cancelled():
+    loop = PIDLoop('pid', lambda state: True, config(), PIDTuning(68, 0.05, window=300))
+    loop.start_autotune()
+    loop.update(snapshot_for(60), now=0)
+    loop.stop_autotune()
+    loop.update(snapshot_for(60), now=5)
+    assert loop.autotuner is None
+    assert loop.last_autotune['error'] == 'cancelled'
+    assert loop.tuning.kp == 0.05
@@ -0,0 +1,68 @@
+"""Compact readings: slotted SensorData and the array-backed ReadingBatch."""
+
+import pytest
+
+from modbus_sensor import PARAMETERS, SensorData
+from reading_batch import ReadingBatch
+
+
+def reading(sensor_id, valid=True, **values):
+    data = SensorData(sensor_id)
+    data.is_valid = valid
+    for param, value in values.items():
+        setattr(data, param, value)
+        setattr(data, f'{param}_raw', value / 2)
+    return data
+
+
+def test_sensor_data_has_a_fixed_schema():
+    data = SensorData(1)
+    assert not hasattr(data, '__dict__')
+    with pytest.raises(AttributeError):
+        data.colour = 'red'
+    assert set(data.to_dict()) == {'sensor_id', 'timestamp', 'is_valid', 'error'} | set(PARAMETERS)
+    data.ph_raw = 3.0
+    assert data.to_dict_with_raw()['_raw']['ph'] == 3.0
+
+
+def test_readings_round_trip():
+    batch = ReadingBatch(raw=True)
+    batch.append('a', reading('a', ph=6.5, ec=1.25), 100.0)
+    batch.append('b', reading('b', valid=False), 101.0)
+    batch.append('a', reading('a', humidity=60.0), 102.0)
+    assert len(batch) == 3
+    assert batch.sensors == ['a', 'b']
+
+    first = batch.get(0)
+    assert first.sensor_id == 'a' and first.is_valid
+    assert (first.ph, first.ec, first.ph_raw, first.humidity) == (6.5, 1.25, 3.25, None)
+    assert not batch.get(1).is_valid
+    assert batch.get(2).humidity == 60.0
+
+
+def test_rows_skip_absent_values_and_invalid_readings():
+    batch = ReadingBatch(raw=True)
+    batch.append('a', reading('a', ph=6.5, ec=1.25), 100.0)
+    batch.append('b', reading('b', valid=False), 101.0)
+    batch.append_values('a', {'humidity': 60.0}, 102.0)  # No raw value given
+    assert list(batch.rows()) == [('a', 'ph', 100.0, 6.5), ('a', 'ec', 100.0, 1.25),
+                                  ('a', 'humidity', 102.0, 60.0)]
+    assert list(batch.rows(raw=True)) == [('a', 'ph', 100.0, 3.25), ('a', 'ec', 100.0, 0.625)]
+    assert list(batch.paired_rows())[2] == ('a', 'humidity', 102.0, 60.0, None)
+
+
+def test_append_only_the_requested_parameters():
+    batch = ReadingBatch()
+    batch.append(1, reading(1, ph=6.5, ec=1.25), 100.0, params=['ec'])
+    assert list(batch.rows()) == [(1, 'ec', 100.0, 1.25)]
+    assert list(batch.rows(raw=True)) == []  # Raw columns not kept
+
+
+def test_float_columns_halve_the_size():
+    double, single = ReadingBatch(), ReadingBatch('f')
+    for batch in (double, single):
+        for i in range(10):
+            batch.append_values(1, {'ph': 6.5}, float(i))
+    value_bytes = len(PARAMETERS) * 10
+    assert double.nbytes - single.nbytes == value_bytes * 4
+    assert single.get(0).ph == 6.5
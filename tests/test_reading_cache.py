@@ -0,0 +1,118 @@
+"""Reading cache: last-good fallback and stale-while-revalidate refreshes."""
+
+from concurrent.futures import Future
+
+import pytest
+
+import reading_cache
+from bus_arbiter import BusArbiter
+from modbus_sensor import SensorData
+from reading_cache import ReadingCache
+
+
+def reading(sensor_id, ph=6.5, valid=True, error=None):
+    data = SensorData(sensor_id)
+    data.ph = ph
+    data.is_valid = valid
+    data.error = error
+    return data
+
+
+class FakeArbiter:
+    PRIORITY_INTERACTIVE = BusArbiter.PRIORITY_INTERACTIVE
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit_read(self, key, priority):
+        future = Future()
+        self.submitted.append((key, priority, future))
+        return future
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(reading_cache.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_failed_read_keeps_the_last_good_reading():
+    cache = ReadingCache(ttl=60)
+    cache.update(reading(1, ph=6.5))
+    entry = cache.update(reading(1, valid=False, error='timeout'))
+    assert entry.data.ph == 6.5
+    assert entry.stale
+    assert entry.to_dict()['last_error'] == 'timeout'
+    # The next good reading clears the error
+    entry = cache.update(reading(1, ph=7.0))
+    assert entry.data.ph == 7.0 and not entry.stale
+
+
+def test_without_fallback_failures_replace_the_reading():
+    cache = ReadingCache(ttl=60, fallback=False)
+    cache.update(reading(1))
+    assert not cache.update(reading(1, valid=False, error='timeout')).data.is_valid
+
+
+def test_failure_without_a_good_reading_is_served_as_is():
+    cache = ReadingCache(ttl=60)
+    entry = cache.update(reading(1, valid=False, error='timeout'))
+    assert not entry.data.is_valid and entry.last_error is None
+
+
+def test_get_never_blocks_and_refreshes_in_the_background(clock):
+    arbiter = FakeArbiter()
+    cache = ReadingCache(arbiter, ttl=60)
+    assert cache.get(1) is None
+    assert [(key, priority) for key, priority, _ in arbiter.submitted] == [(1, BusArbiter.PRIORITY_INTERACTIVE)]
+    assert cache.get(1) is None  # Refresh already in flight
+    assert len(arbiter.submitted) == 1
+
+    arbiter.submitted[0][2].set_result(reading(1, ph=6.0))
+    entry = cache.get(1)
+    assert entry.data.ph == 6.0
+    assert len(arbiter.submitted) == 1
+    assert cache.stats()['misses'] == 2 and cache.stats()['hits'] == 1
+
+
+def test_expired_entry_is_served_while_it_revalidates(clock):
+    arbiter = FakeArbiter()
+    cache = ReadingCache(arbiter, ttl=60)
+    cache.update(reading(1, ph=6.0))
+    clock[0] += 61
+    assert cache.get(1).data.ph == 6.0
+    assert len(arbiter.submitted) == 1
+    assert cache.stats()['stale_hits'] == 1
+
+    # A failed refresh keeps the old reading and is not retried within the TTL
+    arbiter.submitted[0][2].set_result(reading(1, valid=False, error='timeout'))
+    entry = cache.get(1)
+    assert entry.data.ph == 6.0 and entry.last_error == 'timeout'
+    clock[0] += 30
+    cache.get(1)
+    assert len(arbiter.submitted) == 1
+    clock[0] += 31
+    cache.get(1)
+    assert len(arbiter.submitted) == 2
+
+
+def test_refresh_exception_is_logged_not_raised(clock):
+    arbiter = FakeArbiter()
+    cache = ReadingCache(arbiter, ttl=60)
+    cache.get(1)
+    arbiter.submitted[0][2].set_exception(RuntimeError('Bus arbiter stopped'))
+    assert cache.peek(1) is None
+
+
+def test_per_sensor_ttl_and_external_sensors(clock):
+    arbiter = FakeArbiter()
+    cache = ReadingCache(arbiter, ttl=60)
+    cache.set_ttl(1, 5)
+    cache.set_external('ambient')
+    assert cache.update(reading(1)).ttl == 5
+    cache.update(reading('ambient'), 'ambient')
+    clock[0] += 10
+    cache.get(1)
+    cache.get('ambient')
+    assert [key for key, _, _ in arbiter.submitted] == [1]
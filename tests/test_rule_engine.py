@@ -0,0 +1,184 @@
+"""Rule parsing, compiled evaluation, 'for' timers and incremental updates."""
+
+import time
+
+import pytest
+
+from modbus_sensor import SensorData
+from reading_cache import CachedReading
+from rule_engine import RuleEngine, TimeWindow, rules_from_config
+from sensor_poller import SensorSnapshot
+
+RELAYS = {1: {}, 2: {}}
+
+
+def snapshot(readings, updated=None):
+    """Snapshot of {key: {param: value}}; updated defaults to every key."""
+    entries = {}
+    for key, values in readings.items():
+        data = SensorData(key)
+        for param, value in values.items():
+            setattr(data, param, value)
+        data.is_valid = True
+        entries[key] = CachedReading(data, ttl=60.0)
+    return SensorSnapshot(entries, updated=frozenset(updated) if updated is not None else None)
+
+
+def engine(*rules, **options):
+    return RuleEngine(**options).compile(rules_from_config({'rules': list(rules)}, targets=RELAYS))
+
+
+def active(engine, name):
+    return next(rule.active for rule in engine.rules if rule.name == name)
+
+
+@pytest.mark.parametrize('when, message', [
+    ('ec >', 'unexpected end of condition'),
+    ('ec > 2 for 10', 'expected a duration unit'),
+    ('foo > 1', "unknown parameter 'foo'"),
+    ('avg(ec, 0m) > 1', 'durations must be positive'),
+    ('1 > 2', 'comparison of two constants'),
+    ('ec > 2 $', r"unexpected '\$' at column 7"),
+    ('(ec > 2', r'expected \)'),
+    ('ec[] > 2', 'empty sensor selector'),
+])
+def test_parse_errors(when, message):
+    with pytest.raises(ValueError, match=message):
+        engine({'name': 'bad', 'when': when, 'relay': 1})
+
+
+def test_config_errors():
+    with pytest.raises(ValueError, match="'when' and 'relay' are required"):
+        rules_from_config([{'name': 'x', 'when': 'ec > 1'}])
+    with pytest.raises(ValueError, match='unknown relay 3'):
+        rules_from_config([{'when': 'ec > 1', 'relay': 3}], targets=RELAYS)
+    with pytest.raises(ValueError, match='relay must be a port number'):
+        rules_from_config([{'when': 'ec > 1', 'relay': 'ac'}], targets=RELAYS)
+    with pytest.raises(ValueError, match='unknown settings: colour'):
+        rules_from_config([{'when': 'ec > 1', 'relay': 1, 'colour': 'red'}])
+
+
+def test_relay_given_as_string():
+    rules = rules_from_config([{'when': 'ec > 1', 'relay': '2'}], targets=RELAYS)
+    assert rules[0].target == 2
+
+
+def test_logic_and_zone_aggregates():
+    rules = engine(
+        {'name': 'salty', 'when': 'avg(ec) > 2 and not max(ph) >= 7', 'relay': 1},
+        {'name': 'either', 'when': 'ec[a] > 5 or (ph[b] < 6 and ph[a] < 6)', 'relay': 2},
+    )
+    rules.update(snapshot({'a': {'ec': 1.0, 'ph': 5.5}, 'b': {'ec': 4.0, 'ph': 6.5}}), now=0)
+    assert active(rules, 'salty')  # mean 2.5, max pH 6.5
+    assert not active(rules, 'either')
+    rules.update(snapshot({'b': {'ec': 4.0, 'ph': 5.0}}), now=5)
+    assert active(rules, 'either')
+
+
+def test_for_timer_fires_and_resets():
+    rules = engine({'name': 'hot', 'when': 'temperature > 28 for 10m', 'relay': 2, 'else': False})
+    hot, cool = {'s': {'temperature': 30}}, {'s': {'temperature': 25}}
+    assert rules.update(snapshot(hot), now=0) == {2: (False, 'rule hot')}
+    assert rules.update(snapshot(hot), now=599) == {}
+    # Due by its timer even though no value changed
+    assert rules.update(snapshot(hot, updated=()), now=600) == {2: (True, 'rule hot')}
+    assert rules.evaluations == 1
+    assert rules.update(snapshot(cool), now=700) == {2: (False, 'rule hot')}
+    # The timer starts over once the condition holds again
+    rules.update(snapshot(hot), now=800)
+    assert rules.update(snapshot(hot, updated=()), now=1399) == {}
+    assert rules.update(snapshot(hot, updated=()), now=1400) == {2: (True, 'rule hot')}
+
+
+def test_missing_signal_is_unknown():
+    rules = engine(
+        {'name': 'neg', 'when': 'not temperature > 28', 'relay': 1},
+        {'name': 'neg-or', 'when': 'not (temperature > 28 or ec > 1)', 'relay': 2},
+    )
+    rules.update(snapshot({'s': {'ec': 0.5}}), now=0)
+    assert not active(rules, 'neg')
+    assert not active(rules, 'neg-or')
+    rules.update(snapshot({'s': {'ec': 0.5, 'temperature': 20}}), now=5)
+    assert active(rules, 'neg')
+    assert active(rules, 'neg-or')
+
+
+def test_negated_timer_with_missing_signal():
+    rules = engine({'name': 'not-hot', 'when': 'not (temperature > 28 for 10m)', 'relay': 1})
+    rules.update(snapshot({'s': {'ec': 1.0}}), now=0)
+    assert not active(rules, 'not-hot')
+    rules.update(snapshot({'s': {'temperature': 30}}), now=5)
+    assert active(rules, 'not-hot')  # Hot, but not for 10 minutes yet
+    rules.update(snapshot({'s': {'temperature': 30}}, updated=()), now=605)
+    assert not active(rules, 'not-hot')
+
+
+def test_stale_readings_are_dropped(monkeypatch):
+    rules = engine({'name': 'hot', 'when': 'temperature > 28', 'relay': 2}, max_age=10.0)
+    rules.update(snapshot({'s': {'temperature': 30}}), now=0)
+    assert active(rules, 'hot')
+    clock = time.monotonic() + 11
+    monkeypatch.setattr(time, 'monotonic', lambda: clock)
+    assert rules.update(snapshot({}), now=11) == {2: None}
+    assert not active(rules, 'hot')
+
+
+def test_only_affected_rules_are_evaluated():
+    rules = engine(
+        {'name': 'ec', 'when': 'ec[a] > 1', 'relay': 1},
+        {'name': 'ph', 'when': 'ph[b] < 6', 'relay': 2},
+    )
+    rules.update(snapshot({'a': {'ec': 2.0}, 'b': {'ph': 5.0}}), now=0)
+    assert rules.evaluations == 2
+    rules.update(snapshot({'a': {'ec': 3.0}, 'b': {'ph': 5.0}}), now=5)
+    assert rules.evaluations == 1
+    rules.update(snapshot({'a': {'ec': 3.0}, 'b': {'ph': 5.0}}), now=10)
+    assert rules.evaluations == 0
+
+
+def test_first_rule_per_target_decides():
+    rules = engine(
+        {'name': 'dry', 'when': 'humidity < 40', 'relay': 1},
+        {'name': 'hot', 'when': 'temperature > 28', 'relay': 1, 'state': False},
+    )
+    changes = rules.update(snapshot({'s': {'humidity': 30, 'temperature': 30}}), now=0)
+    assert changes == {1: (True, 'rule dry')}
+    changes = rules.update(snapshot({'s': {'humidity': 50, 'temperature': 30}}), now=5)
+    assert changes == {1: (False, 'rule hot')}
+    changes = rules.update(snapshot({'s': {'humidity': 50, 'temperature': 20}}), now=10)
+    assert changes == {1: None}
+
+
+def test_reload_keeps_timers_and_releases_removed_targets():
+    hot_rule = {'name': 'hot', 'when': 'temperature > 28 for 10m', 'relay': 2}
+    rules = engine(hot_rule, {'name': 'dry', 'when': 'humidity < 40', 'relay': 1})
+    hot = {'s': {'temperature': 30, 'humidity': 30}}
+    rules.update(snapshot(hot), now=0)
+    reloaded = rules.compile(rules_from_config([hot_rule], targets=RELAYS))
+    assert reloaded.update(snapshot(hot, updated=()), now=300) == {1: None}
+    assert reloaded.update(snapshot(hot, updated=()), now=600) == {2: (True, 'rule hot')}
+
+
+def test_windowed_signal():
+    rules = engine({'name': 'dry', 'when': 'min(humidity, 5m) < 40', 'relay': 1})
+    rules.update(snapshot({'s': {'humidity': 35}}), now=0)
+    rules.update(snapshot({'s': {'humidity': 60}}), now=60)
+    assert active(rules, 'dry')  # 35 is still in the window
+    rules.update(snapshot({'s': {'humidity': 60}}), now=301)
+    assert not active(rules, 'dry')
+
+
+@pytest.mark.parametrize('function, expected', [
+    ('min', [5, 3, 3, 3, 4]),
+    ('max', [5, 5, 5, 6, 7]),
+    ('mean', [5, 4, 4, 13 / 3, 17 / 3]),
+    ('median', [5, 4, 4, 4, 6]),
+])
+def test_time_window(function, expected):
+    window = TimeWindow(function, 10)
+    values = []
+    for now, value in [(0, 5), (3, 3), (6, 4), (12, 6), (14, 7)]:
+        window.push(now, value)
+        window.expire(now)
+        values.append(window.value())
+    assert values == pytest.approx(expected)
@@ -0,0 +1,118 @@
+"""Background poller: snapshots, listeners, due-only readers and background sources."""
+
+import threading
+
+from modbus_sensor import SensorData
+from sensor_poller import BackgroundSource, SensorPoller, SensorSnapshot
+
+
+def reading(sensor_id, humidity=50.0, valid=True):
+    data = SensorData(sensor_id)
+    data.humidity = humidity
+    data.is_valid = valid
+    return data
+
+
+class FakeReader:
+    def __init__(self, *sensor_ids):
+        self.sensor_ids = sensor_ids
+        self.reads = 0
+
+    def read_all_sensors(self):
+        self.reads += 1
+        return {sensor_id: reading(sensor_id, humidity=float(self.reads)) for sensor_id in self.sensor_ids}
+
+
+class DueReader(FakeReader):
+    def __init__(self, *cycles):
+        super().__init__()
+        self.cycles = list(cycles)
+
+    def read_due_sensors(self):
+        return {sensor_id: reading(sensor_id) for sensor_id in self.cycles.pop(0)}
+
+
+def test_poll_once_publishes_a_new_snapshot():
+    poller = SensorPoller(FakeReader(1, 2))
+    first = poller.snapshot
+    assert first.cycle == 0 and first.entries == {}
+
+    snapshot = poller.poll_once()
+    assert poller.snapshot is snapshot
+    assert snapshot.cycle == 1
+    assert snapshot.updated == {1, 2}
+    assert snapshot.readings[1].humidity == 1.0
+    assert snapshot.get(2)['humidity'] == 1.0
+    assert snapshot.get(3) is None
+    assert first.entries == {}  # Published snapshots are never modified
+
+    assert poller.poll_once().readings[1].humidity == 2.0
+
+
+def test_due_only_readers_keep_the_other_entries():
+    poller = SensorPoller(DueReader([1, 2], [2]))
+    poller.poll_once()
+    snapshot = poller.poll_once()
+    assert snapshot.updated == {2}
+    assert set(snapshot.entries) == {1, 2}
+    assert set(snapshot.unfiltered) == {2}
+
+
+def test_listeners_run_after_each_cycle_and_are_isolated():
+    seen = []
+    poller = SensorPoller(FakeReader(1))
+
+    def broken(snapshot):
+        raise RuntimeError('listener bug')
+
+    poller.add_listener(broken)
+    poller.add_listener(lambda snapshot: seen.append(snapshot.cycle))
+    poller.poll_once()
+    poller.poll_once()
+    assert seen == [1, 2]
+
+
+def test_background_source_readings_join_the_next_cycle():
+    poller = SensorPoller(FakeReader(1))
+    source = BackgroundSource('ambient', lambda: reading('ambient', 40.0))
+    poller.add_source(source)
+    assert 'ambient' in poller.cache._external
+
+    source._latest = reading('ambient', 40.0)
+    snapshot = poller.poll_once()
+    assert snapshot.readings['ambient'].humidity == 40.0
+    # Taken once: the next cycle keeps the entry but does not count it as updated
+    snapshot = poller.poll_once()
+    assert 'ambient' not in snapshot.updated
+    assert 'ambient' in snapshot.entries
+
+
+def test_thread_polls_until_stopped():
+    cycles = threading.Event()
+    poller = SensorPoller(FakeReader(1), interval=0.01)
+    poller.add_listener(lambda snapshot: snapshot.cycle >= 3 and cycles.set())
+    poller.start()
+    try:
+        assert cycles.wait(5)
+    finally:
+        poller.stop(timeout=5)
+    assert not poller.is_alive()
+
+
+def test_failed_cycle_does_not_stop_the_thread():
+    class FlakyReader(FakeReader):
+        def read_all_sensors(self):
+            if self.reads == 0:
+                self.reads += 1
+                raise OSError('bus gone')
+            return super().read_all_sensors()
+
+    polled = threading.Event()
+    poller = SensorPoller(FlakyReader(1), interval=0.01)
+    poller.add_listener(lambda snapshot: polled.set())
+    poller.start()
+    try:
+        assert polled.wait(5)
+    finally:
+        poller.stop(timeout=5)
+    assert isinstance(poller.snapshot, SensorSnapshot) and poller.snapshot.cycle >= 1
@@ -0,0 +1,82 @@
+"""Sensor registry files: buses, register maps and per-sensor settings."""
+
+import json
+import os
+
+import pytest
+
+from modbus_sensor import DEFAULT_REGISTER_MAP
+from sensor_registry import build_registry, load_registry
+
+EXAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'sensors.example.json')
+
+
+def test_example_file():
+    registry = load_registry(EXAMPLE)
+    assert registry.keys == ['default/ttyAMA0/1']
+    bus = registry.buses[0]
+    assert (bus.port, bus.gpio_de_re, bus.slaves) == ('/dev/ttyAMA0', 24, [1])
+    # The declared npk7 layout is the built-in one, shared rather than copied
+    assert bus.register_maps[1] is DEFAULT_REGISTER_MAP
+
+
+def test_buses_sensors_and_defaults():
+    registry = build_registry({
+        'register_maps': {'th2': {'start': 0, 'count': 2, 'function': 'input',
+                                  'params': {'humidity': {'offset': 0, 'scale': 10},
+                                             'temperature': {'offset': 1, 'scale': 10}}}},
+        'buses': [
+            {'port': '/dev/ttyUSB0', 'room': 'greenhouse', 'name': 'north', 'param_intervals': {'nitrogen': 300},
+             'sensors': [{'slave': 1}, {'slave': '2', 'calibration': 'probe-a', 'poll_interval': 30}]},
+            {'port': '/dev/ttyUSB1', 'room': 'shed', 'baudrate': 19200,
+             'sensors': [{'slave': 7, 'register_map': 'th2'}]},
+        ],
+    }, defaults={'baudrate': 4800, 'timeout': 0.5})
+    assert registry.keys == ['greenhouse/north/1', 'greenhouse/north/2', 'shed/ttyUSB1/7']
+    north, shed = registry.buses
+    assert (north.baudrate, north.timeout, shed.baudrate) == (4800, 0.5, 19200)
+    assert north.calibration_ids == {1: 1, 2: 'probe-a'}
+    assert north.poll_intervals == {2: 30}
+    assert north.param_intervals == {1: {'nitrogen': 300}, 2: {'nitrogen': 300}}
+
+    spec = registry.get('shed/ttyUSB1/7')
+    assert spec.to_dict() == {
+        'key': 'shed/ttyUSB1/7', 'bus': 'shed/ttyUSB1', 'slave': 7,
+        'parameters': ['humidity', 'temperature'], 'poll_interval': None,
+        'param_intervals': None, 'calibration_id': 7,
+    }
+    assert spec.register_map.function == 'input'
+    assert registry.get('shed/ttyUSB1/8') is None
+
+
+def test_scale_override_shares_identical_maps():
+    registry = build_registry({'buses': [{'port': '/dev/ttyUSB0', 'sensors': [
+        {'slave': 1, 'scale': {'ec': 1000}},
+        {'slave': 2, 'scale': {'ec': 1000}},
+        {'slave': 3},
+    ]}]})
+    maps = registry.buses[0].register_maps
+    assert maps[1] is maps[2]
+    assert maps[3] is DEFAULT_REGISTER_MAP
+    assert dict((param, scale) for param, _, scale in maps[1].fields)['ec'] == 1000
+
+
+def test_disabled_sensors_are_skipped():
+    registry = build_registry({'buses': [{'port': '/dev/ttyUSB0', 'sensors': [
+        {'slave': 1, 'enabled': False}, {'slave': 2}]}]})
+    assert registry.keys == ['default/ttyUSB0/2']
+
+
+@pytest.mark.parametrize('sensors, message', [
+    ([{'slave': 1, 'register_map': 'missing'}], "unknown register map 'missing'"),
+    ([{'slave': 1}, {'slave': 1}], 'Duplicate sensor default/ttyUSB0/1'),
+])
+def test_invalid_registry(sensors, message):
+    with pytest.raises(ValueError, match=message):
+        build_registry({'buses': [{'port': '/dev/ttyUSB0', 'sensors': sensors}]})
+
+
+def test_load_json_file(tmp_path):
+    path = tmp_path / 'sensors.json'
+    path.write_text(json.dumps({'buses': [{'port': '/dev/ttyUSB0', 'room': 'lab', 'sensors': [{'slave': 5}]}]}))
+    assert load_registry(str(path)).keys == ['lab/ttyUSB0/5']
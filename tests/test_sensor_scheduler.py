@@ -0,0 +1,177 @@
+"""Poll scheduler: per-parameter intervals, backoff and circuit breaker."""
+
+import time
+from concurrent.futures import Future
+
+import pytest
+
+from modbus_sensor import SensorData
+from sensor_scheduler import STATE_HEALTHY, STATE_OPEN, STATE_SUSPECT, PollScheduler
+
+POLL, PROBE = 1, 2
+
+
+class Bus:
+    """submit() hook answering from a set of live slaves; can hold reads back."""
+
+    def __init__(self, alive=(1, 2)):
+        self.alive = set(alive)
+        self.calls = []
+        self.held = []
+        self.hold = set()  # Keys whose reads stay pending until release()
+
+    def __call__(self, key, params, retries, priority):
+        self.calls.append((key, params, retries, priority))
+        future = Future()
+        if key in self.hold:
+            self.held.append((key, params, future))
+        else:
+            future.set_result(self.read(key, params))
+        return future
+
+    def read(self, key, params):
+        data = SensorData(key)
+        if key in self.alive:
+            for param in params or ('temperature', 'nitrogen'):
+                setattr(data, param, float(len(self.calls)))
+                setattr(data, f'{param}_raw', float(len(self.calls)))
+            data.is_valid = True
+        else:
+            data.error = 'No response'
+        return data
+
+    def release(self):
+        for key, params, future in self.held:
+            future.set_result(self.read(key, params))
+        self.held = []
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    return now
+
+
+def scheduler(bus, **options):
+    scheduler = PollScheduler(bus, POLL, PROBE, retries=3, failure_threshold=2,
+                              backoff_base=30, backoff_max=100, **options)
+    for key in (1, 2):
+        scheduler.add(key, key, ('temperature', 'nitrogen'))
+    return scheduler
+
+
+def test_healthy_slaves_are_read_every_poll(clock):
+    bus = Bus()
+    polls = scheduler(bus)
+    assert set(polls.poll()) == {1, 2}
+    assert set(polls.poll()) == {1, 2}
+    assert bus.calls[0] == (1, None, 3, POLL)
+
+
+def test_failing_slave_goes_suspect_then_open(clock):
+    bus = Bus(alive=(1,))
+    polls = scheduler(bus)
+    readings = polls.poll()
+    assert not readings[2].is_valid
+    assert polls.status()[2]['state'] == STATE_SUSPECT
+
+    # Suspect: one attempt at probe priority, handed over once it completes
+    readings = polls.poll()
+    assert bus.calls[-1] == (2, None, 1, PROBE)
+    assert not readings[2].is_valid
+    status = polls.status()[2]
+    assert status['state'] == STATE_OPEN
+    assert status['next_probe_in'] == 30
+    assert polls.unavailable(2) == 'Sensor 2 not responding (next probe in 30s)'
+    assert polls.unavailable(1) is None
+
+    calls = len(bus.calls)
+    polls.poll()
+    assert [call[0] for call in bus.calls[calls:]] == [1]
+
+
+def test_backoff_doubles_up_to_the_maximum(clock):
+    bus = Bus(alive=(1,))
+    polls = scheduler(bus)
+    backoffs = []
+    for _ in range(6):
+        polls.poll()
+        status = polls.status()[2]
+        if status['state'] == STATE_OPEN:
+            backoffs.append(status['next_probe_in'])
+            clock[0] += status['next_probe_in']
+    assert backoffs == [30, 60, 100, 100, 100]
+
+
+def test_slave_recovers_after_a_probe(clock):
+    bus = Bus(alive=(1,))
+    polls = scheduler(bus)
+    polls.poll()
+    polls.poll()
+    assert polls.status()[2]['state'] == STATE_OPEN
+    bus.alive.add(2)
+    clock[0] += 30
+    polls.poll()  # Probe succeeds in the background
+    readings = polls.poll()
+    assert readings[2].is_valid
+    status = polls.status()[2]
+    assert status['state'] == STATE_HEALTHY and status['failures'] == 0
+    assert polls.unavailable(2) is None
+
+
+def test_background_reads_do_not_block_the_poll(clock):
+    bus = Bus(alive=(1,))
+    polls = scheduler(bus)
+    polls.poll()
+    bus.hold = {2}
+    assert set(polls.poll()) == {1}  # Returns without waiting for the suspect slave
+    calls = len(bus.calls)
+    polls.poll()
+    assert [call[0] for call in bus.calls[calls:]] == [1]  # Not queued again while in flight
+    bus.alive.add(2)
+    bus.hold = set()
+    bus.release()
+    assert polls.poll()[2].is_valid
+
+
+def test_param_intervals_read_only_due_params_and_carry_the_rest(clock):
+    bus = Bus()
+    polls = PollScheduler(bus, POLL, PROBE)
+    polls.add(1, 1, ('temperature', 'nitrogen'), param_intervals={'nitrogen': 60})
+    first = polls.poll()[1]
+    clock[0] += 5
+    second = polls.poll()[1]
+    assert bus.calls[-1][1] == ('temperature',)
+    assert second.nitrogen == first.nitrogen
+    assert second.temperature != first.temperature
+    assert second.carried_params == ('nitrogen',)
+    clock[0] += 60
+    polls.poll()
+    assert bus.calls[-1][1] is None
+    assert polls.status()[1]['param_intervals'] == {'nitrogen': 60}
+
+
+def test_interval_skips_slaves_that_are_not_due(clock):
+    bus = Bus()
+    polls = PollScheduler(bus, POLL, PROBE)
+    polls.add(1, 1, ('temperature',), interval=30)
+    polls.add(2, 2, ('temperature',))
+    polls.poll()
+    clock[0] += 10
+    assert set(polls.poll()) == {2}
+    clock[0] += 20
+    assert set(polls.poll()) == {1, 2}
+
+
+def test_exception_from_a_read_counts_as_a_failure(clock):
+    def submit(key, params, retries, priority):
+        future = Future()
+        future.set_exception(OSError('port closed'))
+        return future
+
+    polls = PollScheduler(submit, POLL, PROBE)
+    polls.add(1, 1, ('temperature',))
+    data = polls.poll()[1]
+    assert data.error == 'port closed'
+    assert polls.status()[1]['last_error'] == 'port closed'
@@ -0,0 +1,99 @@
+"""Streaming filters and where they apply (served readings, not history)."""
+
+from concurrent.futures import Future
+
+import pytest
+
+from modbus_sensor import SensorData
+from reading_cache import ReadingCache
+from sensor_poller import SensorPoller
+from signal_filters import (EWMAFilter, KalmanFilter, MedianFilter, SignalFilterStage, parse_chain,
+                            parse_filter_spec)
+
+
+def reading(sensor_id=1, **values):
+    data = SensorData(sensor_id)
+    for param, value in values.items():
+        setattr(data, param, value)
+        setattr(data, f'{param}_raw', value)
+    data.is_valid = True
+    return data
+
+
+class FakeArbiter:
+    """Bus front-end whose background refreshes return queued readings."""
+
+    PRIORITY_INTERACTIVE = 0
+
+    def __init__(self):
+        self.pending = []
+
+    def submit_read(self, key, priority=None):
+        future = Future()
+        future.set_result(self.pending.pop(0))
+        return future
+
+
+class FakeReader:
+    def __init__(self, readings):
+        self.readings = readings
+
+    def read_all_sensors(self):
+        return {key: values.pop(0) for key, values in self.readings.items()}
+
+
+def test_median_rejects_a_spike():
+    median = MedianFilter(3)
+    assert [median.update(v) for v in (10, 11, 90, 12, 11)] == [10, 10.5, 11, 12, 12]
+
+
+def test_ewma_and_kalman_converge():
+    ewma, kalman = EWMAFilter(0.5), KalmanFilter(0.01, 1.0)
+    assert ewma.update(10) == 10
+    assert ewma.update(20) == 15
+    for _ in range(200):
+        value = kalman.update(5.0)
+    assert kalman.update(10.0) < 5.5  # Heavy smoothing: one outlier barely moves it
+    assert value == pytest.approx(5.0)
+
+
+def test_parse_filter_spec():
+    chains = parse_filter_spec('humidity=median:5,ewma:0.3;*=median:3')
+    assert chains['humidity'] == [('median', (5,)), ('ewma', (0.3,))]
+    assert chains['ph'] == [('median', (3,))]
+    with pytest.raises(ValueError, match='Unknown filter'):
+        parse_chain('mean:3')
+    with pytest.raises(ValueError, match='alpha'):
+        parse_chain('ewma:2')
+    with pytest.raises(ValueError, match='Unknown parameter'):
+        parse_filter_spec('colour=median:3')
+
+
+def test_stage_keeps_raw_and_carried_values():
+    stage = SignalFilterStage(parse_filter_spec('ph=ewma:0.5'))
+    assert stage.apply('a', reading(ph=6.0)).ph == 6.0
+    filtered = stage.apply('a', reading(ph=7.0))
+    assert filtered.ph == 6.5
+    assert filtered.ph_raw == 7.0
+    carried = reading(ph=7.0)
+    carried.carried_params = ('ph',)
+    assert stage.apply('a', carried).ph == 6.5  # Not fed to the filter again
+    assert stage.apply('b', reading(ph=7.0)).ph == 7.0  # Separate state per sensor
+
+
+def test_cache_filters_background_refreshes():
+    arbiter = FakeArbiter()
+    cache = ReadingCache(arbiter, ttl=0.0, filters=SignalFilterStage(parse_filter_spec('ph=ewma:0.5')))
+    cache.update(reading(ph=6.0), 'a')
+    arbiter.pending.append(reading(ph=8.0))
+    cache.get('a')  # Expired: refreshed through the arbiter
+    assert cache.peek('a').data.ph == 7.0
+
+
+def test_history_gets_unfiltered_readings():
+    cache = ReadingCache(ttl=60.0, filters=SignalFilterStage(parse_filter_spec('ph=ewma:0.5')))
+    poller = SensorPoller(FakeReader({'a': [reading(ph=6.0), reading(ph=8.0)]}), cache=cache)
+    poller.poll_once()
+    snapshot = poller.poll_once()
+    assert snapshot.entries['a'].data.ph == 7.0
+    assert snapshot.unfiltered['a'].ph == 8.0